@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Materialiserat saldoindex per konto, valuta och dag
+
+Istället för att summera alla posteringar från ingående balans vid varje
+saldofråga lagras det ackumulerade saldot per (konto, valuta, dag) i SQLite.
+Tabellen är en WITHOUT ROWID-tabell med primärnyckeln (account, currency,
+day), så B-trädet är både index och data: saldot en viss dag är en
+binärsökning efter senaste rad med day <= D.
+
+Nya transaktioner läggs till inkrementellt. Transaktioner efter seriens
+senaste dag blir nya rader; bakåtdaterade transaktioner justerar raderna
+efter sitt datum. Om transaktioner försvunnit ur huvudboken byggs indexet om.
+
+Beloppen lagras som heltal skalade med 10^6.
+"""
+
+import argparse
+import hashlib
+import logging
+import sqlite3
+import sys
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from beancount import loader
+from beancount.core import data
+
+from agents.config import Config, config as default_config
+from agents.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+SCALE = 10**6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS balances (
+    account TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (account, currency, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS series (
+    account TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    PRIMARY KEY (account, currency)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS entries (
+    hash TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+
+def _to_int(number: Decimal) -> int:
+    return int((number * SCALE).to_integral_value())
+
+
+def _to_decimal(value: int) -> Decimal:
+    return (Decimal(value) / SCALE).normalize() + Decimal("0.00")
+
+
+def entry_hashes(entries: Iterable[data.Transaction]) -> List[str]:
+    """Stabil nyckel per transaktion - identiska transaktioner numreras"""
+    seen: Counter = Counter()
+    hashes = []
+    for entry in entries:
+        parts = [str(entry.date), entry.flag or "", entry.payee or "", entry.narration or ""]
+        parts += [f"{p.account}|{p.units}|{p.cost}|{p.price}" for p in entry.postings]
+        digest = hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+        seen[digest] += 1
+        hashes.append(f"{digest}:{seen[digest]}")
+    return hashes
+
+
+class BalanceIndex:
+    """Ackumulerade dagssaldon i SQLite med O(log n) uppslag"""
+
+    def __init__(self, db_path=":memory:"):
+        """
+        Args:
+            db_path: SQLite-fil (":memory:" för ett index i minnet)
+        """
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Stäng databasen"""
+        self.conn.close()
+
+    # -- Uppdatering ------------------------------------------------------
+
+    def sync(self, entries: Iterable) -> int:
+        """
+        Synkronisera indexet med huvudbokens transaktioner
+
+        Args:
+            entries: Beancount-direktiv (endast Transaction används)
+
+        Returns:
+            Antal nya transaktioner som lagts till i indexet
+        """
+        transactions = [entry for entry in entries if isinstance(entry, data.Transaction)]
+        hashes = entry_hashes(transactions)
+        indexed = {row[0] for row in self.conn.execute("SELECT hash FROM entries")}
+
+        current = set(hashes)
+        if indexed - current:
+            logger.info(f"Saldoindex: {len(indexed - current)} transaktioner borttagna - bygger om")
+            with self.conn:
+                self.conn.execute("DELETE FROM balances")
+                self.conn.execute("DELETE FROM series")
+                self.conn.execute("DELETE FROM entries")
+            indexed = set()
+
+        new = [(h, tx) for h, tx in zip(hashes, transactions) if h not in indexed]
+        if not new:
+            return 0
+
+        deltas: Dict[Tuple[str, str], Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        for _hash, entry in new:
+            day = entry.date.toordinal()
+            for posting in entry.postings:
+                if posting.units is None or posting.units.number is None:
+                    continue
+                deltas[(posting.account, posting.units.currency)][day] += _to_int(posting.units.number)
+
+        with self.conn:
+            for key, by_day in deltas.items():
+                self._apply(key, sorted((day, amount) for day, amount in by_day.items() if amount))
+            self.conn.executemany("INSERT INTO entries (hash) VALUES (?)", [(h,) for h, _tx in new])
+
+        logger.info(f"Saldoindex: {len(new)} nya transaktioner, {len(deltas)} kontoserier")
+        return len(new)
+
+    def _apply(self, key: Tuple[str, str], deltas: List[Tuple[int, int]]):
+        """Applicera dagliga förändringar på en (konto, valuta)-serie"""
+        if not deltas:
+            return
+        account, currency = key
+        self.conn.execute("INSERT OR IGNORE INTO series (account, currency) VALUES (?, ?)", key)
+        last = self.conn.execute(
+            "SELECT day, balance FROM balances WHERE account = ? AND currency = ? "
+            "ORDER BY day DESC LIMIT 1",
+            key,
+        ).fetchone()
+        last_day, balance = last if last else (None, 0)
+
+        # Vanliga fallet: allt nytt ligger efter seriens sista dag - bara nya rader
+        if last_day is None or deltas[0][0] > last_day:
+            rows = []
+            for day, amount in deltas:
+                balance += amount
+                rows.append((account, currency, day, balance))
+            self.conn.executemany(
+                "INSERT INTO balances (account, currency, day, balance) VALUES (?, ?, ?, ?)", rows
+            )
+            return
+
+        # Bakåtdaterat: justera alla senare rader
+        for day, amount in deltas:
+            previous = self._lookup(account, currency, day)
+            exists = self.conn.execute(
+                "SELECT 1 FROM balances WHERE account = ? AND currency = ? AND day = ?",
+                (account, currency, day),
+            ).fetchone()
+            self.conn.execute(
+                "UPDATE balances SET balance = balance + ? "
+                "WHERE account = ? AND currency = ? AND day >= ?",
+                (amount, account, currency, day),
+            )
+            if not exists:
+                self.conn.execute(
+                    "INSERT INTO balances (account, currency, day, balance) VALUES (?, ?, ?, ?)",
+                    (account, currency, day, previous + amount),
+                )
+
+    def update_from_ledger(self, ledger_path: Path) -> int:
+        """Läs huvudboken och lägg till nya transaktioner"""
+        entries, errors, _options = loader.load_file(str(ledger_path))
+        if errors:
+            logger.warning(f"{len(errors)} fel vid inläsning av {ledger_path}")
+        return self.sync(entries)
+
+    # -- Frågor -----------------------------------------------------------
+
+    def _lookup(self, account: str, currency: str, day: int) -> int:
+        row = self.conn.execute(
+            "SELECT balance FROM balances WHERE account = ? AND currency = ? AND day <= ? "
+            "ORDER BY day DESC LIMIT 1",
+            (account, currency, day),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _series(self, account: str, include_children: bool) -> List[Tuple[str, str]]:
+        if include_children:
+            # ";" sorterar direkt efter ":" - intervallet täcker alla underkonton
+            return self.conn.execute(
+                "SELECT account, currency FROM series "
+                "WHERE account = ? OR (account > ? AND account < ?)",
+                (account, account + ":", account + ";"),
+            ).fetchall()
+        return self.conn.execute(
+            "SELECT account, currency FROM series WHERE account = ?", (account,)
+        ).fetchall()
+
+    def balance(self, account: str, on: date, include_children: bool = False) -> Dict[str, Decimal]:
+        """
+        Saldo per valuta vid slutet av en dag
+
+        Args:
+            account: Beancount-konto, t.ex. "Assets:Bank:Företagskonto"
+            on: Datum (saldot inkluderar dagens transaktioner)
+            include_children: Summera även underkonton
+        """
+        totals: Dict[str, int] = defaultdict(int)
+        for series_account, currency in self._series(account, include_children):
+            totals[currency] += self._lookup(series_account, currency, on.toordinal())
+        return {currency: _to_decimal(value) for currency, value in sorted(totals.items()) if value}
+
+    def delta(
+        self, account: str, start: date, end: date, include_children: bool = False
+    ) -> Dict[str, Decimal]:
+        """Förändring per valuta under perioden start..end (båda dagarna inkluderade)"""
+        before = start - timedelta(days=1)
+        totals: Dict[str, int] = defaultdict(int)
+        for series_account, currency in self._series(account, include_children):
+            totals[currency] += (
+                self._lookup(series_account, currency, end.toordinal())
+                - self._lookup(series_account, currency, before.toordinal())
+            )
+        return {currency: _to_decimal(value) for currency, value in sorted(totals.items()) if value}
+
+    def rows(
+        self, start: date, end: date, exclude_currency: Optional[str] = None
+    ) -> List[Tuple[str, str, date, Decimal]]:
+        """
+        Alla saldorader med datum i (start, end], sorterade per serie och dag
+
+        Args:
+            exclude_currency: Hoppa över serier i denna valuta (t.ex. redovisningsvalutan)
+        """
+        result = self.conn.execute(
+            "SELECT b.account, b.currency, b.day, b.balance FROM series s "
+            "JOIN balances b ON b.account = s.account AND b.currency = s.currency "
+            "AND b.day > ? AND b.day <= ? "
+            "WHERE s.currency IS NOT ? ORDER BY b.account, b.currency, b.day",
+            (start.toordinal(), end.toordinal(), exclude_currency),
+        )
+        return [
+            (account, currency, date.fromordinal(day), _to_decimal(balance))
+            for account, currency, day, balance in result
+        ]
+
+    def series(self, exclude_currency: Optional[str] = None) -> List[Tuple[str, str]]:
+        """Alla (konto, valuta)-serier i indexet"""
+        return self.conn.execute(
+            "SELECT account, currency FROM series WHERE currency IS NOT ? ORDER BY account, currency",
+            (exclude_currency,),
+        ).fetchall()
+
+    def accounts(self) -> List[str]:
+        """Alla konton i indexet"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT account FROM series ORDER BY account")]
+
+
+def main(config: Optional[Config] = None):
+    """
+    Huvudprogram
+
+    Args:
+        config: Inställningar (default: den globala config)
+    """
+    config = config or default_config
+    parser = argparse.ArgumentParser(description="Saldo per konto från saldoindexet")
+    parser.add_argument("account", help="Beancount-konto, t.ex. Assets:Bank")
+    parser.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Saldo vid slutet av denna dag (standard: idag)"
+    )
+    parser.add_argument(
+        "--from",
+        dest="start",
+        type=date.fromisoformat,
+        help="Visa förändring från detta datum till --date istället för saldo"
+    )
+    parser.add_argument(
+        "--children",
+        action="store_true",
+        help="Inkludera underkonton"
+    )
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        default=config.MAIN_LEDGER,
+        help=f"Huvudbokens fil (standard: {config.MAIN_LEDGER})"
+    )
+    args = parser.parse_args()
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    index = BalanceIndex(config.BALANCE_INDEX_DB)
+    try:
+        index.update_from_ledger(args.ledger)
+        if args.start:
+            result = index.delta(args.account, args.start, args.date, args.children)
+            print(f"\nFörändring {args.account} {args.start} - {args.date}")
+        else:
+            result = index.balance(args.account, args.date, args.children)
+            print(f"\nSaldo {args.account} {args.date}")
+        for currency, amount in result.items():
+            print(f"  {amount:>16} {currency}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
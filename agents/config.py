@@ -1,67 +1,217 @@
 """
 Konfigurations-hantering för Efficra Accounting System
+
+Inställningarna läses lat: .env och miljövariabler läses först när en
+inställning används, och varje värde cachas på instansen. Import av modulen
+har inga sidoeffekter.
+
+Den globala `config` används av CLI:na. Bibliotekskod tar en config som
+argument så att tester, parallella arbetare och flera bolag i samma process
+kan ha egna inställningar:
+
+    acme = Config(env_file="acme.env", DATA_LEDGER="data/acme/ledger")
+    InvoiceProcessor(config=acme)
 """
 
 import os
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import Callable, Dict, Optional
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+
+def _bool(value: str) -> bool:
+    return value.lower() == "true"
+
 
-# Ladda .env fil
-load_dotenv()
+class Setting:
+    """
+    En inställning från miljön, med standardvärde och typkonvertering
+
+    Värdet räknas ut vid första åtkomsten och sparas i instansens __dict__,
+    så efterföljande åtkomster är vanliga attributuppslag.
+    """
+
+    def __init__(self, default: str, cast: Callable = str, path: bool = False):
+        self.default = default
+        self.cast = cast
+        self.path = path
+        self.name = ""
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def resolve(self, config: "Config", raw) -> object:
+        if raw is None or (self.path and raw == ""):  # Tom sökväg = inte satt
+            return None
+        if self.path:
+            return config.BASE_DIR / raw
+        return self.cast(raw) if isinstance(raw, str) else raw
+
+    def __get__(self, config: Optional["Config"], owner=None):
+        if config is None:
+            return self
+        value = self.resolve(config, config.environ.get(self.name, self.default))
+        config.__dict__[self.name] = value
+        return value
 
 
 class Config:
     """Centraliserad konfiguration"""
 
     # Företagsinformation
-    COMPANY_NAME = os.getenv("COMPANY_NAME", "Efficra Consulting KB")
-    ORG_NUMBER = os.getenv("ORG_NUMBER", "")
-    VAT_NUMBER = os.getenv("VAT_NUMBER", "")
+    COMPANY_NAME = Setting("Efficra Consulting KB")
+    TENANT_ID = Setting("")  # Kort namn i loggar och mätvärden när flera bolag synkas
+    ORG_NUMBER = Setting("")
+    VAT_NUMBER = Setting("")
 
     # Ollama AI
-    OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-    OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+    OLLAMA_HOST = Setting("http://localhost:11434")
+    OLLAMA_MODEL = Setting("llama3")
+    OLLAMA_MAX_IN_FLIGHT = Setting("4", int)
+    OLLAMA_TIMEOUT = Setting("120", float)
 
     # Revolut API
-    REVOLUT_BUSINESS_API_KEY = os.getenv("REVOLUT_BUSINESS_API_KEY", "")
-    REVOLUT_SANDBOX = os.getenv("REVOLUT_SANDBOX", "false").lower() == "true"
-    REVOLUT_SYNC_DAYS = int(os.getenv("REVOLUT_SYNC_DAYS", "7"))
-    REVOLUT_AUTO_SYNC = os.getenv("REVOLUT_AUTO_SYNC", "false").lower() == "true"
+    REVOLUT_BUSINESS_API_KEY = Setting("")
+    REVOLUT_CLIENT_ID = Setting("")  # OAuth används i stället för API-nyckeln om satt
+    REVOLUT_CERT_DIR = Setting(None, path=True)  # None = ~/.revolut/certs
+    REVOLUT_TOKEN_FILE = Setting(None, path=True)  # None = ~/.revolut/tokens.json
+    REVOLUT_RATE_LIMIT = Setting("0", float)  # Max förfrågningar per sekund (0 = obegränsat)
+    REVOLUT_TOKEN_TIMEOUT = Setting("30", float)  # Sekunder per förfrågan mot token-endpointen
+    REVOLUT_SANDBOX = Setting("false", _bool)
+    REVOLUT_API_URL = Setting("")  # Tom = efter REVOLUT_SANDBOX
+    REVOLUT_SYNC_DAYS = Setting("7", int)
+    REVOLUT_AUTO_SYNC = Setting("false", _bool)  # true = revolut_sync_agent körs som daemon
+    REVOLUT_SYNC_INTERVAL = Setting("900", float)  # Sekunder mellan synkar i daemonläge
+    REVOLUT_SYNC_JITTER = Setting("0.1", float)  # Andel av intervallet som slumpas
+    BACKFILL_WORKERS = Setting("3", int)  # Månader som hämtas samtidigt vid historisk import
+    BACKFILL_CHECKPOINT = Setting("data/cache/revolut_backfill.json", path=True)
+    REVOLUT_WEBHOOK_SECRET = Setting("")  # Signeringshemlighet från webhook-registreringen
+    REVOLUT_WEBHOOK_HOST = Setting("127.0.0.1")
+    REVOLUT_WEBHOOK_PORT = Setting("8780", int)
+    REVOLUT_WEBHOOK_QUEUE = Setting("data/cache/webhook_events.sqlite", path=True)
+    REVOLUT_WEBHOOK_BATCH_SECONDS = Setting("1.0", float)  # Samla händelser så länge före bokföring
+    REVOLUT_WEBHOOK_GAP_FILL_INTERVAL = Setting("3600", float)  # Sekunder mellan luckfyllande polling
 
     # Fava
-    FAVA_HOST = os.getenv("FAVA_HOST", "0.0.0.0")
-    FAVA_PORT = int(os.getenv("FAVA_PORT", "5000"))
-
-    # Sökvägar
-    BASE_DIR = Path(__file__).parent.parent
-    DATA_INBOX = BASE_DIR / os.getenv("DATA_INBOX", "data/inbox")
-    DATA_PROCESSED = BASE_DIR / os.getenv("DATA_PROCESSED", "data/processed")
-    DATA_ARCHIVE = BASE_DIR / os.getenv("DATA_ARCHIVE", "data/archive")
-    DATA_LEDGER = BASE_DIR / os.getenv("DATA_LEDGER", "data/ledger")
+    FAVA_HOST = Setting("0.0.0.0")
+    FAVA_PORT = Setting("5000", int)
+
+    # Sökvägar (relativa till BASE_DIR)
+    DATA_INBOX = Setting("data/inbox", path=True)
+    DATA_PROCESSED = Setting("data/processed", path=True)
+    DATA_ARCHIVE = Setting("data/archive", path=True)
+    DATA_LEDGER = Setting("data/ledger", path=True)
+    SIE_EXPORT_DIR = Setting("data/export/sie", path=True)
+    OLLAMA_CACHE_DIR = Setting("data/cache/llm", path=True)
+    METRICS_DIR = Setting("data/metrics", path=True)
 
     # Beancount
-    MAIN_LEDGER = BASE_DIR / os.getenv("MAIN_LEDGER", "main.beancount")
-    CURRENCY = os.getenv("CURRENCY", "SEK")
-    OPENING_DATE = os.getenv("OPENING_DATE", "2024-01-01")
+    MAIN_LEDGER = Setting("main.beancount", path=True)
+    CURRENCY = Setting("SEK")
+    OPENING_DATE = Setting("2024-01-01")
+    BALANCE_INDEX_DB = Setting("data/cache/balances.sqlite", path=True)
+    POSTINGS_DIR = Setting("data/cache/postings", path=True)
+
+    # Valutakurser
+    PRICE_DB = Setting("data/cache/prices.sqlite", path=True)
+    FX_GAIN_ACCOUNT = Setting("Income:Valutakursvinster")
+    FX_LOSS_ACCOUNT = Setting("Expenses:Valutakursförluster")
+
+    # Moms
+    VAT_ACCOUNT = Setting("Liabilities:Skatteskulder:Moms")
+    VAT_PERIOD = Setting("monthly")  # monthly, quarterly eller yearly
+    VAT_CACHE_FILE = Setting("data/cache/vat_report.json", path=True)
 
     # OCR
-    TESSERACT_LANG = os.getenv("TESSERACT_LANG", "swe+eng")
-    OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+    TESSERACT_LANG = Setting("swe+eng")
+    OCR_BACKEND = Setting("auto")  # auto, tesserocr eller pytesseract
+    OCR_MODE = Setting("regions")  # regions (nyckelfält) eller full (hela sidan)
+    OCR_LAYOUT_DPI = Setting("100", int)
+    OCR_DPI = Setting("300", int)
+    OCR_PREPROCESS = Setting("true", _bool)
+    OCR_BINARIZE = Setting("true", _bool)
+    OCR_DESKEW = Setting("true", _bool)
+    OCR_CROP_BORDERS = Setting("true", _bool)
+    OCR_CACHE_DIR = Setting("data/cache/ocr", path=True)
+
+    # Fakturatolkning
+    # Dokument med lägre konfidens än detta skickas vidare till LLM
+    INVOICE_LLM_THRESHOLD = Setting("0.8", float)
+    INVOICE_LLM_ENABLED = Setting("true", _bool)
+    # Datumfönster för matchning mot banktransaktioner (dagar före fakturadatum
+    # respektive efter förfallodatum)
+    INVOICE_MATCH_DAYS_BEFORE = Setting("5", int)
+    INVOICE_MATCH_DAYS_AFTER = Setting("30", int)
+
+    # Kontoklassificering av banktransaktioner (tränas på huvudboken)
+    CLASSIFIER_ENABLED = Setting("true", _bool)
+    CLASSIFIER_MODEL = Setting("data/models/classifier.npz", path=True)
+    CLASSIFIER_THRESHOLD = Setting("0.7", float)
 
     # Loggning
-    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-    LOG_FILE = BASE_DIR / os.getenv("LOG_FILE", "logs/efficra.log")
-
-    @classmethod
-    def validate(cls):
+    LOG_LEVEL = Setting("INFO")
+    LOG_FILE = Setting("logs/efficra.log", path=True)
+    LOG_FORMAT = Setting("text")  # text eller json (en JSON-rad per post)
+    # Max antal loggposter per anropsställe och minut (0 = obegränsat)
+    LOG_RATE_LIMIT = Setting("20", int)
+
+    def __init__(
+        self,
+        env_file: Optional[Path] = None,
+        base_dir: Optional[Path] = None,
+        environ: Optional[Dict[str, str]] = None,
+        **overrides
+    ):
+        """
+        Args:
+            env_file: .env-fil att läsa (default: .env i base_dir)
+            base_dir: Katalog som relativa sökvägar utgår från (default: projektroten)
+            environ: Miljövariabler (default: os.environ, som går före .env)
+            **overrides: Inställningar som ersätter miljön, t.ex. DATA_LEDGER="..."
+        """
+        unknown = [name for name in overrides if not isinstance(getattr(Config, name, None), Setting)]
+        if unknown:
+            raise TypeError(f"Okända inställningar: {', '.join(sorted(unknown))}")
+
+        self.env_file = env_file
+        self.BASE_DIR = Path(base_dir) if base_dir else PROJECT_DIR
+        self._environ = environ
+        self._env: Optional[Dict[str, str]] = None
+        self._overrides = overrides
+        for name, value in overrides.items():
+            self.__dict__[name] = Config.__dict__[name].resolve(self, value)
+
+    @property
+    def environ(self) -> Dict[str, str]:
+        """.env-filen med miljövariablerna ovanpå (läses en gång per instans)"""
+        if self._env is None:
+            env_file = Path(self.env_file) if self.env_file else self.BASE_DIR / ".env"
+            values = {}
+            if env_file.exists():
+                from dotenv import dotenv_values
+
+                values = {k: v for k, v in dotenv_values(env_file).items() if v is not None}
+            values.update(os.environ if self._environ is None else self._environ)
+            self._env = values
+        return self._env
+
+    def with_overrides(self, **overrides) -> "Config":
+        """Ny instans med samma källor och ytterligare inställningar"""
+        return Config(
+            env_file=self.env_file, base_dir=self.BASE_DIR, environ=self._environ,
+            **{**self._overrides, **overrides}
+        )
+
+    def validate(self):
         """Validera konfiguration"""
         errors = []
 
-        if not cls.ORG_NUMBER:
+        if not self.ORG_NUMBER:
             errors.append("ORG_NUMBER saknas i .env")
 
-        if not cls.DATA_INBOX.exists():
-            errors.append(f"Inbox-mapp saknas: {cls.DATA_INBOX}")
+        if not self.DATA_INBOX.exists():
+            errors.append(f"Inbox-mapp saknas: {self.DATA_INBOX}")
 
         if errors:
             raise ValueError(f"Konfigurationsfel:\n" + "\n".join(f"- {e}" for e in errors))
@@ -69,5 +219,5 @@ class Config:
         return True
 
 
-# Skapa en global config-instans
+# Global config-instans för CLI:na - inget läses förrän en inställning används
 config = Config()
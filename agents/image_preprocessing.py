@@ -0,0 +1,274 @@
+"""
+Bildförbehandling före OCR
+
+Vektoriserad förbehandling med NumPy för fotograferade och skannade fakturor:
+gråskala, nedskalning till mål-DPI, adaptiv binarisering, skevhetskorrigering
+och beskärning av kanter. Resultatet cachas per fil så att samma faktura inte
+behöver förbehandlas två gånger.
+"""
+
+import hashlib
+import json
+import logging
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# A4-bredd i tum - används för att uppskatta DPI när bilden saknar metadata
+A4_WIDTH_INCHES = 8.27
+
+# Lägsta DPI vi litar på i bildens metadata (mobilkameror anger ofta 72)
+MIN_TRUSTED_DPI = 150
+
+# Max antal svarta pixlar som används vid skevhetsestimering
+MAX_SKEW_SAMPLES = 200_000
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """Inställningar för förbehandling"""
+    target_dpi: int = 300
+    binarize: bool = True
+    block_size: int = 31  # Fönsterstorlek (px) för adaptiv tröskel, udda tal
+    threshold_offset: int = 15  # Hur mycket mörkare än omgivningen en pixel måste vara
+    deskew: bool = True
+    max_skew_degrees: float = 10.0
+    crop_borders: bool = True
+    crop_margin: int = 20
+
+    @classmethod
+    def from_config(cls, config) -> "PreprocessOptions":
+        """Skapa inställningar från Config"""
+        return cls(
+            target_dpi=config.OCR_DPI,
+            binarize=config.OCR_BINARIZE,
+            deskew=config.OCR_DESKEW,
+            crop_borders=config.OCR_CROP_BORDERS,
+        )
+
+    def cache_key(self) -> str:
+        """Stabil nyckel för inställningarna (del av cache-nyckeln)"""
+        return json.dumps(asdict(self), sort_keys=True)
+
+
+def to_grayscale(image: Image.Image) -> np.ndarray:
+    """Konvertera PIL-bild till gråskala-array (uint8) med luminansvikter"""
+    if image.mode == "L":
+        return np.asarray(image, dtype=np.uint8)
+
+    rgb = np.asarray(image.convert("RGB"), dtype=np.float32)
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return np.clip(gray + 0.5, 0, 255).astype(np.uint8)
+
+
+def estimate_dpi(image: Image.Image) -> float:
+    """
+    Uppskatta bildens DPI
+
+    Använder metadata om den är rimlig, annars antas att bildens kortsida
+    motsvarar en A4-bredd (typiskt för mobilfoton av kvitton och fakturor).
+    """
+    dpi = image.info.get("dpi")
+    if dpi and float(dpi[0]) >= MIN_TRUSTED_DPI:
+        return float(dpi[0])
+    return min(image.size) / A4_WIDTH_INCHES
+
+
+def downscale_to_dpi(gray: np.ndarray, source_dpi: float, target_dpi: int) -> np.ndarray:
+    """Skala ned gråskala-array till mål-DPI (skalar aldrig upp)"""
+    if source_dpi <= target_dpi * 1.05:
+        return gray
+
+    scale = target_dpi / source_dpi
+    height, width = gray.shape
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    resized = Image.fromarray(gray).resize(size, Image.Resampling.LANCZOS)
+    return np.asarray(resized, dtype=np.uint8)
+
+
+def adaptive_threshold(gray: np.ndarray, block_size: int = 31, offset: int = 15) -> np.ndarray:
+    """
+    Adaptiv binarisering med lokalt medelvärde
+
+    Medelvärdet per fönster räknas fram med en integralbild, så kostnaden är
+    oberoende av fönsterstorleken. Returnerar 0 för bläck och 255 för bakgrund.
+    """
+    if block_size % 2 == 0:
+        block_size += 1
+    pad = block_size // 2
+    height, width = gray.shape
+
+    padded = np.pad(gray, pad, mode="edge").astype(np.int64)
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.int64)
+    integral[1:, 1:] = padded.cumsum(axis=0).cumsum(axis=1)
+
+    b = block_size
+    window_sum = (
+        integral[b:b + height, b:b + width]
+        - integral[0:height, b:b + width]
+        - integral[b:b + height, 0:width]
+        + integral[0:height, 0:width]
+    )
+    local_mean = window_sum / float(b * b)
+
+    return np.where(gray.astype(np.float64) < local_mean - offset, 0, 255).astype(np.uint8)
+
+
+def _projection_score(ys: np.ndarray, xs: np.ndarray, angle: float) -> float:
+    """Hur skarp radprofilen blir om bläckpixlarna roteras med angle (radianer)"""
+    rows = np.round(ys - xs * np.tan(angle)).astype(np.int64)
+    rows -= rows.min()
+    profile = np.bincount(rows).astype(np.float64)
+    return float(np.dot(profile, profile))
+
+
+def estimate_skew(binary: np.ndarray, max_degrees: float = 10.0) -> float:
+    """
+    Uppskatta textens lutning i grader med projektionsprofiler
+
+    Söker grovt (1°) och sedan fint (0.1°) efter vinkeln där textraderna ger
+    skarpast radprofil. Positiv vinkel betyder att texten lutar moturs, dvs.
+    att bilden ska roteras medurs (PIL: rotate(-vinkel)) för att rätas upp.
+    """
+    ys, xs = np.nonzero(binary == 0)
+    if ys.size < 100:
+        return 0.0
+
+    if ys.size > MAX_SKEW_SAMPLES:
+        stride = ys.size // MAX_SKEW_SAMPLES + 1
+        ys, xs = ys[::stride], xs[::stride]
+
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+
+    def best_angle(candidates: np.ndarray) -> float:
+        scores = [_projection_score(ys, xs, np.deg2rad(a)) for a in candidates]
+        return float(candidates[int(np.argmax(scores))])
+
+    coarse = best_angle(np.arange(-max_degrees, max_degrees + 0.5, 1.0))
+    fine = best_angle(np.arange(coarse - 1.0, coarse + 1.0001, 0.1))
+    # Bildens y-axel pekar nedåt, så lutningen moturs har motsatt tecken
+    return -round(fine, 2)
+
+
+def deskew(binary: np.ndarray, angle: float) -> np.ndarray:
+    """Rotera binärbild så att textraderna blir horisontella"""
+    if abs(angle) < 0.05:
+        return binary
+    rotated = Image.fromarray(binary).rotate(
+        -angle,
+        resample=Image.Resampling.BILINEAR,
+        expand=True,
+        fillcolor=255,
+    )
+    return np.asarray(rotated, dtype=np.uint8)
+
+
+def crop_borders(binary: np.ndarray, margin: int = 20) -> np.ndarray:
+    """
+    Beskär tomma och svarta kanter runt dokumentet
+
+    Rader och kolumner som nästan helt består av bläck (kanten mot bordet
+    i ett mobilfoto, skannerkanter) räknas inte som innehåll.
+    """
+    # Nolla först linjer som sträcker sig över nästan hela bilden
+    cleaned = binary.copy()
+    cleaned[(cleaned == 0).mean(axis=1) >= 0.6, :] = 255
+    cleaned[:, (cleaned == 0).mean(axis=0) >= 0.6] = 255
+
+    ink = cleaned == 0
+    content_rows = np.nonzero(ink.mean(axis=1) > 0.002)[0]
+    content_cols = np.nonzero(ink.mean(axis=0) > 0.002)[0]
+    if content_rows.size == 0 or content_cols.size == 0:
+        return binary
+
+    height, width = binary.shape
+    top = max(0, content_rows[0] - margin)
+    bottom = min(height, content_rows[-1] + margin + 1)
+    left = max(0, content_cols[0] - margin)
+    right = min(width, content_cols[-1] + margin + 1)
+
+    return cleaned[top:bottom, left:right]
+
+
+class ImagePreprocessor:
+    """Förbehandlar fakturabilder före OCR, med cache per fil"""
+
+    def __init__(
+        self,
+        options: Optional[PreprocessOptions] = None,
+        cache_dir: Optional[Path] = None,
+    ):
+        """
+        Args:
+            options: Förbehandlingsinställningar (default: PreprocessOptions())
+            cache_dir: Katalog för cachade resultat (None = ingen cache)
+        """
+        self.options = options or PreprocessOptions()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+    def preprocess(self, image: Image.Image) -> Image.Image:
+        """Kör hela förbehandlingskedjan på en PIL-bild"""
+        opts = self.options
+
+        # Mobilfoton lagrar ofta rotationen i EXIF istället för i pixlarna
+        image = ImageOps.exif_transpose(image)
+
+        gray = to_grayscale(image)
+        gray = downscale_to_dpi(gray, estimate_dpi(image), opts.target_dpi)
+
+        if not opts.binarize:
+            return Image.fromarray(gray)
+
+        binary = adaptive_threshold(gray, opts.block_size, opts.threshold_offset)
+
+        if opts.deskew:
+            angle = estimate_skew(binary, opts.max_skew_degrees)
+            if angle:
+                logger.debug(f"Korrigerar lutning {angle:.2f}°")
+            binary = deskew(binary, angle)
+
+        if opts.crop_borders:
+            binary = crop_borders(binary, opts.crop_margin)
+
+        result = Image.fromarray(binary)
+        result.info["dpi"] = (opts.target_dpi, opts.target_dpi)
+        return result
+
+    def _cache_path(self, file_path: Path) -> Optional[Path]:
+        """Cache-sökväg baserad på filinnehåll och inställningar"""
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256(file_path.read_bytes())
+        digest.update(self.options.cache_key().encode())
+        return self.cache_dir / f"{digest.hexdigest()}.png"
+
+    def process_file(self, file_path: Path) -> Image.Image:
+        """
+        Förbehandla en bildfil, med cache
+
+        Cachen nycklas på filens innehåll (inte sökväg) så att den överlever
+        att filen flyttas från inbox till arkiv.
+        """
+        file_path = Path(file_path)
+        cache_path = self._cache_path(file_path)
+
+        if cache_path and cache_path.exists():
+            logger.debug(f"Använder cachad förbehandling för {file_path.name}")
+            with Image.open(cache_path) as cached:
+                cached.load()
+                return cached.copy()
+
+        with Image.open(file_path) as image:
+            result = self.preprocess(image)
+
+        if cache_path:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            result.save(cache_path, format="PNG", dpi=result.info.get("dpi"))
+
+        return result
@@ -0,0 +1,397 @@
+"""
+Deterministisk fältextraktion för svenska fakturor
+
+Snabb regel- och regex-baserad tolkning av OCR-text: datum, belopp med
+decimalkomma, "Moms 25%"-rader, organisationsnummer, bankgiro/plusgiro och
+OCR-referenser. Varje fält får en konfidens, och bara dokument med låg
+total konfidens behöver skickas vidare till LLM.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+FIELD_NAMES = (
+    "supplier",
+    "invoice_number",
+    "invoice_date",
+    "due_date",
+    "amount",
+    "vat",
+    "vat_rate",
+    "currency",
+    "org_number",
+    "bankgiro",
+    "plusgiro",
+    "ocr_reference",
+)
+
+# Fält som måste vara säkra för att bokföra utan LLM
+REQUIRED_FIELDS = ("supplier", "invoice_date", "amount", "vat")
+
+VAT_RATES = (25, 12, 6)
+
+SWEDISH_MONTHS = {
+    "januari": 1, "jan": 1, "februari": 2, "feb": 2, "mars": 3, "mar": 3,
+    "april": 4, "apr": 4, "maj": 5, "juni": 6, "jun": 6, "juli": 7, "jul": 7,
+    "augusti": 8, "aug": 8, "september": 9, "sep": 9, "sept": 9,
+    "oktober": 10, "okt": 10, "november": 11, "nov": 11, "december": 12, "dec": 12,
+}
+
+# Belopp med decimaler: "1 234,50", "1.234,50", "1234.50", "1 249:-"
+AMOUNT_RE = re.compile(
+    r"(?<![\d.,:-])(\d{1,3}(?:[  .]\d{3})+|\d+)(?:[,.](\d{2})|:-)(?![\d%])"
+)
+PERCENT_RE = re.compile(r"(\d{1,2})(?:[,.]\d+)?\s*%")
+
+ISO_DATE_RE = re.compile(r"\b(20\d{2})-(\d{2})-(\d{2})\b")
+EU_DATE_RE = re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](20\d{2})\b")
+COMPACT_DATE_RE = re.compile(r"(?<!\d)(20\d{2})(\d{2})(\d{2})(?!\d)")
+TEXT_DATE_RE = re.compile(
+    r"\b(\d{1,2})\s+(" + "|".join(sorted(SWEDISH_MONTHS, key=len, reverse=True)) + r")\.?\s+(20\d{2})\b",
+    re.IGNORECASE,
+)
+
+ORG_NUMBER_RE = re.compile(r"(?<!\d)(\d{6})-?(\d{4})(?!\d)")
+VAT_NUMBER_RE = re.compile(r"\bSE\s?(\d{10})01\b")
+BANKGIRO_RE = re.compile(r"(?<!\d)(\d{3,4})\s?-\s?(\d{4})(?!\d)")
+PLUSGIRO_RE = re.compile(r"(?<!\d)((?:\d ?){1,7})-\s?(\d)(?!\d)")
+OCR_REFERENCE_RE = re.compile(r"(?<!\d)(\d(?:[ ]?\d){1,24})(?!\d)")
+INVOICE_NUMBER_RE = re.compile(
+    r"\bfaktura\s*(?:nr|nummer|nr\.|no)?\s*[:.]?\s*([A-Z0-9][A-Z0-9/-]*\d)\b",
+    re.IGNORECASE,
+)
+INVOICE_NUMBER_LABEL_RE = re.compile(
+    r"\b(?:fakturanr|fakturanummer|fakturanumret)\.?\s*[:.]?\s*([A-Z0-9][A-Z0-9/-]*\d)\b",
+    re.IGNORECASE,
+)
+COMPANY_SUFFIX_RE = re.compile(
+    r"\b(AB|HB|KB|Aktiebolag|Handelsbolag|Kommanditbolag|Oy|AS|ApS|GmbH|Ltd|Limited|Inc|LLC|BV)\b\.?$"
+)
+PAYMENT_TERMS_RE = re.compile(r"(\d{1,3})\s*dagar", re.IGNORECASE)
+
+INVOICE_DATE_LABELS = re.compile(r"fakturadatum|fakt\.?\s*datum|\bdatum\b", re.IGNORECASE)
+DUE_DATE_LABELS = re.compile(
+    r"förfallo|forfallo|betalningsdag|betalas senast|betala senast|sista betal", re.IGNORECASE
+)
+TOTAL_LABELS: Tuple[Tuple[re.Pattern, float], ...] = (
+    (re.compile(r"att\s+betala", re.IGNORECASE), 0.95),
+    (re.compile(r"(totalt|summa|total)\s+inkl", re.IGNORECASE), 0.85),
+    (re.compile(r"\btotalt?\b", re.IGNORECASE), 0.75),
+    (re.compile(r"\bsumma\b", re.IGNORECASE), 0.6),
+)
+NET_LABELS = re.compile(r"exkl|netto|exklusive", re.IGNORECASE)
+VAT_LINE_RE = re.compile(r"\bmoms\b|\bmoms\s*\d|\bvat\b", re.IGNORECASE)
+CURRENCY_MARKERS = (
+    (re.compile(r"\bSEK\b|\bkr\b|:-", re.IGNORECASE), "SEK"),
+    (re.compile(r"\bEUR\b|€"), "EUR"),
+    (re.compile(r"\bUSD\b|\$"), "USD"),
+    (re.compile(r"\bGBP\b|£"), "GBP"),
+    (re.compile(r"\bNOK\b"), "NOK"),
+    (re.compile(r"\bDKK\b"), "DKK"),
+)
+
+
+def luhn_valid(digits: str) -> bool:
+    """Kontrollera mod 10 (Luhn) - används för org.nr, bankgiro, plusgiro och OCR"""
+    if not digits.isdigit() or len(digits) < 2:
+        return False
+    total = 0
+    for i, char in enumerate(reversed(digits)):
+        value = int(char)
+        if i % 2 == 1:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def parse_swedish_amount(text: str) -> Optional[Decimal]:
+    """
+    Tolka ett belopp skrivet på svenskt sätt
+
+    Exempel: "1 234,50" -> Decimal("1234.50"), "1.249,00" -> Decimal("1249.00"),
+    "1 249:-" -> Decimal("1249.00")
+    """
+    match = AMOUNT_RE.search(text)
+    if not match:
+        return None
+    return _amount_from_match(match)
+
+
+def _amount_from_match(match: re.Match) -> Optional[Decimal]:
+    integer = re.sub(r"[  .]", "", match.group(1))
+    decimals = match.group(2) or "00"
+    try:
+        return Decimal(f"{integer}.{decimals}")
+    except InvalidOperation:
+        return None
+
+
+def _amounts_in(line: str) -> List[Decimal]:
+    return [amount for amount in (_amount_from_match(m) for m in AMOUNT_RE.finditer(line)) if amount is not None]
+
+
+def _dates_in(line: str) -> List[date]:
+    """Alla giltiga datum på en rad, i den ordning de står"""
+    found: List[Tuple[int, date]] = []
+
+    def add(position: int, year: int, month: int, day: int):
+        try:
+            found.append((position, date(year, month, day)))
+        except ValueError:
+            pass
+
+    for m in ISO_DATE_RE.finditer(line):
+        add(m.start(), int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    for m in EU_DATE_RE.finditer(line):
+        add(m.start(), int(m.group(3)), int(m.group(2)), int(m.group(1)))
+    for m in TEXT_DATE_RE.finditer(line):
+        add(m.start(), int(m.group(3)), SWEDISH_MONTHS[m.group(2).lower()], int(m.group(1)))
+    if not found:
+        for m in COMPACT_DATE_RE.finditer(line):
+            add(m.start(), int(m.group(1)), int(m.group(2)), int(m.group(3)))
+
+    return [d for _pos, d in sorted(found, key=lambda item: item[0])]
+
+
+def _format_amount(amount: Decimal) -> str:
+    return str(amount.quantize(Decimal("0.01")))
+
+
+@dataclass
+class ExtractionResult:
+    """Extraherade fält med konfidens per fält (0-1)"""
+    fields: Dict[str, Optional[str]] = field(default_factory=lambda: {name: None for name in FIELD_NAMES})
+    confidence: Dict[str, float] = field(default_factory=lambda: {name: 0.0 for name in FIELD_NAMES})
+
+    def set(self, name: str, value: Optional[str], confidence: float):
+        """Sätt fältet om den nya konfidensen är högre än den befintliga"""
+        if value is None or confidence <= self.confidence[name]:
+            return
+        self.fields[name] = value
+        self.confidence[name] = confidence
+
+    @property
+    def overall_confidence(self) -> float:
+        """Lägsta konfidens bland fälten som krävs för bokföring"""
+        return min(self.confidence[name] for name in REQUIRED_FIELDS)
+
+    def needs_llm(self, threshold: float) -> bool:
+        """True om dokumentet bör skickas vidare till LLM"""
+        return self.overall_confidence < threshold
+
+
+class InvoiceFieldExtractor:
+    """Regel- och regex-baserad extraktion av fakturafält"""
+
+    def __init__(self, own_company: str = "", own_org_number: str = ""):
+        """
+        Args:
+            own_company: Eget företagsnamn (ska inte tolkas som leverantör)
+            own_org_number: Eget org.nr (ska inte tolkas som leverantörens)
+        """
+        self.own_company = own_company.strip().lower()
+        self.own_org_digits = re.sub(r"\D", "", own_org_number)
+
+    def extract(self, text: str) -> ExtractionResult:
+        """Extrahera alla fält ur OCR-text"""
+        result = ExtractionResult()
+        lines = [line.strip() for line in text.splitlines()]
+
+        self._extract_supplier(lines, result)
+        self._extract_dates(lines, result)
+        self._extract_amounts(lines, result)
+        self._extract_identifiers(lines, result)
+        self._extract_currency(lines, result)
+        return result
+
+    def _extract_supplier(self, lines: List[str], result: ExtractionResult):
+        candidates = [line for line in lines[:10] if re.search(r"[A-Za-zÅÄÖåäö]{2,}", line)]
+        candidates = [
+            line for line in candidates
+            if not re.match(r"(faktura|kvitto|invoice)\b", line, re.IGNORECASE)
+            and (not self.own_company or self.own_company not in line.lower())
+        ]
+        for line in candidates:
+            if COMPANY_SUFFIX_RE.search(line):
+                result.set("supplier", line, 0.9)
+                return
+        if candidates:
+            result.set("supplier", candidates[0], 0.5)
+
+    def _extract_dates(self, lines: List[str], result: ExtractionResult):
+        all_dates: List[date] = []
+        for line in lines:
+            dates = _dates_in(line)
+            if dates:
+                all_dates.extend(dates)
+                self._labelled_date(line, dates, result)
+
+        if result.fields["invoice_date"] is None and all_dates:
+            result.set("invoice_date", min(all_dates).isoformat(), 0.4)
+
+        if result.fields["due_date"] is None and result.fields["invoice_date"]:
+            self._due_date_from_terms(lines, result)
+
+        if result.fields["invoice_date"] and result.fields["due_date"]:
+            if result.fields["due_date"] < result.fields["invoice_date"]:
+                result.confidence["due_date"] = min(result.confidence["due_date"], 0.3)
+
+    def _labelled_date(self, line: str, dates: List[date], result: ExtractionResult):
+        if DUE_DATE_LABELS.search(line):
+            result.set("due_date", dates[-1].isoformat(), 0.95)
+        elif re.search(r"fakturadatum|fakt\.?\s*datum", line, re.IGNORECASE):
+            result.set("invoice_date", dates[0].isoformat(), 0.95)
+        elif INVOICE_DATE_LABELS.search(line):
+            result.set("invoice_date", dates[0].isoformat(), 0.8)
+
+    def _due_date_from_terms(self, lines: List[str], result: ExtractionResult):
+        """Förfallodatum från betalningsvillkor ("30 dagar netto")"""
+        for line in lines:
+            terms = PAYMENT_TERMS_RE.search(line)
+            if terms and re.search(r"villkor|netto|betalning", line, re.IGNORECASE):
+                due = date.fromisoformat(result.fields["invoice_date"]) + timedelta(days=int(terms.group(1)))
+                result.set("due_date", due.isoformat(), 0.7)
+                return
+
+    def _extract_amounts(self, lines: List[str], result: ExtractionResult):
+        net: Optional[Decimal] = None
+
+        for i, line in enumerate(lines):
+            lowered = line.lower()
+            if re.search(r"bankgiro|plusgiro|\bocr\b", lowered):
+                continue
+
+            amounts = _amounts_in(line)
+            is_vat_line = (
+                VAT_LINE_RE.search(line)
+                and not re.search(r"exkl|inkl|momsreg|momsnr|ink\.", lowered)
+            )
+            is_net_line = NET_LABELS.search(line) and not is_vat_line
+
+            if is_vat_line:
+                self._vat_line(line, amounts, result)
+            elif is_net_line:
+                net = amounts[-1] if amounts else net
+            else:
+                self._total_line(lines, i, amounts, result)
+
+        self._check_vat_consistency(result, net)
+
+    def _vat_line(self, line: str, amounts: List[Decimal], result: ExtractionResult):
+        rate = PERCENT_RE.search(line)
+        if rate and int(rate.group(1)) in VAT_RATES:
+            result.set("vat_rate", rate.group(1), 0.9)
+        if amounts:
+            result.set("vat", _format_amount(amounts[-1]), 0.8)
+
+    def _total_line(self, lines: List[str], i: int, amounts: List[Decimal], result: ExtractionResult):
+        """Totalbelopp på raden, eller på nästa rad om etiketten står ensam"""
+        for pattern, confidence in TOTAL_LABELS:
+            if pattern.search(lines[i]):
+                if not amounts and i + 1 < len(lines):
+                    amounts = _amounts_in(lines[i + 1])
+                if amounts:
+                    result.set("amount", _format_amount(amounts[-1]), confidence)
+                return
+
+    def _check_vat_consistency(self, result: ExtractionResult, net: Optional[Decimal]):
+        """Höj eller sänk konfidens beroende på om belopp, moms och momssats går ihop"""
+        if result.fields["amount"] is None or result.fields["vat"] is None:
+            return
+
+        total = Decimal(result.fields["amount"])
+        vat = Decimal(result.fields["vat"])
+        tolerance = Decimal("0.05")
+
+        if result.fields["vat_rate"] is None and total > vat > 0:
+            # Härled momssats från kvoten moms / (total - moms)
+            ratio = vat / (total - vat) * 100
+            for rate in VAT_RATES:
+                if abs(ratio - rate) < Decimal("0.5"):
+                    result.set("vat_rate", str(rate), 0.7)
+                    break
+
+        consistent = False
+        if result.fields["vat_rate"] is not None:
+            rate = Decimal(result.fields["vat_rate"])
+            expected = total * rate / (100 + rate)
+            consistent = abs(expected - vat) <= tolerance
+        if net is not None:
+            consistent = consistent or abs(net + vat - total) <= tolerance
+
+        if consistent:
+            for name in ("amount", "vat", "vat_rate"):
+                if result.fields[name] is not None:
+                    result.confidence[name] = max(result.confidence[name], 0.95)
+        else:
+            result.confidence["vat"] = min(result.confidence["vat"], 0.5)
+
+    def _extract_identifiers(self, lines: List[str], result: ExtractionResult):
+        for line in lines:
+            lowered = line.lower()
+            self._invoice_number(line, result)
+            self._org_numbers(line, lowered, result)
+            self._giro_numbers(line, lowered, result)
+            self._ocr_reference(line, lowered, result)
+
+    def _invoice_number(self, line: str, result: ExtractionResult):
+        label = INVOICE_NUMBER_LABEL_RE.search(line)
+        if label:
+            result.set("invoice_number", label.group(1), 0.9)
+            return
+        loose = INVOICE_NUMBER_RE.search(line)
+        if loose and not _dates_in(line):
+            result.set("invoice_number", loose.group(1), 0.7)
+
+    def _org_numbers(self, line: str, lowered: str, result: ExtractionResult):
+        if "org" in lowered:
+            for m in ORG_NUMBER_RE.finditer(line):
+                self._set_org_number(result, m.group(1) + m.group(2), 0.95)
+        for m in VAT_NUMBER_RE.finditer(line):
+            self._set_org_number(result, m.group(1), 0.85)
+
+    def _giro_numbers(self, line: str, lowered: str, result: ExtractionResult):
+        if re.search(r"bankgiro|\bbg\b", lowered):
+            for m in BANKGIRO_RE.finditer(line):
+                digits = m.group(1) + m.group(2)
+                result.set("bankgiro", f"{m.group(1)}-{m.group(2)}", 0.95 if luhn_valid(digits) else 0.5)
+
+        if re.search(r"plusgiro|\bpg\b", lowered):
+            for m in PLUSGIRO_RE.finditer(line):
+                digits = m.group(1).replace(" ", "") + m.group(2)
+                value = f"{digits[:-1]}-{digits[-1]}"
+                result.set("plusgiro", value, 0.95 if luhn_valid(digits) else 0.5)
+
+    def _ocr_reference(self, line: str, lowered: str, result: ExtractionResult):
+        ocr_label = re.search(r"\bocr\b[\w-]*", lowered)
+        if not ocr_label:
+            return
+        for m in OCR_REFERENCE_RE.finditer(line[ocr_label.end():]):
+            digits = m.group(1).replace(" ", "")
+            if len(digits) >= 2:
+                result.set("ocr_reference", digits, 0.95 if luhn_valid(digits) else 0.5)
+                return
+
+    def _set_org_number(self, result: ExtractionResult, digits: str, confidence: float):
+        if digits == self.own_org_digits:
+            return
+        if not luhn_valid(digits):
+            confidence = min(confidence, 0.4)
+        result.set("org_number", f"{digits[:6]}-{digits[6:]}", confidence)
+
+    def _extract_currency(self, lines: List[str], result: ExtractionResult):
+        for line in lines:
+            total_line = any(pattern.search(line) for pattern, _c in TOTAL_LABELS)
+            for pattern, currency in CURRENCY_MARKERS:
+                if pattern.search(line):
+                    result.set("currency", currency, 0.9 if total_line else 0.6)
+
+
+def extract_invoice_fields(text: str, own_company: str = "", own_org_number: str = "") -> ExtractionResult:
+    """Bekväm funktion: extrahera fält ur OCR-text"""
+    return InvoiceFieldExtractor(own_company, own_org_number).extract(text)
@@ -0,0 +1,254 @@
+"""
+Matchning av fakturor mot banktransaktioner
+
+Banktransaktionerna indexeras på (valuta, belopp i minsta enhet) och sorteras
+på datum inom varje hink. En faktura slår upp sin hink i O(1) och hittar
+kandidater inom datumfönstret med binärsökning, så att matcha ett helt år
+blir O(n log n) istället för O(fakturor × transaktioner). Kandidaterna
+poängsätts med OCR-referens och motpartsnamn.
+"""
+
+import bisect
+import difflib
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bolagsformer som tas bort innan motpartsnamn jämförs
+COMPANY_SUFFIXES = re.compile(
+    r"\b(ab|hb|kb|aktiebolag|handelsbolag|oy|as|aps|gmbh|ltd|limited|inc|llc|bv|publ)\b\.?"
+)
+
+
+# Antal decimaler i valutor där minsta enheten inte är 1/100 (ISO 4217)
+CURRENCY_EXPONENTS = {
+    "CLP": 0, "ISK": 0, "JPY": 0, "KRW": 0, "UGX": 0, "VND": 0, "XAF": 0, "XOF": 0,
+    "BHD": 3, "JOD": 3, "KWD": 3, "OMR": 3, "TND": 3,
+}
+
+
+def to_minor_units(amount, currency: str = "SEK") -> int:
+    """Belopp i minsta valutaenhet (öre, cent, hela yen)"""
+    exponent = CURRENCY_EXPONENTS.get(currency, 2)
+    return int(Decimal(str(amount)).scaleb(exponent).to_integral_value())
+
+
+def normalize_name(name: str) -> str:
+    """Normalisera motpartsnamn för jämförelse"""
+    name = COMPANY_SUFFIXES.sub(" ", name.lower())
+    name = re.sub(r"^(to|from|till|från)\s+", "", name.strip())
+    return " ".join(re.sub(r"[^\wåäö ]", " ", name).split())
+
+
+@dataclass(frozen=True)
+class BankTransaction:
+    """En banktransaktion (ett ben i en Revolut-transaktion)"""
+    id: str
+    date: date
+    amount_minor: int  # Med tecken: negativt = utbetalning
+    currency: str
+    account: str  # Beancount-konto
+    reference: str = ""
+    counterparty: str = ""
+
+
+@dataclass
+class InvoiceMatch:
+    """En matchning mellan faktura och banktransaktion"""
+    invoice_index: int
+    transaction: BankTransaction
+    score: float
+    reasons: List[str] = field(default_factory=list)
+
+
+def bank_transactions_from_revolut(
+    transactions: Iterable[Dict],
+    account_for_leg: Optional[Callable[[Dict], str]] = None,
+) -> List[BankTransaction]:
+    """
+    Bygg BankTransaction-objekt från Revolut-transaktioner
+
+    Args:
+        transactions: Revolut transaction dicts med legs
+        account_for_leg: Funktion leg -> Beancount-konto
+                         (t.ex. RevolutToBeancount._get_account_for_leg)
+    """
+    result = []
+    for tx in transactions:
+        if tx.get("state") not in (None, "completed"):
+            continue
+        date_str = tx.get("completed_at") or tx.get("created_at")
+        if not date_str:
+            continue
+        tx_date = datetime.fromisoformat(date_str.replace("Z", "+00:00")).date()
+        merchant = (tx.get("merchant") or {}).get("name", "")
+
+        for leg in tx.get("legs", []):
+            currency = leg["currency"]
+            account = account_for_leg(leg) if account_for_leg else f"Assets:Bank:Revolut:{currency}"
+            result.append(BankTransaction(
+                id=tx["id"],
+                date=tx_date,
+                amount_minor=to_minor_units(leg["amount"], currency),
+                currency=currency,
+                account=account,
+                reference=tx.get("reference", "") or "",
+                counterparty=merchant or leg.get("description", "") or "",
+            ))
+    return result
+
+
+def bank_transactions_from_ledger(entries: Iterable, prefix: str = "Assets:Bank") -> List[BankTransaction]:
+    """
+    Bygg BankTransaction-objekt från importerade Revolut-transaktioner i huvudboken
+
+    Args:
+        entries: Beancount-direktiv (t.ex. från revolut_*.beancount)
+        prefix: Bankkonton vars posteringar räknas som betalningar
+    """
+    from beancount.core import data
+
+    result = []
+    for entry in entries:
+        if not isinstance(entry, data.Transaction) or entry.flag != "*":
+            continue
+        tx_id = entry.meta.get("revolut_id")
+        if not tx_id:
+            continue
+        for posting in entry.postings:
+            if not posting.account.startswith(prefix) or posting.units is None or posting.units.number is None:
+                continue
+            result.append(BankTransaction(
+                id=tx_id,
+                date=entry.date,
+                amount_minor=to_minor_units(posting.units.number, posting.units.currency),
+                currency=posting.units.currency,
+                account=posting.account,
+                reference=entry.meta.get("reference", "") or "",
+                counterparty=entry.meta.get("merchant") or entry.payee or entry.narration or "",
+            ))
+    return result
+
+
+class TransactionIndex:
+    """Index över banktransaktioner per (valuta, belopp), sorterat på datum"""
+
+    def __init__(self, transactions: Iterable[BankTransaction]):
+        buckets: Dict[Tuple[str, int], List[BankTransaction]] = defaultdict(list)
+        for tx in transactions:
+            buckets[(tx.currency, tx.amount_minor)].append(tx)
+
+        self._buckets: Dict[Tuple[str, int], Tuple[List[int], List[BankTransaction]]] = {}
+        for key, txs in buckets.items():
+            txs.sort(key=lambda t: t.date)
+            self._buckets[key] = ([t.date.toordinal() for t in txs], txs)
+
+    def __len__(self) -> int:
+        return sum(len(txs) for _days, txs in self._buckets.values())
+
+    def candidates(self, currency: str, amount_minor: int, start: date, end: date) -> List[BankTransaction]:
+        """Transaktioner med exakt belopp och datum i [start, end]"""
+        bucket = self._buckets.get((currency, amount_minor))
+        if not bucket:
+            return []
+        days, txs = bucket
+        lo = bisect.bisect_left(days, start.toordinal())
+        hi = bisect.bisect_right(days, end.toordinal())
+        return txs[lo:hi]
+
+
+class InvoiceMatcher:
+    """Matchar fakturor (från parse_invoice_data) mot banktransaktioner"""
+
+    def __init__(
+        self,
+        days_before: int = 5,
+        days_after: int = 30,
+        min_score: float = 0.5,
+        direction: int = -1,
+    ):
+        """
+        Args:
+            days_before: Dagar före fakturadatum som en betalning får ligga
+            days_after: Dagar efter förfallodatum som en betalning får ligga
+            min_score: Lägsta poäng för att räknas som matchning
+            direction: -1 för leverantörsfakturor (utbetalning), 1 för kundfakturor
+        """
+        self.days_before = days_before
+        self.days_after = days_after
+        self.min_score = min_score
+        self.direction = direction
+
+    def _score(self, invoice: Dict, tx: BankTransaction, target: date) -> Tuple[float, List[str]]:
+        score, reasons = 0.5, ["belopp"]
+
+        ocr = invoice.get("ocr_reference")
+        if ocr:
+            tx_digits = re.sub(r"\D", "", f"{tx.reference} {tx.counterparty}")
+            if ocr in tx_digits:
+                score += 0.3
+                reasons.append("ocr")
+
+        supplier = invoice.get("supplier")
+        if supplier and tx.counterparty:
+            a, b = normalize_name(supplier), normalize_name(tx.counterparty)
+            if a and b:
+                similarity = 1.0 if (a in b or b in a) else difflib.SequenceMatcher(None, a, b).ratio()
+                if similarity >= 0.6:
+                    score += 0.2 * similarity
+                    reasons.append("motpart")
+
+        # Närmare förfallodatum är bättre, men påverkar bara marginellt
+        distance = abs((tx.date - target).days)
+        score -= 0.1 * min(1.0, distance / max(1, self.days_after))
+        return score, reasons
+
+    def match(self, invoices: List[Dict], transactions) -> Dict[int, InvoiceMatch]:
+        """
+        Matcha fakturor mot transaktioner
+
+        Args:
+            invoices: Fakturadata med amount, currency, invoice_date, due_date,
+                      ocr_reference och supplier
+            transactions: TransactionIndex eller lista med BankTransaction
+
+        Returns:
+            Dict från fakturans index i invoices till dess matchning. Varje
+            transaktion används för högst en faktura.
+        """
+        index = transactions if isinstance(transactions, TransactionIndex) else TransactionIndex(transactions)
+
+        proposals: List[Tuple[float, int, BankTransaction, List[str]]] = []
+        for i, invoice in enumerate(invoices):
+            if not invoice.get("amount") or not invoice.get("invoice_date"):
+                continue
+            currency = invoice.get("currency") or "SEK"
+            amount_minor = self.direction * to_minor_units(invoice["amount"], currency)
+            invoice_date = date.fromisoformat(invoice["invoice_date"])
+            due = date.fromisoformat(invoice["due_date"]) if invoice.get("due_date") else invoice_date
+
+            start = invoice_date - timedelta(days=self.days_before)
+            end = max(due, invoice_date) + timedelta(days=self.days_after)
+            for tx in index.candidates(currency, amount_minor, start, end):
+                score, reasons = self._score(invoice, tx, due)
+                if score >= self.min_score:
+                    proposals.append((score, i, tx, reasons))
+
+        # Girig tilldelning: bästa poäng först, varje faktura och transaktion en gång
+        proposals.sort(key=lambda p: (-p[0], p[1]))
+        matches: Dict[int, InvoiceMatch] = {}
+        used = set()
+        for score, i, tx, reasons in proposals:
+            if i in matches or (tx.id, tx.account) in used:
+                continue
+            matches[i] = InvoiceMatch(invoice_index=i, transaction=tx, score=round(score, 3), reasons=reasons)
+            used.add((tx.id, tx.account))
+
+        logger.info(f"Matchade {len(matches)}/{len(invoices)} fakturor mot {len(index)} transaktioner")
+        return matches
@@ -7,38 +7,109 @@ och använder AI för att extrahera relevant information.
 """
 
 import os
+import re
 import sys
+import json
+import argparse
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Optional
-import pytesseract
-from PIL import Image
+from decimal import Decimal
+from typing import TYPE_CHECKING, Dict, List, Optional
 import logging
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("logs/invoice_processor.log"),
-        logging.StreamHandler(sys.stdout),
-    ],
-)
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.config import Config, config as default_config
+from agents.invoice_fields import InvoiceFieldExtractor
+from agents.invoice_matching import BankTransaction, InvoiceMatcher, bank_transactions_from_ledger
+from agents.logging_setup import setup_logging
+from agents.metrics import metrics, profiled
+
+if TYPE_CHECKING:
+    # PIL, NumPy, Tesseract och requests laddas först när processorn skapas
+    from agents.image_preprocessing import ImagePreprocessor
+    from agents.ocr_backend import OCRBackend
+    from agents.ollama_extractor import OllamaExtractor
+
 logger = logging.getLogger(__name__)
 
+# Motkonto för fakturor vars betalning redan finns i Revolut-importen
+SUPPLIER_DEBT_ACCOUNT = "Liabilities:Leverantörsskulder"
+
+# Tecken som inte får förekomma i en Beancount-länk
+_LINK_UNSAFE = re.compile(r"[^A-Za-z0-9_./-]")
+
 
 class InvoiceProcessor:
     """Processor för fakturor med OCR och AI-integration"""
 
-    def __init__(self, inbox_path: str = "data/inbox"):
-        self.inbox_path = Path(inbox_path)
-        self.processed_path = Path("data/processed")
-        self.archive_path = Path("data/archive")
+    def __init__(
+        self,
+        inbox_path: Optional[str] = None,
+        preprocessor: Optional["ImagePreprocessor"] = None,
+        ocr_backend: Optional["OCRBackend"] = None,
+        llm_extractor: Optional["OllamaExtractor"] = None,
+        config: Optional[Config] = None,
+    ):
+        """
+        Args:
+            inbox_path: Inkorg (default: config.DATA_INBOX)
+            preprocessor: Bildförbehandling (default: enligt OCR_PREPROCESS)
+            ocr_backend: OCR-motor (default: enligt OCR_BACKEND)
+            llm_extractor: LLM-tolkning (default: Ollama om INVOICE_LLM_ENABLED)
+            config: Inställningar (default: den globala config)
+        """
+        from agents.image_preprocessing import ImagePreprocessor, PreprocessOptions
+        from agents.ocr_backend import get_ocr_backend
+        from agents.ocr_regions import RegionOCR
+        from agents.ollama_extractor import OllamaExtractor
+
+        self.config = config = config or default_config
+        self.inbox_path = Path(inbox_path) if inbox_path else config.DATA_INBOX
+        self.processed_path = config.DATA_PROCESSED
+        self.archive_path = config.DATA_ARCHIVE
         
         # Skapa mappar om de inte finns
+        self.inbox_path.mkdir(parents=True, exist_ok=True)
         self.processed_path.mkdir(parents=True, exist_ok=True)
         self.archive_path.mkdir(parents=True, exist_ok=True)
 
+        # Förbehandling före OCR (None = skicka originalbilden direkt)
+        if preprocessor is None and config.OCR_PREPROCESS:
+            preprocessor = ImagePreprocessor(
+                options=PreprocessOptions.from_config(config),
+                cache_dir=config.OCR_CACHE_DIR,
+            )
+        self.preprocessor = preprocessor
+
+        # OCR-motor (persistent per process, laddar språkdata en gång)
+        self.ocr = ocr_backend or get_ocr_backend(config.TESSERACT_LANG, config.OCR_BACKEND)
+        self.region_ocr = RegionOCR(self.ocr, layout_dpi=config.OCR_LAYOUT_DPI)
+
+        # Deterministisk fältextraktion - endast osäkra dokument går till LLM
+        self.field_extractor = InvoiceFieldExtractor(
+            own_company=config.COMPANY_NAME, own_org_number=config.ORG_NUMBER
+        )
+        self.llm_threshold = config.INVOICE_LLM_THRESHOLD
+
+        # LLM-tolkning (Ollama) för dokument med låg konfidens
+        if llm_extractor is None and config.INVOICE_LLM_ENABLED:
+            llm_extractor = OllamaExtractor(
+                host=config.OLLAMA_HOST,
+                model=config.OLLAMA_MODEL,
+                max_in_flight=config.OLLAMA_MAX_IN_FLIGHT,
+                cache_dir=config.OLLAMA_CACHE_DIR,
+                timeout=config.OLLAMA_TIMEOUT,
+            )
+        self.llm_extractor = llm_extractor
+
+        # Matchning mot banktransaktioner
+        self.matcher = InvoiceMatcher(
+            days_before=config.INVOICE_MATCH_DAYS_BEFORE,
+            days_after=config.INVOICE_MATCH_DAYS_AFTER,
+        )
+
     def scan_inbox(self) -> list[Path]:
         """Scanna inbox för nya fakturor"""
         supported_formats = [".pdf", ".png", ".jpg", ".jpeg"]
@@ -50,71 +121,206 @@ class InvoiceProcessor:
         logger.info(f"Hittade {len(files)} filer i inbox")
         return files
 
-    def extract_text_from_image(self, image_path: Path) -> str:
-        """Extrahera text från bild med OCR"""
+    def extract_text_from_image(self, image_path: Path, full_page: Optional[bool] = None) -> str:
+        """
+        Extrahera text från bild med OCR
+
+        Args:
+            image_path: Bildfil
+            full_page: True = läs hela sidan, False = läs bara regioner med
+                       nyckelfält (None = enligt OCR_MODE i config)
+        """
+        if full_page is None:
+            full_page = self.config.OCR_MODE == "full"
+        mode = "full" if full_page else "regions"
+
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image, lang="swe+eng")
+            with metrics.timer("invoice_preprocess_seconds"):
+                if self.preprocessor:
+                    image = self.preprocessor.process_file(image_path)
+                else:
+                    from PIL import Image
+
+                    image = Image.open(image_path)
+
+            # En bildfil är en sida
+            with metrics.timer("invoice_ocr_page_seconds", mode=mode):
+                if full_page:
+                    text = self.ocr.image_to_string(image)
+                else:
+                    text = self.region_ocr.recognize(image).text
             logger.info(f"OCR lyckades för {image_path.name}")
             return text
         except Exception as e:
             logger.error(f"OCR misslyckades för {image_path.name}: {e}")
+            metrics.inc("invoice_errors_total", stage="ocr")
             return ""
 
     def parse_invoice_data(self, text: str) -> Optional[Dict]:
         """
         Parsea fakturatext och extrahera viktig information
-        
-        TODO: Integrera med Ollama/LLM för smart parsing
+
+        Fälten extraheras deterministiskt (regex/heuristik) med konfidens per
+        fält. Dokument vars konfidens understiger INVOICE_LLM_THRESHOLD
+        markeras med needs_llm för vidare tolkning med LLM.
         """
-        # Enkel parsing - ska förbättras med AI
+        result = self.field_extractor.extract(text)
+        fields = result.fields
+
         invoice_data = {
-            "date": None,
-            "amount": None,
-            "supplier": None,
+            "date": fields["invoice_date"],
+            "amount": fields["amount"],
+            "supplier": fields["supplier"],
             "description": None,
-            "vat": None,
+            "vat": fields["vat"],
         }
-        
-        # Här skulle AI-integration komma in
-        # För nu returnerar vi bara rådata
+        invoice_data.update(fields)
+        invoice_data["confidence"] = result.confidence
+        invoice_data["overall_confidence"] = result.overall_confidence
+        invoice_data["needs_llm"] = result.needs_llm(self.llm_threshold)
         invoice_data["raw_text"] = text
         
         return invoice_data
 
+    def load_bank_transactions(self) -> List[BankTransaction]:
+        """Banktransaktioner från Revolut-importerna i huvudboken (revolut_*.beancount)"""
+        from beancount.parser import parser
+
+        transactions = []
+        for path in sorted(self.config.DATA_LEDGER.glob("revolut_*.beancount")):
+            entries, errors, _options = parser.parse_file(str(path))
+            if errors:
+                logger.warning(f"{len(errors)} fel vid inläsning av {path}")
+            transactions.extend(bank_transactions_from_ledger(entries))
+        return transactions
+
+    def match_payments(self, invoices: List[Dict], transactions: List[BankTransaction]) -> int:
+        """
+        Koppla fakturor till banktransaktionerna som betalade dem
+
+        Matchade fakturor får payment_account, payment_date och revolut_id.
+
+        Returns:
+            Antal matchade fakturor
+        """
+        matches = self.matcher.match(invoices, transactions)
+        for i, match in matches.items():
+            tx = match.transaction
+            invoices[i]["payment_account"] = tx.account
+            invoices[i]["payment_date"] = tx.date.isoformat()
+            invoices[i]["revolut_id"] = tx.id
+            invoices[i]["match_score"] = match.score
+        return len(matches)
+
     def generate_beancount_entry(self, invoice_data: Dict) -> str:
-        """Generera Beancount-transaktion från fakturadat"""
-        template = """
-{date} * "{supplier}" "{description}"
-    Expenses:Okategoriserat           {amount} SEK
-    Assets:Bank:Företagskonto        -{amount} SEK
-"""
-        # Placeholder för nu
-        return template.format(
-            date=datetime.now().strftime("%Y-%m-%d"),
-            supplier="Okänd leverantör",
-            description="OCR-behandlad faktura",
-            amount="0.00",
-        )
+        """
+        Generera Beancount-transaktion från fakturadata
 
-    def process_file(self, file_path: Path) -> bool:
-        """Bearbeta en enskild fakturfil"""
+        En faktura som matchats mot en banktransaktion bokas mot
+        leverantörsskulder och länkas (^revolut-<id>) till Revolut-importens
+        transaktion - betalningen finns redan där och bokas inte en gång till.
+        Omatchade fakturor bokas mot Assets:Bank:Företagskonto.
+        """
+        currency = invoice_data.get("currency") or "SEK"
+        amount = Decimal(invoice_data.get("amount") or "0.00")
+        vat = Decimal(invoice_data.get("vat") or "0.00")
+        revolut_id = invoice_data.get("revolut_id")
+        account = SUPPLIER_DEBT_ACCOUNT if revolut_id else "Assets:Bank:Företagskonto"
+
+        lines = [
+            f'{invoice_data.get("date") or datetime.now().strftime("%Y-%m-%d")} * '
+            f'"{invoice_data.get("supplier") or "Okänd leverantör"}" '
+            f'"{invoice_data.get("description") or "OCR-behandlad faktura"}"'
+        ]
+        if revolut_id:
+            lines[0] += f" ^revolut-{_LINK_UNSAFE.sub('-', revolut_id)}"
+        for key in ("invoice_number", "ocr_reference", "revolut_id", "payment_account"):
+            if invoice_data.get(key):
+                lines.append(f'  {key}: "{invoice_data[key]}"')
+
+        lines.append(f"  Expenses:Okategoriserat  {amount - vat:.2f} {currency}")
+        if vat:
+            lines.append(f"  Liabilities:Skatteskulder:Moms  {vat:.2f} {currency}")
+        lines.append(f"  {account}  -{amount:.2f} {currency}")
+        return "\n".join(lines) + "\n"
+
+    def apply_llm(self, invoices: List[Dict]) -> int:
+        """
+        Komplettera osäkra fakturor med LLM-tolkning i en batch
+
+        Fält som den deterministiska extraktionen är säker på behålls,
+        övriga ersätts med LLM:ens värden.
+
+        Returns:
+            Antal fakturor som fick LLM-resultat
+        """
+        pending = [data for data in invoices if data.get("needs_llm")]
+        if not pending or not self.llm_extractor:
+            return 0
+
+        results = self.llm_extractor.extract_batch([data["raw_text"] for data in pending])
+
+        updated = 0
+        for data, llm_fields in zip(pending, results):
+            if llm_fields is None:
+                continue
+            replaced = []
+            for name, value in llm_fields.items():
+                if value is not None and data["confidence"][name] < self.llm_threshold:
+                    data[name] = value
+                    replaced.append(name)
+            data["date"] = data["invoice_date"]
+            data["llm_fields"] = replaced
+            data["needs_llm"] = False
+            updated += 1
+        return updated
+
+    def _ocr_and_parse(self, file_path: Path) -> Optional[Dict]:
+        """OCR och deterministisk tolkning av en fil"""
         logger.info(f"Bearbetar {file_path.name}...")
         
         # OCR
         text = self.extract_text_from_image(file_path)
         if not text:
             logger.warning(f"Ingen text extraherad från {file_path.name}")
-            return False
+            metrics.inc("invoice_skipped_total", reason="no_text")
+            return None
         
         # Parse
-        invoice_data = self.parse_invoice_data(text)
-        
+        with metrics.timer("invoice_parse_seconds"):
+            invoice_data = self.parse_invoice_data(text)
+        if invoice_data["needs_llm"]:
+            metrics.inc("invoice_llm_needed_total")
+            logger.info(
+                f"Låg konfidens ({invoice_data['overall_confidence']:.2f}) för {file_path.name} "
+                "- behöver LLM-tolkning"
+            )
+        return invoice_data
+
+    def _save_and_archive(self, file_path: Path, invoice_data: Dict):
+        """Spara OCR-text och extraherade fält, flytta originalet till arkiv"""
+        with metrics.timer("invoice_write_seconds"):
+            self._write_outputs(file_path, invoice_data)
+        metrics.inc("invoice_processed_total")
+
+    def _write_outputs(self, file_path: Path, invoice_data: Dict):
+        text = invoice_data["raw_text"]
+
         # Spara rådata
         output_file = self.processed_path / f"{file_path.stem}.txt"
         with open(output_file, "w", encoding="utf-8") as f:
             f.write(f"=== OCR Text från {file_path.name} ===\n\n")
             f.write(text)
+
+        # Spara extraherade fält
+        fields_file = self.processed_path / f"{file_path.stem}.json"
+        fields = {key: value for key, value in invoice_data.items() if key != "raw_text"}
+        with open(fields_file, "w", encoding="utf-8") as f:
+            json.dump(fields, f, ensure_ascii=False, indent=2)
+
+        # Föreslagen transaktion att granska innan den förs in i huvudboken
+        entry_file = self.processed_path / f"{file_path.stem}.beancount"
+        entry_file.write_text(self.generate_beancount_entry(invoice_data), encoding="utf-8")
         
         logger.info(f"Sparade bearbetad data till {output_file}")
         
@@ -122,22 +328,56 @@ class InvoiceProcessor:
         archive_file = self.archive_path / file_path.name
         file_path.rename(archive_file)
         logger.info(f"Arkiverade original till {archive_file}")
-        
+
+    def process_file(self, file_path: Path) -> bool:
+        """Bearbeta en enskild fakturfil"""
+        invoice_data = self._ocr_and_parse(file_path)
+        if invoice_data is None:
+            return False
+
+        self.apply_llm([invoice_data])
+        self.match_payments([invoice_data], self.load_bank_transactions())
+        self._save_and_archive(file_path, invoice_data)
         return True
 
     def run(self):
         """Huvudloop för att bearbeta alla fakturor"""
         logger.info("Startar fakturabearbetning...")
-        
+        metrics.reset()
+        try:
+            self._run()
+        finally:
+            try:
+                metrics.write("invoice_processor", self.config.METRICS_DIR)
+            except OSError as e:
+                logger.warning(f"Kunde inte skriva mätvärden: {e}")
+
+    def _run(self):
         files = self.scan_inbox()
         if not files:
             logger.info("Inga filer att bearbeta")
             return
         
-        success_count = 0
+        # OCR och deterministisk tolkning först, sedan en gemensam LLM-batch
+        parsed = []
         for file_path in files:
-            if self.process_file(file_path):
-                success_count += 1
+            invoice_data = self._ocr_and_parse(file_path)
+            if invoice_data is not None:
+                parsed.append((file_path, invoice_data))
+
+        with metrics.timer("invoice_llm_batch_seconds"):
+            llm_count = self.apply_llm([invoice_data for _path, invoice_data in parsed])
+        if llm_count:
+            logger.info(f"LLM-tolkning klar för {llm_count} fakturor")
+
+        # Boka mot kontot som betalade fakturan
+        invoices = [invoice_data for _path, invoice_data in parsed]
+        if invoices:
+            self.match_payments(invoices, self.load_bank_transactions())
+
+        for file_path, invoice_data in parsed:
+            self._save_and_archive(file_path, invoice_data)
+        success_count = len(parsed)
         
         logger.info(
             f"Bearbetning klar: {success_count}/{len(files)} filer lyckades"
@@ -146,8 +386,20 @@ class InvoiceProcessor:
 
 def main():
     """Entry point"""
-    processor = InvoiceProcessor()
-    processor.run()
+    parser = argparse.ArgumentParser(description="Bearbeta fakturor i inkorgen med OCR")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Kör bearbetningen under cProfile och tracemalloc"
+    )
+    args = parser.parse_args()
+
+    config = default_config
+    setup_logging(config, log_file=config.LOG_FILE.with_name("invoice_processor.log"), stream=sys.stdout)
+
+    processor = InvoiceProcessor(config=config)
+    with profiled(args.profile, config.METRICS_DIR / "invoice_processor.prof"):
+        processor.run()
 
 
 if __name__ == "__main__":
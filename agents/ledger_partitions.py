@@ -0,0 +1,156 @@
+"""
+Inkrementell inläsning av huvudboken per källfil
+
+Gemensam grund för rapporter som håller ett resultat per inkluderad fil
+(momsrapporten, postexporten). Källfilernas mtime/storlek och include-mönster
+sparas; vid uppdatering läses bara ändrade filer om, fristående med Beancounts
+parser och bokning. Hela huvudboken läses in om huvudfilen ändrats, om
+include-mönstren matchar en annan uppsättning filer än förra gången (t.ex. en
+ny fil under `include "ledger/*.beancount"`), eller om en ändrad fil inte kan
+bokas fristående.
+"""
+
+import glob
+import logging
+import os
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+from beancount import loader
+from beancount.parser import booking, parser
+
+logger = logging.getLogger(__name__)
+
+INCLUDE_PATTERN = re.compile(r'^include\s+"([^"]*)"', re.MULTILINE)
+
+
+def stamp(path: str) -> List[int]:
+    """mtime och storlek för en källfil ([0, -1] om den saknas)"""
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return [0, -1]
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def include_patterns(path: str) -> List[str]:
+    """include-direktiven i en fil som absoluta glob-mönster (som loadern tolkar dem)"""
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except OSError:
+        return []
+    directory = os.path.dirname(path)
+    return [os.path.join(directory, pattern) for pattern in INCLUDE_PATTERN.findall(text)]
+
+
+def expand_includes(patterns: Iterable[str]) -> Set[str]:
+    """Filer som include-mönstren matchar just nu"""
+    return {os.path.normpath(name) for pattern in patterns for name in glob.glob(pattern, recursive=True)}
+
+
+class _FullReload(Exception):
+    """Huvudboken måste läsas in i sin helhet"""
+
+
+class PartitionedLedger:
+    """
+    Bas för resultat per källfil i huvudboken
+
+    Underklasser implementerar `_build` (resultatet för en fil) och vid behov
+    `_discard` (städning för en fil som inte längre ingår). Varje fils resultat
+    kompletteras med "stamp" och "includes" och sparas av underklassen.
+    """
+
+    # Prefix i loggmeddelanden
+    label = "Huvudbok"
+
+    def __init__(self, ledger_path: Path):
+        """
+        Args:
+            ledger_path: Huvudbokens huvudfil
+        """
+        self.ledger_path = Path(ledger_path).resolve()
+        # Statistik från senaste körningen
+        self.loaded_ledger = False
+        self.parsed_files: List[str] = []
+
+    def _build(self, path: str, entries: List, previous: Dict) -> Dict:
+        """Resultat för en källfil (previous är filens tidigare resultat eller {})"""
+        raise NotImplementedError
+
+    def _discard(self, path: str, info: Dict):
+        """En fil ingår inte längre i huvudboken"""
+
+    def refresh(self, files: Dict[str, Dict]) -> Tuple[Dict[str, Dict], bool]:
+        """
+        Uppdatera resultaten för ändrade källfiler
+
+        Args:
+            files: Sparade resultat per fil ({} = läs in allt)
+
+        Returns:
+            (resultat per fil, True om något lästes om)
+        """
+        self.loaded_ledger = False
+        self.parsed_files = []
+
+        changed = [path for path, info in files.items() if stamp(path) != info["stamp"]]
+        if not files or str(self.ledger_path) in changed or self._includes_changed(files):
+            return self._full_load(files), True
+        if not changed:
+            return files, False
+
+        updated = dict(files)
+        try:
+            for path in changed:
+                updated[path] = self._info(path, self._parse_file(path, files[path]), files[path], [])
+        except _FullReload as e:
+            logger.info(f"{self.label}: {e} kan inte läsas fristående - läser hela huvudboken")
+            self.parsed_files = []
+            return self._full_load(files), True
+        return updated, True
+
+    def _info(self, path: str, entries: List, previous: Dict, includes: List[str]) -> Dict:
+        return dict(self._build(path, entries, previous), stamp=stamp(path), includes=includes)
+
+    def _includes_changed(self, files: Dict[str, Dict]) -> bool:
+        """Matchar include-mönstren andra filer än de som har resultat?"""
+        patterns = [pattern for info in files.values() for pattern in info.get("includes", [])]
+        return expand_includes(patterns) | {str(self.ledger_path)} != set(files)
+
+    def _parse_file(self, path: str, info: Dict) -> List:
+        """Läs och boka en enskild inkluderad fil"""
+        entries, errors, options_map = parser.parse_file(path)
+        # Nästlade include-direktiv (nya eller borttagna) kräver loaderns rekursiva inläsning
+        if errors or options_map["include"] or info.get("includes"):
+            raise _FullReload(path)
+        entries, errors = booking.book(entries, options_map)
+        if errors:
+            raise _FullReload(path)
+        self.parsed_files.append(path)
+        return entries
+
+    def _full_load(self, files: Dict[str, Dict]) -> Dict[str, Dict]:
+        entries, errors, options_map = loader.load_file(str(self.ledger_path))
+        self.loaded_ledger = True
+        if errors:
+            logger.warning(f"{len(errors)} fel vid inläsning av {self.ledger_path}")
+
+        by_file: Dict[str, List] = defaultdict(list)
+        for entry in entries:
+            by_file[entry.meta.get("filename", "")].append(entry)
+
+        result = {}
+        for path in options_map["include"]:
+            previous = files.get(path)
+            if previous and previous["stamp"] == stamp(path) and path != str(self.ledger_path):
+                result[path] = previous
+            else:
+                result[path] = self._info(path, by_file.get(path, []), previous or {}, include_patterns(path))
+
+        for path, info in files.items():
+            if path not in result:
+                self._discard(path, info)
+        return result
@@ -0,0 +1,222 @@
+"""
+Icke-blockerande loggning för agenterna
+
+Alla loggposter läggs på en kö via QueueHandler och skrivs av en
+QueueListener-tråd, så att fil- och terminal-I/O aldrig sker i synkens eller
+fakturaflödets loopar. Processpool-arbetare skickar sina poster till samma
+lyssnare via en multiprocessing-kö - huvudprocessen är den enda som skriver
+loggfilen.
+
+- LOG_FORMAT=json ger en JSON-rad per post (med fält från `extra=`)
+- LOG_RATE_LIMIT begränsar antal poster per anropsställe och minut; antalet
+  undertryckta poster skrivs med nästa post från samma ställe
+
+Användning:
+    from agents.logging_setup import setup_logging
+
+    logs = setup_logging(config, log_file=config.LOG_FILE)
+    with ProcessPoolExecutor(**logs.pool_kwargs()) as pool:
+        ...
+    logs.stop()
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attribut som alla LogRecord har - resten kommer från extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """En JSON-rad per loggpost"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Högst `limit` poster per anropsställe och `interval` sekunder
+
+    Anropsstället (fil och rad) används som nyckel eftersom meddelandena är
+    f-strängar och skiljer sig per transaktion. Fel och kritiska poster
+    släpps alltid igenom.
+    """
+
+    def __init__(self, limit: int, interval: float = 60.0):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple[str, int], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.limit:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} liknande meddelanden undertryckta)"
+        return True
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """Köar posten oformaterad - kön lämnar aldrig processen"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogSetup:
+    """Handlers, köer och lyssnartrådar för en process"""
+
+    def __init__(self, handlers: List[logging.Handler], level: int, rate_limit: int):
+        self.handlers = handlers
+        self.level = level
+        self.rate_limit = rate_limit
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.queue_handler = _LocalQueueHandler(self.queue)
+        self._mp_queue = None
+        self._mp_listener: Optional[logging.handlers.QueueListener] = None
+        self._running: List[logging.handlers.QueueListener] = []
+
+    def start(self):
+        _install(self.queue_handler, self.level, self.rate_limit)
+        self.listener.start()
+        self._running.append(self.listener)
+        atexit.register(self.stop)
+
+    def worker_queue(self):
+        """Kö för processpool-arbetare (skapas och avläses vid första anrop)"""
+        if self._mp_queue is None:
+            import multiprocessing
+
+            self._mp_queue = multiprocessing.get_context().Queue(-1)
+            self._mp_listener = logging.handlers.QueueListener(
+                self._mp_queue, *self.handlers, respect_handler_level=True
+            )
+            self._mp_listener.start()
+            self._running.append(self._mp_listener)
+        return self._mp_queue
+
+    def pool_kwargs(self) -> Dict:
+        """initializer/initargs för ProcessPoolExecutor och multiprocessing.Pool"""
+        return {"initializer": init_worker, "initargs": (self.worker_queue(), self.level, self.rate_limit)}
+
+    def stop(self):
+        """Koppla bort kön från rotloggern, töm köerna och stäng handlers"""
+        atexit.unregister(self.stop)
+        logging.getLogger().removeHandler(self.queue_handler)
+        while self._running:
+            self._running.pop().stop()
+        if self._mp_queue is not None:
+            self._mp_queue.close()
+            self._mp_queue.join_thread()
+            self._mp_queue = None
+        for handler in self.handlers:
+            handler.close()
+
+
+_active: Optional[LogSetup] = None
+
+
+def _install(handler: logging.Handler, level: int, rate_limit: int):
+    if rate_limit > 0:
+        handler.addFilter(RateLimitFilter(rate_limit))
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def setup_logging(
+    config=None,
+    log_file: Optional[Path] = None,
+    level: Optional[str] = None,
+    json_format: Optional[bool] = None,
+    rate_limit: Optional[int] = None,
+    stream=sys.stderr,
+) -> LogSetup:
+    """
+    Konfigurera köbaserad loggning för processen
+
+    Args:
+        config: Inställningar (LOG_LEVEL, LOG_FORMAT, LOG_RATE_LIMIT)
+        log_file: Loggfil (None = bara terminalen)
+        level: Loggnivå (default: config.LOG_LEVEL)
+        json_format: JSON-rader i stället för text (default: LOG_FORMAT == "json")
+        rate_limit: Poster per anropsställe och minut, 0 = obegränsat
+        stream: Terminalström (None = ingen)
+
+    Returns:
+        LogSetup - stoppas automatiskt vid processens slut
+    """
+    global _active
+    if config is None:
+        from agents.config import config
+    level_no = getattr(logging, (level or config.LOG_LEVEL).upper())
+    if json_format is None:
+        json_format = config.LOG_FORMAT == "json"
+    if rate_limit is None:
+        rate_limit = config.LOG_RATE_LIMIT
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = []
+    if log_file:
+        log_file = Path(log_file)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    if stream is not None:
+        handlers.append(logging.StreamHandler(stream))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if _active is not None:
+        _active.stop()
+    _active = LogSetup(handlers, level_no, rate_limit)
+    _active.start()
+    return _active
+
+
+def init_worker(log_queue, level: int, rate_limit: int = 0):
+    """Initierare för processpool-arbetare: all loggning går till huvudprocessen"""
+    _install(logging.handlers.QueueHandler(log_queue), level, rate_limit)
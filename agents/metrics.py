@@ -0,0 +1,275 @@
+"""
+Mätvärden för synk- och fakturaflödena
+
+Histogram för tider per steg (API-anrop per endpoint, konvertering,
+skrivning, OCR per sida, LLM per faktura) och räknare för fel och
+överhoppade poster. Efter varje körning skrivs en Prometheus-textfil (för
+node_exporters textfile collector) och en JSON-sammanfattning.
+
+Användning:
+    from agents.metrics import metrics
+
+    with metrics.timer("sync_convert_seconds"):
+        ...
+    metrics.inc("sync_skipped_total", reason="pending")
+    metrics.write("revolut_sync", config.METRICS_DIR)
+
+Flera bolag i samma process märks med `metrics.scope(tenant=...)` - alla
+värden som registreras i blocket (i samma tråd) får etiketten.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "efficra"
+
+# Hinkgränser i sekunder - från snabba lokala steg till långsamma LLM-anrop
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Histogram som räknar antal snarare än sekunder
+COUNT_BUCKETS = (1, 10, 50, 100, 250, 500, 1000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Etiketter från metrics.scope() för aktuell tråd/kontext
+_scope: ContextVar[Dict[str, object]] = ContextVar("metrics_scope", default={})
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    scoped = _scope.get()
+    if scoped:
+        labels = {**scoped, **labels}
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = [(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in items]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Histogram:
+    """Kumulativa hinkar plus summa, antal, min och max"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """Uppskattad kvantil (övre hinkgräns, begränsad av max)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self) -> List[int]:
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "min": round(self.min, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+        }
+
+
+class Metrics:
+    """Trådsäkert register med räknare och histogram per namn och etiketter"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self.started = time.time()
+
+    def reset(self):
+        """Töm registret inför en ny körning"""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Öka en räknare"""
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Optional[Tuple[float, ...]] = None, **labels):
+        """Registrera ett värde i ett histogram"""
+        key = _labels(labels)
+        with self._lock:
+            bounds = self._buckets.setdefault(name, buckets or DEFAULT_BUCKETS)
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(bounds)
+            histogram.observe(value)
+
+    @contextmanager
+    def scope(self, **labels) -> Iterator[None]:
+        """Lägg till etiketter på allt som registreras i blocket"""
+        token = _scope.set({**_scope.get(), **labels})
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Mät tiden för ett block i sekunder"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # -- Export -----------------------------------------------------------
+
+    def prometheus(self, job: str) -> str:
+        """Prometheus text exposition format"""
+        job_label = (("job", job),)
+        lines = []
+        with self._lock:
+            for name in sorted(self.counters):
+                full = f"{NAMESPACE}_{name}"
+                lines.append(f"# TYPE {full} counter")
+                for labels, value in sorted(self.counters[name].items()):
+                    lines.append(f"{full}{_format_labels(job_label + labels)} {value:g}")
+            for name in sorted(self.histograms):
+                full = f"{NAMESPACE}_{name}"
+                lines.append(f"# TYPE {full} histogram")
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    labels = job_label + labels
+                    for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                        lines.append(f"{full}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{full}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {histogram.count}")
+            full = f"{NAMESPACE}_last_run_timestamp_seconds"
+            lines.append(f"# TYPE {full} gauge")
+            lines.append(f"{full}{_format_labels(job_label)} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        """Sammanfattning per mätvärde och etikettkombination"""
+        def label_key(labels: Labels) -> str:
+            return ",".join(f"{k}={v}" for k, v in labels) or "total"
+
+        with self._lock:
+            return {
+                "started": self.started,
+                "duration": round(time.time() - self.started, 3),
+                "counters": {
+                    name: {label_key(labels): value for labels, value in sorted(series.items())}
+                    for name, series in sorted(self.counters.items())
+                },
+                "histograms": {
+                    name: {label_key(labels): h.summary() for labels, h in sorted(series.items())}
+                    for name, series in sorted(self.histograms.items())
+                },
+            }
+
+    def write(self, job: str, directory: Path) -> Tuple[Path, Path]:
+        """
+        Skriv Prometheus-textfil och JSON-sammanfattning (atomiskt)
+
+        Returns:
+            (sökväg till .prom, sökväg till .json)
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        prom_path = directory / f"{job}.prom"
+        json_path = directory / f"{job}.json"
+        for path, content in (
+            (prom_path, self.prometheus(job)),
+            (json_path, json.dumps({"job": job, **self.summary()}, indent=2)),
+        ):
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(content, encoding="utf-8")
+            tmp_path.replace(path)
+        logger.debug(f"Mätvärden skrivna till {prom_path} och {json_path}")
+        return prom_path, json_path
+
+
+# Processens register - nollställs per körning av respektive agent
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(enabled: bool, output: Path, top: int = 25) -> Iterator[None]:
+    """
+    Kör ett block under cProfile och tracemalloc
+
+    Skriver pstats-data till `output` (.prof) och skriver ut de dyraste
+    funktionerna och de största allokeringarna.
+    """
+    if not enabled:
+        yield
+        return
+
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tracemalloc.start(25)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(str(output))
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+        print(f"\n📊 Profil ({output}):")
+        print(stream.getvalue())
+        print(f"🧠 Toppminne: {peak / 1024 / 1024:.1f} MB - största allokeringar:")
+        for stat in snapshot.statistics("lineno")[:10]:
+            print(f"   {stat}")
@@ -0,0 +1,222 @@
+"""
+OCR-backends för fakturabehandling
+
+`pytesseract` startar en ny `tesseract`-process per bild, skriver temporära
+filer och laddar om språkdata varje gång. `TesserocrBackend` använder istället
+Tesseracts C-API via tesserocr med en persistent motor per tråd, så språken
+laddas en gång och bilder skickas direkt i minnet. pytesseract används som
+fallback när tesserocr inte är installerat.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # Valfritt beroende - pytesseract används som fallback
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OCRWord:
+    """Ett igenkänt ord med position i bilden (pixlar)"""
+    text: str
+    confidence: float
+    left: int
+    top: int
+    width: int
+    height: int
+
+    @property
+    def bottom(self) -> int:
+        return self.top + self.height
+
+
+class OCRBackend:
+    """Gemensamt gränssnitt för OCR-motorer"""
+
+    name = "base"
+
+    def __init__(self, lang: str = "swe+eng"):
+        self.lang = lang
+
+    def image_to_string(self, image: Image.Image, psm: Optional[int] = None) -> str:
+        """
+        Kör OCR på en PIL-bild
+
+        Args:
+            image: Bild att läsa
+            psm: Tesseract page segmentation mode (None = motorns standard)
+        """
+        raise NotImplementedError
+
+    def image_to_words(self, image: Image.Image, psm: Optional[int] = None) -> List[OCRWord]:
+        """Kör OCR och returnera ord med positioner (för layoutanalys)"""
+        raise NotImplementedError
+
+    def close(self):
+        """Frigör motorresurser"""
+
+
+class PytesseractBackend(OCRBackend):
+    """OCR via pytesseract (en tesseract-process per anrop)"""
+
+    name = "pytesseract"
+
+    def image_to_string(self, image: Image.Image, psm: Optional[int] = None) -> str:
+        import pytesseract
+
+        config = f"--psm {psm}" if psm is not None else ""
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def image_to_words(self, image: Image.Image, psm: Optional[int] = None) -> List[OCRWord]:
+        import pytesseract
+
+        config = f"--psm {psm}" if psm is not None else ""
+        data = pytesseract.image_to_data(
+            image, lang=self.lang, config=config, output_type=pytesseract.Output.DICT
+        )
+        words = []
+        for i, text in enumerate(data["text"]):
+            if text.strip():
+                words.append(OCRWord(
+                    text=text,
+                    confidence=float(data["conf"][i]),
+                    left=data["left"][i],
+                    top=data["top"][i],
+                    width=data["width"][i],
+                    height=data["height"][i],
+                ))
+        return words
+
+
+class TesserocrBackend(OCRBackend):
+    """
+    OCR via Tesseracts C-API (tesserocr)
+
+    En PyTessBaseAPI-instans är inte trådsäker, så varje tråd får en egen
+    motor som skapas vid första anropet och sedan återanvänds.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str = "swe+eng", tessdata_path: Optional[str] = None):
+        if tesserocr is None:
+            raise ImportError(
+                "tesserocr krävs för TesserocrBackend. Installera med: pip install tesserocr"
+            )
+        super().__init__(lang)
+        self.tessdata_path = tessdata_path
+        self._local = threading.local()
+        self._engines: List = []
+        self._lock = threading.Lock()
+
+    def _engine(self):
+        """Hämta trådens motor, skapa den vid behov"""
+        api = getattr(self._local, "api", None)
+        if api is None:
+            kwargs = {"lang": self.lang}
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.api = api
+            with self._lock:
+                self._engines.append(api)
+            logger.debug(f"Tesseract-motor initierad ({self.lang})")
+        return api
+
+    def image_to_string(self, image: Image.Image, psm: Optional[int] = None) -> str:
+        api = self._engine()
+        api.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+        api.SetImage(image)
+        try:
+            return api.GetUTF8Text()
+        finally:
+            # Släpper bild och resultat men behåller inladdade språk
+            api.Clear()
+
+    def image_to_words(self, image: Image.Image, psm: Optional[int] = None) -> List[OCRWord]:
+        api = self._engine()
+        api.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+        api.SetImage(image)
+        try:
+            api.Recognize()
+            words = []
+            level = tesserocr.RIL.WORD
+            for item in tesserocr.iterate_level(api.GetIterator(), level):
+                text = item.GetUTF8Text(level)
+                box = item.BoundingBox(level)
+                if not text or not text.strip() or box is None:
+                    continue
+                left, top, right, bottom = box
+                words.append(OCRWord(
+                    text=text,
+                    confidence=item.Confidence(level),
+                    left=left,
+                    top=top,
+                    width=right - left,
+                    height=bottom - top,
+                ))
+            return words
+        finally:
+            api.Clear()
+
+    def close(self):
+        with self._lock:
+            for api in self._engines:
+                api.End()
+            self._engines.clear()
+        self._local = threading.local()
+
+
+_BACKEND_TYPES = {
+    PytesseractBackend.name: PytesseractBackend,
+    TesserocrBackend.name: TesserocrBackend,
+}
+
+# En backend per (namn, språk) och process - delas av alla anrop i en worker
+_backends: Dict[Tuple[str, str], OCRBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_ocr_backend(lang: str = "swe+eng", preferred: str = "auto") -> OCRBackend:
+    """
+    Hämta processens OCR-backend
+
+    Args:
+        lang: Tesseract-språk, t.ex. "swe+eng"
+        preferred: "auto" (tesserocr om installerat, annars pytesseract),
+                   "tesserocr" eller "pytesseract"
+
+    Raises:
+        ValueError: Om preferred är okänd
+        ImportError: Om preferred är "tesserocr" och tesserocr saknas
+    """
+    if preferred == "auto":
+        preferred = TesserocrBackend.name if tesserocr is not None else PytesseractBackend.name
+
+    if preferred not in _BACKEND_TYPES:
+        raise ValueError(f"Okänd OCR-backend: {preferred}")
+
+    key = (preferred, lang)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _BACKEND_TYPES[preferred](lang)
+            _backends[key] = backend
+            logger.info(f"Använder OCR-backend {preferred} ({lang})")
+    return backend
+
+
+def close_ocr_backends():
+    """Stäng alla processens OCR-backends"""
+    with _backends_lock:
+        for backend in _backends.values():
+            backend.close()
+        _backends.clear()
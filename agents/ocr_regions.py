@@ -0,0 +1,237 @@
+"""
+Tvåstegs-OCR av fakturornas nyckelfält
+
+För bokföringen behövs bara leverantör, fakturadatum, förfallodatum, belopp,
+moms och OCR-nummer/bankgiro. Istället för att läsa hela sidan i full
+upplösning görs:
+
+1. Ett snabbt layoutpass i låg upplösning som hittar ankare
+   ("Fakturadatum", "Att betala", "Exkl. moms", "Bankgiro", ...) och deras rader.
+2. Ett högupplöst pass som bara läser de utvalda regionerna
+   (sidhuvud, datumrader, summablock, betalningsinformation).
+
+Om layoutpasset inte hittar några ankare läses hela sidan som vanligt.
+"""
+
+import difflib
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from agents.ocr_backend import OCRBackend, OCRWord
+
+logger = logging.getLogger(__name__)
+
+# Ankare per regiontyp (gemener, utan skiljetecken). Flerordsankare matchar
+# ord i följd på samma rad - vanliga ord som "att", "moms" och "summa" räcker
+# inte ensamma, då skulle nästan varje rad i brödtexten bli en region.
+ANCHOR_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "dates": (
+        "fakturadatum", "förfallodatum", "förfallodag", "betalningsdag",
+        "fakturanr", "fakturanummer", "faktura nr", "faktura nummer",
+    ),
+    "totals": (
+        "att betala", "summa att betala", "totalt att betala", "totalbelopp",
+        "momsbelopp", "nettobelopp", "summa exkl", "summa inkl", "exkl moms",
+        "inkl moms", "moms 25%", "moms 12%", "moms 6%",
+    ),
+    "payment": (
+        "bankgiro", "plusgiro", "bg", "pg", "ocr", "ocr-nr", "ocr-nummer",
+        "referens", "iban", "bic",
+    ),
+    "header": ("org.nr", "orgnr", "org", "organisationsnummer", "momsreg.nr"),
+}
+
+# Tesseract page segmentation mode för enskilda regioner (enhetligt textblock)
+REGION_PSM = 6
+
+
+@dataclass
+class OCRRegion:
+    """En region att läsa i högupplöst pass"""
+    name: str
+    box: Tuple[int, int, int, int]  # (left, top, right, bottom) i originalbilden
+    text: str = ""
+
+    @property
+    def area(self) -> int:
+        left, top, right, bottom = self.box
+        return max(0, right - left) * max(0, bottom - top)
+
+
+@dataclass
+class RegionOCRResult:
+    """Resultat från tvåstegs-OCR"""
+    regions: List[OCRRegion] = field(default_factory=list)
+    full_page: bool = False  # True om hela sidan lästes (inga ankare hittades)
+    page_size: Tuple[int, int] = (0, 0)
+
+    @property
+    def text(self) -> str:
+        """Regionernas text i läsordning"""
+        return "\n".join(region.text.strip() for region in self.regions if region.text.strip())
+
+    @property
+    def coverage(self) -> float:
+        """Andel av sidan som lästes i högupplöst pass"""
+        page_area = self.page_size[0] * self.page_size[1]
+        if not page_area:
+            return 0.0
+        return min(1.0, sum(region.area for region in self.regions) / page_area)
+
+
+def _normalize(word: str) -> str:
+    return word.lower().strip(" :.,;()[]")
+
+
+def _matches(token: str, keyword: str) -> bool:
+    if token == keyword or (len(keyword) >= 5 and token.startswith(keyword)):
+        return True
+    # Tolerera lågupplösta felläsningar av längre ankarord (inte andra ord med samma stam)
+    return (
+        len(keyword) >= 6 and abs(len(token) - len(keyword)) <= 1
+        and difflib.SequenceMatcher(None, token, keyword).ratio() >= 0.8
+    )
+
+
+def match_line(words: List[str]) -> Optional[str]:
+    """Returnera regiontyp om raden innehåller ett ankare (ord eller fras i följd)"""
+    tokens = [_normalize(word) for word in words]
+    for name, keywords in ANCHOR_KEYWORDS.items():
+        for keyword in keywords:
+            parts = keyword.split()
+            for start in range(len(tokens) - len(parts) + 1):
+                window = tokens[start:start + len(parts)]
+                if all(_matches(t, k) for t, k in zip(window, parts)):
+                    return name
+    return None
+
+
+def match_anchor(word: str) -> Optional[str]:
+    """Returnera regiontyp om ordet (eller en OCR-förvanskning av det) ensamt är ett ankare"""
+    return match_line([word])
+
+
+def _group_lines(words: List[OCRWord]) -> List[List[OCRWord]]:
+    """Gruppera ord till textrader efter vertikal position"""
+    lines: List[List[OCRWord]] = []
+    for word in sorted(words, key=lambda w: (w.top + w.height / 2, w.left)):
+        center = word.top + word.height / 2
+        if lines:
+            last = lines[-1]
+            last_center = sum(w.top + w.height / 2 for w in last) / len(last)
+            tolerance = max(w.height for w in last) * 0.6
+            if abs(center - last_center) <= tolerance:
+                last.append(word)
+                continue
+        lines.append([word])
+    return lines
+
+
+def _merge_bands(
+    bands: List[Tuple[int, int, str]], gap: int
+) -> List[Tuple[int, int, List[str]]]:
+    """Slå ihop överlappande eller närliggande vertikala band"""
+    merged: List[Tuple[int, int, List[str]]] = []
+    for top, bottom, name in sorted(bands):
+        if merged and top <= merged[-1][1] + gap:
+            prev_top, prev_bottom, names = merged[-1]
+            if name not in names:
+                names.append(name)
+            merged[-1] = (prev_top, max(prev_bottom, bottom), names)
+        else:
+            merged.append((top, bottom, [name]))
+    return merged
+
+
+class RegionOCR:
+    """Tvåstegs-OCR: lågupplöst layoutpass följt av högupplöst läsning av regioner"""
+
+    def __init__(
+        self,
+        backend: OCRBackend,
+        layout_dpi: int = 100,
+        header_fraction: float = 0.15,
+        line_padding: float = 1.0,
+        max_coverage: float = 0.8,
+    ):
+        """
+        Args:
+            backend: OCR-motor för båda passen
+            layout_dpi: Upplösning för layoutpasset
+            header_fraction: Andel av sidans topp som alltid läses (leverantör)
+            line_padding: Marginal runt ankarrader, i radhöjder
+            max_coverage: Läs hela sidan direkt om regionerna täcker mer än så
+        """
+        self.backend = backend
+        self.layout_dpi = layout_dpi
+        self.header_fraction = header_fraction
+        self.line_padding = line_padding
+        self.max_coverage = max_coverage
+
+    def layout(self, image: Image.Image, source_dpi: Optional[float] = None) -> List[OCRRegion]:
+        """
+        Lågupplöst layoutpass - hitta regioner med nyckelfält
+
+        Returnerar regioner i originalbildens koordinater, eller tom lista om
+        inga ankare hittades.
+        """
+        source_dpi = source_dpi or float(image.info.get("dpi", (300, 300))[0])
+        scale = min(1.0, self.layout_dpi / source_dpi)
+        width, height = image.size
+
+        if scale < 1.0:
+            small = image.resize(
+                (max(1, round(width * scale)), max(1, round(height * scale))),
+                Image.Resampling.BOX,
+            )
+        else:
+            small = image
+
+        words = self.backend.image_to_words(small)
+        bands: List[Tuple[int, int, str]] = []
+        for line in _group_lines(words):
+            name = match_line([w.text for w in sorted(line, key=lambda w: w.left)])
+            if not name:
+                continue
+            line_top = min(w.top for w in line) / scale
+            line_bottom = max(w.bottom for w in line) / scale
+            padding = (line_bottom - line_top) * self.line_padding
+            bands.append((
+                max(0, int(line_top - padding)),
+                min(height, int(line_bottom + padding)),
+                name,
+            ))
+
+        if not bands:
+            return []
+
+        header_bottom = int(height * self.header_fraction)
+        bands.append((0, header_bottom, "header"))
+
+        line_height = int(sum(b - t for t, b, _n in bands) / len(bands))
+        return [
+            OCRRegion(name="+".join(names), box=(0, top, width, bottom))
+            for top, bottom, names in _merge_bands(bands, gap=line_height)
+        ]
+
+    def recognize(self, image: Image.Image, source_dpi: Optional[float] = None) -> RegionOCRResult:
+        """Kör båda passen och returnera regionernas text"""
+        regions = self.layout(image, source_dpi)
+        result = RegionOCRResult(regions=regions, page_size=image.size)
+
+        if not regions or result.coverage > self.max_coverage:
+            logger.debug("Regions-OCR: läser hela sidan")
+            page = OCRRegion(name="page", box=(0, 0, image.width, image.height))
+            page.text = self.backend.image_to_string(image)
+            return RegionOCRResult(regions=[page], full_page=True, page_size=image.size)
+
+        for region in regions:
+            region.text = self.backend.image_to_string(image.crop(region.box), psm=REGION_PSM)
+
+        logger.debug(
+            f"Regions-OCR: {len(regions)} regioner, {result.coverage:.0%} av sidan"
+        )
+        return result
@@ -0,0 +1,256 @@
+"""
+LLM-baserad fakturatolkning via Ollama
+
+Används för dokument där den deterministiska extraktionen har låg konfidens.
+Anropen skickas parallellt med ett begränsat antal samtidiga förfrågningar
+över en återanvänd HTTP-anslutning, med JSON-schema-styrt svar. Resultat
+cachas på hash av OCR-text, modell och promptversion.
+
+Prompten är uppbyggd så att allt utom OCR-texten är identiskt mellan anrop,
+vilket låter Ollama återanvända modellens KV-cache för prefixet.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agents.invoice_fields import FIELD_NAMES
+from agents.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ändra vid varje ändring av prompt eller schema - ogiltigförklarar cachen
+PROMPT_VERSION = "invoice-v1"
+
+INVOICE_SCHEMA = {
+    "type": "object",
+    "properties": {name: {"type": ["string", "null"]} for name in FIELD_NAMES},
+    "required": list(FIELD_NAMES),
+}
+
+SYSTEM_PROMPT = (
+    "Du är en noggrann bokföringsassistent för ett svenskt företag. "
+    "Du får OCR-text från en leverantörsfaktura eller ett kvitto och ska "
+    "extrahera fält till JSON enligt schemat. Regler:\n"
+    "- supplier: leverantörens företagsnamn (inte köparens)\n"
+    "- invoice_date, due_date: ISO-format ÅÅÅÅ-MM-DD\n"
+    "- amount: totalt att betala inklusive moms, vat: momsbelopp. "
+    "Punkt som decimaltecken och två decimaler, t.ex. 1234.50\n"
+    "- vat_rate: momssats i procent utan %-tecken (25, 12 eller 6)\n"
+    "- currency: ISO 4217, t.ex. SEK\n"
+    "- org_number: NNNNNN-NNNN, bankgiro: NNN-NNNN eller NNNN-NNNN, "
+    "plusgiro: siffror-kontrollsiffra, ocr_reference: endast siffror\n"
+    "- Använd null för fält som inte finns i texten. Gissa aldrig.\n"
+    "Schema: " + json.dumps(INVOICE_SCHEMA, ensure_ascii=False, sort_keys=True)
+)
+
+# Fast inledning på användarmeddelandet - OCR-texten läggs alltid sist
+USER_PREFIX = "OCR-text:\n<<<\n"
+USER_SUFFIX = "\n>>>"
+
+
+def _normalize_amount(value) -> Optional[str]:
+    if value in (None, ""):
+        return None
+    text = str(value).replace(" ", "").replace(" ", "")
+    if "," in text and "." not in text:
+        text = text.replace(",", ".")
+    try:
+        return str(Decimal(text).quantize(Decimal("0.01")))
+    except InvalidOperation:
+        return None
+
+
+def _normalize_date(value) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+def normalize_llm_fields(data: Dict) -> Dict[str, Optional[str]]:
+    """
+    Validera och normalisera LLM-svar till samma format som invoice_fields
+
+    Raises:
+        ValueError: Om svaret inte är ett JSON-objekt
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"LLM-svaret är inte ett JSON-objekt: {type(data).__name__}")
+    fields: Dict[str, Optional[str]] = {}
+    for name in FIELD_NAMES:
+        value = data.get(name)
+        if name in ("amount", "vat"):
+            fields[name] = _normalize_amount(value)
+        elif name in ("invoice_date", "due_date"):
+            fields[name] = _normalize_date(value)
+        elif name == "ocr_reference":
+            digits = "".join(ch for ch in str(value or "") if ch.isdigit())
+            fields[name] = digits or None
+        elif name == "vat_rate":
+            digits = "".join(ch for ch in str(value or "") if ch.isdigit())
+            fields[name] = digits or None
+        else:
+            fields[name] = str(value).strip() if value not in (None, "") else None
+    return fields
+
+
+class OllamaExtractor:
+    """Parallell, cachad fakturatolkning mot Ollamas chat-API"""
+
+    def __init__(
+        self,
+        host: str = "http://localhost:11434",
+        model: str = "llama3",
+        max_in_flight: int = 4,
+        cache_dir: Optional[Path] = None,
+        timeout: float = 120.0,
+        keep_alive: str = "30m",
+    ):
+        """
+        Args:
+            host: Ollama-serverns URL
+            model: Modellnamn
+            max_in_flight: Max antal samtidiga förfrågningar
+            cache_dir: Katalog för diskcache (None = endast minnescache)
+            timeout: Timeout per förfrågan i sekunder
+            keep_alive: Hur länge Ollama ska hålla modellen laddad
+        """
+        self.host = host.rstrip("/")
+        self.model = model
+        self.max_in_flight = max(1, max_in_flight)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+
+        # En session med en pool stor nog för alla samtidiga förfrågningar
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache: Dict[str, Dict] = {}
+        self._cache_lock = threading.Lock()
+
+    def cache_key(self, text: str) -> str:
+        """Cache-nyckel: promptversion, modell och OCR-text"""
+        digest = hashlib.sha256()
+        for part in (PROMPT_VERSION, self.model, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def build_request(self, text: str) -> Dict:
+        """Bygg förfrågan - allt utom OCR-texten är identiskt mellan anrop"""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": USER_PREFIX + text + USER_SUFFIX},
+            ],
+            "format": INVOICE_SCHEMA,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": 0},
+        }
+
+    def _cache_get(self, key: str) -> Optional[Dict]:
+        with self._cache_lock:
+            if key in self._cache:
+                return self._cache[key]
+        if self.cache_dir:
+            path = self.cache_dir / f"{key}.json"
+            if path.exists():
+                try:
+                    fields = json.loads(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ogiltig LLM-cachefil {path.name}: {e}")
+                    return None
+                with self._cache_lock:
+                    self._cache[key] = fields
+                return fields
+        return None
+
+    def _cache_put(self, key: str, fields: Dict):
+        with self._cache_lock:
+            self._cache[key] = fields
+        if self.cache_dir:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.cache_dir / f"{key}.json.tmp"
+                tmp_path.write_text(json.dumps(fields, ensure_ascii=False), encoding="utf-8")
+                tmp_path.replace(self.cache_dir / f"{key}.json")
+            except OSError as e:
+                logger.warning(f"Kunde inte skriva LLM-cache {key}: {e}")
+
+    def _call(self, text: str) -> Dict[str, Optional[str]]:
+        response = self.session.post(
+            f"{self.host}/api/chat", json=self.build_request(text), timeout=self.timeout
+        )
+        response.raise_for_status()
+        content = response.json()["message"]["content"]
+        return normalize_llm_fields(json.loads(content))
+
+    def extract(self, text: str) -> Optional[Dict[str, Optional[str]]]:
+        """Tolka en OCR-text (None om anropet misslyckas)"""
+        return self.extract_batch([text])[0]
+
+    def extract_batch(self, texts: List[str]) -> List[Optional[Dict[str, Optional[str]]]]:
+        """
+        Tolka flera OCR-texter parallellt
+
+        Cachade texter och dubbletter inom batchen skickas inte till Ollama.
+        Returnerar en lista i samma ordning som texts, med None för
+        dokument där anropet misslyckades.
+        """
+        keys = [self.cache_key(text) for text in texts]
+        results: Dict[str, Optional[Dict]] = {}
+        pending: Dict[str, str] = {}
+
+        for key, text in zip(keys, texts):
+            if key in results or key in pending:
+                continue
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[key] = cached
+                metrics.inc("llm_cache_hits_total", model=self.model)
+            else:
+                pending[key] = text
+
+        if pending:
+            logger.info(
+                f"Skickar {len(pending)} dokument till Ollama ({self.model}, "
+                f"max {self.max_in_flight} samtidiga, {len(texts) - len(pending)} från cache)"
+            )
+
+            def run(key: str, text: str):
+                try:
+                    with metrics.timer("llm_request_seconds", model=self.model):
+                        fields = self._call(text)
+                except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Ollama-tolkning misslyckades: {e}")
+                    metrics.inc("llm_errors_total", model=self.model)
+                    return key, None
+                self._cache_put(key, fields)
+                return key, fields
+
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+                for key, fields in pool.map(lambda item: run(*item), pending.items()):
+                    results[key] = fields
+
+        return [results[key] for key in keys]
+
+    def close(self):
+        """Stäng HTTP-sessionen"""
+        self.session.close()
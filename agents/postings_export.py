@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Kolumnär export av huvudbokens posteringar för analys
+
+Alla posteringar plattas ut till NumPy-kolumner (datum, transaktion, konto,
+motpart, valuta, belopp och vikt i redovisningsvaluta) och sparas som en
+.npz-fil per källfil i huvudboken. Konton, motparter och valutor är
+ordlistekodade: kolumnerna innehåller heltalskoder och ordlistan sparas
+bredvid i samma fil.
+
+Ett manifest håller källfilernas mtime/storlek och include-mönster. Vid
+uppdatering skrivs bara partitioner för ändrade filer om (se ledger_partitions).
+
+Rapporter (kassaflöde, burn rate, intäkt per kund) räknas med vektoriserade
+group-by över kolumnerna istället för Python-loopar över transaktioner.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from beancount.core import convert, data
+
+from agents.config import Config, config as default_config
+from agents.ledger_partitions import PartitionedLedger
+from agents.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+# Kolumner och deras typer; konto, motpart och valuta är koder i ordlistorna
+COLUMNS = {
+    "date": "datetime64[D]",
+    "txn": np.int64,
+    "account": np.int32,
+    "payee": np.int32,
+    "currency": np.int32,
+    "number": np.float64,
+    "weight": np.float64,
+}
+DICTIONARIES = {"account": "accounts", "payee": "payees", "currency": "currencies"}
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _encode(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Ordlistekoda en lista strängar -> (koder, ordlista)"""
+    codes: Dict[str, int] = {}
+    encoded = np.fromiter(
+        (codes.setdefault(value, len(codes)) for value in values), dtype=np.int32, count=len(values)
+    )
+    return encoded, np.array(list(codes), dtype=str)
+
+
+def flatten(entries: List, operating_currency: str = "SEK") -> Dict[str, np.ndarray]:
+    """
+    Platta ut transaktionernas posteringar till kolumner
+
+    Returns:
+        Kolumner och ordlistor för en partition
+    """
+    dates, txns, accounts, payees, currencies, numbers, weights = [], [], [], [], [], [], []
+    txn = 0
+    for entry in entries:
+        if not isinstance(entry, data.Transaction):
+            continue
+        for posting in entry.postings:
+            if posting.units is None or posting.units.number is None:
+                continue
+            weight = convert.get_weight(posting)
+            dates.append(entry.date.toordinal())
+            txns.append(txn)
+            accounts.append(posting.account)
+            payees.append(entry.payee or "")
+            currencies.append(posting.units.currency)
+            numbers.append(float(posting.units.number))
+            weights.append(float(weight.number) if weight.currency == operating_currency else np.nan)
+        txn += 1
+
+    account_codes, account_names = _encode(accounts)
+    payee_codes, payee_names = _encode(payees)
+    currency_codes, currency_names = _encode(currencies)
+    return {
+        "date": (np.array(dates, dtype=np.int64) - _EPOCH).astype("datetime64[D]"),
+        "txn": np.array(txns, dtype=np.int64),
+        "account": account_codes,
+        "payee": payee_codes,
+        "currency": currency_codes,
+        "number": np.array(numbers, dtype=np.float64),
+        "weight": np.array(weights, dtype=np.float64),
+        "accounts": account_names,
+        "payees": payee_names,
+        "currencies": currency_names,
+    }
+
+
+class Postings:
+    """Posteringar från alla partitioner med gemensamma ordlistor"""
+
+    def __init__(self, partitions: List[Dict[str, np.ndarray]]):
+        global_codes: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARIES.values()}
+        columns: Dict[str, List[np.ndarray]] = defaultdict(list)
+        txn_offset = 0
+        for part in partitions:
+            for column, dictionary in DICTIONARIES.items():
+                codes = global_codes[dictionary]
+                remap = np.array(
+                    [codes.setdefault(str(name), len(codes)) for name in part[dictionary]], dtype=np.int32
+                )
+                columns[column].append(remap[part[column]] if len(remap) else part[column])
+            columns["txn"].append(part["txn"] + txn_offset)
+            txn_offset += int(part["txn"][-1]) + 1 if len(part["txn"]) else 0
+            for column in ("date", "number", "weight"):
+                columns[column].append(part[column])
+
+        for column, dtype in COLUMNS.items():
+            values = columns[column]
+            setattr(self, column, np.concatenate(values).astype(dtype) if values else np.zeros(0, dtype=dtype))
+        for dictionary, codes in global_codes.items():
+            setattr(self, dictionary, np.array(list(codes), dtype=str))
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def account_mask(self, *prefixes: str) -> np.ndarray:
+        """Radmask för konton under något av prefixen (hela kontosegment)"""
+        selected = np.zeros(len(self.accounts), dtype=bool)
+        for prefix in prefixes:
+            selected |= (self.accounts == prefix) | np.char.startswith(self.accounts, prefix + ":")
+        return selected[self.account]
+
+    def period_mask(self, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        """Radmask för datum i [start, end]"""
+        mask = np.ones(len(self), dtype=bool)
+        if start:
+            mask &= self.date >= np.datetime64(start, "D")
+        if end:
+            mask &= self.date <= np.datetime64(end, "D")
+        return mask
+
+    @staticmethod
+    def group_sum(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Summa per unik nyckel -> (nycklar, summor)"""
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return unique, np.bincount(inverse, weights=values, minlength=len(unique))
+
+    def monthly(self, mask: np.ndarray, column: str = "weight") -> Dict[str, float]:
+        """Summa per månad (ÅÅÅÅ-MM) för raderna i masken"""
+        values = getattr(self, column)
+        mask = mask & ~np.isnan(values)
+        months, sums = self.group_sum(self.date[mask].astype("datetime64[M]"), values[mask])
+        return {str(month): round(float(total), 2) for month, total in zip(months, sums)}
+
+    def cash_flow(self, prefix: str = "Assets:Bank", start: Optional[date] = None,
+                  end: Optional[date] = None) -> Dict[str, float]:
+        """Nettoförändring av likvida medel per månad; överföringar mellan bankkonton tar ut varandra"""
+        return self.monthly(self.account_mask(prefix) & self.period_mask(start, end))
+
+    def burn_rate(self, months: int = 3, end: Optional[date] = None, prefix: str = "Assets:Bank") -> float:
+        """Genomsnittligt nettoutflöde per månad de senaste hela månaderna (positivt = minskande kassa)"""
+        end = end or date.today()
+        last = np.datetime64(end, "M") - 1
+        first = last - (months - 1)
+        flows = self.cash_flow(prefix)
+        total = sum(flows.get(str(first + i), 0.0) for i in range(months))
+        return round(-total / months, 2)
+
+    def revenue_by_customer(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, float]:
+        """Intäkter per motpart (payee), störst först"""
+        mask = self.account_mask("Income") & self.period_mask(start, end) & ~np.isnan(self.weight)
+        payees, sums = self.group_sum(self.payee[mask], -self.weight[mask])
+        order = np.argsort(-sums)
+        return {self.payees[payees[i]] or "(okänd)": round(float(sums[i]), 2) for i in order}
+
+
+class PostingsExport(PartitionedLedger):
+    """Inkrementell kolumnär export med en partition per källfil"""
+
+    label = "Postexport"
+
+    def __init__(self, ledger_path: Path, directory: Path, operating_currency: str = "SEK"):
+        """
+        Args:
+            ledger_path: Huvudbokens huvudfil
+            directory: Katalog för partitioner och manifest
+            operating_currency: Valuta för viktkolumnen
+        """
+        super().__init__(ledger_path)
+        self.directory = Path(directory)
+        self.operating_currency = operating_currency
+        self.manifest_path = self.directory / "manifest.json"
+        self.written: List[str] = []
+
+    def _settings(self) -> Dict:
+        return {
+            "version": MANIFEST_VERSION,
+            "ledger": str(self.ledger_path),
+            "operating_currency": self.operating_currency,
+        }
+
+    @staticmethod
+    def _partition_name(path: str) -> str:
+        stem = Path(path).stem
+        return f"{stem}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]}.npz"
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ogiltigt manifest {self.manifest_path}: {e}")
+            return {}
+        if manifest.get("settings") != self._settings():
+            return {}
+        files = manifest.get("files", {})
+        # Saknas en partition byggs exporten om
+        if not all((self.directory / info["partition"]).exists() for info in files.values()):
+            return {}
+        return files
+
+    def _save_manifest(self, files: Dict[str, Dict]):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"settings": self._settings(), "files": files}, indent=1), encoding="utf-8")
+        tmp_path.replace(self.manifest_path)
+
+    def _build(self, path: str, entries: List, previous: Dict) -> Dict:
+        """Skriv om partitionen för en källfil"""
+        columns = flatten(entries, self.operating_currency)
+        name = self._partition_name(path)
+        tmp_path = self.directory / (name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **columns)
+        tmp_path.replace(self.directory / name)
+        self.written.append(path)
+        return {"partition": name, "rows": len(columns["date"])}
+
+    def _discard(self, path: str, info: Dict):
+        (self.directory / info["partition"]).unlink(missing_ok=True)
+
+    def update(self) -> Dict[str, Dict]:
+        """
+        Skriv om partitioner för ändrade källfiler
+
+        Returns:
+            Manifestets filer
+        """
+        self.written = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        files, refreshed = self.refresh(self._load_manifest())
+        if refreshed:
+            logger.info(f"Postexport: skrev {len(self.written)} partitioner")
+            self._save_manifest(files)
+        return files
+
+    def load(self) -> Postings:
+        """Uppdatera exporten och läs alla partitioner"""
+        files = self.update()
+        partitions = []
+        for path in sorted(files):
+            with np.load(self.directory / files[path]["partition"]) as saved:
+                partitions.append({name: saved[name] for name in saved.files})
+        return Postings(partitions)
+
+
+def main(config: Optional[Config] = None):
+    """
+    Huvudprogram
+
+    Args:
+        config: Inställningar (default: den globala config)
+    """
+    config = config or default_config
+    parser = argparse.ArgumentParser(description="Kolumnär export av posteringar och analysrapporter")
+    parser.add_argument(
+        "--report",
+        choices=["cashflow", "burn", "customers"],
+        help="Rapport att visa efter exporten"
+    )
+    parser.add_argument(
+        "--year",
+        type=int,
+        help="Begränsa rapporten till ett år"
+    )
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        default=config.MAIN_LEDGER,
+        help=f"Huvudbokens fil (standard: {config.MAIN_LEDGER})"
+    )
+    args = parser.parse_args()
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    export = PostingsExport(args.ledger, config.POSTINGS_DIR, config.CURRENCY)
+    postings = export.load()
+    print(f"✅ {len(postings)} posteringar ({len(export.written)} partitioner skrivna) i {config.POSTINGS_DIR}")
+
+    start = date(args.year, 1, 1) if args.year else None
+    end = date(args.year, 12, 31) if args.year else None
+    if args.report == "cashflow":
+        for month, amount in postings.cash_flow(start=start, end=end).items():
+            print(f"  {month}  {amount:>14,.2f} {config.CURRENCY}")
+    elif args.report == "burn":
+        print(f"  Burn rate (3 mån): {postings.burn_rate(end=end):,.2f} {config.CURRENCY}/mån")
+    elif args.report == "customers":
+        for payee, amount in postings.revenue_by_customer(start, end).items():
+            print(f"  {amount:>14,.2f} {config.CURRENCY}  {payee}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Valutakurser och omvärdering av valutasaldon
+
+Dagliga kurser samlas från Revolut (växlingstransaktionernas ben och
+/rate-endpointen) i en deduplicerad SQLite-databas med en kurs per
+(valuta, kursvaluta, dag). Ur databasen skrivs `price`-direktiv, en fil per
+år, så att Fava kan värdera utländska saldon i SEK.
+
+Omvärderingen vid periodslut läser dagssaldon från saldoindexet och slår
+upp kurser för alla valutor i ett vektoriserat pass med numpy.searchsorted.
+"""
+
+import argparse
+import logging
+import sqlite3
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from beancount import loader
+from beancount.core import data
+
+from agents.balance_index import BalanceIndex
+from agents.config import Config, config as default_config
+from agents.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Vid flera kurser samma dag vinner källan med högst prioritet
+SOURCE_PRIORITY = {"exchange": 1, "api": 2, "manual": 3}
+
+# Endast monetära poster omvärderas
+REVALUED_ROOTS = ("Assets:", "Liabilities:")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    currency TEXT NOT NULL,
+    quote TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    rate TEXT NOT NULL,
+    source TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    PRIMARY KEY (currency, quote, day)
+) WITHOUT ROWID;
+"""
+
+
+def _parse_day(value: str) -> date:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+
+
+def rates_from_exchange(transaction: Dict, quote: str = "SEK") -> List[Tuple[str, date, Decimal]]:
+    """
+    Kurser ur en växlingstransaktion
+
+    Returns:
+        (valuta, dag, kurs i quote) - tom lista om ingen sida är i quote
+    """
+    legs = transaction.get("legs", [])
+    if transaction.get("type") != "exchange" or len(legs) != 2:
+        return []
+    date_str = transaction.get("completed_at") or transaction.get("created_at")
+    if not date_str:
+        return []
+
+    by_currency = {leg["currency"]: abs(Decimal(str(leg["amount"]))) for leg in legs}
+    if quote not in by_currency or len(by_currency) != 2:
+        return []
+    currency = next(c for c in by_currency if c != quote)
+    amount = by_currency[currency]
+    if not amount:
+        return []
+    rate = (by_currency[quote] / amount).quantize(Decimal("0.000001"))
+    return [(currency, _parse_day(date_str), rate)]
+
+
+@dataclass
+class Revaluation:
+    """Omvärdering av ett valutasaldo under en period"""
+    account: str
+    currency: str
+    balance: Decimal  # Saldo i valutan vid periodslut
+    rate: Decimal  # Kurs vid periodslut
+    value: Decimal  # Värde i redovisningsvaluta vid periodslut
+    adjustment: Decimal  # Kursdifferens under perioden (positiv = vinst)
+
+
+class PriceDB:
+    """Deduplicerad kursdatabas i SQLite"""
+
+    def __init__(self, db_path=":memory:", quote: str = "SEK"):
+        """
+        Args:
+            db_path: SQLite-fil (":memory:" för en databas i minnet)
+            quote: Redovisningsvaluta som kurserna anges i
+        """
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.quote = quote
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Stäng databasen"""
+        self.conn.close()
+
+    # -- Insamling --------------------------------------------------------
+
+    def add_rates(self, rates: Iterable[Tuple[str, date, Decimal]], source: str) -> int:
+        """
+        Lägg till kurser; en befintlig kurs samma dag ersätts bara av en källa
+        med högre prioritet
+
+        Returns:
+            Antal nya eller ändrade kurser
+        """
+        priority = SOURCE_PRIORITY[source]
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO prices (currency, quote, day, rate, source, priority) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (currency, quote, day) DO UPDATE SET "
+                "rate = excluded.rate, source = excluded.source, priority = excluded.priority "
+                "WHERE excluded.priority > prices.priority",
+                [
+                    (currency, self.quote, day.toordinal(), str(rate), source, priority)
+                    for currency, day, rate in rates
+                    if currency != self.quote
+                ],
+            )
+        return self.conn.total_changes - before
+
+    def add_from_transactions(self, transactions: Iterable[Dict]) -> int:
+        """Samla kurser från Revolut-växlingar"""
+        rates = []
+        for transaction in transactions:
+            rates += rates_from_exchange(transaction, self.quote)
+        return self.add_rates(rates, "exchange")
+
+    def fetch_rates(self, exchange, currencies: Iterable[str]) -> int:
+        """
+        Hämta dagens kurser från Revolut
+
+        Args:
+            exchange: RevolutExchange-instans
+            currencies: Valutor att hämta kurs för
+        """
+        rates = []
+        for currency in currencies:
+            if currency == self.quote:
+                continue
+            result = exchange.get_exchange_rate(currency, self.quote)
+            day = _parse_day(result["rate_date"]) if result.get("rate_date") else date.today()
+            rates.append((currency, day, Decimal(str(result["rate"]))))
+        return self.add_rates(rates, "api")
+
+    # -- Uppslag ----------------------------------------------------------
+
+    def rate(self, currency: str, on: date) -> Optional[Decimal]:
+        """Senaste kurs på eller före ett datum"""
+        if currency == self.quote:
+            return Decimal(1)
+        row = self.conn.execute(
+            "SELECT rate FROM prices WHERE currency = ? AND quote = ? AND day <= ? "
+            "ORDER BY day DESC LIMIT 1",
+            (currency, self.quote, on.toordinal()),
+        ).fetchone()
+        return Decimal(row[0]) if row else None
+
+    def _rate_table(self) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+        """Alla kurser som sorterade nycklar (valutakod << 32 | dag) och kurser"""
+        rows = self.conn.execute(
+            "SELECT currency, day, rate FROM prices WHERE quote = ? ORDER BY currency, day",
+            (self.quote,),
+        ).fetchall()
+        codes: Dict[str, int] = {}
+        keys = np.empty(len(rows), dtype=np.int64)
+        rates = np.empty(len(rows), dtype=np.float64)
+        for i, (currency, day, rate) in enumerate(rows):
+            code = codes.setdefault(currency, len(codes) + 1)
+            keys[i] = (code << 32) | day
+            rates[i] = float(rate)
+        return codes, keys, rates
+
+    # -- Price-direktiv ---------------------------------------------------
+
+    def write_partitions(self, directory: Path, years: Optional[Iterable[int]] = None) -> List[Path]:
+        """
+        Skriv price-direktiv till en fil per år (prices_ÅÅÅÅ.beancount)
+
+        Filer skrivs bara om när innehållet ändrats.
+
+        Returns:
+            Filer som skrevs
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        by_year: Dict[int, List[str]] = {}
+        for currency, day, rate in self.conn.execute(
+            "SELECT currency, day, rate FROM prices WHERE quote = ? ORDER BY day, currency",
+            (self.quote,),
+        ):
+            on = date.fromordinal(day)
+            by_year.setdefault(on.year, []).append(f"{on} price {currency} {rate} {self.quote}")
+
+        written = []
+        for year, lines in sorted(by_year.items()):
+            if years is not None and year not in years:
+                continue
+            path = directory / f"prices_{year}.beancount"
+            content = f"; Valutakurser {year} - genererad av agents/price_db.py\n\n" + "\n".join(lines) + "\n"
+            if path.exists() and path.read_text(encoding="utf-8") == content:
+                continue
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(content, encoding="utf-8")
+            tmp_path.replace(path)
+            written.append(path)
+        return written
+
+    # -- Omvärdering ------------------------------------------------------
+
+    def revalue(self, index: BalanceIndex, start: date, end: date) -> List[Revaluation]:
+        """
+        Kursdifferenser för alla valutasaldon under perioden (start, end]
+
+        Differensen per serie är värdet vid periodslut minus värdet vid
+        periodstart minus periodens flöden värderade till respektive dags kurs.
+        """
+        series = [
+            key for key in index.series(exclude_currency=self.quote)
+            if key[0].startswith(REVALUED_ROOTS)
+        ]
+        if not series:
+            return []
+        series_ids = {key: i for i, key in enumerate(series)}
+        baseline = np.array([
+            float(index.balance(account, start).get(currency, 0)) for account, currency in series
+        ])
+
+        rows = [
+            row for row in index.rows(start, end, exclude_currency=self.quote)
+            if (row[0], row[1]) in series_ids
+        ]
+        row_series = np.array([series_ids[(a, c)] for a, c, _d, _b in rows], dtype=np.int64)
+        row_days = np.array([d.toordinal() for _a, _c, d, _b in rows], dtype=np.int64)
+        row_balances = np.array([float(b) for _a, _c, _d, b in rows])
+
+        # Dagliga flöden: skillnad mot föregående rad i samma serie (eller startsaldot)
+        previous = np.empty_like(row_balances)
+        if len(rows):
+            previous[1:] = row_balances[:-1]
+            first = np.r_[True, row_series[1:] != row_series[:-1]]
+            previous[first] = baseline[row_series[first]]
+        flows = row_balances - previous
+
+        codes, keys, rates = self._rate_table()
+        series_codes = np.array([codes.get(currency, 0) for _a, currency in series], dtype=np.int64)
+
+        def lookup(code: np.ndarray, days: np.ndarray) -> np.ndarray:
+            query = (code << 32) | days
+            pos = np.searchsorted(keys, query, side="right") - 1
+            found = (pos >= 0) & (code > 0)
+            found[found] &= (keys[pos[found]] >> 32) == code[found]
+            result = np.full(len(query), np.nan)
+            result[found] = rates[pos[found]]
+            return result
+
+        start_rates = lookup(series_codes, np.full(len(series), start.toordinal()))
+        end_rates = lookup(series_codes, np.full(len(series), end.toordinal()))
+        flow_rates = lookup(series_codes[row_series], row_days)
+
+        end_balances = baseline.copy()
+        if len(rows):
+            last = np.r_[row_series[1:] != row_series[:-1], True]
+            end_balances[row_series[last]] = row_balances[last]
+
+        flow_value = np.bincount(row_series, weights=flows * flow_rates, minlength=len(series))
+        # Saknad kurs vid start spelar ingen roll för ett nollsaldo
+        start_value = np.where(baseline == 0, 0.0, baseline * start_rates)
+        end_value = end_balances * end_rates
+        adjustments = end_value - start_value - flow_value
+        active = (baseline != 0) | (end_balances != 0) | (
+            np.bincount(row_series, weights=np.abs(flows), minlength=len(series)) > 0
+        )
+
+        result = []
+        for i, (account, currency) in enumerate(series):
+            if not active[i]:
+                continue
+            if np.isnan(adjustments[i]):
+                logger.warning(f"Saknar kurs {currency}/{self.quote} för {account} - hoppar över omvärdering")
+                continue
+            result.append(Revaluation(
+                account=account,
+                currency=currency,
+                balance=Decimal(f"{end_balances[i]:.2f}"),
+                rate=Decimal(str(float(end_rates[i]))),
+                value=Decimal(f"{end_value[i]:.2f}"),
+                adjustment=Decimal(f"{adjustments[i]:.2f}"),
+            ))
+        return result
+
+
+def revaluation_entry(
+    revaluations: List[Revaluation],
+    on: date,
+    gain_account: str = "Income:Valutakursvinster",
+    loss_account: str = "Expenses:Valutakursförluster",
+    quote: str = "SEK",
+    opened: Optional[Iterable[str]] = None,
+) -> str:
+    """
+    Beancount-transaktion för omvärderingen
+
+    Kursdifferensen bokas på underkontot :Omvärdering till varje valutakonto.
+    Omvärderingskontona och vinst-/förlustkontona måste vara öppna: med
+    `opened` (huvudbokens redan öppnade konton) skrivs open-direktiv för
+    övriga, daterade `on`. Utan `opened` skrivs inga open-direktiv.
+    """
+    needed = []
+    for item in revaluations:
+        if item.adjustment:
+            needed.append(f"{item.account}:Omvärdering")
+            needed.append(gain_account if item.adjustment > 0 else loss_account)
+    opens = []
+    if opened is not None:
+        missing = sorted(set(needed) - set(opened))
+        opens = [f"{on} open {account} {quote}" for account in missing]
+
+    lines = [f'{on} * "Omvärdering av valutasaldon per {on}"']
+    for item in revaluations:
+        if not item.adjustment:
+            continue
+        counter = gain_account if item.adjustment > 0 else loss_account
+        lines.append(f'  {item.account}:Omvärdering  {item.adjustment} {quote}')
+        lines.append(f'    rate: "{item.rate} {quote}/{item.currency}"')
+        lines.append(f"  {counter}  {-item.adjustment} {quote}")
+    if len(lines) == 1:
+        return ""
+    return "\n".join(opens + ([""] if opens else []) + lines) + "\n"
+
+
+def main(config: Optional[Config] = None):
+    """
+    Huvudprogram
+
+    Args:
+        config: Inställningar (default: den globala config)
+    """
+    config = config or default_config
+    parser = argparse.ArgumentParser(description="Valutakurser och omvärdering")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    collect = subparsers.add_parser("collect", help="Hämta kurser från Revolut")
+    collect.add_argument("--days", type=int, default=30, help="Dagar bakåt för växlingar")
+
+    subparsers.add_parser("write", help="Skriv price-direktiv per år till huvudbokskatalogen")
+
+    revalue = subparsers.add_parser("revalue", help="Beräkna omvärdering för en period")
+    revalue.add_argument("--from", dest="start", type=date.fromisoformat, required=True,
+                         help="Föregående periodslut, t.ex. 2024-12-31")
+    revalue.add_argument("--to", dest="end", type=date.fromisoformat, required=True,
+                         help="Periodslut, t.ex. 2025-12-31")
+    revalue.add_argument("--ledger", type=Path, default=config.MAIN_LEDGER,
+                         help=f"Huvudbokens fil (standard: {config.MAIN_LEDGER})")
+    args = parser.parse_args()
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    prices = PriceDB(config.PRICE_DB, quote=config.CURRENCY)
+    try:
+        if args.command == "collect":
+            from datetime import timedelta
+            from agents.revolut_sync_agent import RevolutSyncAgent
+
+            # Samma autentisering som synken (API-nyckel eller OAuth)
+            sync = RevolutSyncAgent(config).sync
+            if not sync:
+                sys.exit(1)
+            exchanges = sync.exchange.get_exchanges(from_date=datetime.now() - timedelta(days=args.days))
+            added = prices.add_from_transactions(exchanges)
+            currencies = {info["currency"] for info in sync.get_balances().values()}
+            added += prices.fetch_rates(sync.exchange, currencies)
+            print(f"✅ {added} nya kurser")
+        elif args.command == "write":
+            for path in prices.write_partitions(config.DATA_LEDGER):
+                print(f"✅ {path}")
+        else:
+            entries, errors, _options = loader.load_file(str(args.ledger))
+            if errors:
+                logger.warning(f"{len(errors)} fel vid inläsning av {args.ledger}")
+            opened = {entry.account for entry in entries if isinstance(entry, data.Open)}
+            index = BalanceIndex(config.BALANCE_INDEX_DB)
+            try:
+                index.sync(entries)
+                revaluations = prices.revalue(index, args.start, args.end)
+            finally:
+                index.close()
+            for item in revaluations:
+                print(f"; {item.account}: {item.balance} {item.currency} à {item.rate} = {item.value} "
+                      f"{prices.quote} (differens {item.adjustment})")
+            print(revaluation_entry(
+                revaluations, args.end, config.FX_GAIN_ACCOUNT, config.FX_LOSS_ACCOUNT, prices.quote, opened
+            ))
+    finally:
+        prices.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Återupptagbar historisk import från Revolut
+
+Intervallet delas i kalendermånader som hämtas (med sidindelning) och skrivs
+parallellt, högst `workers` månader åt gången. Varje månad skrivs till sin
+partition i huvudboken (revolut_backfill_ÅÅÅÅ_MM.beancount) och bockas av i
+en checkpoint-fil när den är klar. Avbryts körningen, eller misslyckas en
+månad, hämtas vid nästa körning bara de månader som inte är avbockade.
+
+Bara transaktioner med nya revolut_id skrivs, så importen krockar inte med
+den löpande synken. Innevarande månad bockas inte av eftersom den kan få
+fler transaktioner.
+
+Användning:
+    python agents/revolut_backfill.py --from 2022-01-01 --to 2024-12-31
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.config import config as default_config
+from agents.logging_setup import setup_logging
+from agents.metrics import COUNT_BUCKETS, metrics
+
+logger = logging.getLogger(__name__)
+
+Chunk = Tuple[str, datetime, datetime]
+
+
+def month_chunks(start: date, end: date) -> List[Chunk]:
+    """
+    Dela [start, end) i kalendermånader
+
+    Returns:
+        (ÅÅÅÅ-MM, från, till) i UTC - första och sista månaden kan vara delar
+    """
+    chunks = []
+    current = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    stop = datetime(end.year, end.month, end.day, tzinfo=timezone.utc)
+    while current < stop:
+        if current.month == 12:
+            next_month = current.replace(year=current.year + 1, month=1, day=1)
+        else:
+            next_month = current.replace(month=current.month + 1, day=1)
+        chunks.append((current.strftime("%Y-%m"), current, min(next_month, stop)))
+        current = next_month
+    return chunks
+
+
+class Checkpoint:
+    """Avklarade månader i en JSON-fil som skrivs atomiskt efter varje månad"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.chunks: Dict[str, Dict] = {}
+        if self.path.exists():
+            try:
+                self.chunks = json.loads(self.path.read_text(encoding="utf-8")).get("chunks", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ogiltig checkpoint {self.path}: {e} - börjar från början")
+
+    def done(self, key: str, start: datetime, end: datetime) -> bool:
+        """Är månaden redan importerad för minst samma intervall?"""
+        chunk = self.chunks.get(key)
+        return bool(chunk) and chunk["from"] <= start.isoformat() and chunk["to"] >= end.isoformat()
+
+    def mark(self, key: str, start: datetime, end: datetime, **info):
+        """Bocka av en månad"""
+        with self._lock:
+            self.chunks[key] = {
+                "from": start.isoformat(), "to": end.isoformat(),
+                "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), **info,
+            }
+            self._save()
+
+    def clear(self):
+        """Glöm alla avbockade månader"""
+        with self._lock:
+            self.chunks = {}
+            self.path.unlink(missing_ok=True)
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{self.path.name}.", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"chunks": dict(sorted(self.chunks.items()))}, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+
+class Backfill:
+    """Hämta och skriv historik månad för månad med begränsad parallellitet"""
+
+    def __init__(self, sync, checkpoint: Checkpoint, workers: int = 3, page_size: int = 1000):
+        """
+        Args:
+            sync: RevolutSync som hämtar och skriver (huvudbokens output_dir)
+            checkpoint: Avbockade månader
+            workers: Max antal månader som hämtas samtidigt
+            page_size: Transaktioner per förfrågan (API:ts max är 1000)
+        """
+        self.sync = sync
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.page_size = page_size
+
+    def run(self, start: date, end: date, restart: bool = False) -> Dict[str, str]:
+        """
+        Importera [start, end)
+
+        Args:
+            start: Första dagen
+            end: Dagen efter sista dagen
+            restart: Ignorera checkpoint och gå igenom alla månader igen
+
+        Returns:
+            Status per månad: "done", "skipped" (redan klar), "partial"
+            (innevarande månad, inte avbockad) eller "failed"
+        """
+        if restart:
+            self.checkpoint.clear()
+        chunks = month_chunks(start, end)
+        status = {key: "skipped" for key, chunk_start, chunk_end in chunks
+                  if self.checkpoint.done(key, chunk_start, chunk_end)}
+        pending = [chunk for chunk in chunks if chunk[0] not in status]
+        logger.info(
+            f"Backfill {start} - {end - timedelta(days=1)}: {len(chunks)} månader, "
+            f"{len(status)} redan klara, {self.workers} parallellt"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="revolut-backfill") as pool:
+            futures = {pool.submit(self._run_chunk, *chunk): chunk[0] for chunk in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    status[key] = future.result()
+                except Exception as e:
+                    logger.error(f"Backfill {key} misslyckades: {e}")
+                    status[key] = "failed"
+                metrics.inc("backfill_chunks_total", result=status[key])
+
+        failed = sorted(key for key, result in status.items() if result == "failed")
+        if failed:
+            logger.warning(f"{len(failed)} månader misslyckades ({', '.join(failed)}) - kör igen för att återuppta")
+        return dict(sorted(status.items()))
+
+    def _run_chunk(self, key: str, start: datetime, end: datetime) -> str:
+        started = time.perf_counter()
+        transactions = self.sync.business.get_all_transactions(
+            from_date=start, to_date=end, page_size=self.page_size
+        )
+        path = self.sync.write_partition(transactions, f"backfill_{key.replace('-', '_')}")
+        metrics.observe("backfill_chunk_transactions", len(transactions), buckets=COUNT_BUCKETS)
+        metrics.observe("backfill_chunk_seconds", time.perf_counter() - started)
+        logger.info(f"Backfill {key}: {len(transactions)} transaktioner -> {path or 'inga nya'}")
+
+        # Innevarande månad kan få fler transaktioner - bocka inte av den
+        if end > datetime.now(timezone.utc):
+            return "partial"
+        self.checkpoint.mark(key, start, end, transactions=len(transactions), file=Path(path).name if path else None)
+        return "done"
+
+
+def main():
+    """Huvudprogram"""
+    config = default_config
+    parser = argparse.ArgumentParser(
+        description="Revolut Backfill - Återupptagbar import av historik månad för månad"
+    )
+    parser.add_argument(
+        "--from",
+        dest="start",
+        type=date.fromisoformat,
+        required=True,
+        help="Första dagen (ÅÅÅÅ-MM-DD)"
+    )
+    parser.add_argument(
+        "--to",
+        dest="end",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Sista dagen, inklusive (standard: idag)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.BACKFILL_WORKERS,
+        help=f"Antal månader som hämtas samtidigt (standard: {config.BACKFILL_WORKERS})"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignorera checkpoint och gå igenom alla månader igen (redan importerade revolut_id skrivs inte om)"
+    )
+    args = parser.parse_args()
+    if args.end < args.start:
+        parser.error("--to måste vara samma dag som eller efter --from")
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    from agents.revolut_sync_agent import RevolutSyncAgent
+
+    agent = RevolutSyncAgent(config)
+    if not agent.sync:
+        sys.exit(1)
+
+    metrics.reset()
+    backfill = Backfill(agent.sync, Checkpoint(config.BACKFILL_CHECKPOINT), workers=args.workers)
+    try:
+        status = backfill.run(args.start, args.end + timedelta(days=1), restart=args.restart)
+    finally:
+        try:
+            metrics.write("revolut_backfill", config.METRICS_DIR)
+        except OSError as e:
+            logger.warning(f"Kunde inte skriva mätvärden: {e}")
+
+    counts: Dict[str, int] = {}
+    for result in status.values():
+        counts[result] = counts.get(result, 0) + 1
+    print("\n" + ", ".join(f"{result}: {count}" for result, count in sorted(counts.items())))
+    if counts.get("failed"):
+        print("❌ Alla månader blev inte klara - kör samma kommando igen för att återuppta")
+        sys.exit(1)
+    print("✅ Backfill klar")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,113 @@
 """
 Revolut Business & Exchange API Integration
 Hanterar automatisk synkronisering av transaktioner och valutaväxlingar
+
+requests och klassificeraren (NumPy) importeras först när de används, så att
+modulen och CLI:t startar snabbt.
 """
 
 import os
-import requests
+import time
 from datetime import datetime, timedelta
 from decimal import Decimal
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional, Set, Tuple
 import json
 import logging
+import re
+import threading
+
+from agents.metrics import COUNT_BUCKETS, metrics
+from agents.revolut_token_manager import TokenManager
+
+if TYPE_CHECKING:
+    from agents.transaction_classifier import TransactionClassifier
 
 logger = logging.getLogger(__name__)
 
+# revolut_id-metadata i redan importerade filer
+_REVOLUT_ID = re.compile(r'^\s+revolut_id: "([^"]+)"', re.MULTILINE)
+
+# Antal nya försök efter 429 och längsta paus som Retry-After får ge
+THROTTLE_RETRIES = 3
+MAX_RETRY_AFTER = 60.0
+
+
+def _endpoint_label(endpoint: str) -> str:
+    """Endpoint utan ID:n för mätvärden, t.ex. /accounts/{id}"""
+    parts = endpoint.split("?")[0].strip("/").split("/")
+    return "/" + parts[0] + ("/{id}" if len(parts) > 1 else "")
+
+
+def _retry_after(response) -> float:
+    """Sekunder att vänta enligt Retry-After (1 om headern saknas)"""
+    try:
+        delay = float(response.headers.get("Retry-After", 1))
+    except (AttributeError, ValueError):
+        delay = 1.0
+    return min(max(delay, 0.0), MAX_RETRY_AFTER)
+
+
+class RateLimiter:
+    """
+    Högst `rate` förfrågningar per sekund för en klient
+
+    Efter 429 pausas klientens alla trådar med pause(). Varje klient (bolag)
+    har en egen begränsare, så en strypt klient väntar utan att påverka andra.
+    """
+
+    def __init__(self, rate: float = 0):
+        """
+        Args:
+            rate: Förfrågningar per sekund (0 = obegränsat, bara paus efter 429)
+        """
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        """Vänta tills nästa förfrågan får skickas"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds: float):
+        """Skicka inget på `seconds` sekunder"""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
 
 class RevolutAPI:
     """Base class för Revolut API-kommunikation med OAuth-stöd"""
 
-    def __init__(self, oauth_handler=None, api_key: str = None, base_url: str = None, sandbox: bool = False):
+    def __init__(
+        self,
+        oauth_handler=None,
+        api_key: str = None,
+        base_url: str = None,
+        sandbox: bool = False,
+        rate_limit: float = 0
+    ):
         """
         Initialisera API med antingen OAuth-handler eller direkt API-nyckel
         
         Args:
-            oauth_handler: RevolutOAuth-instans (rekommenderat för production)
+            oauth_handler: RevolutOAuth- eller TokenManager-instans (rekommenderat för production)
             api_key: Direkt Bearer token (deprecated, för bakåtkompatibilitet)
             base_url: API base URL
             sandbox: Sandbox-läge
+            rate_limit: Max förfrågningar per sekund (0 = obegränsat)
         """
-        self.oauth = oauth_handler
+        # Klienter med samma RevolutOAuth delar en TokenManager så att
+        # förnyelser inte dubbleras mellan parallella arbetare
+        if isinstance(oauth_handler, TokenManager):
+            self.tokens = oauth_handler
+        else:
+            self.tokens = TokenManager.shared(oauth_handler) if oauth_handler else None
+        self.oauth = self.tokens.oauth if self.tokens else None
         self.sandbox = sandbox
         self.base_url = base_url or (
             "https://sandbox-b2b.revolut.com/api/1.0"
@@ -36,7 +115,10 @@ class RevolutAPI:
             else "https://b2b.revolut.com/api/1.0"
         )
         
+        import requests
+
         self.session = requests.Session()
+        self.limiter = RateLimiter(rate_limit)
         
         # Använd OAuth om tillgängligt, annars fallback till direkt API-nyckel
         if not oauth_handler and api_key:
@@ -47,17 +129,49 @@ class RevolutAPI:
             })
 
     def _request(self, method: str, endpoint: str, **kwargs) -> dict:
-        """Gör en API-förfrågan med automatisk token-förnyelse"""
+        """
+        Gör en API-förfrågan med automatisk token-förnyelse och mätvärden per endpoint
+
+        Vid 429 väntar klienten enligt Retry-After och försöker igen högst
+        THROTTLE_RETRIES gånger.
+        """
+        import requests
+
+        label = _endpoint_label(endpoint)
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                self.limiter.acquire()
+                try:
+                    return self._send(method, endpoint, **kwargs)
+                except requests.exceptions.HTTPError as e:
+                    if e.response is None or e.response.status_code != 429 or attempt >= THROTTLE_RETRIES:
+                        raise
+                    attempt += 1
+                    delay = _retry_after(e.response)
+                    metrics.inc("revolut_api_throttled_total", endpoint=label)
+                    logger.warning("429 från %s - väntar %.1f s (försök %d)", label, delay, attempt)
+                    self.limiter.pause(delay)
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else "unknown"
+            metrics.inc("revolut_api_errors_total", endpoint=label, status=status)
+            raise
+        except requests.exceptions.RequestException:
+            metrics.inc("revolut_api_errors_total", endpoint=label, status="connection")
+            raise
+        finally:
+            metrics.observe("revolut_api_request_seconds", time.perf_counter() - start, endpoint=label)
+
+    def _send(self, method: str, endpoint: str, **kwargs) -> dict:
+        import requests
+
         url = f"{self.base_url}{endpoint}"
         
         # Uppdatera headers med OAuth om tillgängligt
-        if self.oauth:
+        if self.tokens:
             try:
-                headers = self.oauth.get_auth_headers()
-                if 'headers' in kwargs:
-                    kwargs['headers'].update(headers)
-                else:
-                    kwargs['headers'] = headers
+                kwargs['headers'] = {**kwargs.get('headers', {}), **self.tokens.get_auth_headers()}
             except Exception as e:
                 logger.error(f"OAuth token-fel: {e}")
                 raise ValueError("OAuth-autentisering misslyckades. Kör authenticate() igen.")
@@ -67,34 +181,47 @@ class RevolutAPI:
             response.raise_for_status()
             return response.json() if response.content else {}
         except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 401 and self.oauth:
-                # Token kan ha gått ut, försök förnya
-                logger.info("401 Unauthorized - försöker förnya token...")
-                try:
-                    self.oauth.refresh_access_token()
-                    # Försök igen med ny token
-                    headers = self.oauth.get_auth_headers()
-                    if 'headers' in kwargs:
-                        kwargs['headers'].update(headers)
-                    else:
-                        kwargs['headers'] = headers
-                    response = self.session.request(method, url, **kwargs)
-                    response.raise_for_status()
-                    return response.json() if response.content else {}
-                except Exception as refresh_error:
-                    logger.error(f"Token-förnyelse misslyckades: {refresh_error}")
-                    raise
-            logger.error(f"Revolut API-fel: {e}")
+            if e.response.status_code == 401 and self.tokens:
+                return self._retry_with_new_token(method, url, **kwargs)
+            if e.response.status_code != 429:
+                logger.error(f"Revolut API-fel: {e}")
             raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Revolut API-fel: {e}")
             raise
 
+    def _retry_with_new_token(self, method: str, url: str, **kwargs) -> dict:
+        """
+        Förnya token efter 401 och försök igen
+
+        Token kan ha gått ut eller återkallats - förnyas en gång för alla
+        trådar som fick 401 med samma token.
+        """
+        logger.info("401 Unauthorized - försöker förnya token...")
+        try:
+            stale = kwargs['headers']['Authorization'].split(" ", 1)[1]
+            self.tokens.refresh(stale=stale)
+            # Försök igen med ny token
+            kwargs['headers'].update(self.tokens.get_auth_headers())
+            response = self.session.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json() if response.content else {}
+        except Exception as refresh_error:
+            logger.error(f"Token-förnyelse misslyckades: {refresh_error}")
+            raise
+
 
 class RevolutBusiness(RevolutAPI):
     """Revolut Business API - hanterar transaktioner och konton"""
 
-    def __init__(self, oauth_handler=None, api_key: str = None, sandbox: bool = False):
+    def __init__(
+        self,
+        oauth_handler=None,
+        api_key: str = None,
+        sandbox: bool = False,
+        base_url: str = None,
+        rate_limit: float = 0
+    ):
         """
         Initialisera Business API
         
@@ -102,8 +229,12 @@ class RevolutBusiness(RevolutAPI):
             oauth_handler: RevolutOAuth-instans (rekommenderat)
             api_key: Direkt Bearer token (deprecated)
             sandbox: Sandbox-läge
+            base_url: API base URL (t.ex. en lokal stubbe), annars efter sandbox
+            rate_limit: Max förfrågningar per sekund (0 = obegränsat)
         """
-        super().__init__(oauth_handler=oauth_handler, api_key=api_key, sandbox=sandbox)
+        super().__init__(
+            oauth_handler=oauth_handler, api_key=api_key, base_url=base_url, sandbox=sandbox, rate_limit=rate_limit
+        )
 
     def get_accounts(self) -> List[Dict]:
         """Hämta alla konton"""
@@ -148,7 +279,50 @@ class RevolutBusiness(RevolutAPI):
         if transaction_type:
             params["type"] = transaction_type
 
-        return self._request("GET", "/transactions", params=params)
+        page = self._request("GET", "/transactions", params=params)
+        metrics.inc("revolut_pages_fetched_total", endpoint="/transactions")
+        metrics.observe("revolut_page_transactions", len(page), buckets=COUNT_BUCKETS, endpoint="/transactions")
+        return page
+
+    def get_all_transactions(
+        self,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        account_id: Optional[str] = None,
+        transaction_type: Optional[str] = None,
+        page_size: int = 1000
+    ) -> List[Dict]:
+        """
+        Hämta alla transaktioner i intervallet, sida för sida
+
+        Nästa sida hämtas med `to` en millisekund efter sista transaktionens
+        created_at (`to` är exklusivt), så att transaktioner med samma tidpunkt
+        på båda sidor om sidgränsen kommer med. Dubbletter tas bort på id.
+
+        Returns:
+            Transaktioner, nyaste först
+        """
+        found: Dict[str, Dict] = {}
+        to = to_date
+        while True:
+            page = self.get_transactions(
+                account_id=account_id, from_date=from_date, to_date=to,
+                limit=page_size, transaction_type=transaction_type
+            )
+            new = [tx for tx in page if tx["id"] not in found]
+            found.update((tx["id"], tx) for tx in new)
+            if len(page) < page_size:
+                break
+            if not new:
+                logger.warning("Fler än %d transaktioner med samma created_at - resten hoppas över", page_size)
+                break
+            last = datetime.fromisoformat(page[-1]["created_at"].replace("Z", "+00:00"))
+            to = last + timedelta(milliseconds=1)
+        return list(found.values())
+
+    def get_transaction(self, transaction_id: str) -> Dict:
+        """Hämta en specifik transaktion"""
+        return self._request("GET", f"/transaction/{transaction_id}")
 
     def get_counterparties(self) -> List[Dict]:
         """Hämta alla motparter (leverantörer/kunder)"""
@@ -230,9 +404,9 @@ class RevolutExchange:
     ) -> List[Dict]:
         """
         Hämta valutaväxlingar (exchange transactions)
-        Använder transactions endpoint med type=exchange filter
+        Använder transactions endpoint med type=exchange filter, sida för sida
         """
-        return self.api.get_transactions(
+        return self.api.get_all_transactions(
             from_date=from_date,
             to_date=to_date,
             transaction_type="exchange"
@@ -242,11 +416,20 @@ class RevolutExchange:
 class RevolutToBeancount:
     """Konverterar Revolut-transaktioner till Beancount-format"""
 
-    def __init__(self, config):
+    def __init__(self, config, classifier: Optional["TransactionClassifier"] = None):
         self.config = config
         self.currency_map = self._load_currency_mapping()
         self.account_map = self._load_account_mapping()
 
+        # Klassificerare tränad på huvudboken - reglerna används under tröskeln
+        if classifier is None and getattr(config, "CLASSIFIER_ENABLED", False):
+            from agents.transaction_classifier import load_classifier
+
+            classifier = load_classifier(config.CLASSIFIER_MODEL)
+        self.classifier = classifier
+        self.classifier_threshold = getattr(config, "CLASSIFIER_THRESHOLD", 0.7)
+        self._predictions: Dict[str, Tuple[Optional[str], float]] = {}
+
     def _load_currency_mapping(self) -> Dict[str, str]:
         """Ladda valutamappning för Beancount"""
         # Standard mappning - kan utökas via config
@@ -288,7 +471,7 @@ class RevolutToBeancount:
         # Hämta description från första leg
         legs = transaction.get("legs", [])
         if not legs:
-            logger.warning(f"Transaction {transaction.get('id')} har inga legs")
+            logger.warning("Transaction %s har inga legs", transaction.get("id"))
             return ""
         
         first_leg = legs[0]
@@ -300,7 +483,7 @@ class RevolutToBeancount:
         
         # Skippa pending transactions
         if state == "pending":
-            logger.debug(f"Skippar pending transaction {transaction.get('id')}")
+            logger.debug("Skippar pending transaction %s", transaction.get("id"))
             return ""
         
         # Bygg Beancount-transaktion
@@ -376,11 +559,38 @@ class RevolutToBeancount:
         # Den har redan legs så vi kan använda transaction_to_beancount
         return self.transaction_to_beancount(exchange)
 
+    def prepare(self, transactions: List[Dict]):
+        """
+        Klassificera alla enbenstransaktioner i en batch inför konvertering
+
+        Anropas en gång per synk så att klassificeraren körs vektoriserat
+        istället för en transaktion i taget.
+        """
+        self._predictions = {}
+        if not self.classifier:
+            return
+        from agents.transaction_classifier import revolut_tokens
+
+        batch = [tx for tx in transactions if len(tx.get("legs", [])) == 1]
+        results = self.classifier.predict([revolut_tokens(tx) for tx in batch])
+        for tx, prediction in zip(batch, results):
+            self._predictions[tx.get("id")] = prediction
+
     def _categorize_transaction(self, transaction: Dict) -> str:
         """
         Kategorisera transaktion till rätt Beancount-konto
-        Använder AI eller regler för kategorisering
+        Använder klassificeraren om den är säker nog, annars regler
         """
+        if self.classifier:
+            tx_id = transaction.get("id")
+            if tx_id not in self._predictions:
+                from agents.transaction_classifier import revolut_tokens
+
+                self._predictions[tx_id] = self.classifier.predict([revolut_tokens(transaction)])[0]
+            account, confidence = self._predictions[tx_id]
+            if account and confidence >= self.classifier_threshold:
+                return account
+
         tx_type = transaction.get("type", "").lower()
         description = transaction.get("description", "").lower()
         
@@ -408,67 +618,94 @@ class RevolutSync:
         business_api_key: str,
         exchange_api_key: Optional[str] = None,  # Inte längre använd, behålls för bakåtkompatibilitet
         sandbox: bool = False,
-        config=None
+        config=None,
+        base_url: Optional[str] = None,
+        oauth_handler=None
     ):
-        self.business = RevolutBusiness(business_api_key, sandbox)
+        """
+        Args:
+            business_api_key: Direkt API-nyckel (används om oauth_handler saknas)
+            sandbox: Sandbox-läge
+            config: Inställningar (DATA_LEDGER, REVOLUT_RATE_LIMIT, klassificerare)
+            base_url: API base URL, annars efter sandbox
+            oauth_handler: RevolutOAuth- eller TokenManager-instans för bolaget
+        """
+        if config is None:
+            from agents.config import config
+        self.business = RevolutBusiness(
+            oauth_handler=oauth_handler,
+            api_key=business_api_key,
+            sandbox=sandbox,
+            base_url=base_url,
+            rate_limit=getattr(config, "REVOLUT_RATE_LIMIT", 0)
+        )
         self.exchange = RevolutExchange(self.business)
         self.converter = RevolutToBeancount(config)
         self.config = config
-        self.output_dir = Path(config.DATA_LEDGER if config else "data/ledger")
+        self.output_dir = Path(config.DATA_LEDGER)
+        # Revolut-ID:n som redan finns i huvudboken (laddas av load_known_ids)
+        self.known_ids: Optional[Set[str]] = None
+        # Polling och webhooks kan skriva samtidigt - urval mot known_ids,
+        # skrivning och uppdatering av mängden sker under låset
+        self._write_lock = threading.RLock()
+
+    def load_known_ids(self) -> int:
+        """
+        Läs revolut_id från tidigare importfiler i output_dir
+
+        Används av daemonläget så att överlappande synkfönster bara skriver
+        nya transaktioner. Mängden hålls sedan uppdaterad i minnet.
+
+        Returns:
+            Antal kända ID:n
+        """
+        known = set()
+        with self._write_lock:
+            for path in self.output_dir.glob("revolut_*.beancount"):
+                known.update(_REVOLUT_ID.findall(path.read_text(encoding="utf-8")))
+            self.known_ids = known
+        logger.info(f"{len(known)} tidigare importerade Revolut-transaktioner")
+        return len(known)
+
+    def _only_new(self, transactions: List[Dict]) -> List[Dict]:
+        if self.known_ids is None:
+            self.load_known_ids()
+        return [tx for tx in transactions if tx.get("id") not in self.known_ids]
 
     def sync_transactions(
         self,
         days_back: int = 7,
-        output_file: Optional[str] = None
-    ) -> str:
+        output_file: Optional[str] = None,
+        only_new: bool = False
+    ) -> Optional[str]:
         """
         Synkronisera transaktioner från Revolut till Beancount
         
         Args:
             days_back: Antal dagar bakåt att hämta
             output_file: Outputfil (None = auto-genererad)
+            only_new: Hoppa över redan importerade transaktioner (ingen fil om inget är nytt)
             
         Returns:
             Path till skapad fil
         """
         logger.info(f"Synkroniserar Revolut-transaktioner ({days_back} dagar bakåt)...")
         
-        # Hämta transaktioner
+        # Hämta transaktioner (alla sidor - en sida är max 1000)
         from_date = datetime.now() - timedelta(days=days_back)
-        transactions = self.business.get_transactions(from_date=from_date)
+        transactions = self.business.get_all_transactions(from_date=from_date)
         
         logger.info(f"Hittade {len(transactions)} transaktioner")
-        
-        # Konvertera till Beancount
-        beancount_entries = []
-        for tx in transactions:
-            try:
-                entry = self.converter.transaction_to_beancount(tx)
-                beancount_entries.append(entry)
-            except Exception as e:
-                logger.error(f"Kunde inte konvertera transaktion {tx.get('id')}: {e}")
-        
-        # Spara till fil
-        if not output_file:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = self.output_dir / f"revolut_import_{timestamp}.beancount"
-        else:
-            output_file = Path(output_file)
-        
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(f"; Revolut Import - {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
-            f.write(f"; Importerade {len(beancount_entries)} transaktioner\n\n")
-            f.writelines(beancount_entries)
-        
-        logger.info(f"Sparade {len(beancount_entries)} transaktioner till {output_file}")
-        return str(output_file)
+        return self._import(
+            transactions, self.converter.transaction_to_beancount, "transactions",
+            "revolut_import", "Revolut Import", "transaktioner", only_new, output_file
+        )
 
     def sync_exchanges(
         self,
         days_back: int = 30,
-        output_file: Optional[str] = None
+        output_file: Optional[str] = None,
+        only_new: bool = False
     ) -> Optional[str]:
         """
         Synkronisera valutaväxlingar (exchange transactions)
@@ -476,6 +713,7 @@ class RevolutSync:
         Args:
             days_back: Antal dagar bakåt att hämta
             output_file: Outputfil (None = auto-genererad)
+            only_new: Hoppa över redan importerade växlingar (ingen fil om inget är nytt)
             
         Returns:
             Path till skapad fil
@@ -487,33 +725,156 @@ class RevolutSync:
         exchanges = self.exchange.get_exchanges(from_date=from_date)
         
         logger.info(f"Hittade {len(exchanges)} valutaväxlingar")
+
+        self._record_prices(exchanges)
         
-        # Konvertera till Beancount
-        beancount_entries = []
-        for ex in exchanges:
+        return self._import(
+            exchanges, self.converter.exchange_to_beancount, "exchanges",
+            "revolut_exchanges", "Revolut Exchange Import", "valutaväxlingar", only_new, output_file
+        )
+
+    def ingest(self, transactions: List[Dict], failed: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Skriv transaktioner som kommit utanför pollingen (t.ex. webhooks)
+
+        Bara transaktioner med nya revolut_id skrivs, till en egen
+        revolut_webhook_*-fil.
+
+        Args:
+            transactions: Transaktioner i API-format
+            failed: Fylls med id för transaktioner som inte kunde konverteras
+
+        Returns:
+            Path till skapad fil, eller None om inget var nytt
+        """
+        return self._import(
+            transactions, self.converter.transaction_to_beancount, "transactions",
+            "revolut_webhook", "Revolut Webhook Import", "transaktioner", True, failed=failed
+        )
+
+    def write_partition(self, transactions: List[Dict], partition: str) -> Optional[str]:
+        """
+        Skriv transaktioner för en period till huvudbokens partition
+
+        Filen heter revolut_<partition>.beancount; finns den redan skrivs nya
+        transaktioner till revolut_<partition>_2.beancount osv. Bara nya
+        revolut_id skrivs och växlingarnas kurser sparas i kursdatabasen.
+
+        Returns:
+            Path till skapad fil, eller None om inget var nytt
+        """
+        self._record_prices([tx for tx in transactions if tx.get("type") == "exchange"])
+        return self._import(
+            transactions, self.converter.transaction_to_beancount, "transactions",
+            f"revolut_{partition}", f"Revolut Import {partition}", "transaktioner", True,
+            self._free_path(f"revolut_{partition}")
+        )
+
+    def _record_prices(self, exchanges: List[Dict]):
+        """Spara växlingarnas kurser i kursdatabasen"""
+        if not exchanges or self.config is None or not getattr(self.config, "PRICE_DB", None):
+            return
+        from agents.price_db import PriceDB
+
+        with self._write_lock:
+            prices = PriceDB(self.config.PRICE_DB, quote=self.config.CURRENCY)
             try:
-                entry = self.converter.exchange_to_beancount(ex)
-                beancount_entries.append(entry)
-            except Exception as e:
-                logger.error(f"Kunde inte konvertera växling {ex.get('id')}: {e}")
-        
-        # Spara till fil
-        if not output_file:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = self.output_dir / f"revolut_exchanges_{timestamp}.beancount"
-        else:
-            output_file = Path(output_file)
-        
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(f"; Revolut Exchange Import - {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
-            f.write(f"; Importerade {len(beancount_entries)} valutaväxlingar\n\n")
-            f.writelines(beancount_entries)
-        
-        logger.info(f"Sparade {len(beancount_entries)} växlingar till {output_file}")
+                added = prices.add_from_transactions(exchanges)
+                logger.info(f"{added} nya valutakurser i {self.config.PRICE_DB}")
+            finally:
+                prices.close()
+
+    def _import(
+        self,
+        transactions: List[Dict],
+        convert,
+        kind: str,
+        prefix: str,
+        title: str,
+        noun: str,
+        only_new: bool,
+        output_file: Optional[str] = None,
+        failed: Optional[List[str]] = None
+    ) -> Optional[str]:
+        """Konvertera och skriv en batch till en ny importfil"""
+        with self._write_lock:
+            if only_new:
+                transactions = self._only_new(transactions)
+
+            # Konvertera till Beancount
+            converted = self._convert(transactions, convert, kind, failed)
+            beancount_entries = [entry for _tx_id, entry in converted]
+            if only_new and not beancount_entries:
+                logger.info(f"Inga nya {noun}")
+                return None
+
+            # Spara till fil
+            output_file = Path(output_file) if output_file else self._new_output_file(prefix)
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+
+            # Skriv till temporär fil och byt namn, så att en avbruten körning
+            # aldrig lämnar en halv fil vars revolut_id räknas som importerade
+            tmp_path = output_file.with_name(output_file.name + ".tmp")
+            with metrics.timer("sync_write_seconds", kind=kind):
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(f"; {title} - {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
+                    f.write(f"; Importerade {len(beancount_entries)} {noun}\n\n")
+                    f.writelines(beancount_entries)
+                tmp_path.replace(output_file)
+
+            self._remember(converted)
+        logger.info(f"Sparade {len(beancount_entries)} {noun} till {output_file}")
         return str(output_file)
 
+    def _new_output_file(self, prefix: str) -> Path:
+        """Tidsstämplad fil som inte skriver över en tidigare körning samma sekund"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return self._free_path(f"{prefix}_{timestamp}")
+
+    def _free_path(self, stem: str) -> Path:
+        """<stem>.beancount i output_dir, eller <stem>_2.beancount osv. om den finns"""
+        path = self.output_dir / f"{stem}.beancount"
+        counter = 1
+        while path.exists():
+            counter += 1
+            path = self.output_dir / f"{stem}_{counter}.beancount"
+        return path
+
+    def _remember(self, converted: List[Tuple[str, str]]):
+        if self.known_ids is not None:
+            self.known_ids.update(tx_id for tx_id, _entry in converted)
+
+    def _convert(
+        self, transactions: List[Dict], convert, kind: str, failed: Optional[List[str]] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Konvertera en batch till Beancount-poster och räkna konverterade, överhoppade och fel
+
+        Args:
+            failed: Fylls med id för transaktioner som inte kunde konverteras
+
+        Returns:
+            (Revolut-ID, post) för varje transaktion som gav en post
+        """
+        entries = []
+        with metrics.timer("sync_convert_seconds", kind=kind):
+            self.converter.prepare(transactions)
+            for tx in transactions:
+                try:
+                    entry = convert(tx)
+                except Exception as e:
+                    logger.error(f"Kunde inte konvertera {tx.get('id')}: {e}")
+                    metrics.inc("sync_errors_total", stage="convert", kind=kind)
+                    if failed is not None:
+                        failed.append(tx.get("id"))
+                    continue
+                if entry:
+                    metrics.inc("sync_entries_total", kind=kind)
+                    entries.append((tx.get("id"), entry))
+                else:
+                    metrics.inc("sync_skipped_total", kind=kind, state=tx.get("state", "unknown"))
+        return entries
+
     def get_balances(self) -> Dict[str, Dict]:
         """
         Hämta aktuella balanser från alla Revolut-konton
@@ -1,6 +1,9 @@
 """
 Revolut Business API OAuth 2.0 Authentication Handler
 Hanterar certifikat, JWT-signering, token-förnyelse och säker lagring
+
+cryptography och requests importeras först när en nyckel ska läsas eller
+en token hämtas, så att import av modulen inte laddar x509-stacken.
 """
 
 import os
@@ -8,26 +11,21 @@ import json
 import time
 import base64
 import hashlib
+import importlib.util
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Tuple
 import logging
 from dataclasses import dataclass, asdict
-import requests
 
-try:
-    from cryptography.hazmat.primitives import hashes, serialization
-    from cryptography.hazmat.primitives.asymmetric import rsa, padding
-    from cryptography.hazmat.backends import default_backend
-    from cryptography import x509
-    from cryptography.x509.oid import NameOID
-except ImportError:
-    raise ImportError(
-        "cryptography library krävs. Installera med: pip install cryptography"
-    )
+from agents.revolut_token_store import TokenStore
 
 logger = logging.getLogger(__name__)
 
+# Återanvänd en signerad client assertion tills så här många sekunder före exp
+ASSERTION_REUSE_MARGIN = 60
+
 
 @dataclass
 class TokenData:
@@ -65,7 +63,9 @@ class RevolutOAuth:
         redirect_uri: str = "https://localhost:8080/callback",
         sandbox: bool = False,
         cert_dir: Optional[Path] = None,
-        token_file: Optional[Path] = None
+        token_file: Optional[Path] = None,
+        base_url: Optional[str] = None,
+        timeout: float = 30.0
     ):
         """
         Initierar OAuth-handler
@@ -76,13 +76,21 @@ class RevolutOAuth:
             sandbox: True för sandbox, False för production
             cert_dir: Katalog för certifikat (default: ~/.revolut/certs)
             token_file: Fil för token-lagring (default: ~/.revolut/tokens.json)
+            base_url: Revoluts bas-URL (t.ex. en lokal stubbe), annars efter sandbox
+            timeout: Sekunder per förfrågan mot token-endpointen (förnyelsen håller fillåset)
         """
+        if importlib.util.find_spec("cryptography") is None:
+            raise ImportError(
+                "cryptography library krävs. Installera med: pip install cryptography"
+            )
+        
         self.client_id = client_id
         self.redirect_uri = redirect_uri
         self.sandbox = sandbox
+        self.timeout = timeout
         
         # API endpoints
-        self.base_url = (
+        self.base_url = base_url or (
             "https://sandbox-b2b.revolut.com" if sandbox 
             else "https://b2b.revolut.com"
         )
@@ -97,13 +105,30 @@ class RevolutOAuth:
         self.public_cert_path = self.cert_dir / "publiccert.cer"
         
         self.token_file = token_file or Path.home() / ".revolut" / "tokens.json"
-        self.token_file.parent.mkdir(parents=True, exist_ok=True)
+        self.store = TokenStore(self.token_file)
+        
+        # Avserialiserad nyckel och senaste assertion - laddas om när filen ändras
+        self._key_lock = threading.Lock()
+        self._private_key = None
+        self._key_stamp: Optional[Tuple[int, int]] = None
+        self._assertion: Optional[Tuple[Tuple[int, int], int, str, int]] = None
         
         # Ladda eller generera certifikat
         self._ensure_certificates()
         
         # Ladda sparade tokens
-        self.token_data: Optional[TokenData] = self._load_tokens()
+        self._token_data: Optional[TokenData] = self._load_tokens()
+    
+    @property
+    def token_data(self) -> Optional[TokenData]:
+        """Aktuell token - läses om om en annan process har skrivit tokens.json"""
+        if self.store.changed():
+            self._token_data = self._load_tokens()
+        return self._token_data
+    
+    @token_data.setter
+    def token_data(self, token_data: Optional[TokenData]):
+        self._token_data = token_data
     
     def _ensure_certificates(self):
         """Säkerställ att certifikat finns, annars generera nya"""
@@ -130,6 +155,12 @@ class RevolutOAuth:
         Returns:
             Tuple med (private_key_path, public_cert_path)
         """
+        from cryptography import x509
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import NameOID
+        
         logger.info("Genererar RSA 2048-bit certifikat...")
         
         # Generera privat nyckel
@@ -173,6 +204,11 @@ class RevolutOAuth:
         with open(self.public_cert_path, "wb") as f:
             f.write(cert.public_bytes(serialization.Encoding.PEM))
         
+        with self._key_lock:
+            self._private_key = private_key
+            self._key_stamp = self._file_stamp(self.private_key_path)
+            self._assertion = None
+        
         logger.info(f"✓ Certifikat genererade i {self.cert_dir}")
         logger.info(f"  - Privat nyckel: {self.private_key_path.name}")
         logger.info(f"  - Publikt certifikat: {self.public_cert_path.name}")
@@ -184,59 +220,100 @@ class RevolutOAuth:
         with open(self.public_cert_path, "r") as f:
             return f.read()
     
-    def generate_jwt(self, expiry_seconds: int = 300) -> str:
+    @staticmethod
+    def _file_stamp(path: Path) -> Tuple[int, int]:
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _load_private_key(self) -> Tuple[Tuple[int, int], object]:
+        """
+        Hämta den privata nyckeln (anroparen håller _key_lock)
+        
+        Nyckeln läses och avserialiseras bara om när filens mtime eller
+        storlek har ändrats, t.ex. efter ett certifikatbyte.
+        """
+        stamp = self._file_stamp(self.private_key_path)
+        if self._private_key is None or stamp != self._key_stamp:
+            from cryptography.hazmat.backends import default_backend
+            from cryptography.hazmat.primitives import serialization
+            
+            with open(self.private_key_path, "rb") as f:
+                self._private_key = serialization.load_pem_private_key(
+                    f.read(),
+                    password=None,
+                    backend=default_backend()
+                )
+            if self._key_stamp is not None:
+                logger.info("Privat nyckel ändrad på disk, laddad om")
+            self._key_stamp = stamp
+            self._assertion = None
+        return self._key_stamp, self._private_key
+    
+    def generate_jwt(self, expiry_seconds: int = 300, reuse: bool = True) -> str:
         """
         Generera JWT för client assertion
         
+        En tidigare signerad assertion återanvänds tills ASSERTION_REUSE_MARGIN
+        sekunder före dess exp, så länge nyckeln och giltighetstiden är desamma.
+        
         Args:
             expiry_seconds: JWT-giltighetstid i sekunder (default: 5 min)
+            reuse: Återanvänd en giltig assertion i stället för att signera ny
             
         Returns:
             Signerad JWT-token
         """
-        # JWT Header
-        header = {
-            "alg": "RS256",
-            "typ": "JWT"
-        }
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
         
-        # JWT Payload
-        now = int(time.time())
-        # Extrahera domän utan port från redirect_uri
-        domain = self.redirect_uri.split("://")[1].split("/")[0].split(":")[0]
-        payload = {
-            "iss": domain,  # Endast domän, ingen port
-            "sub": self.client_id,
-            "aud": "https://revolut.com",
-            "exp": now + expiry_seconds
-        }
-        
-        # Base64 URL-encode header och payload
-        header_b64 = self._base64url_encode(json.dumps(header, separators=(',', ':')))
-        payload_b64 = self._base64url_encode(json.dumps(payload, separators=(',', ':')))
-        
-        # Signera med privat nyckel
-        message = f"{header_b64}.{payload_b64}".encode()
-        
-        with open(self.private_key_path, "rb") as f:
-            private_key = serialization.load_pem_private_key(
-                f.read(),
-                password=None,
-                backend=default_backend()
+        with self._key_lock:
+            stamp, private_key = self._load_private_key()
+            now = int(time.time())
+            
+            cached = self._assertion
+            if (
+                reuse and cached
+                and cached[0] == stamp
+                and cached[1] == expiry_seconds
+                and cached[3] - now > min(ASSERTION_REUSE_MARGIN, expiry_seconds // 2)
+            ):
+                return cached[2]
+            
+            # JWT Header
+            header = {
+                "alg": "RS256",
+                "typ": "JWT"
+            }
+            
+            # JWT Payload
+            # Extrahera domän utan port från redirect_uri
+            domain = self.redirect_uri.split("://")[1].split("/")[0].split(":")[0]
+            payload = {
+                "iss": domain,  # Endast domän, ingen port
+                "sub": self.client_id,
+                "aud": "https://revolut.com",
+                "exp": now + expiry_seconds
+            }
+            
+            # Base64 URL-encode header och payload
+            header_b64 = self._base64url_encode(json.dumps(header, separators=(',', ':')))
+            payload_b64 = self._base64url_encode(json.dumps(payload, separators=(',', ':')))
+            
+            # Signera med privat nyckel
+            message = f"{header_b64}.{payload_b64}".encode()
+            signature = private_key.sign(
+                message,
+                padding.PKCS1v15(),
+                hashes.SHA256()
             )
-        
-        signature = private_key.sign(
-            message,
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
-        
-        signature_b64 = self._base64url_encode(signature)
-        
-        jwt = f"{header_b64}.{payload_b64}.{signature_b64}"
-        logger.debug(f"JWT genererad (exp: {expiry_seconds}s)")
-        
-        return jwt
+            
+            signature_b64 = self._base64url_encode(signature)
+            
+            jwt = f"{header_b64}.{payload_b64}.{signature_b64}"
+            self._assertion = (stamp, expiry_seconds, jwt, payload["exp"])
+            logger.debug(f"JWT genererad (exp: {expiry_seconds}s)")
+            
+            return jwt
     
     @staticmethod
     def _base64url_encode(data) -> str:
@@ -278,6 +355,8 @@ class RevolutOAuth:
         Returns:
             TokenData med access och refresh tokens
         """
+        import requests
+        
         logger.info("Byter authorization code mot access token...")
         
         jwt = self.generate_jwt()
@@ -292,7 +371,8 @@ class RevolutOAuth:
         response = requests.post(
             self.token_url,
             data=data,
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            timeout=self.timeout
         )
         
         response.raise_for_status()
@@ -309,7 +389,8 @@ class RevolutOAuth:
         )
         
         # Spara tokens
-        self._save_tokens(token_data)
+        with self.store.locked():
+            self._save_tokens(token_data)
         self.token_data = token_data
         
         logger.info("✓ Access token erhållen")
@@ -319,48 +400,70 @@ class RevolutOAuth:
         """
         Förnya access token med refresh token
         
+        Körs under fillåset. Har en annan process redan förnyat (tokens.json
+        innehåller en annan, giltig token) används den i stället för att
+        förnya igen - Revolut roterar refresh token, så en andra förnyelse
+        med den gamla skulle misslyckas.
+        
         Returns:
             Ny TokenData
             
         Raises:
             ValueError: Om ingen refresh token finns
+            requests.Timeout: Om token-endpointen inte svarar inom timeout (låset släpps)
         """
-        if not self.token_data or not self.token_data.refresh_token:
-            raise ValueError("Ingen refresh token tillgänglig. Kör fullständig autentisering igen.")
-        
-        logger.info("Förnyar access token...")
-        
-        jwt = self.generate_jwt()
-        
-        data = {
-            "grant_type": "refresh_token",
-            "refresh_token": self.token_data.refresh_token,
-            "client_assertion_type": "urn:ietf:params:oauth:client-assertion-type:jwt-bearer",
-            "client_assertion": jwt
-        }
-        
-        response = requests.post(
-            self.token_url,
-            data=data,
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        
-        response.raise_for_status()
-        token_response = response.json()
-        
-        # Uppdatera TokenData (behåll gamla refresh token om ingen ny returneras)
-        now = time.time()
-        token_data = TokenData(
-            access_token=token_response["access_token"],
-            refresh_token=token_response.get("refresh_token", self.token_data.refresh_token),
-            token_type=token_response["token_type"],
-            expires_at=now + token_response["expires_in"],
-            created_at=now
-        )
-        
-        # Spara uppdaterade tokens
-        self._save_tokens(token_data)
-        self.token_data = token_data
+        import requests
+        
+        stale = self._token_data
+        
+        with self.store.locked():
+            current = self._load_tokens(quiet=True)
+            if (
+                current is not None
+                and (stale is None or current.access_token != stale.access_token)
+                and not current.is_expired()
+            ):
+                logger.info("Token redan förnyad av annan process, använder den")
+                self.token_data = current
+                return current
+            
+            if not current or not current.refresh_token:
+                raise ValueError("Ingen refresh token tillgänglig. Kör fullständig autentisering igen.")
+            
+            logger.info("Förnyar access token...")
+            
+            jwt = self.generate_jwt()
+            
+            data = {
+                "grant_type": "refresh_token",
+                "refresh_token": current.refresh_token,
+                "client_assertion_type": "urn:ietf:params:oauth:client-assertion-type:jwt-bearer",
+                "client_assertion": jwt
+            }
+            
+            response = requests.post(
+                self.token_url,
+                data=data,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                timeout=self.timeout
+            )
+            
+            response.raise_for_status()
+            token_response = response.json()
+            
+            # Uppdatera TokenData (behåll gamla refresh token om ingen ny returneras)
+            now = time.time()
+            token_data = TokenData(
+                access_token=token_response["access_token"],
+                refresh_token=token_response.get("refresh_token", current.refresh_token),
+                token_type=token_response["token_type"],
+                expires_at=now + token_response["expires_in"],
+                created_at=now
+            )
+            
+            # Spara uppdaterade tokens
+            self._save_tokens(token_data)
+            self.token_data = token_data
         
         logger.info(f"✓ Access token förnyad (giltig i {token_data.time_until_expiry()//60} min)")
         return token_data
@@ -394,31 +497,21 @@ class RevolutOAuth:
         return self.token_data.access_token
     
     def _save_tokens(self, token_data: TokenData):
-        """Spara tokens till disk (krypterat)"""
-        data = asdict(token_data)
-        
-        # Sätt restriktiva rättigheter före skrivning
-        if self.token_file.exists():
-            os.chmod(self.token_file, 0o600)
-        
-        with open(self.token_file, "w") as f:
-            json.dump(data, f, indent=2)
-        
-        os.chmod(self.token_file, 0o600)
-        logger.debug(f"Tokens sparade i {self.token_file}")
+        """Spara tokens till disk (atomiskt, 0600 - anroparen håller store.locked())"""
+        self.store.save(asdict(token_data))
     
-    def _load_tokens(self) -> Optional[TokenData]:
+    def _load_tokens(self, quiet: bool = False) -> Optional[TokenData]:
         """Ladda sparade tokens från disk"""
-        if not self.token_file.exists():
-            return None
-        
         try:
-            with open(self.token_file, "r") as f:
-                data = json.load(f)
+            data = self.store.load()
+            if data is None:
+                return None
             
             token_data = TokenData(**data)
             
-            if token_data.is_expired(buffer_seconds=0):
+            if quiet:
+                pass
+            elif token_data.is_expired(buffer_seconds=0):
                 logger.warning("Sparad access token har gått ut")
             else:
                 logger.info(f"Laddat token (giltig i {token_data.time_until_expiry()//60} min)")
@@ -431,9 +524,9 @@ class RevolutOAuth:
     
     def clear_tokens(self):
         """Rensa sparade tokens"""
-        if self.token_file.exists():
-            self.token_file.unlink()
-            logger.info("Tokens rensade")
+        with self.store.locked():
+            self.store.clear()
+        logger.info("Tokens rensade")
         self.token_data = None
     
     def is_authenticated(self) -> bool:
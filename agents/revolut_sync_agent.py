@@ -5,41 +5,74 @@ Automatisk synkronisering av Revolut-transaktioner och valutaväxlingar till Bea
 """
 
 import sys
+import time
+import random
+import signal
 import argparse
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, List, Optional
 
 # Lägg till parent directory till path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from agents.config import config
+from agents.config import Config, config as default_config
+from agents.logging_setup import setup_logging
+from agents.metrics import metrics, profiled
 from agents.revolut_integration import RevolutSync
 
-# Konfigurera loggning
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(config.LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
+def _tenant_name(config: Config) -> str:
+    return config.TENANT_ID or config.COMPANY_NAME
+
+
+def _check_tenants(configs: List[Config]):
+    """Bolag i samma process får inte dela namn, utkatalog eller tokenfil"""
+    shared = (
+        ("namn (TENANT_ID)", [_tenant_name(c) for c in configs]),
+        ("DATA_LEDGER", [c.DATA_LEDGER for c in configs]),
+        ("REVOLUT_TOKEN_FILE", [c.REVOLUT_TOKEN_FILE for c in configs if c.REVOLUT_CLIENT_ID]),
+    )
+    for label, values in shared:
+        duplicates = {str(v or "~/.revolut/tokens.json") for v in values if values.count(v) > 1}
+        if duplicates:
+            raise ValueError(f"Flera bolag delar {label}: {', '.join(sorted(duplicates))}")
+
+
+def _write_metrics(directory: Path):
+    """Skriv körningens mätvärden (Prometheus-textfil och JSON)"""
+    try:
+        prom_path, json_path = metrics.write("revolut_sync", directory)
+        logger.info(f"Mätvärden: {prom_path}, {json_path}")
+    except OSError as e:
+        logger.warning(f"Kunde inte skriva mätvärden: {e}")
+
+
 class RevolutSyncAgent:
     """Agent för automatisk synkronisering av Revolut-data"""
 
-    def __init__(self):
-        self.config = config
+    def __init__(self, config: Optional[Config] = None):
+        """
+        Args:
+            config: Inställningar (default: den globala config)
+        """
+        self.config = config or default_config
+        self.name = _tenant_name(self.config)
         self.sync = None
+        self.runs = 0
+        self.skipped_runs = 0
+        self._stop = threading.Event()
         self._initialize_sync()
 
     def _initialize_sync(self):
         """Initialisera Revolut-synkronisering"""
-        if not self.config.REVOLUT_BUSINESS_API_KEY:
-            logger.error("REVOLUT_BUSINESS_API_KEY saknas i konfigurationen!")
+        if not self.config.REVOLUT_BUSINESS_API_KEY and not self.config.REVOLUT_CLIENT_ID:
+            logger.error(f"[{self.name}] REVOLUT_BUSINESS_API_KEY eller REVOLUT_CLIENT_ID saknas i konfigurationen!")
             logger.info("Lägg till din API-nyckel i .env filen")
             return
 
@@ -49,53 +82,238 @@ class RevolutSyncAgent:
         try:
             self.sync = RevolutSync(
                 business_api_key=self.config.REVOLUT_BUSINESS_API_KEY,
-                exchange_api_key=self.config.REVOLUT_EXCHANGE_API_KEY or None,
                 sandbox=self.config.REVOLUT_SANDBOX,
-                config=self.config
+                config=self.config,
+                base_url=self.config.REVOLUT_API_URL or None,
+                oauth_handler=self._oauth() if self.config.REVOLUT_CLIENT_ID else None
             )
             logger.info("✓ Revolut-synkronisering initierad")
         except Exception as e:
             logger.error(f"Kunde inte initiera Revolut-synkronisering: {e}")
             raise
 
-    def run_sync(self, days_back: int = None, sync_exchanges: bool = True):
+    def _oauth(self):
+        """RevolutOAuth med bolagets egna certifikat och tokenfil"""
+        from agents.revolut_oauth import RevolutOAuth
+
+        api_url = self.config.REVOLUT_API_URL
+        return RevolutOAuth(
+            client_id=self.config.REVOLUT_CLIENT_ID,
+            sandbox=self.config.REVOLUT_SANDBOX,
+            cert_dir=self.config.REVOLUT_CERT_DIR,
+            token_file=self.config.REVOLUT_TOKEN_FILE,
+            base_url=api_url.removesuffix("/api/1.0") if api_url else None,
+            timeout=self.config.REVOLUT_TOKEN_TIMEOUT
+        )
+
+    def run_sync(
+        self,
+        days_back: int = None,
+        sync_exchanges: bool = True,
+        only_new: bool = False,
+        show_balances: bool = True
+    ):
         """
         Kör synkronisering
         
         Args:
             days_back: Antal dagar bakåt (None = använd config)
             sync_exchanges: Synkronisera också valutaväxlingar
+            only_new: Skriv bara transaktioner som inte redan importerats
+            show_balances: Visa balanser efter synken
+
+        Mätvärdena nollställs inte här - de är gemensamma för processen (se
+        sync_tenants). Den som äger processen nollställer före körningen.
         """
         if not self.sync:
             logger.error("Revolut-synkronisering inte initierad!")
             return False
 
+        try:
+            return self._sync_once(days_back, sync_exchanges, only_new, show_balances)
+        finally:
+            self.write_metrics()
+
+    def _sync_once(self, days_back: Optional[int], sync_exchanges: bool, only_new: bool, show_balances: bool) -> bool:
         days = days_back or self.config.REVOLUT_SYNC_DAYS
         logger.info(f"🔄 Startar synkronisering ({days} dagar bakåt)...")
 
         try:
             # Synka transaktioner
-            tx_file = self.sync.sync_transactions(days_back=days)
-            logger.info(f"✓ Transaktioner sparade: {tx_file}")
-            print(f"\n✅ Transaktioner importerade till: {tx_file}")
+            tx_file = self.sync.sync_transactions(days_back=days, only_new=only_new)
+            if tx_file:
+                logger.info(f"✓ Transaktioner sparade: {tx_file}")
+                print(f"\n✅ Transaktioner importerade till: {tx_file}")
 
             # Synka valutaväxlingar (del av Business API)
             if sync_exchanges:
-                ex_file = self.sync.sync_exchanges(days_back=days)
+                ex_file = self.sync.sync_exchanges(days_back=days, only_new=only_new)
                 if ex_file:
                     logger.info(f"✓ Valutaväxlingar sparade: {ex_file}")
                     print(f"\n✅ Valutaväxlingar importerade till: {ex_file}")
 
             # Visa balanser
-            self.show_balances()
+            if show_balances:
+                self.show_balances()
 
             return True
 
         except Exception as e:
-            logger.error(f"Synkronisering misslyckades: {e}")
+            logger.error(f"[{self.name}] Synkronisering misslyckades: {e}")
             print(f"\n❌ Fel vid synkronisering: {e}")
+            metrics.inc("sync_errors_total", stage="run")
             return False
 
+    @classmethod
+    def sync_tenants(
+        cls,
+        configs: List[Config],
+        days_back: Optional[int] = None,
+        sync_exchanges: bool = True,
+        max_workers: Optional[int] = None,
+        metrics_dir: Optional[Path] = None
+    ) -> Dict[str, bool]:
+        """
+        Synka flera bolag samtidigt i samma process
+
+        Varje bolag får en egen agent med egen HTTP-session (anslutningspool),
+        token (REVOLUT_TOKEN_FILE), begränsning av förfrågningar
+        (REVOLUT_RATE_LIMIT) och utkatalog (DATA_LEDGER). Ett bolag som
+        fallerar eller stryps (429) väntar i sin egen tråd medan de övriga
+        fortsätter. Mätvärdena får etiketten tenant.
+
+        Args:
+            configs: En Config per bolag
+            days_back: Antal dagar bakåt (None = varje bolags REVOLUT_SYNC_DAYS)
+            sync_exchanges: Synkronisera också valutaväxlingar
+            max_workers: Max antal bolag som synkas samtidigt (default: alla)
+            metrics_dir: Katalog för mätvärden (default: den globala configens METRICS_DIR)
+
+        Returns:
+            Lyckades synken, per bolag
+
+        Raises:
+            ValueError: Om två bolag delar namn, DATA_LEDGER eller tokenfil
+        """
+        _check_tenants(configs)
+        # En gång per omgång - run_sync nollställer inte
+        metrics.reset()
+
+        def run(config: Config):
+            name = _tenant_name(config)
+            threading.current_thread().name = f"revolut-sync-{name}"
+            start = time.perf_counter()
+            with metrics.scope(tenant=name):
+                try:
+                    agent = cls(config)
+                    ok = bool(agent.sync) and agent._sync_once(days_back, sync_exchanges, False, False)
+                except Exception as e:
+                    logger.error(f"[{name}] Kunde inte synka: {e}")
+                    metrics.inc("sync_errors_total", stage="init")
+                    ok = False
+                elapsed = time.perf_counter() - start
+                metrics.observe("sync_tenant_seconds", elapsed)
+            logger.info(f"[{name}] {'klar' if ok else 'misslyckades'} efter {elapsed:.1f} s")
+            return name, ok
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(configs)) as pool:
+            results = dict(pool.map(run, configs))
+
+        _write_metrics(metrics_dir or default_config.METRICS_DIR)
+        return results
+
+    def run_daemon(
+        self,
+        interval: Optional[float] = None,
+        jitter: Optional[float] = None,
+        days_back: Optional[int] = None,
+        sync_exchanges: bool = True,
+        max_runs: Optional[int] = None
+    ):
+        """
+        Synka med jämna mellanrum i samma process
+
+        HTTP-session, token, klassificerare och kända revolut_id hålls varma
+        mellan körningarna. Intervallet slumpas ±jitter så att flera
+        instanser inte träffar API:t samtidigt. Pågår föregående körning när
+        nästa ska starta hoppas den över. SIGTERM/SIGINT väntar in en
+        pågående körning och avslutar sedan.
+
+        Args:
+            interval: Sekunder mellan körningar (default: REVOLUT_SYNC_INTERVAL)
+            jitter: Andel av intervallet att slumpa (default: REVOLUT_SYNC_JITTER)
+            days_back: Antal dagar bakåt per körning (None = använd config)
+            sync_exchanges: Synkronisera också valutaväxlingar
+            max_runs: Avsluta efter så många startade körningar (None = tills stopp)
+        """
+        if not self.sync:
+            logger.error("Revolut-synkronisering inte initierad!")
+            return False
+
+        interval = interval or self.config.REVOLUT_SYNC_INTERVAL
+        jitter = self.config.REVOLUT_SYNC_JITTER if jitter is None else jitter
+        rng = random.Random()
+        previous = self._install_signal_handlers()
+        self.sync.load_known_ids()
+        logger.info(f"🔁 Daemonläge: synk var {interval:.0f}:e sekund (±{jitter:.0%})")
+
+        worker: Optional[threading.Thread] = None
+        next_run = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if worker is not None and worker.is_alive():
+                    self.skipped_runs += 1
+                    logger.warning("Föregående synk pågår fortfarande - hoppar över körningen")
+                else:
+                    metrics.reset()
+                    worker = threading.Thread(
+                        target=self.run_sync,
+                        kwargs={
+                            "days_back": days_back,
+                            "sync_exchanges": sync_exchanges,
+                            "only_new": True,
+                            "show_balances": False,
+                        },
+                        name="revolut-sync",
+                    )
+                    worker.start()
+                    self.runs += 1
+                    if max_runs and self.runs >= max_runs:
+                        break
+
+                next_run += interval * (1 + rng.uniform(-jitter, jitter))
+                self._stop.wait(max(0.0, next_run - time.monotonic()))
+        finally:
+            if worker is not None and worker.is_alive():
+                logger.info("Väntar på pågående synk...")
+                worker.join()
+            self._restore_signal_handlers(previous)
+            logger.info(f"Daemon stoppad efter {self.runs} körningar ({self.skipped_runs} överhoppade)")
+        return True
+
+    def stop(self):
+        """Be daemonen avsluta efter pågående körning"""
+        self._stop.set()
+
+    def _install_signal_handlers(self) -> dict:
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+
+        def handle(signum, _frame):
+            logger.info(f"Tog emot {signal.Signals(signum).name}, avslutar...")
+            self.stop()
+
+        return {sig: signal.signal(sig, handle) for sig in (signal.SIGTERM, signal.SIGINT)}
+
+    @staticmethod
+    def _restore_signal_handlers(previous: dict):
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+    def write_metrics(self):
+        """Skriv körningens mätvärden (Prometheus-textfil och JSON)"""
+        _write_metrics(self.config.METRICS_DIR)
+
     def show_balances(self):
         """Visa aktuella balanser"""
         try:
@@ -152,8 +370,65 @@ class RevolutSyncAgent:
             return False
 
 
+def _run_tenants(args, config: Config) -> bool:
+    """Synka bolagen i --tenants och skriv resultatet per bolag"""
+    tenants = [Config(env_file=path, environ={}) for path in args.tenants]
+    results = RevolutSyncAgent.sync_tenants(
+        tenants,
+        days_back=args.days,
+        sync_exchanges=not args.no_exchanges,
+        max_workers=args.max_workers,
+        metrics_dir=config.METRICS_DIR
+    )
+    for name, ok in results.items():
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+
+def _run_agent(args, config: Config) -> bool:
+    """Ett bolag: anslutningstest, balanser, daemon eller en synk"""
+    agent = RevolutSyncAgent(config)
+
+    # Test-läge
+    if args.test_connection:
+        agent.check_api_connection()
+        return True
+
+    # Visa balanser
+    if args.show_balances:
+        agent.show_balances()
+        return True
+
+    # Daemonläge
+    if args.daemon or config.REVOLUT_AUTO_SYNC:
+        return agent.run_daemon(
+            interval=args.interval,
+            days_back=args.days,
+            sync_exchanges=not args.no_exchanges
+        )
+
+    # Kör synkronisering
+    metrics.reset()
+    with profiled(args.profile, config.METRICS_DIR / "revolut_sync.prof"):
+        success = agent.run_sync(
+            days_back=args.days,
+            sync_exchanges=not args.no_exchanges
+        )
+
+    if success:
+        print("\n✅ Synkronisering klar!")
+        print(f"\nNästa steg:")
+        print(f"1. Granska importerade transaktioner i data/ledger/")
+        print(f"2. Inkludera filen i main.beancount")
+        print(f"3. Öppna Fava för att verifiera: fava main.beancount")
+    else:
+        print("\n❌ Synkronisering misslyckades - se logg för detaljer")
+    return success
+
+
 def main():
     """Huvudprogram"""
+    config = default_config
     parser = argparse.ArgumentParser(
         description="Revolut Sync Agent - Synkronisera transaktioner till Beancount"
     )
@@ -177,41 +452,48 @@ def main():
         action="store_true",
         help="Visa balanser och avsluta"
     )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Kör som daemon och synka med jämna mellanrum (standard om REVOLUT_AUTO_SYNC=true)"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        help=f"Sekunder mellan synkar i daemonläge (standard: {config.REVOLUT_SYNC_INTERVAL})"
+    )
+    parser.add_argument(
+        "--tenants",
+        nargs="+",
+        type=Path,
+        metavar="ENV_FILE",
+        help="Synka flera bolag samtidigt - en .env-fil per bolag (miljövariabler ignoreras)"
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="Max antal bolag som synkas samtidigt med --tenants (standard: alla)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Kör synken under cProfile och tracemalloc"
+    )
 
     args = parser.parse_args()
 
+    # Konfigurera loggning (köbaserad, skrivs av en bakgrundstråd)
+    setup_logging(config, log_file=config.LOG_FILE)
+
     # Banner
     print("\n" + "=" * 60)
     print("   Revolut Sync Agent - Efficra Accounting System")
     print("=" * 60 + "\n")
 
     try:
-        agent = RevolutSyncAgent()
-
-        # Test-läge
-        if args.test_connection:
-            agent.check_api_connection()
-            return
-
-        # Visa balanser
-        if args.show_balances:
-            agent.show_balances()
-            return
-
-        # Kör synkronisering
-        success = agent.run_sync(
-            days_back=args.days,
-            sync_exchanges=not args.no_exchanges
-        )
-
-        if success:
-            print("\n✅ Synkronisering klar!")
-            print(f"\nNästa steg:")
-            print(f"1. Granska importerade transaktioner i data/ledger/")
-            print(f"2. Inkludera filen i main.beancount")
-            print(f"3. Öppna Fava för att verifiera: fava main.beancount")
-        else:
-            print("\n❌ Synkronisering misslyckades - se logg för detaljer")
+        # Flera bolag i samma process, annars ett
+        ok = _run_tenants(args, config) if args.tenants else _run_agent(args, config)
+        if not ok:
             sys.exit(1)
 
     except KeyboardInterrupt:
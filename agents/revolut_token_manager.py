@@ -0,0 +1,209 @@
+"""
+Tokenhantering för Revolut Business API
+
+TokenManager ligger framför RevolutOAuth och ser till att:
+- förfrågningar normalt aldrig väntar på förnyelse - token förnyas i
+  bakgrunden när den har mindre än `refresh_margin` sekunder kvar (högst
+  halva livslängden, så att kortlivade token inte förnyas i en tät loop)
+- samtidiga förnyelser (utgången token, 401 från flera trådar) slås ihop
+  till en enda förfrågan mot token-endpointen
+- en 401 för en token som redan har ersatts inte leder till ny förnyelse
+
+Alla klienter som delar samma RevolutOAuth bör dela samma manager, se
+TokenManager.shared().
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+from agents.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Förnya i bakgrunden när token har så här många sekunder kvar
+REFRESH_MARGIN = 600
+
+# Under så här många sekunder kvar väntar förfrågan på ny token
+EXPIRY_BUFFER = 30
+
+# Paus innan en misslyckad bakgrundsförnyelse försöks igen
+RETRY_INTERVAL = 30
+
+_managers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_managers_lock = threading.Lock()
+
+
+class TokenManager:
+    """Single-flight och proaktiv förnyelse av access tokens"""
+
+    def __init__(
+        self,
+        oauth,
+        refresh_margin: int = REFRESH_MARGIN,
+        expiry_buffer: int = EXPIRY_BUFFER,
+        retry_interval: int = RETRY_INTERVAL
+    ):
+        """
+        Args:
+            oauth: RevolutOAuth-instans som äger token och refresh token
+            refresh_margin: Sekunder före utgång då bakgrundsförnyelse startar
+                            (högst halva tokenens livslängd)
+            expiry_buffer: Sekunder före utgång då förfrågningar väntar på ny token
+            retry_interval: Sekunder mellan försök efter misslyckad bakgrundsförnyelse
+        """
+        self.oauth = oauth
+        self.refresh_margin = refresh_margin
+        self.expiry_buffer = expiry_buffer
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._inflight: Optional[Future] = None
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def shared(cls, oauth) -> "TokenManager":
+        """Processens gemensamma manager för en RevolutOAuth-instans"""
+        with _managers_lock:
+            manager = _managers.get(oauth)
+            if manager is None:
+                manager = _managers[oauth] = cls(oauth)
+            return manager
+
+    def get_access_token(self) -> str:
+        """
+        Hämta giltig access token
+
+        Returnerar direkt så länge token har mer än `expiry_buffer` sekunder
+        kvar; inom `refresh_margin` startas samtidigt en bakgrundsförnyelse.
+
+        Raises:
+            ValueError: Om ingen token finns
+        """
+        token = self.oauth.token_data
+        if token is None:
+            raise ValueError("Ingen access token tillgänglig. Kör authenticate() först.")
+
+        remaining = token.expires_at - time.time()
+        if remaining > self.expiry_buffer:
+            if remaining <= self._margin(token) and token.refresh_token and time.time() >= self._retry_at:
+                self._start_refresh(token.access_token)
+            return token.access_token
+
+        return self.refresh(stale=token.access_token).access_token
+
+    def _margin(self, token) -> float:
+        """refresh_margin, men högst halva tokenens livslängd"""
+        # Annars är en kortlivad token "på väg att gå ut" direkt och förnyas i en tät loop
+        return min(self.refresh_margin, (token.expires_at - token.created_at) / 2)
+
+    def get_auth_headers(self) -> Dict[str, str]:
+        """Authorization headers för API-requests"""
+        return {
+            "Authorization": f"Bearer {self.get_access_token()}",
+            "Content-Type": "application/json"
+        }
+
+    def refresh(self, stale: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Förnya token och vänta på resultatet
+
+        Args:
+            stale: Access token som anroparen vet är ogiltig. Har den redan
+                   ersatts returneras den nya utan ny förfrågan.
+            timeout: Max väntetid i sekunder
+
+        Returns:
+            Ny TokenData
+        """
+        return self._start_refresh(stale).result(timeout)
+
+    def _start_refresh(self, stale: Optional[str]) -> Future:
+        """Starta en förnyelse, eller anslut till den som redan pågår"""
+        with self._lock:
+            if self._inflight is not None:
+                return self._inflight
+
+            current = self.oauth.token_data
+            if stale is not None and current is not None and current.access_token != stale:
+                future = Future()
+                future.set_result(current)
+                return future
+
+            future = self._inflight = Future()
+
+        # Med anroparens kontext så att mätvärdena behåller t.ex. tenant-etiketten
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(self._run_refresh, future),
+            name="revolut-token-refresh", daemon=True
+        ).start()
+        return future
+
+    def _run_refresh(self, future: Future):
+        start = time.perf_counter()
+        try:
+            token = self.oauth.refresh_access_token()
+        except BaseException as e:
+            logger.error(f"Token-förnyelse misslyckades: {e}")
+            metrics.inc("revolut_token_refresh_total", result="error")
+            with self._lock:
+                self._inflight = None
+                self._retry_at = time.time() + self.retry_interval
+            future.set_exception(e)
+        else:
+            metrics.inc("revolut_token_refresh_total", result="ok")
+            with self._lock:
+                self._inflight = None
+                self._retry_at = 0.0
+            future.set_result(token)
+        finally:
+            metrics.observe("revolut_token_refresh_seconds", time.perf_counter() - start)
+
+    # -- Bakgrundstråd ----------------------------------------------------
+
+    def start(self):
+        """Förnya token i en bakgrundstråd `refresh_margin` sekunder före utgång"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._loop,), name="revolut-token-timer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stoppa bakgrundstråden"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            token = self.oauth.token_data
+            if token is None or not token.refresh_token:
+                self._stop.wait(self.retry_interval)
+                continue
+
+            wait = max(token.expires_at - self._margin(token), self._retry_at) - time.time()
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+
+            try:
+                self.refresh(stale=token.access_token)
+            except Exception:
+                # Redan loggat; nästa försök efter retry_interval
+                pass
+
+    def __enter__(self) -> "TokenManager":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
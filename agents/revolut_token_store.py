@@ -0,0 +1,120 @@
+"""
+Processäker lagring av Revolut-tokens
+
+Token-cron och synk-cron (och parallella arbetare) delar samma tokens.json.
+TokenStore:
+- låser en separat .lock-fil med flock kring läs-förnya-skriv, så att bara
+  en process i taget förnyar och ingen roterad refresh token går förlorad
+- skriver atomiskt: temporär fil med 0600 (mkstemp), fsync, rename och fsync av katalogen
+- läser bara om filen när mtime, storlek eller inode har ändrats
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - bara låsning inom processen
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+Stamp = Tuple[int, int, int]
+
+
+class TokenStore:
+    """JSON-fil med tokens, delad mellan processer"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread_lock = threading.RLock()
+        self._stamp: Optional[Stamp] = None
+        self._data: Optional[Dict] = None
+
+    def _current_stamp(self) -> Optional[Stamp]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def changed(self) -> bool:
+        """Har filen ändrats (av någon annan) sedan senaste läsning/skrivning?"""
+        return self._current_stamp() != self._stamp
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Exklusivt lås mellan trådar och processer"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def load(self) -> Optional[Dict]:
+        """
+        Läs tokens (cachat tills filen ändras)
+
+        Returns:
+            Sparade data, eller None om filen saknas
+        """
+        with self._thread_lock:
+            stamp = self._current_stamp()
+            if stamp == self._stamp:
+                return self._data
+            if stamp is None:
+                self._stamp, self._data = None, None
+                return None
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Stämpeln tas före läsningen - byts filen under tiden läses den
+            # om vid nästa anrop
+            self._stamp, self._data = stamp, data
+            return data
+
+    def save(self, data: Dict):
+        """Skriv tokens atomiskt (anroparen bör hålla locked())"""
+        with self._thread_lock:
+            fd, tmp_name = tempfile.mkstemp(prefix=f".{self.path.name}.", dir=self.path.parent)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_name, self.path)
+            except BaseException:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+            self._fsync_dir()
+            self._stamp, self._data = self._current_stamp(), data
+            logger.debug(f"Tokens sparade i {self.path}")
+
+    def clear(self):
+        """Ta bort sparade tokens"""
+        with self._thread_lock:
+            self.path.unlink(missing_ok=True)
+            self._fsync_dir()
+            self._stamp, self._data = None, None
+
+    def _fsync_dir(self):
+        if os.name != "posix":
+            return
+        fd = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
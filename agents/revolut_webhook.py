@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Webhook-mottagare för Revolut Business
+
+Revolut skickar TransactionCreated och TransactionStateChanged när något
+händer på kontona. Mottagaren:
+- verifierar signaturen (HMAC-SHA256 över `v1.{timestamp}.{kropp}` med
+  webhookens signeringshemlighet) och avvisar för gamla tidsstämplar
+- sparar händelsen i en SQLite-kö (WAL, synchronous=FULL) innan den svarar
+  2xx, så att inget går förlorat om processen dör
+- bokför kön i mikrobatcher via RevolutSync.ingest - bara transaktioner med
+  nya revolut_id skrivs, så omsända händelser och pollingen krockar inte
+
+Pollingen körs kvar med långt intervall för att fylla luckor (missade
+händelser, driftstopp).
+
+Användning:
+    python agents/revolut_webhook.py --port 8780
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.config import config as default_config
+from agents.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhooks/revolut"
+
+# Händelser som bokförs - övriga kvitteras och ignoreras
+TRANSACTION_EVENTS = ("TransactionCreated", "TransactionStateChanged")
+
+# Max ålder på en signerad förfrågan i sekunder (skydd mot återuppspelning)
+SIGNATURE_TOLERANCE = 300
+
+MAX_BODY_BYTES = 1024 * 1024
+
+# Händelser som misslyckats så här många gånger lämnas åt pollingen
+MAX_ATTEMPTS = 5
+
+# Bokförda händelser sparas så länge för att känna igen omsändningar
+RETENTION_SECONDS = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest TEXT NOT NULL UNIQUE,
+    event TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_open ON events (done, seq);
+CREATE TABLE IF NOT EXISTS pending_transactions (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def sign(secret: str, body: bytes, timestamp: str) -> str:
+    """Signatur för en webhook-kropp (värdet i Revolut-Signature)"""
+    message = b"v1." + timestamp.encode() + b"." + body
+    return "v1=" + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_signature(
+    secret: str,
+    body: bytes,
+    timestamp: Optional[str],
+    signature: Optional[str],
+    tolerance: float = SIGNATURE_TOLERANCE,
+    now: Optional[float] = None
+) -> bool:
+    """
+    Verifiera Revolut-Signature för en webhook-förfrågan
+
+    Args:
+        secret: Webhookens signeringshemlighet
+        body: Kroppen exakt som den togs emot
+        timestamp: Revolut-Request-Timestamp (millisekunder sedan epok)
+        signature: Revolut-Signature - flera kommaseparerade vid byte av hemlighet
+        tolerance: Max skillnad mot klockan i sekunder
+        now: Aktuell tid (för tester)
+
+    Returns:
+        True om någon signatur stämmer och tidsstämpeln är färsk
+    """
+    if not secret or not timestamp or not signature:
+        return False
+    try:
+        sent = int(timestamp) / 1000
+    except ValueError:
+        return False
+    if abs((now or time.time()) - sent) > tolerance:
+        return False
+    expected = sign(secret, body, timestamp)
+    return any(hmac.compare_digest(expected, candidate.strip()) for candidate in signature.split(","))
+
+
+class EventQueue:
+    """
+    Beständig kö för mottagna händelser
+
+    Omsända händelser (samma kropp) läggs bara in en gång - bokförda
+    händelser ligger kvar i RETENTION_SECONDS för det. Pending-transaktioner
+    sparas så att en senare TransactionStateChanged kan bokföras utan API-anrop.
+    """
+
+    def __init__(self, db_path=":memory:"):
+        """
+        Args:
+            db_path: SQLite-fil (":memory:" för en kö i minnet)
+        """
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        # Delas av HTTP-trådarna och bokföringstråden, serialiserat av låset
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Stäng databasen"""
+        with self._lock:
+            self.conn.close()
+
+    def put(self, event: str, body: bytes) -> bool:
+        """
+        Lägg en händelse på kön (beständigt när metoden returnerar)
+
+        Returns:
+            False om samma kropp redan har tagits emot
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO events (digest, event, payload, received_at) VALUES (?, ?, ?, ?)",
+                (digest, event, body.decode("utf-8"), time.time())
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, limit: int) -> List[Tuple[int, str, Dict, float]]:
+        """
+        De äldsta obokförda händelserna
+
+        Returns:
+            (seq, händelsetyp, payload, mottagningstid) i mottagningsordning
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, event, payload, received_at FROM events WHERE done = 0 AND attempts < ? "
+                "ORDER BY seq LIMIT ?",
+                (MAX_ATTEMPTS, limit)
+            ).fetchall()
+        return [(seq, event, json.loads(payload), received) for seq, event, payload, received in rows]
+
+    def ack(self, seqs: Iterable[int], transactions: Iterable[Dict] = ()):
+        """
+        Markera händelser som bokförda och uppdatera sparade pending-transaktioner
+
+        Transaktioner i `transactions` som fortfarande är pending sparas,
+        övriga tas bort ur pending-tabellen.
+        """
+        transactions = list(transactions)
+        with self._lock, self.conn:
+            self.conn.executemany("UPDATE events SET done = 1 WHERE seq = ?", [(seq,) for seq in seqs])
+            self.conn.execute(
+                "DELETE FROM events WHERE done = 1 AND received_at < ?", (time.time() - RETENTION_SECONDS,)
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pending_transactions (id, payload) VALUES (?, ?)",
+                [(tx["id"], json.dumps(tx)) for tx in transactions if tx.get("state") == "pending"]
+            )
+            self.conn.executemany(
+                "DELETE FROM pending_transactions WHERE id = ?",
+                [(tx["id"],) for tx in transactions if tx.get("state") != "pending"]
+            )
+
+    def fail(self, seqs: Iterable[int]):
+        """Räkna upp försök för händelser som misslyckades"""
+        with self._lock, self.conn:
+            self.conn.executemany("UPDATE events SET attempts = attempts + 1 WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def pending_transaction(self, transaction_id: str) -> Optional[Dict]:
+        """Senast sparade pending-version av en transaktion"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT payload FROM pending_transactions WHERE id = ?", (transaction_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM events WHERE done = 0 AND attempts < ?", (MAX_ATTEMPTS,)
+            ).fetchone()[0]
+
+
+class WebhookIngestor:
+    """Bokför köade händelser i mikrobatcher i en bakgrundstråd"""
+
+    def __init__(
+        self,
+        sync,
+        queue: EventQueue,
+        batch_seconds: float = 1.0,
+        batch_size: int = 500,
+        retry_interval: float = 30.0
+    ):
+        """
+        Args:
+            sync: RevolutSync som konverterar och skriver (delas med pollingen)
+            queue: Kön som mottagaren skriver till
+            batch_seconds: Väntetid efter första händelsen för att samla fler
+            batch_size: Max antal händelser per batch
+            retry_interval: Paus innan misslyckade händelser försöks igen
+        """
+        self.sync = sync
+        self.queue = queue
+        self.batch_seconds = batch_seconds
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.batches = 0
+        self.failed_events = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def notify(self):
+        """Väck bokföringstråden (anropas när en händelse har köats)"""
+        self._wakeup.set()
+
+    def process(self) -> int:
+        """
+        Bokför en batch från kön
+
+        Varje händelse hämtas och konverteras för sig: händelser som
+        misslyckas räknas upp och försöks igen, övriga i batchen bokförs.
+
+        Returns:
+            Antal händelser som hanterades
+        """
+        rows = self.queue.claim(self.batch_size)
+        if not rows:
+            return 0
+        seqs = [seq for seq, _event, _payload, _received in rows]
+        transactions, sources, failed = self._transactions(rows)
+        unconverted: List[str] = []
+        try:
+            self.sync.ingest(list(transactions.values()), failed=unconverted)
+        except Exception as e:
+            # Inget skrevs - hela batchen försöks igen
+            logger.error(f"Webhook-batch med {len(rows)} händelser misslyckades: {e}")
+            self.queue.fail(seqs)
+            raise
+        for tx_id in unconverted:
+            failed.update(sources[tx_id])
+            transactions.pop(tx_id, None)
+
+        if failed:
+            logger.warning(f"{len(failed)} av {len(rows)} webhook-händelser misslyckades - försöks igen")
+            self.queue.fail(failed)
+            self.failed_events += len(failed)
+        self.queue.ack([seq for seq in seqs if seq not in failed], transactions.values())
+        self.batches += 1
+        lag = time.time() - rows[0][3]
+        logger.info("Webhook-batch: %d händelser, %d transaktioner, %.1f s efter mottagning",
+                    len(rows), len(transactions), lag)
+        return len(rows)
+
+    def _transactions(
+        self, rows: List[Tuple[int, str, Dict, float]]
+    ) -> Tuple[Dict[str, Dict], Dict[str, List[int]], Set[int]]:
+        """
+        Senaste kända version av varje transaktion i batchen
+
+        Returns:
+            (transaktion per id, händelser per id, händelser vars transaktion inte kunde hämtas)
+        """
+        latest: Dict[str, Dict] = {}
+        sources: Dict[str, List[int]] = defaultdict(list)
+        failed: Set[int] = set()
+        for seq, event, payload, _received in rows:
+            data = payload.get("data") or {}
+            tx_id = data.get("id")
+            if event not in TRANSACTION_EVENTS or not tx_id:
+                continue
+            if event == "TransactionCreated":
+                latest[tx_id] = data
+            else:
+                # TransactionStateChanged innehåller bara id och tillstånd
+                transaction = latest.get(tx_id) or self.queue.pending_transaction(tx_id)
+                if transaction is None:
+                    try:
+                        transaction = self.sync.business.get_transaction(tx_id)
+                    except Exception as e:
+                        logger.error(f"Kunde inte hämta transaktion {tx_id}: {e}")
+                        failed.add(seq)
+                        continue
+                latest[tx_id] = {**transaction, "state": data.get("new_state", transaction.get("state"))}
+            sources[tx_id].append(seq)
+        return latest, sources, failed
+
+    # -- Bakgrundstråd ----------------------------------------------------
+
+    def start(self):
+        """Starta bokföringstråden (köade händelser från förra körningen bokförs först)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._wakeup.set()
+        self._thread = threading.Thread(target=self._loop, name="revolut-webhook-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stoppa tråden efter pågående batch"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Samla händelser som kommer tätt efter varandra i samma batch
+            self._stop.wait(self.batch_seconds)
+            try:
+                failed = self.failed_events
+                while self.process() == self.batch_size and self.failed_events == failed:
+                    pass
+                retry = self.failed_events != failed
+            except Exception:
+                retry = True
+            if retry:
+                # Redan loggat; händelserna ligger kvar och försöks igen
+                self._stop.wait(self.retry_interval)
+                self._wakeup.set()
+
+
+class WebhookReceiver:
+    """HTTP-server som tar emot, verifierar och köar webhook-händelser"""
+
+    def __init__(
+        self,
+        secret: str,
+        queue: EventQueue,
+        on_event=None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        tolerance: float = SIGNATURE_TOLERANCE
+    ):
+        """
+        Args:
+            secret: Webhookens signeringshemlighet
+            queue: Kö att lägga verifierade händelser på
+            on_event: Anropas efter att en ny händelse köats (t.ex. WebhookIngestor.notify)
+            host: Adress att lyssna på
+            port: TCP-port (0 = valfri ledig)
+            tolerance: Max ålder på tidsstämpeln i sekunder
+        """
+        if not secret:
+            raise ValueError("REVOLUT_WEBHOOK_SECRET saknas - kan inte verifiera webhooks")
+        self.secret = secret
+        self.queue = queue
+        self.on_event = on_event
+        self.tolerance = tolerance
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{WEBHOOK_PATH}"
+
+    def receive(self, body: bytes, timestamp: Optional[str], signature: Optional[str]) -> int:
+        """
+        Hantera en webhook-förfrågan
+
+        Returns:
+            HTTP-status att svara med
+        """
+        if not verify_signature(self.secret, body, timestamp, signature, self.tolerance):
+            logger.warning("Webhook med ogiltig signatur eller tidsstämpel avvisad")
+            self._count("rejected")
+            return 401
+        try:
+            event = json.loads(body)["event"]
+        except (ValueError, KeyError, TypeError):
+            self._count("rejected")
+            return 400
+
+        if not self.queue.put(event, body):
+            self._count("duplicates")
+            return 204
+        self._count("accepted")
+        logger.debug("Webhook %s köad", event)
+        if self.on_event:
+            self.on_event()
+        return 204
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY_BYTES:
+                    self.close_connection = True
+                    self._respond(413)
+                    return
+                body = self.rfile.read(length)
+                if self.path.split("?")[0] != WEBHOOK_PATH:
+                    self._respond(404)
+                    return
+                try:
+                    status = receiver.receive(
+                        body,
+                        self.headers.get("Revolut-Request-Timestamp"),
+                        self.headers.get("Revolut-Signature"),
+                    )
+                except Exception as e:
+                    # Inget 2xx - Revolut skickar om händelsen
+                    logger.error(f"Kunde inte köa webhook: {e}")
+                    status = 500
+                self._respond(status)
+
+        return Handler
+
+    def start(self):
+        """Börja ta emot förfrågningar i en bakgrundstråd"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="revolut-webhook-http", daemon=True)
+        self._thread.start()
+        logger.info(f"Tar emot Revolut-webhooks på {self.url}")
+
+    def stop(self):
+        """Sluta ta emot förfrågningar"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "WebhookReceiver":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    """Huvudprogram"""
+    config = default_config
+    parser = argparse.ArgumentParser(
+        description="Revolut Webhook - Ta emot transaktionshändelser och bokför dem direkt"
+    )
+    parser.add_argument(
+        "--host",
+        default=config.REVOLUT_WEBHOOK_HOST,
+        help=f"Adress att lyssna på (standard: {config.REVOLUT_WEBHOOK_HOST})"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=config.REVOLUT_WEBHOOK_PORT,
+        help=f"TCP-port (standard: {config.REVOLUT_WEBHOOK_PORT})"
+    )
+    parser.add_argument(
+        "--gap-fill-interval",
+        type=float,
+        default=config.REVOLUT_WEBHOOK_GAP_FILL_INTERVAL,
+        help=f"Sekunder mellan luckfyllande polling (standard: {config.REVOLUT_WEBHOOK_GAP_FILL_INTERVAL})"
+    )
+    args = parser.parse_args()
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    from agents.revolut_sync_agent import RevolutSyncAgent
+
+    agent = RevolutSyncAgent(config)
+    if not agent.sync:
+        sys.exit(1)
+
+    queue = EventQueue(config.REVOLUT_WEBHOOK_QUEUE)
+    ingestor = WebhookIngestor(agent.sync, queue, batch_seconds=config.REVOLUT_WEBHOOK_BATCH_SECONDS)
+    try:
+        receiver = WebhookReceiver(
+            config.REVOLUT_WEBHOOK_SECRET, queue, ingestor.notify, host=args.host, port=args.port
+        )
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    ingestor.start()
+    try:
+        with receiver:
+            # Pollingen fyller luckor; SIGTERM stoppar den och sedan mottagaren
+            agent.run_daemon(interval=args.gap_fill_interval)
+    finally:
+        ingestor.stop()
+        logger.info(
+            f"Webhooks: {receiver.accepted} köade, {receiver.duplicates} dubbletter, "
+            f"{receiver.rejected} avvisade, {ingestor.batches} batcher, {len(queue)} kvar i kön"
+        )
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+SIE4-export av Beancount-huvudboken
+
+Skriver en SIE4-fil (typ 4, verifikationer) per räkenskapsår med BAS-konton.
+Transaktionerna gås igenom en gång: varje verifikation skrivs direkt till en
+temporär fil för sitt år och exporten håller bara summor per konto och år.
+Huvudboken läses in av Beancounts loader som vanligt (omräkning av utländsk
+valuta behöver prisnoteringar från hela huvudboken). När alla transaktioner
+lästs skrivs filhuvudet med #KONTO, #IB, #UB och #RES följt av årets
+verifikationer.
+
+Beloppen avrundas till ören per rad efter omräkning; avrundningsdifferensen
+läggs på verifikationens sista rad så att varje #VER balanserar. En större
+differens (kursdifferens när valutor räknas om till dagskurs) bokas på
+kontot för valutakursvinst eller -förlust i stället för på sista raden.
+
+BAS-nummer hämtas från metadata `bas` på kontots open-direktiv, annars från
+BAS_ACCOUNTS (exakt namn eller närmaste överkonto).
+"""
+
+import argparse
+import logging
+import shutil
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from beancount import loader
+from beancount.core import convert, data, prices
+
+from agents.config import Config, config as default_config
+from agents.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# SIE4 använder PC8 (IBM-teckentabell 437)
+SIE_ENCODING = "cp437"
+
+CENT = Decimal("0.01")
+
+# Beancount-konto (eller överkonto) -> BAS-kontonummer
+BAS_ACCOUNTS: Dict[str, str] = {
+    "Assets:Bank:Företagskonto": "1930",
+    "Assets:Bank:Sparkonto": "1940",
+    "Assets:Bank:Revolut": "1940",
+    "Assets:Bank": "1940",
+    "Assets:Kundfordringar": "1510",
+    "Assets:Förutbetalda:Kostnader": "1790",
+    "Liabilities:Leverantörsskulder": "2440",
+    "Liabilities:Skatteskulder:Moms": "2650",
+    "Liabilities:Skatteskulder:Preliminärskatt": "2510",
+    "Equity:Ingående:Balans": "2010",
+    "Equity:Årets:Resultat": "2099",
+    "Income:Konsulttjänster": "3041",
+    "Income:Övrigt": "3990",
+    "Income:Valutakursvinster": "3960",
+    "Income": "3990",
+    "Expenses:Kontorsmaterial": "6110",
+    "Expenses:Representation": "6071",
+    "Expenses:Resor": "5800",
+    "Expenses:Travel": "5800",
+    "Expenses:Telefon:Internet": "6230",
+    "Expenses:Programvara": "5420",
+    "Expenses:Bankkostnader": "6570",
+    "Expenses:Banking": "6570",
+    "Expenses:Bokföring:Revision": "6530",
+    "Expenses:Food": "6071",
+    "Expenses:Valutakursförluster": "7960",
+    "Expenses": "6990",
+}
+
+# Ackumulerat resultat från tidigare år redovisas som balanserat resultat
+RETAINED_EARNINGS = "2091"
+
+
+class SIEExportError(Exception):
+    """Fel vid SIE-export"""
+
+
+def account_type(bas: str) -> str:
+    """#KTYP för ett BAS-konto: T, S, I eller K"""
+    return {"1": "T", "2": "S", "3": "I"}.get(bas[0], "K")
+
+
+def is_balance_account(bas: str) -> bool:
+    return bas[0] in "12"
+
+
+def sie_quote(text: str) -> str:
+    return '"' + (text or "").replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def format_amount(amount: Decimal) -> str:
+    return f"{amount.quantize(CENT)}"
+
+
+class SIEExporter:
+    """Strömmande SIE4-export med en fil per räkenskapsår"""
+
+    def __init__(
+        self,
+        company_name: str,
+        org_number: str = "",
+        currency: str = "SEK",
+        account_map: Optional[Dict[str, str]] = None,
+        price_map=None,
+        fx_gain_account: str = "Income:Valutakursvinster",
+        fx_loss_account: str = "Expenses:Valutakursförluster",
+    ):
+        """
+        Args:
+            company_name: Företagsnamn (#FNAMN)
+            org_number: Organisationsnummer (#ORGNR)
+            currency: Redovisningsvaluta
+            account_map: Beancount-konto -> BAS-nummer (standard: BAS_ACCOUNTS)
+            price_map: Beancount-prismap för omräkning av utländsk valuta
+            fx_gain_account: Konto för kursdifferens som är en vinst
+            fx_loss_account: Konto för kursdifferens som är en förlust
+        """
+        self.company_name = company_name
+        self.org_number = org_number
+        self.currency = currency
+        self.account_map = dict(BAS_ACCOUNTS if account_map is None else account_map)
+        self.price_map = price_map
+        self.fx_gain_account = fx_gain_account
+        self.fx_loss_account = fx_loss_account
+        self._bas_cache: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+
+    def bas_account(self, account: str) -> str:
+        """BAS-nummer för ett Beancount-konto"""
+        bas = self._bas_cache.get(account)
+        if bas:
+            return bas
+        parts = account.split(":")
+        for i in range(len(parts), 0, -1):
+            bas = self.account_map.get(":".join(parts[:i]))
+            if bas:
+                break
+        else:
+            raise SIEExportError(
+                f"Konto saknar BAS-nummer: {account} - lägg till metadata bas: på open-direktivet"
+            )
+        self._bas_cache[account] = bas
+        self._names.setdefault(bas, parts[-1])
+        return bas
+
+    def _register_open(self, entry: data.Open):
+        bas = entry.meta.get("bas")
+        if bas:
+            self._bas_cache[entry.account] = str(bas)
+            self._names.setdefault(str(bas), entry.account.split(":")[-1])
+
+    def _sek_amount(self, entry: data.Transaction, posting: data.Posting) -> Decimal:
+        weight = convert.get_weight(posting)
+        if weight.currency == self.currency:
+            return weight.number
+        if self.price_map is not None:
+            converted = convert.convert_amount(weight, self.currency, self.price_map, entry.date)
+            if converted.currency == self.currency:
+                return converted.number
+        raise SIEExportError(
+            f"{entry.date} \"{entry.narration}\": saknar kurs {weight.currency}/{self.currency}"
+        )
+
+    def export(
+        self,
+        entries: Iterable,
+        output_dir: Path,
+        years: Optional[Iterable[int]] = None,
+    ) -> List[Path]:
+        """
+        Exportera verifikationer till en SIE4-fil per räkenskapsår
+
+        Args:
+            entries: Beancount-direktiv i datumordning
+            output_dir: Katalog för SIE-filerna
+            years: Räkenskapsår att skriva ut (None = alla)
+
+        Returns:
+            Skrivna filer
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        wanted = set(years) if years is not None else None
+
+        movements: Dict[int, Dict[str, Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+        ver_files: Dict[int, TextIO] = {}
+        ver_numbers: Dict[int, int] = defaultdict(int)
+
+        try:
+            for entry in entries:
+                if isinstance(entry, data.Open):
+                    self._register_open(entry)
+                    continue
+                if not isinstance(entry, data.Transaction):
+                    continue
+
+                year = entry.date.year
+                rows = self._rows(entry)
+                lines = []
+                for bas, amount in rows:
+                    movements[year][bas] += amount
+                    lines.append(f"   #TRANS {bas} {{}} {format_amount(amount)}\n")
+
+                if wanted is not None and year not in wanted:
+                    continue
+                out = ver_files.get(year)
+                if out is None:
+                    out = tempfile.TemporaryFile(mode="w+", encoding=SIE_ENCODING, errors="replace")
+                    ver_files[year] = out
+                ver_numbers[year] += 1
+                text = " - ".join(part for part in (entry.payee, entry.narration) if part)
+                out.write(
+                    f"#VER A {ver_numbers[year]} {entry.date:%Y%m%d} {sie_quote(text)}\n{{\n"
+                )
+                out.writelines(lines)
+                out.write("}\n")
+
+            written = []
+            for year in sorted(ver_files):
+                path = output_dir / f"{self._file_stem()}_{year}.se"
+                self._write_year(path, year, movements, ver_files[year])
+                written.append(path)
+                logger.info(f"SIE-export {year}: {ver_numbers[year]} verifikationer till {path}")
+            return written
+        finally:
+            for out in ver_files.values():
+                out.close()
+
+    def _rows(self, entry: data.Transaction) -> List[Tuple[str, Decimal]]:
+        """
+        (BAS-konto, belopp i ören) per postering
+
+        Avrundningsdifferensen (högst ett öre per rad) läggs på sista raden,
+        en större kursdifferens på en egen rad för valutakursvinst/-förlust.
+        """
+        rows = [
+            (self.bas_account(posting.account), self._sek_amount(entry, posting).quantize(CENT))
+            for posting in entry.postings
+        ]
+        residual = -sum(amount for _bas, amount in rows)
+        if not residual:
+            return rows
+        if abs(residual) <= CENT * len(rows):
+            bas, amount = rows[-1]
+            rows[-1] = (bas, amount + residual)
+        else:
+            account = self.fx_loss_account if residual > 0 else self.fx_gain_account
+            logger.info(f"{entry.date} \"{entry.narration}\": kursdifferens {residual} bokas på {account}")
+            rows.append((self.bas_account(account), residual))
+        return rows
+
+    def _file_stem(self) -> str:
+        return self.org_number.replace("-", "") or "sie"
+
+    def _opening_balances(self, year: int, movements: Dict[int, Dict[str, Decimal]]) -> Dict[str, Decimal]:
+        """#IB: balanskonton ackumulerade före året, tidigare resultat som balanserat resultat"""
+        balances: Dict[str, Decimal] = defaultdict(Decimal)
+        for previous, accounts in movements.items():
+            if previous >= year:
+                continue
+            for bas, amount in accounts.items():
+                balances[bas if is_balance_account(bas) else RETAINED_EARNINGS] += amount
+        return balances
+
+    def _write_year(self, path: Path, year: int, movements, ver_file: TextIO):
+        years = [year] + ([year - 1] if year - 1 in movements else [])
+
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding=SIE_ENCODING, errors="replace", newline="\r\n") as out:
+            self._write_header(out, years)
+            self._write_accounts(out, years, movements)
+            for index, rar_year in enumerate(years):
+                self._write_balances(out, -index, rar_year, movements)
+            ver_file.seek(0)
+            shutil.copyfileobj(ver_file, out)
+        tmp_path.replace(path)
+
+    def _write_header(self, out: TextIO, years: List[int]):
+        out.write("#FLAGGA 0\n")
+        out.write("#FORMAT PC8\n")
+        out.write("#SIETYP 4\n")
+        out.write('#PROGRAM "Efficra Accounting" 1.0\n')
+        out.write(f"#GEN {date.today():%Y%m%d}\n")
+        out.write(f"#FNAMN {sie_quote(self.company_name)}\n")
+        if self.org_number:
+            out.write(f"#ORGNR {self.org_number}\n")
+        out.write(f"#VALUTA {self.currency}\n")
+        for index, rar_year in enumerate(years):
+            out.write(f"#RAR {-index} {rar_year}0101 {rar_year}1231\n")
+
+    def _write_accounts(self, out: TextIO, years: List[int], movements):
+        """#KONTO och #KTYP för alla konton som används under åren"""
+        names = dict(self._names)
+        names.setdefault(RETAINED_EARNINGS, "Balanserat resultat")
+        used = set()
+        for rar_year in years:
+            used.update(movements[rar_year])
+            used.update(self._opening_balances(rar_year, movements))
+        for bas in sorted(used):
+            out.write(f"#KONTO {bas} {sie_quote(names.get(bas, bas))}\n")
+            out.write(f"#KTYP {bas} {account_type(bas)}\n")
+
+    def _write_balances(self, out: TextIO, index: int, rar_year: int, movements):
+        """#IB, #UB och #RES för ett räkenskapsår (index 0 = aktuellt, -1 = föregående)"""
+        opening = self._opening_balances(rar_year, movements)
+        closing = defaultdict(Decimal, opening)
+        for bas, amount in movements[rar_year].items():
+            if is_balance_account(bas):
+                closing[bas] += amount
+        for bas in sorted(opening):
+            if opening[bas]:
+                out.write(f"#IB {index} {bas} {format_amount(opening[bas])}\n")
+        for bas in sorted(closing):
+            if closing[bas]:
+                out.write(f"#UB {index} {bas} {format_amount(closing[bas])}\n")
+        for bas, amount in sorted(movements[rar_year].items()):
+            if not is_balance_account(bas) and amount:
+                out.write(f"#RES {index} {bas} {format_amount(amount)}\n")
+
+
+def export_ledger(
+    ledger_path: Path,
+    output_dir: Path,
+    years: Optional[Iterable[int]] = None,
+    config: Optional[Config] = None,
+) -> List[Path]:
+    """Läs huvudboken och exportera SIE4-filer (företagsuppgifter från config)"""
+    config = config or default_config
+    entries, errors, options_map = loader.load_file(str(ledger_path))
+    if errors:
+        logger.warning(f"{len(errors)} fel vid inläsning av {ledger_path}")
+    exporter = SIEExporter(
+        company_name=config.COMPANY_NAME,
+        org_number=config.ORG_NUMBER,
+        currency=options_map["operating_currency"][0] if options_map["operating_currency"] else config.CURRENCY,
+        price_map=prices.build_price_map(entries),
+        fx_gain_account=config.FX_GAIN_ACCOUNT,
+        fx_loss_account=config.FX_LOSS_ACCOUNT,
+    )
+    return exporter.export(entries, output_dir, years)
+
+
+def main(config: Optional[Config] = None):
+    """
+    Huvudprogram
+
+    Args:
+        config: Inställningar (default: den globala config)
+    """
+    config = config or default_config
+    parser = argparse.ArgumentParser(description="SIE4-export av huvudboken")
+    parser.add_argument(
+        "--year",
+        type=int,
+        action="append",
+        help="Räkenskapsår att exportera (kan anges flera gånger, standard: alla)"
+    )
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        default=config.MAIN_LEDGER,
+        help=f"Huvudbokens fil (standard: {config.MAIN_LEDGER})"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=config.SIE_EXPORT_DIR,
+        help=f"Katalog för SIE-filer (standard: {config.SIE_EXPORT_DIR})"
+    )
+    args = parser.parse_args()
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    try:
+        paths = export_ledger(args.ledger, args.output_dir, args.year, config=config)
+    except SIEExportError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+
+    for path in paths:
+        print(f"✅ {path}")
+
+
+if __name__ == "__main__":
+    main()
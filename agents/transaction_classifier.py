@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Kontoklassificering av banktransaktioner tränad på huvudboken
+
+Multinomial naive Bayes över hashade ord-features (handlare, beskrivning,
+referens, transaktionstyp och beloppsintervall), vektoriserad med NumPy.
+Modellen lagrar råa frekvenser per konto så att den kan tränas vidare
+inkrementellt med nya posteringar; IDF-viktningen räknas fram från aktuell
+dokumentfrekvens vid prediktion. Modellen sparas med numpy.savez.
+
+Träningsexempel är transaktioner i huvudboken med exakt ett intäkts- eller
+kostnadskonto (utom Expenses:Unknown och bankavgifter).
+"""
+
+import argparse
+import hashlib
+import logging
+import math
+import re
+import sys
+import zlib
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.config import Config, config as default_config
+from agents.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2**16
+
+# Konton som aldrig används som träningsetikett
+IGNORED_LABELS = ("Expenses:Unknown", "Expenses:Banking:Fees")
+
+_WORD = re.compile(r"[^\W_]{2,}")
+
+
+def amount_band(amount: Optional[Decimal]) -> str:
+    """Beloppsintervall: tecken och tvåpotens, t.ex. -2^7 för -150"""
+    if amount is None or amount == 0:
+        return "0"
+    sign = "-" if amount < 0 else "+"
+    return f"{sign}2^{int(math.log2(abs(float(amount))))}"
+
+
+def tokenize(
+    texts: Iterable[Optional[str]], amount: Optional[Decimal] = None, tags: Iterable[str] = ()
+) -> List[str]:
+    """Features för en transaktion"""
+    tokens = ["__bias__", f"amt:{amount_band(amount)}"]
+    tokens += [f"tag:{tag}" for tag in tags]
+    for text in texts:
+        if text:
+            words = _WORD.findall(text.lower())
+            tokens += words
+            tokens += [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    return tokens
+
+
+def revolut_tokens(transaction: Dict) -> List[str]:
+    """Features för en Revolut-transaktion (samma som transaction_to_beancount skriver)"""
+    legs = transaction.get("legs") or [{}]
+    leg = legs[0]
+    merchant = (transaction.get("merchant") or {}).get("name")
+    amount = Decimal(str(leg["amount"])) if leg.get("amount") is not None else None
+    tx_type = transaction.get("type", "")
+    return tokenize(
+        [leg.get("description"), merchant, transaction.get("reference")],
+        amount,
+        [tx_type.lower().replace("_", "-")] if tx_type else [],
+    )
+
+
+def ledger_example(entry) -> Optional[Tuple[List[str], str]]:
+    """(features, konto) för en Beancount-transaktion, eller None om den inte är ett exempel"""
+    labels = [
+        posting for posting in entry.postings
+        if posting.account.startswith(("Expenses:", "Income:")) and posting.account not in IGNORED_LABELS
+    ]
+    if len(labels) != 1 or labels[0].units is None:
+        return None
+    label = labels[0]
+    tokens = tokenize(
+        [entry.narration, entry.payee, entry.meta.get("merchant"), entry.meta.get("reference")],
+        -label.units.number,
+        sorted(entry.tags or ()),
+    )
+    return tokens, label.account
+
+
+def _entry_key(entry) -> int:
+    parts = [str(entry.date), entry.payee or "", entry.narration or ""]
+    parts += [f"{p.account}|{p.units}" for p in entry.postings]
+    digest = hashlib.sha1("\n".join(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+class TransactionClassifier:
+    """Hashad TF-IDF + multinomial naive Bayes"""
+
+    def __init__(self, n_features: int = N_FEATURES, alpha: float = 0.1):
+        """
+        Args:
+            n_features: Antal hash-hinkar
+            alpha: Laplace-utjämning
+        """
+        self.n_features = n_features
+        self.alpha = alpha
+        self.classes: List[str] = []
+        self.class_counts = np.zeros((0, n_features), dtype=np.float64)
+        self.class_docs = np.zeros(0, dtype=np.int64)
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.seen = np.zeros(0, dtype=np.uint64)
+        self._weights: Optional[np.ndarray] = None
+
+    # -- Features ---------------------------------------------------------
+
+    def _hash(self, tokens: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Unika hash-index och sublinjär termfrekvens för ett dokument"""
+        indices = np.fromiter(
+            (zlib.crc32(token.encode("utf-8")) % self.n_features for token in tokens),
+            dtype=np.int64,
+            count=len(tokens),
+        )
+        unique, counts = np.unique(indices, return_counts=True)
+        return unique, 1.0 + np.log(counts)
+
+    def _csr(self, documents: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Gles matris (indptr, index, tf) för en batch"""
+        indptr = [0]
+        all_indices, all_tf = [], []
+        for tokens in documents:
+            indices, tf = self._hash(tokens)
+            all_indices.append(indices)
+            all_tf.append(tf)
+            indptr.append(indptr[-1] + len(indices))
+        if not all_indices:
+            return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.array(indptr), np.concatenate(all_indices), np.concatenate(all_tf)
+
+    # -- Träning ----------------------------------------------------------
+
+    def _class_index(self, label: str) -> int:
+        try:
+            return self.classes.index(label)
+        except ValueError:
+            self.classes.append(label)
+            self.class_counts = np.vstack([self.class_counts, np.zeros((1, self.n_features))])
+            self.class_docs = np.append(self.class_docs, 0)
+            return len(self.classes) - 1
+
+    def partial_fit(self, documents: Sequence[Sequence[str]], labels: Sequence[str]):
+        """Träna vidare med nya exempel"""
+        if not documents:
+            return
+        indptr, indices, tf = self._csr(documents)
+        label_ids = np.array([self._class_index(label) for label in labels])
+        rows = np.repeat(label_ids, np.diff(indptr))
+
+        np.add.at(self.class_counts, (rows, indices), tf)
+        np.add.at(self.class_docs, label_ids, 1)
+        np.add.at(self.doc_freq, indices, 1)
+        self.n_docs += len(documents)
+        self._weights = None
+
+    def fit_entries(self, entries: Iterable) -> int:
+        """
+        Träna på Beancount-transaktioner som modellen inte sett tidigare
+
+        Returns:
+            Antal nya träningsexempel
+        """
+        seen = set(self.seen.tolist())
+        documents, labels, keys = [], [], []
+        for entry in entries:
+            if not hasattr(entry, "postings"):
+                continue
+            key = _entry_key(entry)
+            if key in seen:
+                continue
+            example = ledger_example(entry)
+            if example is None:
+                continue
+            seen.add(key)
+            keys.append(key)
+            documents.append(example[0])
+            labels.append(example[1])
+
+        self.partial_fit(documents, labels)
+        self.seen = np.concatenate([self.seen, np.array(keys, dtype=np.uint64)])
+        return len(documents)
+
+    # -- Prediktion -------------------------------------------------------
+
+    def _log_weights(self) -> np.ndarray:
+        if self._weights is None:
+            smoothed = self.class_counts + self.alpha
+            self._weights = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        return self._weights
+
+    def predict(self, documents: Sequence[Sequence[str]]) -> List[Tuple[Optional[str], float]]:
+        """
+        Klassificera en batch
+
+        Returns:
+            (konto, sannolikhet) per dokument; (None, 0.0) om modellen är otränad
+        """
+        if not self.classes or not documents:
+            return [(None, 0.0)] * len(documents)
+
+        indptr, indices, tf = self._csr(documents)
+        idf = np.log((1 + self.n_docs) / (1 + self.doc_freq[indices])) + 1.0
+        weighted = self._log_weights()[:, indices] * (tf * idf)
+
+        # Varje dokument har minst en feature (__bias__), så reduceat är säker
+        scores = np.add.reduceat(weighted, indptr[:-1], axis=1)
+        scores += np.log(self.class_docs / self.class_docs.sum())[:, None]
+
+        scores -= scores.max(axis=0)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=0)
+        best = probabilities.argmax(axis=0)
+        return [
+            (self.classes[c], float(probabilities[c, i])) for i, c in enumerate(best)
+        ]
+
+    # -- Persistens -------------------------------------------------------
+
+    def save(self, path: Path):
+        """Spara modellen (atomiskt)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                n_features=self.n_features,
+                alpha=self.alpha,
+                classes=np.array(self.classes, dtype=str),
+                class_counts=self.class_counts,
+                class_docs=self.class_docs,
+                doc_freq=self.doc_freq,
+                n_docs=self.n_docs,
+                seen=self.seen,
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "TransactionClassifier":
+        """Ladda en sparad modell"""
+        with np.load(path) as saved:
+            model = cls(n_features=int(saved["n_features"]), alpha=float(saved["alpha"]))
+            model.classes = [str(c) for c in saved["classes"]]
+            model.class_counts = saved["class_counts"]
+            model.class_docs = saved["class_docs"]
+            model.doc_freq = saved["doc_freq"]
+            model.n_docs = int(saved["n_docs"])
+            model.seen = saved["seen"]
+        return model
+
+
+def load_classifier(path: Path) -> Optional[TransactionClassifier]:
+    """Ladda modellen om den finns, annars None"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        return TransactionClassifier.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Kunde inte ladda klassificerare {path}: {e}")
+        return None
+
+
+def main(config: Optional[Config] = None):
+    """
+    Huvudprogram
+
+    Args:
+        config: Inställningar (default: den globala config)
+    """
+    config = config or default_config
+    parser = argparse.ArgumentParser(
+        description="Träna kontoklassificeraren på huvudbokens transaktioner"
+    )
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        default=config.MAIN_LEDGER,
+        help=f"Huvudbokens fil (standard: {config.MAIN_LEDGER})"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Träna om från början istället för inkrementellt"
+    )
+    args = parser.parse_args()
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    from beancount import loader
+
+    entries, errors, _options = loader.load_file(str(args.ledger))
+    if errors:
+        logger.warning(f"{len(errors)} fel vid inläsning av {args.ledger}")
+
+    model = None if args.full else load_classifier(config.CLASSIFIER_MODEL)
+    model = model or TransactionClassifier()
+    added = model.fit_entries(entries)
+    model.save(config.CLASSIFIER_MODEL)
+
+    print(f"✅ {added} nya exempel, {model.n_docs} totalt, {len(model.classes)} konton")
+    print(f"   Sparad till {config.CLASSIFIER_MODEL}")
+
+
+if __name__ == "__main__":
+    main()
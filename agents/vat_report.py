@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Momsdeklaration från Beancount-huvudboken
+
+Summerar utgående och ingående moms per redovisningsperiod och per ruta i
+Skatteverkets momsdeklaration (05, 10-12, 48, 49, ...).
+
+Aggregaten cachas per källfil och period tillsammans med ett fingeravtryck
+av periodens transaktioner. Om ingen av huvudbokens filer ändrats returneras
+cachen utan att huvudboken läses in; annars läses bara ändrade filer om och
+bara de perioder vars transaktioner ändrats räknas om (se ledger_partitions).
+
+Regler:
+- En negativ postering på momskontot är utgående moms. Momssatsen härleds
+  ur förhållandet mot intäktsposteringarna (25/12/6 % -> ruta 10/11/12)
+  och intäkterna redovisas i ruta 05.
+- En positiv postering på momskontot är ingående moms (ruta 48).
+- Metadata `vat_box` på en postering styr den posteringen till angiven ruta.
+  På transaktionen styr den intäkternas ruta (t.ex. "39" för tjänsteexport).
+- Transaktioner utan intäkts- eller kostnadskonton (t.ex. betalning av
+  momsskulden till skattekontot) räknas inte.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from collections import defaultdict
+from datetime import date
+from decimal import ROUND_DOWN, Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# Lägg till parent directory till path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from beancount.core import convert, data
+
+from agents.config import Config, config as default_config
+from agents.ledger_partitions import PartitionedLedger
+from agents.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+
+VAT_BOXES = {
+    "05": "Momspliktig försäljning som inte ingår i ruta 06, 07 eller 08",
+    "06": "Momspliktiga uttag",
+    "07": "Beskattningsunderlag vid vinstmarginalbeskattning",
+    "08": "Hyresinkomster vid frivillig skattskyldighet",
+    "10": "Utgående moms 25 %",
+    "11": "Utgående moms 12 %",
+    "12": "Utgående moms 6 %",
+    "20": "Inköp av varor från annat EU-land",
+    "21": "Inköp av tjänster från annat EU-land",
+    "22": "Inköp av tjänster från land utanför EU",
+    "23": "Inköp av varor i Sverige (omvänd skattskyldighet)",
+    "24": "Övriga inköp av tjänster (omvänd skattskyldighet)",
+    "30": "Utgående moms 25 % på inköp",
+    "31": "Utgående moms 12 % på inköp",
+    "32": "Utgående moms 6 % på inköp",
+    "35": "Försäljning av varor till annat EU-land",
+    "36": "Försäljning av varor utanför EU",
+    "39": "Försäljning av tjänster till näringsidkare i annat EU-land",
+    "40": "Övrig försäljning av tjänster omsatta utomlands",
+    "42": "Övrig försäljning m.m.",
+    "48": "Ingående moms att dra av",
+    "49": "Moms att betala eller få tillbaka",
+}
+
+# Rutor där debet räknas positivt - övriga rutor räknar kredit positivt
+DEBIT_BOXES = {"20", "21", "22", "23", "24", "48"}
+
+# Rutor som ingår i utgående moms för ruta 49
+OUTPUT_VAT_BOXES = ("10", "11", "12", "30", "31", "32", "60", "61", "62")
+
+OUTPUT_VAT_BOX_BY_RATE = {25: "10", 12: "11", 6: "12"}
+
+FREQUENCIES = ("monthly", "quarterly", "yearly")
+
+
+def period_key(day: date, frequency: str = "monthly") -> str:
+    """Redovisningsperiod för ett datum: 2025-01, 2025-Q1 eller 2025"""
+    if frequency == "monthly":
+        return f"{day.year}-{day.month:02d}"
+    if frequency == "quarterly":
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    if frequency == "yearly":
+        return str(day.year)
+    raise ValueError(f"Okänd redovisningsperiod: {frequency}")
+
+
+def entry_fingerprint(entry: data.Transaction) -> str:
+    """Billigt, stabilt fingeravtryck av det som påverkar momsen"""
+    parts = [str(entry.date), entry.flag or "", entry.payee or "", entry.narration or "",
+             str(entry.meta.get("vat_box", ""))]
+    for posting in entry.postings:
+        parts.append(
+            f"{posting.account}|{posting.units}|{posting.cost}|{posting.price}|"
+            f"{(posting.meta or {}).get('vat_box', '')}"
+        )
+    return "\n".join(parts)
+
+
+def _signed(box: str, number: Decimal) -> Decimal:
+    return number if box in DEBIT_BOXES else -number
+
+
+def _affects_vat(entry: data.Transaction) -> bool:
+    """Har transaktionen intäkter, kostnader eller uttryckliga momsrutor?"""
+    return any(
+        p.account.startswith(("Income:", "Expenses:")) or (p.meta or {}).get("vat_box")
+        for p in entry.postings
+    )
+
+
+def _output_vat_box(entry: data.Transaction, output_vat: Decimal, income: Decimal) -> str:
+    """Ruta för utgående moms (10, 11 eller 12) utifrån momssatsen"""
+    rate = round(output_vat / income * 100) if income else None
+    box = OUTPUT_VAT_BOX_BY_RATE.get(rate)
+    if box is None:
+        logger.warning(
+            f"{entry.date} \"{entry.narration}\": kan inte härleda momssats "
+            f"(moms {output_vat}, intäkt {income}) - redovisas i ruta 10"
+        )
+        box = "10"
+    return box
+
+
+def transaction_boxes(entry: data.Transaction, vat_account: str) -> Dict[str, Decimal]:
+    """Momsrutor som en transaktion bidrar till"""
+    if not _affects_vat(entry):
+        return {}
+
+    boxes: Dict[str, Decimal] = defaultdict(Decimal)
+    income = Decimal(0)
+    output_vat = Decimal(0)
+    income_postings = []
+
+    for posting in entry.postings:
+        number = convert.get_weight(posting).number
+        box = (posting.meta or {}).get("vat_box")
+        if box:
+            boxes[str(box)] += _signed(str(box), number)
+        elif posting.account == vat_account:
+            if number < 0:
+                output_vat += -number
+            else:
+                boxes["48"] += number
+        elif posting.account.startswith("Income:"):
+            income += -number
+            income_postings.append(number)
+
+    if output_vat:
+        boxes[_output_vat_box(entry, output_vat, income)] += output_vat
+
+    income_box = entry.meta.get("vat_box")
+    if income_postings and (output_vat or income_box):
+        income_box = str(income_box or "05")
+        for number in income_postings:
+            boxes[income_box] += _signed(income_box, number)
+
+    return {box: amount for box, amount in boxes.items() if amount}
+
+
+def vat_to_pay(boxes: Dict[str, Decimal]) -> Decimal:
+    """Ruta 49: utgående moms minus ingående moms"""
+    return sum((boxes.get(box, Decimal(0)) for box in OUTPUT_VAT_BOXES), Decimal(0)) - boxes.get("48", Decimal(0))
+
+
+def aggregate(entries: Iterable[data.Transaction], vat_account: str) -> Dict[str, Decimal]:
+    """Summera momsrutor för en mängd transaktioner, inklusive ruta 49"""
+    boxes: Dict[str, Decimal] = defaultdict(Decimal)
+    for entry in entries:
+        for box, amount in transaction_boxes(entry, vat_account).items():
+            boxes[box] += amount
+    boxes["49"] = vat_to_pay(boxes)
+    return dict(sorted(boxes.items()))
+
+
+class VATReport(PartitionedLedger):
+    """
+    Inkrementell momsrapport med cache per källfil och period
+
+    Cachen håller momsrutor per (fil, period). Vilka filer som läses om
+    avgörs av PartitionedLedger, och endast perioder vars transaktioner
+    ändrats räknas om.
+    """
+
+    label = "Momsrapport"
+
+    def __init__(
+        self,
+        ledger_path: Path,
+        vat_account: str = "Liabilities:Skatteskulder:Moms",
+        frequency: str = "monthly",
+        cache_path: Optional[Path] = None,
+    ):
+        """
+        Args:
+            ledger_path: Huvudbokens huvudfil
+            vat_account: Momskontot i Beancount
+            frequency: "monthly", "quarterly" eller "yearly"
+            cache_path: JSON-fil för periodcachen (None = ingen cache)
+        """
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Okänd redovisningsperiod: {frequency}")
+        super().__init__(ledger_path)
+        self.vat_account = vat_account
+        self.frequency = frequency
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.recomputed: List[str] = []
+
+    def _settings(self) -> Dict:
+        return {
+            "version": CACHE_VERSION,
+            "ledger": str(self.ledger_path),
+            "vat_account": self.vat_account,
+            "frequency": self.frequency,
+        }
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        if not self.cache_path or not self.cache_path.exists():
+            return {}
+        try:
+            cache = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ogiltig momscache {self.cache_path}: {e}")
+            return {}
+        return cache.get("files", {}) if cache.get("settings") == self._settings() else {}
+
+    def _save_cache(self, files: Dict[str, Dict]):
+        if not self.cache_path:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps({"settings": self._settings(), "files": files}, indent=1),
+            encoding="utf-8",
+        )
+        tmp_path.replace(self.cache_path)
+
+    def _build(self, path: str, entries: List, previous: Dict) -> Dict:
+        """Momsrutor per period för en källfil, återanvänder oförändrade perioder"""
+        cached = previous.get("periods", {})
+        by_period: Dict[str, List[data.Transaction]] = defaultdict(list)
+        digests = {}
+        for entry in entries:
+            if not isinstance(entry, data.Transaction):
+                continue
+            key = period_key(entry.date, self.frequency)
+            by_period[key].append(entry)
+            if key not in digests:
+                digests[key] = hashlib.sha256()
+            digests[key].update(entry_fingerprint(entry).encode("utf-8"))
+            digests[key].update(b"\0")
+
+        periods = {}
+        for key, period_entries in by_period.items():
+            fingerprint = digests[key].hexdigest()
+            cached_period = cached.get(key)
+            if cached_period and cached_period["fingerprint"] == fingerprint:
+                periods[key] = cached_period
+                continue
+            boxes = aggregate(period_entries, self.vat_account)
+            boxes.pop("49")
+            periods[key] = {
+                "fingerprint": fingerprint,
+                "boxes": {box: str(amount) for box, amount in boxes.items()},
+            }
+            self.recomputed.append(key)
+
+        # Perioder som försvunnit ur filen har också ändrats
+        self.recomputed.extend(key for key in cached if key not in periods)
+        return {"periods": periods}
+
+    def _discard(self, path: str, info: Dict):
+        self.recomputed.extend(info["periods"])
+
+    def periods(self) -> Dict[str, Dict[str, Decimal]]:
+        """Momsrutor för alla perioder i huvudboken"""
+        self.recomputed = []
+        files, refreshed = self.refresh(self._load_cache())
+
+        if refreshed:
+            self.recomputed = sorted(set(self.recomputed))
+            if self.recomputed:
+                logger.info(f"Momsrapport: räknade om {len(self.recomputed)} perioder")
+            self._save_cache(files)
+
+        return self._combine(files)
+
+    @staticmethod
+    def _combine(files: Dict[str, Dict]) -> Dict[str, Dict[str, Decimal]]:
+        """Summera filernas periodrutor och beräkna ruta 49"""
+        combined: Dict[str, Dict[str, Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+        for info in files.values():
+            for key, period in info["periods"].items():
+                boxes = combined[key]
+                for box, amount in period["boxes"].items():
+                    boxes[box] += Decimal(amount)
+
+        result = {}
+        for key in sorted(combined):
+            boxes = combined[key]
+            boxes["49"] = vat_to_pay(boxes)
+            result[key] = dict(sorted(boxes.items()))
+        return result
+
+    def declaration(self, period: str) -> Dict[str, Decimal]:
+        """
+        Momsdeklaration för en period i hela kronor (ören stryks)
+
+        Ruta 49 beräknas från de avrundade rutorna, som på blanketten.
+        """
+        boxes = self.periods().get(period, {})
+        whole = {
+            box: amount.quantize(Decimal(1), rounding=ROUND_DOWN)
+            for box, amount in boxes.items() if box != "49"
+        }
+        whole["49"] = vat_to_pay(whole)
+        return dict(sorted(whole.items()))
+
+
+def previous_period(today: date, frequency: str) -> str:
+    """Senast avslutade redovisningsperiod"""
+    if frequency == "monthly":
+        year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        return period_key(date(year, month, 1), frequency)
+    if frequency == "quarterly":
+        quarter = (today.month - 1) // 3
+        return f"{today.year}-Q{quarter}" if quarter else f"{today.year - 1}-Q4"
+    return str(today.year - 1)
+
+
+def main(config: Optional[Config] = None):
+    """
+    Huvudprogram
+
+    Args:
+        config: Inställningar (default: den globala config)
+    """
+    config = config or default_config
+    parser = argparse.ArgumentParser(description="Momsdeklaration från huvudboken")
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        default=config.MAIN_LEDGER,
+        help=f"Huvudbokens fil (standard: {config.MAIN_LEDGER})"
+    )
+    parser.add_argument(
+        "--period",
+        help="Period, t.ex. 2025-01, 2025-Q1 eller 2025 (standard: senast avslutade)"
+    )
+    parser.add_argument(
+        "--frequency",
+        choices=FREQUENCIES,
+        default=config.VAT_PERIOD,
+        help=f"Redovisningsperiod (standard: {config.VAT_PERIOD})"
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Skriv ut deklarationen som JSON"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Räkna om alla perioder utan cache"
+    )
+    args = parser.parse_args()
+
+    setup_logging(config, log_file=config.LOG_FILE)
+
+    report = VATReport(
+        args.ledger,
+        vat_account=config.VAT_ACCOUNT,
+        frequency=args.frequency,
+        cache_path=None if args.no_cache else config.VAT_CACHE_FILE,
+    )
+    period = args.period or previous_period(date.today(), args.frequency)
+    declaration = report.declaration(period)
+
+    if args.json:
+        print(json.dumps({"period": period, "boxes": {k: str(v) for k, v in declaration.items()}}, indent=2))
+        return
+
+    print(f"\nMomsdeklaration {period} ({config.COMPANY_NAME})\n")
+    for box, amount in declaration.items():
+        print(f"  {box}  {VAT_BOXES.get(box, ''):<62} {amount:>12}")
+
+
+if __name__ == "__main__":
+    main()
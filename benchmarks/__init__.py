@@ -0,0 +1,6 @@
+"""
+Prestandatester för Efficra Accounting System
+
+Körs separat från testsviten:
+    pytest benchmarks/ --bench-json benchmarks/results/latest.json
+"""
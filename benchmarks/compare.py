@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Jämför två körningar av prestandatesterna
+
+    python benchmarks/compare.py benchmarks/results/baseline.json benchmarks/results/latest.json
+
+Jämför medianen per test och avslutar med kod 1 om något test blivit
+långsammare än tröskeln (standard 20 %).
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+def load_results(path: Path) -> Tuple[Dict, Dict[str, Dict]]:
+    """(metadata, resultat per testnamn) från en JSON-fil"""
+    content = json.loads(Path(path).read_text(encoding="utf-8"))
+    results = {result["name"]: result for result in content.get("benchmarks", [])}
+    return content.get("metadata", {}), results
+
+
+def compare(
+    baseline: Dict[str, Dict], current: Dict[str, Dict], threshold: float = 0.2
+) -> List[Tuple[str, float, float, float, bool]]:
+    """
+    Jämför medianer för tester som finns i båda körningarna
+
+    Returns:
+        (test, median före, median efter, kvot, regression) per test
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        before = baseline[name].get("stats", {}).get("median")
+        after = current[name].get("stats", {}).get("median")
+        if not before or after is None:
+            continue
+        ratio = after / before
+        rows.append((name, before, after, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def _describe(metadata: Dict) -> str:
+    if not metadata:
+        return "(okänd körning)"
+    commit = metadata.get("commit", "")[:10] or "?"
+    dirty = " (ändrad)" if metadata.get("dirty") else ""
+    return f"{commit}{dirty} {metadata.get('timestamp', '')} {metadata.get('machine', '')}"
+
+
+def main():
+    """Huvudprogram"""
+    parser = argparse.ArgumentParser(description="Jämför två körningar av prestandatesterna")
+    parser.add_argument("baseline", type=Path, help="JSON-resultat att jämföra mot")
+    parser.add_argument("current", type=Path, help="JSON-resultat från aktuell körning")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Tillåten försämring av medianen innan testet räknas som regression (standard: 0.2)"
+    )
+    args = parser.parse_args()
+
+    baseline_meta, baseline = load_results(args.baseline)
+    current_meta, current = load_results(args.current)
+    print(f"Före:  {_describe(baseline_meta)}")
+    print(f"Efter: {_describe(current_meta)}\n")
+
+    rows = compare(baseline, current, args.threshold)
+    width = max((len(name) for name, *_rest in rows), default=10)
+    for name, before, after, ratio, regression in rows:
+        marker = "  ⚠️  regression" if regression else ""
+        print(f"{name:<{width}}  {before * 1000:>10.2f} ms  {after * 1000:>10.2f} ms  {ratio:>6.2f}x{marker}")
+
+    for name in sorted(set(current) - set(baseline)):
+        print(f"{name:<{width}}  (nytt test)")
+
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} tester långsammare än {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\n✅ Inga regressioner över {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Gemensam infrastruktur för prestandatester
+
+Fixturen `bench` tidsmäter ett anrop ett antal varv och samlar statistiken.
+Med `--bench-json PATH` skrivs alla resultat till en JSON-fil tillsammans med
+commit och maskin, så att körningar kan jämföras med benchmarks/compare.py.
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import pytest
+
+_RESULTS: List[Dict] = []
+
+
+class Bench:
+    """Tidsmätare för ett enskilt prestandatest"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats: Dict = {}
+        self.extra_info: Dict = {}
+
+    def __call__(self, func: Callable, *args, rounds: int = 5, warmup: int = 1, **kwargs):
+        """Kör func `rounds` gånger (efter `warmup` uppvärmningsvarv) och returnera sista resultatet"""
+        result = None
+        for _ in range(warmup):
+            result = func(*args, **kwargs)
+
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            timings.append(time.perf_counter() - start)
+
+        self.stats = {
+            "rounds": rounds,
+            "min": min(timings),
+            "max": max(timings),
+            "mean": statistics.fmean(timings),
+            "median": statistics.median(timings),
+            "stddev": statistics.stdev(timings) if rounds > 1 else 0.0,
+        }
+        return result
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-json",
+        action="store",
+        default=None,
+        help="Skriv prestandaresultat till denna JSON-fil",
+    )
+
+
+@pytest.fixture
+def bench(request) -> Bench:
+    """Tidsmätare vars resultat sparas efter testet"""
+    recorder = Bench(request.node.nodeid)
+    yield recorder
+    if recorder.stats or recorder.extra_info:
+        _RESULTS.append(
+            {"name": recorder.name, "stats": recorder.stats, "extra_info": recorder.extra_info}
+        )
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _RESULTS:
+        return
+    terminalreporter.section("prestandaresultat")
+    for result in _RESULTS:
+        stats = result["stats"]
+        line = result["name"]
+        if stats:
+            line += f"  median {stats['median'] * 1000:.2f} ms  (min {stats['min'] * 1000:.2f} ms)"
+        terminalreporter.write_line(line)
+        for key, value in result["extra_info"].items():
+            terminalreporter.write_line(f"    {key}: {value}")
+
+
+def _git(*args: str) -> str:
+    try:
+        result = subprocess.run(
+            ["git", *args], capture_output=True, text=True, timeout=30, cwd=Path(__file__).parent
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def run_metadata() -> Dict:
+    """Commit, tidpunkt och maskin för en körning"""
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "branch": _git("rev-parse", "--abbrev-ref", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def pytest_sessionfinish(session):
+    path = session.config.getoption("--bench-json")
+    if not path or not _RESULTS:
+        return
+    output = Path(path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"metadata": run_metadata(), "benchmarks": _RESULTS}, indent=2), encoding="utf-8")
@@ -0,0 +1,310 @@
+"""
+Syntetiska testdata för prestandatester
+
+Fakturatexterna kommer från tests/fixtures/invoices/ och renderas till bilder
+som liknar mobilfoton (stor upplösning, färgstick, ojämnt ljus och lutning).
+Huvudböcker och Revolut-transaktioner genereras med fast slumpfrö.
+"""
+
+import json
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+FIXTURES_DIR = Path(__file__).parent.parent / "tests" / "fixtures" / "invoices"
+
+
+def load_invoice_fixtures() -> List[Tuple[str, str, Dict]]:
+    """Ladda fakturafixturer som (namn, text, förväntade fält)"""
+    fixtures = []
+    for text_file in sorted(FIXTURES_DIR.glob("*.txt")):
+        expected = json.loads(text_file.with_suffix(".json").read_text(encoding="utf-8"))
+        fixtures.append((text_file.stem, text_file.read_text(encoding="utf-8"), expected))
+    return fixtures
+
+
+def _load_font(size: int) -> ImageFont.ImageFont:
+    """DejaVu Sans (har å, ä, ö) om det finns, annars Pillows inbyggda typsnitt"""
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def render_invoice_page(text: str, dpi: int = 300) -> Image.Image:
+    """Rendera fakturatext till en ren A4-sida i gråskala"""
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = _load_font(max(12, dpi // 8))
+
+    margin = dpi // 2
+    line_height = int(font.size * 1.5)
+    for i, line in enumerate(text.splitlines()):
+        draw.text((margin, margin + i * line_height), line, fill=0, font=font)
+    return page
+
+
+def render_phone_photo(
+    text: str,
+    skew_degrees: float = 3.0,
+    photo_size: Tuple[int, int] = (3024, 4032),
+    seed: int = 0,
+) -> Image.Image:
+    """
+    Rendera fakturatext som ett mobilfoto
+
+    Sidan läggs på en mörk bakgrund, roteras, får ett gulaktigt färgstick,
+    ett ljusgradient och brus - och skalas upp till mobilkamerans upplösning.
+    """
+    rng = random.Random(seed)
+    page = render_invoice_page(text, dpi=300).convert("RGB")
+    page = page.rotate(skew_degrees, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=(60, 55, 50))
+
+    background = Image.new("RGB", photo_size, (60, 55, 50))
+    scale = min(photo_size[0] * 0.9 / page.width, photo_size[1] * 0.9 / page.height)
+    page = page.resize((int(page.width * scale), int(page.height * scale)), Image.Resampling.BICUBIC)
+    offset = (
+        (photo_size[0] - page.width) // 2 + rng.randint(-40, 40),
+        (photo_size[1] - page.height) // 2 + rng.randint(-40, 40),
+    )
+    background.paste(page, offset)
+
+    pixels = np.asarray(background, dtype=np.float32)
+    # Ojämnt ljus: mörkare mot nedre högra hörnet
+    ys, xs = np.mgrid[0:photo_size[1], 0:photo_size[0]]
+    lighting = 1.0 - 0.35 * (xs / photo_size[0] + ys / photo_size[1]) / 2
+    pixels *= lighting[..., None]
+    pixels *= np.array([1.0, 0.96, 0.85], dtype=np.float32)  # varmt färgstick
+    noise = np.random.default_rng(seed).normal(0, 6, pixels.shape[:2])
+    pixels += noise[..., None]
+
+    photo = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    photo.info["dpi"] = (72, 72)
+    return photo
+
+
+LEDGER_ACCOUNTS = (
+    "Assets:Bank:Företagskonto",
+    "Assets:Bank:Revolut:SEK",
+    "Assets:Bank:Revolut:EUR",
+    "Assets:Kundfordringar",
+    "Liabilities:Skatteskulder:Moms",
+    "Equity:Ingående:Balans",
+    "Income:Konsulttjänster",
+    "Income:Övrigt",
+    "Expenses:Kontorsmaterial",
+    "Expenses:Representation",
+    "Expenses:Resor",
+    "Expenses:Telefon:Internet",
+    "Expenses:Programvara",
+    "Expenses:Bankkostnader",
+)
+
+_EXPENSE_ACCOUNTS = LEDGER_ACCOUNTS[8:]
+
+
+def _ledger_transaction(rng: random.Random, day) -> str:
+    kind = rng.random()
+    if kind < 0.15:
+        net = rng.randrange(5_000, 150_000)
+        vat = net * 25 // 100
+        return (
+            f'{day} * "Kund {rng.randrange(40)} AB" "Konsultarvode"\n'
+            f"  Assets:Kundfordringar  {net + vat}.00 SEK\n"
+            f"  Income:Konsulttjänster  -{net}.00 SEK\n"
+            f"  Liabilities:Skatteskulder:Moms  -{vat}.00 SEK\n"
+        )
+    if kind < 0.25:
+        amount = rng.randrange(100, 5_000)
+        return (
+            f'{day} * "Leverantör {rng.randrange(200)}" "Kortköp EUR"\n'
+            f"  {rng.choice(_EXPENSE_ACCOUNTS)}  {amount}.00 EUR @ 11.{rng.randrange(10, 90)} SEK\n"
+            f"  Assets:Bank:Revolut:SEK\n"
+        )
+    gross = rng.randrange(50, 25_000)
+    vat = round(gross * 0.2, 2)
+    bank = rng.choice(("Assets:Bank:Företagskonto", "Assets:Bank:Revolut:SEK"))
+    return (
+        f'{day} * "Leverantör {rng.randrange(200)}" "Inköp"\n'
+        f"  {rng.choice(_EXPENSE_ACCOUNTS)}  {gross - vat:.2f} SEK\n"
+        f"  Liabilities:Skatteskulder:Moms  {vat:.2f} SEK\n"
+        f"  {bank}  -{gross}.00 SEK\n"
+    )
+
+
+def write_synthetic_ledger(
+    directory: Path,
+    years: Tuple[int, ...] = (2021, 2022, 2023, 2024, 2025),
+    transactions_per_month: int = 300,
+    seed: int = 1,
+) -> Path:
+    """
+    Skriv en syntetisk huvudbok med en fil per år
+
+    Returns:
+        Sökväg till huvudfilen som inkluderar årsfilerna
+    """
+    from datetime import date
+
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    main = [
+        'option "title" "Syntetisk huvudbok"',
+        'option "operating_currency" "SEK"',
+        "",
+    ]
+    opening = date(years[0], 1, 1)
+    main += [f"{opening} open {account}" for account in LEDGER_ACCOUNTS]
+    main += [
+        "",
+        f'{opening} * "Ingående balans"',
+        "  Assets:Bank:Företagskonto  500000.00 SEK",
+        "  Equity:Ingående:Balans",
+        "",
+    ]
+
+    for year in years:
+        lines = []
+        for month in range(1, 13):
+            days = sorted(rng.randrange(1, 29) for _ in range(transactions_per_month))
+            lines += [_ledger_transaction(rng, date(year, month, day)) for day in days]
+        (directory / f"{year}.beancount").write_text("\n".join(lines), encoding="utf-8")
+        main.append(f'include "{year}.beancount"')
+
+    main_path = directory / "main.beancount"
+    main_path.write_text("\n".join(main) + "\n", encoding="utf-8")
+    return main_path
+
+
+REVOLUT_ACCOUNTS = {
+    "SEK": "acc-0001-sek",
+    "EUR": "acc-0002-eur",
+    "USD": "acc-0003-usd",
+}
+
+_MERCHANTS = (
+    ("Telia Sverige AB", "SEK", 4814), ("GitHub", "USD", 5734), ("Atlassian", "USD", 5734),
+    ("Clas Ohlson", "SEK", 5200), ("SJ AB", "SEK", 4112), ("Scandic Hotels", "SEK", 7011),
+    ("Restaurang Prinsen", "SEK", 5812), ("Lufthansa", "EUR", 3008), ("Hetzner Online", "EUR", 4816),
+    ("Airbnb", "EUR", 7011), ("Kjell & Company", "SEK", 5732), ("Google Workspace", "EUR", 5734),
+)
+
+# Fördelning av transaktionstyper och tillstånd i en typisk företagsbank
+_TYPES = (
+    ("card_payment", 0.55), ("transfer", 0.12), ("exchange", 0.08), ("fee", 0.05),
+    ("topup", 0.05), ("card_refund", 0.03), ("internal_transfer", 0.12),
+)
+_STATES = (("completed", 0.92), ("pending", 0.05), ("reverted", 0.02), ("declined", 0.01))
+
+
+def _pick(rng: random.Random, choices) -> str:
+    return rng.choices([c for c, _w in choices], weights=[w for _c, w in choices])[0]
+
+
+def _revolut_transaction(rng: random.Random, index: int, created) -> Dict:
+    from datetime import timedelta
+
+    tx_type = _pick(rng, _TYPES)
+    state = _pick(rng, _STATES)
+    tx = {
+        "id": f"tx-{index:08d}",
+        "type": tx_type,
+        "state": state,
+        "created_at": created.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "updated_at": (created + timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    }
+    if state == "completed":
+        tx["completed_at"] = tx["updated_at"]
+
+    if tx_type in ("card_payment", "card_refund"):
+        name, currency, mcc = rng.choice(_MERCHANTS)
+        amount = round(rng.lognormvariate(5, 1.2), 2) * (1 if currency == "SEK" else 0.1)
+        sign = 1 if tx_type == "card_refund" else -1
+        leg = {
+            "leg_id": f"leg-{index:08d}-0",
+            "account_id": REVOLUT_ACCOUNTS[currency],
+            "amount": round(sign * max(amount, 1.0), 2),
+            "currency": currency,
+            "description": f"{'Refund from' if sign > 0 else 'To'} {name}",
+            "balance": round(rng.uniform(1_000, 200_000), 2),
+        }
+        if currency != "SEK" and rng.random() < 0.3:
+            leg["fee"] = round(abs(leg["amount"]) * 0.01, 2)
+        tx["merchant"] = {"name": name, "city": rng.choice(("Stockholm", "Dublin", "Berlin")),
+                          "category_code": str(mcc), "country": "SE"}
+        tx["card"] = {"card_number": "4599********1234", "first_name": "Anna", "last_name": "Svensson"}
+        tx["legs"] = [leg]
+    elif tx_type == "exchange":
+        foreign = rng.choice(("EUR", "USD"))
+        sek = round(rng.uniform(1_000, 50_000), 2)
+        rate = rng.uniform(10.5, 11.8) if foreign == "EUR" else rng.uniform(9.5, 11.0)
+        tx["reference"] = f"Exchanged to {foreign}"
+        tx["legs"] = [
+            {"leg_id": f"leg-{index:08d}-0", "account_id": REVOLUT_ACCOUNTS["SEK"], "amount": -sek,
+             "currency": "SEK", "description": f"Exchanged to {foreign}"},
+            {"leg_id": f"leg-{index:08d}-1", "account_id": REVOLUT_ACCOUNTS[foreign],
+             "amount": round(sek / rate, 2), "currency": foreign, "description": "Exchanged from SEK"},
+        ]
+    elif tx_type == "internal_transfer":
+        # Överföring mellan egna konton - två ben i samma valuta
+        amount = round(rng.uniform(500, 100_000), 2)
+        tx["type"] = "transfer"
+        tx["reference"] = "Till sparkonto"
+        tx["legs"] = [
+            {"leg_id": f"leg-{index:08d}-0", "account_id": REVOLUT_ACCOUNTS["SEK"], "amount": -amount,
+             "currency": "SEK", "description": "To Sparkonto"},
+            {"leg_id": f"leg-{index:08d}-1", "account_id": "acc-0004-savings", "amount": amount,
+             "currency": "SEK", "description": "From Företagskonto"},
+        ]
+    elif tx_type == "transfer":
+        amount = round(rng.uniform(1_000, 150_000), 2)
+        incoming = rng.random() < 0.4
+        counterparty = f"Kund {rng.randrange(40)} AB" if incoming else f"Leverantör {rng.randrange(200)} AB"
+        tx["reference"] = f"Faktura {rng.randrange(10_000, 99_999)}"
+        tx["legs"] = [{
+            "leg_id": f"leg-{index:08d}-0", "account_id": REVOLUT_ACCOUNTS["SEK"],
+            "counterparty": {"id": f"cp-{counterparty}", "account_type": "external"},
+            "amount": amount if incoming else -amount, "currency": "SEK",
+            "description": f"{'From' if incoming else 'To'} {counterparty}",
+        }]
+    elif tx_type == "fee":
+        tx["legs"] = [{
+            "leg_id": f"leg-{index:08d}-0", "account_id": REVOLUT_ACCOUNTS["SEK"],
+            "amount": -rng.choice((99.0, 349.0, 1_190.0)), "currency": "SEK",
+            "description": "Grow plan fee",
+        }]
+    else:
+        tx["legs"] = [{
+            "leg_id": f"leg-{index:08d}-0", "account_id": REVOLUT_ACCOUNTS["SEK"],
+            "amount": round(rng.uniform(10_000, 500_000), 2), "currency": "SEK",
+            "description": "Top-Up by bank transfer",
+        }]
+    return tx
+
+
+def revolut_transactions(count: int = 1000, seed: int = 1, start=None) -> List[Dict]:
+    """
+    Syntetiska Revolut Business-transaktioner i API-format
+
+    Blandar kortköp i flera valutor (med avgifter), växlingar, överföringar
+    med ett eller två ben, avgifter, insättningar och återbetalningar i
+    tillstånden completed, pending, reverted och declined. Sorterade som
+    API:t returnerar dem - nyaste först.
+    """
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    start = start or datetime(2025, 1, 1, 8, 0)
+    transactions = []
+    created = start
+    for index in range(count):
+        created += timedelta(minutes=rng.randrange(5, 240))
+        transactions.append(_revolut_transaction(rng, index, created))
+    transactions.reverse()
+    return transactions
@@ -0,0 +1,95 @@
+"""
+Prestandatest: saldoindex
+
+Jämför saldofrågor mot indexet med att summera alla posteringar från
+ingående balans, på en femårig syntetisk huvudbok.
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from beancount import loader
+from beancount.core import data
+
+from agents.balance_index import BalanceIndex
+from benchmarks.synthetic import write_synthetic_ledger
+
+ACCOUNT = "Assets:Bank:Företagskonto"
+
+
+@pytest.fixture(scope="module")
+def ledger_entries(tmp_path_factory):
+    main = write_synthetic_ledger(tmp_path_factory.mktemp("ledger"))
+    entries, errors, _options = loader.load_file(str(main))
+    assert not errors
+    return entries
+
+
+def _query_days(count: int = 1000):
+    rng = random.Random(3)
+    return [date(2021, 1, 1) + timedelta(days=rng.randrange(5 * 365)) for _ in range(count)]
+
+
+def _naive_balance(entries, account, on):
+    total = Decimal(0)
+    for entry in entries:
+        if not isinstance(entry, data.Transaction) or entry.date > on:
+            continue
+        for posting in entry.postings:
+            if posting.account == account:
+                total += posting.units.number
+    return total
+
+
+def test_build_index(bench, ledger_entries, tmp_path):
+    counter = iter(range(100))
+
+    def run():
+        index = BalanceIndex(tmp_path / f"balances-{next(counter)}.sqlite")
+        index.sync(ledger_entries)
+        index.close()
+
+    bench(run, rounds=3)
+    bench.extra_info["transactions"] = sum(isinstance(e, data.Transaction) for e in ledger_entries)
+
+
+def test_append_day(bench, ledger_entries, tmp_path):
+    cutoff = date(2025, 12, 28)
+    base = [entry for entry in ledger_entries if entry.date < cutoff]
+    indexes = []
+    for i in range(3):
+        index = BalanceIndex(tmp_path / f"append-{i}.sqlite")
+        index.sync(base)
+        indexes.append(index)
+
+    # Ett förberett index per varv - varje sync lägger till de sista dagarna
+    remaining = iter(indexes)
+    bench(lambda: next(remaining).sync(ledger_entries), rounds=3, warmup=0)
+    bench.extra_info["appended"] = len(ledger_entries) - len(base)
+
+
+def test_balance_queries(bench, ledger_entries):
+    index = BalanceIndex()
+    index.sync(ledger_entries)
+    days = _query_days()
+
+    def run():
+        return [index.balance(ACCOUNT, day) for day in days]
+
+    results = bench(run, rounds=5)
+    assert results[0] == {"SEK": _naive_balance(ledger_entries, ACCOUNT, days[0])}
+    bench.extra_info["queries"] = len(days)
+    bench.extra_info["per_query_us"] = round(bench.stats["median"] / len(days) * 1e6, 1)
+
+
+def test_naive_balance_queries(bench, ledger_entries):
+    days = _query_days(20)
+
+    def run():
+        return [_naive_balance(ledger_entries, ACCOUNT, day) for day in days]
+
+    bench(run, rounds=3)
+    bench.extra_info["queries"] = len(days)
+    bench.extra_info["per_query_us"] = round(bench.stats["median"] / len(days) * 1e6, 1)
@@ -0,0 +1,81 @@
+"""
+Prestandatest: matchning av fakturor mot banktransaktioner
+
+Ett års data för ett litet bolag i överkant: 20 000 banktransaktioner och
+3 000 leverantörsfakturor. Hela avstämningen ska ta under en sekund.
+"""
+
+import random
+from datetime import date, timedelta
+
+from agents.invoice_matching import BankTransaction, InvoiceMatcher, TransactionIndex
+
+N_TRANSACTIONS = 20_000
+N_INVOICES = 3_000
+
+
+def _generate_year(seed: int = 7):
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    invoices, transactions = [], []
+
+    for i in range(N_INVOICES):
+        invoice_date = start + timedelta(days=rng.randrange(330))
+        due = invoice_date + timedelta(days=30)
+        amount_minor = rng.randrange(10_000, 5_000_000)
+        ocr = str(rng.randrange(10**9, 10**10))
+        invoices.append({
+            "supplier": f"Leverantör {i % 200} AB",
+            "amount": f"{amount_minor / 100:.2f}",
+            "currency": "SEK",
+            "invoice_date": invoice_date.isoformat(),
+            "due_date": due.isoformat(),
+            "ocr_reference": ocr,
+        })
+        transactions.append(BankTransaction(
+            id=f"pay-{i}",
+            date=due + timedelta(days=rng.randrange(-3, 4)),
+            amount_minor=-amount_minor,
+            currency="SEK",
+            account="Assets:Bank:Revolut:SEK",
+            reference=ocr if rng.random() < 0.7 else "",
+            counterparty=f"To Leverantör {i % 200}",
+        ))
+
+    # Brus: kortköp och överföringar, en del med samma belopp som fakturor
+    amounts = [-int(float(inv["amount"]) * 100) for inv in invoices]
+    for i in range(N_TRANSACTIONS - N_INVOICES):
+        amount_minor = rng.choice(amounts) if rng.random() < 0.1 else -rng.randrange(1_000, 2_000_000)
+        transactions.append(BankTransaction(
+            id=f"noise-{i}",
+            date=start + timedelta(days=rng.randrange(365)),
+            amount_minor=amount_minor,
+            currency=rng.choice(["SEK", "SEK", "SEK", "EUR"]),
+            account="Assets:Bank:Revolut:SEK",
+            counterparty=f"Handlare {i % 500}",
+        ))
+
+    rng.shuffle(transactions)
+    return invoices, transactions
+
+
+def test_match_year(bench):
+    invoices, transactions = _generate_year()
+    matcher = InvoiceMatcher()
+
+    def run():
+        return matcher.match(invoices, transactions)
+
+    matches = bench(run, rounds=5)
+    correct = sum(match.transaction.id == f"pay-{i}" for i, match in matches.items())
+
+    bench.extra_info["matched"] = len(matches)
+    bench.extra_info["correct"] = correct
+    assert correct / N_INVOICES > 0.98
+    assert bench.stats["median"] < 1.0
+
+
+def test_index_build(bench):
+    _invoices, transactions = _generate_year()
+    bench(TransactionIndex, transactions, rounds=5)
+    bench.extra_info["transactions"] = len(transactions)
@@ -0,0 +1,53 @@
+"""
+Prestandatest: loggning i en tät loop
+
+Tiden i anroparens tråd för 20 000 INFO-poster med en vanlig FileHandler
+(som basicConfig) jämfört med köbaserad loggning, med och utan
+begränsning per anropsställe.
+"""
+
+import logging
+
+from agents.config import Config
+from agents.logging_setup import TEXT_FORMAT, setup_logging
+
+RECORDS = 20_000
+
+logger = logging.getLogger("benchmarks.logging")
+
+
+def _loop():
+    for i in range(RECORDS):
+        logger.info(f"Konverterade transaktion tx-{i}")
+
+
+def test_file_handler(bench, tmp_path):
+    handler = logging.FileHandler(tmp_path / "sync.log")
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    previous = root.handlers[:], root.level
+    root.handlers, root.level = [handler], logging.INFO
+    try:
+        bench(_loop, rounds=3)
+    finally:
+        root.handlers, root.level = previous
+        handler.close()
+    bench.extra_info["per_record_us"] = round(bench.stats["median"] / RECORDS * 1e6, 2)
+
+
+def test_queue_handler(bench, tmp_path):
+    logs = setup_logging(Config(environ={}), log_file=tmp_path / "sync.log", rate_limit=0, stream=None)
+    try:
+        bench(_loop, rounds=3)
+    finally:
+        logs.stop()
+    bench.extra_info["per_record_us"] = round(bench.stats["median"] / RECORDS * 1e6, 2)
+
+
+def test_queue_handler_rate_limited(bench, tmp_path):
+    logs = setup_logging(Config(environ={}), log_file=tmp_path / "sync.log", rate_limit=20, stream=None)
+    try:
+        bench(_loop, rounds=3)
+    finally:
+        logs.stop()
+    bench.extra_info["per_record_us"] = round(bench.stats["median"] / RECORDS * 1e6, 2)
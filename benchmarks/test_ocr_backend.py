@@ -0,0 +1,40 @@
+"""
+Prestandatest: OCR-backends
+
+Mäter fast kostnad per anrop på ett litet kvitto, där processstart och
+språkladdning i pytesseract dominerar över själva igenkänningen.
+"""
+
+import shutil
+
+import pytest
+
+from agents import ocr_backend
+from agents.ocr_backend import PytesseractBackend, TesserocrBackend
+from benchmarks.synthetic import load_invoice_fixtures, render_invoice_page
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("tesseract") is None, reason="tesseract är inte installerat"
+)
+
+
+@pytest.fixture(scope="module")
+def small_receipt():
+    fixtures = {name: text for name, text, _expected in load_invoice_fixtures()}
+    return render_invoice_page(fixtures["kvitto_cafe"], dpi=150).crop((0, 0, 1240, 500))
+
+
+def test_pytesseract_per_call(bench, small_receipt):
+    backend = PytesseractBackend("swe+eng")
+    text = bench(backend.image_to_string, small_receipt, rounds=10)
+    bench.extra_info["characters"] = len(text)
+
+
+@pytest.mark.skipif(ocr_backend.tesserocr is None, reason="tesserocr är inte installerat")
+def test_tesserocr_per_call(bench, small_receipt):
+    backend = TesserocrBackend("swe+eng")
+    try:
+        text = bench(backend.image_to_string, small_receipt, rounds=10)
+    finally:
+        backend.close()
+    bench.extra_info["characters"] = len(text)
@@ -0,0 +1,65 @@
+"""
+Prestandatest: tvåstegs-OCR mot helsides-OCR
+
+Mäter OCR-tid per faktura och kontrollerar att raderna med nyckelfält
+(datum, belopp, moms, bankgiro/OCR) finns kvar i regionstexten.
+"""
+
+import difflib
+import shutil
+import time
+
+import pytest
+
+from agents.ocr_backend import get_ocr_backend
+from agents.ocr_regions import RegionOCR, match_line
+from benchmarks.synthetic import load_invoice_fixtures, render_invoice_page
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("tesseract") is None, reason="tesseract är inte installerat"
+)
+
+
+def _key_lines(text: str):
+    """Rader i fixturen som innehåller ankare"""
+    return [line for line in text.splitlines() if match_line(line.split())]
+
+
+def _retained(key_lines, ocr_text: str) -> float:
+    ocr_lines = [line for line in ocr_text.splitlines() if line.strip()]
+    found = 0
+    for line in key_lines:
+        best = max(
+            (difflib.SequenceMatcher(None, " ".join(line.split()), " ".join(o.split())).ratio() for o in ocr_lines),
+            default=0.0,
+        )
+        found += best >= 0.8
+    return found / len(key_lines) if key_lines else 1.0
+
+
+def test_regions_vs_full_page(bench):
+    backend = get_ocr_backend("swe+eng")
+    region_ocr = RegionOCR(backend)
+    pages = [
+        (render_invoice_page(text, dpi=300), _key_lines(text))
+        for _name, text, _expected in load_invoice_fixtures()
+    ]
+
+    start = time.perf_counter()
+    full_retained = [_retained(keys, backend.image_to_string(page)) for page, keys in pages]
+    full_seconds = time.perf_counter() - start
+
+    def run_regions():
+        return [region_ocr.recognize(page, source_dpi=300) for page, _keys in pages]
+
+    results = bench(run_regions, rounds=1, warmup=0)
+    region_retained = [_retained(keys, result.text) for (_page, keys), result in zip(pages, results)]
+
+    bench.extra_info.update({
+        "documents": len(pages),
+        "full_page_seconds": round(full_seconds, 3),
+        "regions_seconds": round(bench.stats["mean"], 3),
+        "mean_coverage": round(sum(r.coverage for r in results) / len(results), 3),
+        "full_page_key_lines": round(sum(full_retained) / len(full_retained), 3),
+        "regions_key_lines": round(sum(region_retained) / len(region_retained), 3),
+    })
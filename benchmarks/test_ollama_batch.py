@@ -0,0 +1,44 @@
+"""
+Prestandatest: batchad LLM-tolkning
+
+Kör mot den lokala Ollama-stubben med fast svarstid per anrop för att mäta
+vinsten av parallella förfrågningar och cache, oberoende av modellens fart.
+"""
+
+import time
+
+from agents.ollama_extractor import OllamaExtractor
+from tests.ollama_stub import OllamaStub
+
+LATENCY = 0.05
+DOCUMENTS = 40
+
+
+def _texts(prefix: str):
+    return [f"{prefix} kvitto {i}\nCafé Lilla Torget" for i in range(DOCUMENTS)]
+
+
+def test_sequential_vs_concurrent(bench):
+    answer = {"supplier": "Café Lilla Torget", "amount": "80.00"}
+    with OllamaStub({}, default=answer, latency=LATENCY) as stub:
+        sequential = OllamaExtractor(host=stub.url, max_in_flight=1)
+        concurrent = OllamaExtractor(host=stub.url, max_in_flight=8)
+
+        start = time.perf_counter()
+        sequential.extract_batch(_texts("sekventiell"))
+        sequential_seconds = time.perf_counter() - start
+
+        rounds = iter(range(100))
+        bench(lambda: concurrent.extract_batch(_texts(f"parallell {next(rounds)}")), rounds=3, warmup=0)
+
+        cached_start = time.perf_counter()
+        concurrent.extract_batch(_texts("parallell 0"))
+        cached_seconds = time.perf_counter() - cached_start
+
+    bench.extra_info.update({
+        "documents": DOCUMENTS,
+        "stub_latency_seconds": LATENCY,
+        "sequential_seconds": round(sequential_seconds, 3),
+        "concurrent_seconds": round(bench.stats["median"], 3),
+        "cached_seconds": round(cached_seconds, 4),
+    })
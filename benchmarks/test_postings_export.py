@@ -0,0 +1,76 @@
+"""
+Prestandatest: kolumnär postexport
+
+Export och rapporter på en femårig syntetisk huvudbok: full export,
+omskrivning av en ändrad årsfil, inläsning av kolumnerna och intäkt per
+kund med vektoriserad group-by jämfört med en loop över transaktionerna.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+import pytest
+from beancount import loader
+from beancount.core import convert, data
+
+from agents.postings_export import PostingsExport
+from benchmarks.synthetic import write_synthetic_ledger
+
+
+@pytest.fixture(scope="module")
+def ledger(tmp_path_factory):
+    return write_synthetic_ledger(tmp_path_factory.mktemp("ledger"))
+
+
+def _loop_revenue_by_customer(entries):
+    totals = defaultdict(Decimal)
+    for entry in entries:
+        if not isinstance(entry, data.Transaction):
+            continue
+        for posting in entry.postings:
+            if posting.account.startswith("Income:"):
+                totals[entry.payee or "(okänd)"] -= convert.get_weight(posting).number
+    return totals
+
+
+def test_full_export(bench, ledger, tmp_path):
+    counter = iter(range(100))
+    bench(lambda: PostingsExport(ledger, tmp_path / f"full-{next(counter)}").update(), rounds=1, warmup=0)
+
+
+def test_changed_year(bench, ledger, tmp_path):
+    export = PostingsExport(ledger, tmp_path / "postings")
+    export.update()
+    year = ledger.parent / "2025.beancount"
+    text = year.read_text(encoding="utf-8")
+    counter = iter(range(100))
+
+    def run():
+        year.write_text(text + f"\n; ändring {next(counter)}\n", encoding="utf-8")
+        export.update()
+
+    bench(run, rounds=3, warmup=0)
+    year.write_text(text, encoding="utf-8")
+    assert not export.loaded_ledger
+    bench.extra_info["partitions_written"] = len(export.written)
+
+
+def test_load_columns(bench, ledger, tmp_path):
+    export = PostingsExport(ledger, tmp_path / "postings")
+    export.update()
+    postings = bench(export.load, rounds=5)
+    bench.extra_info["postings"] = len(postings)
+
+
+def test_vectorized_revenue_by_customer(bench, ledger, tmp_path):
+    postings = PostingsExport(ledger, tmp_path / "postings").load()
+    result = bench(postings.revenue_by_customer, rounds=10)
+
+    entries, _errors, _options = loader.load_file(str(ledger))
+    expected = _loop_revenue_by_customer(entries)
+    assert {k: round(float(v), 2) for k, v in expected.items()} == result
+
+
+def test_loop_revenue_by_customer(bench, ledger):
+    entries, _errors, _options = loader.load_file(str(ledger))
+    bench(_loop_revenue_by_customer, entries, rounds=3)
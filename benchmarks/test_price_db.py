@@ -0,0 +1,88 @@
+"""
+Prestandatest: omvärdering av valutasaldon
+
+Femårig omvärdering av 30 valutakonton med dagliga flöden och dagskurser,
+vektoriserad mot en naiv variant som slår upp kursen per saldorad i SQLite.
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from beancount import loader
+
+from agents.balance_index import BalanceIndex
+from agents.price_db import PriceDB
+
+CURRENCIES = ("EUR", "USD", "GBP")
+ACCOUNTS_PER_CURRENCY = 10
+START = date(2021, 1, 1)
+DAYS = 5 * 365
+
+
+def _ledger() -> str:
+    rng = random.Random(5)
+    accounts = [
+        (f"Assets:Bank:Revolut:{currency}{i}", currency)
+        for currency in CURRENCIES for i in range(ACCOUNTS_PER_CURRENCY)
+    ]
+    lines = [f"2020-12-31 open {account} {currency}" for account, currency in accounts]
+    lines.append("2020-12-31 open Equity:Ingående:Balans")
+    for offset in range(DAYS):
+        day = START + timedelta(days=offset)
+        for account, currency in rng.sample(accounts, 8):
+            amount = Decimal(rng.randrange(-5000, 10000)) / 100
+            lines.append(f'{day} * "Flöde"\n  {account}  {amount} {currency}\n  Equity:Ingående:Balans')
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture(scope="module")
+def setup():
+    entries, errors, _options = loader.load_string(_ledger())
+    assert not errors
+    index = BalanceIndex()
+    index.sync(entries)
+
+    rng = random.Random(6)
+    prices = PriceDB()
+    for currency, base in zip(CURRENCIES, (11.0, 10.0, 13.0)):
+        prices.add_rates([
+            (currency, START + timedelta(days=offset), Decimal(f"{base + rng.uniform(-0.5, 0.5):.4f}"))
+            for offset in range(DAYS)
+        ], "api")
+    return index, prices
+
+
+def _naive(index, prices, start, end):
+    adjustments = {}
+    for account, currency in index.series(exclude_currency=prices.quote):
+        balance = index.balance(account, start).get(currency, Decimal(0))
+        opening = balance * (prices.rate(currency, start) or 0)
+        flows = Decimal(0)
+        for _a, _c, day, value in index.rows(start, end):
+            if (_a, _c) != (account, currency):
+                continue
+            flows += (value - balance) * prices.rate(currency, day)
+            balance = value
+        adjustments[account] = balance * prices.rate(currency, end) - opening - flows
+    return adjustments
+
+
+def test_vectorized_revaluation(bench, setup):
+    index, prices = setup
+    start, end = date(2021, 12, 31), date(2025, 12, 30)
+    result = bench(prices.revalue, index, start, end, rounds=5)
+    bench.extra_info["series"] = len(result)
+    bench.extra_info["balance_rows"] = len(index.rows(start, end))
+
+    expected = _naive(index, prices, date(2025, 11, 30), end)
+    for item in prices.revalue(index, date(2025, 11, 30), end):
+        assert abs(item.adjustment - expected[item.account]) < Decimal("0.05")
+
+
+def test_naive_revaluation_one_month(bench, setup):
+    index, prices = setup
+    start, end = date(2025, 11, 30), date(2025, 12, 30)
+    bench(_naive, index, prices, start, end, rounds=1, warmup=0)
+    bench.extra_info["balance_rows"] = len(index.rows(start, end))
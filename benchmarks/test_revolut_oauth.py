@@ -0,0 +1,32 @@
+"""
+Prestandatest: client assertions i RevolutOAuth
+
+Jämför signering med nyckeln i minnet, signering där PEM-filen läses och
+avserialiseras varje gång (som före nyckelcachen) och en återanvänd assertion.
+"""
+
+from agents.revolut_oauth import RevolutOAuth
+
+
+def _oauth(tmp_path):
+    return RevolutOAuth("benchmark", cert_dir=tmp_path / "certs", token_file=tmp_path / "tokens.json")
+
+
+def test_assertion_cold_key(bench, tmp_path):
+    oauth = _oauth(tmp_path)
+
+    def run():
+        oauth._private_key = None
+        return oauth.generate_jwt(reuse=False)
+
+    bench(run, rounds=50)
+
+
+def test_assertion_cached_key(bench, tmp_path):
+    oauth = _oauth(tmp_path)
+    bench(oauth.generate_jwt, reuse=False, rounds=50)
+
+
+def test_assertion_reused(bench, tmp_path):
+    oauth = _oauth(tmp_path)
+    bench(oauth.generate_jwt, rounds=1000)
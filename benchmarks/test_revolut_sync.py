@@ -0,0 +1,127 @@
+"""
+Prestandatest: Revolut-konvertering och synk
+
+Syntetiska API-svar (kortköp i flera valutor med avgifter, växlingar,
+överföringar med ett och två ben, pending/reverted/declined) genom
+transaction_to_beancount, _categorize_transaction och hela skrivvägen i
+RevolutSync.sync_transactions. API-anropet ersätts med de färdiga svaren så
+att bara den lokala delen mäts; test_sync_over_http kör hela vägen mot den
+lokala Revolut-stubben.
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from agents.revolut_integration import RevolutSync, RevolutToBeancount
+from agents.transaction_classifier import TransactionClassifier, revolut_tokens
+from benchmarks.synthetic import revolut_transactions
+from tests.revolut_stub import RevolutStub
+
+MERCHANT_ACCOUNTS = {
+    "Telia Sverige AB": "Expenses:Telefon:Internet",
+    "GitHub": "Expenses:Programvara",
+    "Atlassian": "Expenses:Programvara",
+    "Google Workspace": "Expenses:Programvara",
+    "Hetzner Online": "Expenses:Programvara",
+    "Clas Ohlson": "Expenses:Kontorsmaterial",
+    "Kjell & Company": "Expenses:Kontorsmaterial",
+    "SJ AB": "Expenses:Resor",
+    "Lufthansa": "Expenses:Resor",
+    "Scandic Hotels": "Expenses:Resor",
+    "Airbnb": "Expenses:Resor",
+    "Restaurang Prinsen": "Expenses:Representation",
+}
+
+
+def _config(directory, **overrides):
+    settings = {
+        "DATA_LEDGER": directory,
+        "CLASSIFIER_ENABLED": False,
+        "CLASSIFIER_THRESHOLD": 0.7,
+        "PRICE_DB": None,
+        "CURRENCY": "SEK",
+    }
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return revolut_transactions(5_000)
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    history = [tx for tx in revolut_transactions(20_000, seed=2) if "merchant" in tx]
+    model = TransactionClassifier()
+    model.partial_fit(
+        [revolut_tokens(tx) for tx in history],
+        [MERCHANT_ACCOUNTS[tx["merchant"]["name"]] for tx in history],
+    )
+    return model
+
+
+def test_transaction_to_beancount(bench, transactions, tmp_path):
+    converter = RevolutToBeancount(_config(tmp_path))
+
+    def run():
+        return [converter.transaction_to_beancount(tx) for tx in transactions]
+
+    entries = bench(run, rounds=5)
+    bench.extra_info["transactions"] = len(transactions)
+    bench.extra_info["entries"] = sum(1 for entry in entries if entry)
+    bench.extra_info["per_transaction_us"] = round(bench.stats["median"] / len(transactions) * 1e6, 1)
+
+
+def test_categorize_rules(bench, transactions, tmp_path):
+    converter = RevolutToBeancount(_config(tmp_path))
+
+    def run():
+        return [converter._categorize_transaction(tx) for tx in transactions]
+
+    bench(run, rounds=5)
+    bench.extra_info["per_transaction_us"] = round(bench.stats["median"] / len(transactions) * 1e6, 2)
+
+
+def test_categorize_with_classifier(bench, transactions, classifier, tmp_path):
+    converter = RevolutToBeancount(_config(tmp_path), classifier=classifier)
+
+    def run():
+        converter.prepare(transactions)
+        return [converter._categorize_transaction(tx) for tx in transactions]
+
+    accounts = bench(run, rounds=5)
+    card = [
+        (tx, account) for tx, account in zip(transactions, accounts)
+        if tx["type"] == "card_payment"
+    ]
+    correct = sum(account == MERCHANT_ACCOUNTS[tx["merchant"]["name"]] for tx, account in card)
+    bench.extra_info["per_transaction_us"] = round(bench.stats["median"] / len(transactions) * 1e6, 2)
+    bench.extra_info["card_accuracy"] = round(correct / len(card), 3)
+
+
+def test_sync_write_path(bench, transactions, tmp_path):
+    sync = RevolutSync("benchmark", config=_config(tmp_path))
+    sync.business.get_all_transactions = lambda **_kwargs: transactions
+    counter = iter(range(100))
+
+    def run():
+        return sync.sync_transactions(output_file=tmp_path / f"import-{next(counter)}.beancount")
+
+    path = bench(run, rounds=5)
+    bench.extra_info["bytes"] = (tmp_path / path).stat().st_size
+
+
+def test_sync_over_http(bench, tmp_path):
+    start = datetime.now() - timedelta(days=3)
+    with RevolutStub(transactions=revolut_transactions(1_000, start=start), latency=0.02) as stub:
+        sync = RevolutSync("benchmark", config=_config(tmp_path), base_url=stub.api_url)
+        counter = iter(range(100))
+
+        def run():
+            return sync.sync_transactions(output_file=tmp_path / f"http-{next(counter)}.beancount")
+
+        bench(run, rounds=5)
+        bench.extra_info["requests"] = len(stub.requests)
@@ -0,0 +1,49 @@
+"""
+Prestandatest: SIE4-export
+
+Exporterar hela historiken i en femårig syntetisk huvudbok och mäter tid
+samt exportens egen minnesanvändning (utöver de inlästa direktiven).
+"""
+
+import tracemalloc
+
+import pytest
+from beancount import loader
+from beancount.core import prices
+
+from agents.sie_export import SIEExporter
+from benchmarks.synthetic import write_synthetic_ledger
+
+
+@pytest.fixture(scope="module")
+def ledger_entries(tmp_path_factory):
+    main = write_synthetic_ledger(tmp_path_factory.mktemp("ledger"))
+    entries, errors, _options = loader.load_file(str(main))
+    assert not errors
+    return entries
+
+
+def _exporter(entries):
+    return SIEExporter("Efficra Consulting KB", "969000-0000", price_map=prices.build_price_map(entries))
+
+
+def test_sie_export_full_history(bench, ledger_entries, tmp_path):
+    exporter = _exporter(ledger_entries)
+    paths = bench(exporter.export, ledger_entries, tmp_path, rounds=3)
+    bench.extra_info["files"] = len(paths)
+    bench.extra_info["total_mb"] = round(sum(p.stat().st_size for p in paths) / 1e6, 2)
+
+
+@pytest.mark.parametrize("years", [1, 5])
+def test_sie_export_memory(bench, ledger_entries, tmp_path, years):
+    first_year = ledger_entries[-1].date.year - years + 1
+    entries = [entry for entry in ledger_entries if entry.date.year >= first_year]
+    exporter = _exporter(entries)
+
+    tracemalloc.start()
+    exporter.export(entries, tmp_path)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    bench.extra_info["years"] = years
+    bench.extra_info["peak_kb"] = round(peak / 1024)
@@ -0,0 +1,73 @@
+"""
+Prestandatest: kontoklassificering
+
+Syntetisk historik med 200 handlare som vardera hör till ett konto. Mäter
+träning, inkrementell träning och batchprediktion för en hel synk, samt
+träffsäkerhet på ett hållet år.
+"""
+
+import random
+from decimal import Decimal
+
+from agents.transaction_classifier import TransactionClassifier, tokenize
+
+ACCOUNTS = [
+    "Expenses:Programvara", "Expenses:Resor", "Expenses:Representation",
+    "Expenses:Kontorsmaterial", "Expenses:Telefon:Internet", "Expenses:Bankkostnader",
+    "Expenses:Bokföring:Revision", "Expenses:Food:Restaurant", "Income:Konsulttjänster",
+    "Income:Övrigt",
+]
+CITIES = ["Stockholm", "Göteborg", "Malmö", "Uppsala", "London", "Berlin"]
+
+
+def _documents(count: int, seed: int):
+    rng = random.Random(seed)
+    merchants = [(f"Handlare{i}", ACCOUNTS[i % len(ACCOUNTS)], rng.randrange(50, 5000)) for i in range(200)]
+    documents, labels = [], []
+    for _ in range(count):
+        name, account, typical = rng.choice(merchants)
+        amount = Decimal(max(1, int(rng.gauss(typical, typical / 4))))
+        sign = 1 if account.startswith("Income") else -1
+        documents.append(tokenize(
+            [f"To {name} {rng.choice(CITIES)}", name, f"Ref {rng.randrange(10**6)}"],
+            sign * amount,
+            ["card-payment"],
+        ))
+        labels.append(account)
+    return documents, labels
+
+
+def test_train(bench):
+    documents, labels = _documents(20_000, seed=1)
+
+    def run():
+        model = TransactionClassifier()
+        model.partial_fit(documents, labels)
+        return model
+
+    bench(run, rounds=3)
+    bench.extra_info["documents"] = len(documents)
+
+
+def test_incremental_train(bench):
+    documents, labels = _documents(20_000, seed=1)
+    new_documents, new_labels = _documents(300, seed=2)
+    model = TransactionClassifier()
+    model.partial_fit(documents, labels)
+
+    bench(model.partial_fit, new_documents, new_labels, rounds=5)
+    bench.extra_info["documents"] = len(new_documents)
+
+
+def test_predict_sync_batch(bench):
+    documents, labels = _documents(20_000, seed=1)
+    test_documents, test_labels = _documents(2_000, seed=3)
+    model = TransactionClassifier()
+    model.partial_fit(documents, labels)
+
+    predictions = bench(model.predict, test_documents, rounds=5)
+    correct = sum(account == label for (account, _p), label in zip(predictions, test_labels))
+
+    bench.extra_info["documents"] = len(test_documents)
+    bench.extra_info["accuracy"] = round(correct / len(test_labels), 3)
+    assert correct / len(test_labels) > 0.95
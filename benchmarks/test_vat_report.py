@@ -0,0 +1,57 @@
+"""
+Prestandatest: momsrapport på en flerårig huvudbok
+
+Jämför en kall körning (hela huvudboken läses och alla perioder räknas)
+med en varm körning utan ändringar och en körning där bara den senaste
+månaden ändrats (endast årsfilen läses om).
+"""
+
+from pathlib import Path
+
+from agents.vat_report import VATReport
+from benchmarks.synthetic import write_synthetic_ledger
+
+
+def test_vat_report_cold(bench, tmp_path):
+    main = write_synthetic_ledger(tmp_path / "ledger")
+
+    def run():
+        return VATReport(main).periods()
+
+    # Ett varv utan uppvärmning - annars svarar Beancounts egen pickle-cache
+    periods = bench(run, rounds=1, warmup=0)
+    bench.extra_info["periods"] = len(periods)
+
+
+def test_vat_report_cached(bench, tmp_path):
+    main = write_synthetic_ledger(tmp_path / "ledger")
+    report = VATReport(main, cache_path=tmp_path / "vat.json")
+    report.periods()
+
+    bench(report.periods, rounds=20)
+    assert not report.loaded_ledger
+    bench.extra_info["ledger_loaded"] = report.loaded_ledger
+
+
+def test_vat_report_one_period_changed(bench, tmp_path):
+    main = write_synthetic_ledger(tmp_path / "ledger")
+    report = VATReport(main, cache_path=tmp_path / "vat.json")
+    report.periods()
+    latest = tmp_path / "ledger" / "2025.beancount"
+    counter = iter(range(10_000))
+
+    def run():
+        with latest.open("a", encoding="utf-8") as f:
+            f.write(
+                f'\n2025-12-30 * "Leverantör" "Tillägg {next(counter)}"\n'
+                "  Expenses:Programvara  80.00 SEK\n"
+                "  Liabilities:Skatteskulder:Moms  20.00 SEK\n"
+                "  Assets:Bank:Företagskonto  -100.00 SEK\n"
+            )
+        return report.periods()
+
+    bench(run, rounds=3)
+    assert not report.loaded_ledger
+    assert report.recomputed == ["2025-12"]
+    bench.extra_info["parsed_files"] = [Path(path).name for path in report.parsed_files]
+    bench.extra_info["recomputed"] = report.recomputed
@@ -0,0 +1,82 @@
+"""
+Lokal stubbserver för Ollamas chat-API
+
+Spelar upp fördefinierade svar istället för att köra en modell. Svaret väljs
+på första nyckel i `responses` som finns i OCR-texten. Servern räknar
+förfrågningar, samtidiga förfrågningar och antal TCP-anslutningar.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class OllamaStub:
+    """Ollama-stubbe som körs i en bakgrundstråd"""
+
+    def __init__(self, responses: Dict[str, Dict], default: Optional[Dict] = None, latency: float = 0.0):
+        self.responses = responses
+        self.default = default or {}
+        self.latency = latency
+        self.requests: List[Dict] = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests.append(body)
+                    stub.connections.add(self.client_address)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    text = body["messages"][-1]["content"]
+                    fields = next(
+                        (resp for key, resp in stub.responses.items() if key in text), stub.default
+                    )
+                    payload = json.dumps({
+                        "model": body["model"],
+                        "message": {"role": "assistant", "content": json.dumps(fields)},
+                        "done": True,
+                    }).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+        return Handler
+
+    def __enter__(self) -> "OllamaStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,403 @@
+"""
+Lokal stubbserver för Revolut Business API
+
+Implementerar de endpoints som RevolutBusiness, RevolutExchange och
+RevolutOAuth använder (/accounts, /transactions, /rate, /counterparties och
+/auth/token) mot ett dataset i minnet. /transactions följer API:ts
+semantik: nyaste först, `from` inklusive, `to` exklusive, högst `count`
+(max 1000) per sida och filter på `type` och `account` - nästa sida hämtas
+med `to` satt till sista transaktionens created_at.
+
+Latens, 429 (rate limit) och 5xx kan injiceras slumpmässigt eller i en
+bestämd ordning. Med `upstream` vidarebefordras förfrågningar till riktiga
+API:t och svaren spelas in till en kassettfil; med `cassette` spelas de
+inspelade svaren upp.
+
+Kan köras fristående för lasttester:
+
+    python -m tests.revolut_stub --port 8999 --transactions 10000 --latency 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+API_PREFIX = "/api/1.0"
+
+DEFAULT_ACCOUNTS = [
+    {"id": "acc-0001-sek", "name": "Main", "currency": "SEK", "balance": 250000.0, "state": "active",
+     "public": False, "created_at": "2024-01-01T00:00:00.000Z", "updated_at": "2024-01-01T00:00:00.000Z"},
+    {"id": "acc-0002-eur", "name": "EUR", "currency": "EUR", "balance": 12000.0, "state": "active",
+     "public": False, "created_at": "2024-01-01T00:00:00.000Z", "updated_at": "2024-01-01T00:00:00.000Z"},
+    {"id": "acc-0003-usd", "name": "USD", "currency": "USD", "balance": 3000.0, "state": "active",
+     "public": False, "created_at": "2024-01-01T00:00:00.000Z", "updated_at": "2024-01-01T00:00:00.000Z"},
+]
+
+DEFAULT_RATES = {("EUR", "SEK"): 11.45, ("USD", "SEK"): 10.52, ("GBP", "SEK"): 13.31}
+
+# Fält som aldrig skrivs till en kassett
+SECRET_FIELDS = ("access_token", "refresh_token", "client_assertion")
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: "REDACTED" if k in SECRET_FIELDS else _redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+class RevolutStub:
+    """Revolut Business-stubbe som körs i en bakgrundstråd"""
+
+    def __init__(
+        self,
+        transactions: Optional[List[Dict]] = None,
+        accounts: Optional[List[Dict]] = None,
+        counterparties: Optional[List[Dict]] = None,
+        rates: Optional[Dict[Tuple[str, str], float]] = None,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        faults: Optional[List[int]] = None,
+        token_ttl: int = 2399,
+        require_auth: bool = False,
+        rotate_refresh_tokens: bool = False,
+        upstream: Optional[str] = None,
+        cassette: Optional[Path] = None,
+        port: int = 0,
+        seed: int = 1,
+    ):
+        """
+        Args:
+            transactions: Dataset för /transactions (sorteras nyaste först)
+            accounts: Konton för /accounts
+            counterparties: Motparter för /counterparties
+            rates: Kurser per (från, till) för /rate
+            latency: Fördröjning per förfrågan i sekunder
+            error_rate: Andel förfrågningar som får 503
+            throttle_rate: Andel förfrågningar som får 429 med Retry-After
+            faults: Statuskoder som returneras i tur och ordning före vanliga svar
+            token_ttl: expires_in för utfärdade access tokens
+            require_auth: Kräv en utfärdad Bearer-token på API-anrop
+            rotate_refresh_tokens: Refresh tokens gäller en gång och byts vid varje förnyelse
+            upstream: Riktig API-bas (t.ex. https://sandbox-b2b.revolut.com) att spela in från
+            cassette: Kassettfil - spelas in till med upstream, annars spelas upp
+            port: TCP-port (0 = valfri ledig)
+            seed: Slumpfrö för felinjektion
+        """
+        self.transactions = sorted(
+            transactions or [], key=lambda tx: _parse_time(tx["created_at"]), reverse=True
+        )
+        self.accounts = accounts if accounts is not None else DEFAULT_ACCOUNTS
+        self.counterparties = counterparties or []
+        self.rates = rates or DEFAULT_RATES
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.faults = list(faults or [])
+        self.token_ttl = token_ttl
+        self.require_auth = require_auth
+        self.rotate_refresh_tokens = rotate_refresh_tokens
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.cassette = Path(cassette) if cassette else None
+        self.interactions: List[Dict] = []
+        if self.cassette and not self.upstream and self.cassette.exists():
+            self.interactions = json.loads(self.cassette.read_text(encoding="utf-8"))["interactions"]
+
+        self.requests: List[Tuple[str, str]] = []
+        self.tokens: Dict[str, float] = {}
+        self.refresh_tokens: Set[str] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._rng = random.Random(seed)
+        self._times = [_parse_time(tx["created_at"]) for tx in self.transactions]
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def add_transactions(self, transactions: List[Dict]):
+        """Lägg till nya transaktioner i datasetet (t.ex. mellan två synkar)"""
+        with self._lock:
+            self.transactions = sorted(
+                self.transactions + transactions, key=lambda tx: _parse_time(tx["created_at"]), reverse=True
+            )
+            self._times = [_parse_time(tx["created_at"]) for tx in self.transactions]
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        """Bas-URL för RevolutBusiness (base_url)"""
+        return self.url + API_PREFIX
+
+    # -- Endpoints --------------------------------------------------------
+
+    def _transactions(self, query: Dict[str, str]) -> List[Dict]:
+        count = min(int(query.get("count", 100)), 1000)
+        start = _parse_time(query["from"]) if "from" in query else None
+        end = _parse_time(query["to"]) if "to" in query else None
+        page = []
+        for tx, created in zip(self.transactions, self._times):
+            if end and created >= end:
+                continue
+            if start and created < start:
+                break
+            if "type" in query and tx.get("type") != query["type"]:
+                continue
+            if "account" in query and not any(
+                leg.get("account_id") == query["account"] for leg in tx.get("legs", [])
+            ):
+                continue
+            page.append(tx)
+            if len(page) == count:
+                break
+        return page
+
+    def _rate(self, query: Dict[str, str]) -> Tuple[int, Dict]:
+        pair = (query.get("from"), query.get("to"))
+        if pair[0] == pair[1]:
+            rate = 1.0
+        elif pair in self.rates:
+            rate = self.rates[pair]
+        elif pair[::-1] in self.rates:
+            rate = 1 / self.rates[pair[::-1]]
+        else:
+            return 404, {"code": 3000, "message": f"Rate {pair[0]}/{pair[1]} not found"}
+        amount = float(query.get("amount", 1))
+        return 200, {
+            "from": {"amount": amount, "currency": pair[0]},
+            "to": {"amount": round(amount * rate, 2), "currency": pair[1]},
+            "rate": round(rate, 6),
+            "fee": {"amount": 0, "currency": pair[0]},
+            "rate_date": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        }
+
+    def _token(self, form: Dict[str, str]) -> Tuple[int, Dict]:
+        if form.get("grant_type") not in ("authorization_code", "refresh_token"):
+            return 400, {"error": "unsupported_grant_type"}
+        if not form.get("client_assertion"):
+            return 400, {"error": "invalid_client"}
+        token = f"oa_stub_{uuid.uuid4().hex}"
+        response = {"access_token": token, "token_type": "bearer", "expires_in": self.token_ttl}
+        with self._lock:
+            if form["grant_type"] == "refresh_token" and self.rotate_refresh_tokens:
+                if form.get("refresh_token") not in self.refresh_tokens:
+                    return 400, {"error": "invalid_grant"}
+                self.refresh_tokens.discard(form["refresh_token"])
+            if form["grant_type"] == "authorization_code" or self.rotate_refresh_tokens:
+                response["refresh_token"] = f"oa_stub_refresh_{uuid.uuid4().hex}"
+                self.refresh_tokens.add(response["refresh_token"])
+            self.tokens[token] = time.time() + self.token_ttl
+        return 200, response
+
+    def _authorized(self, header: Optional[str]) -> bool:
+        if not self.require_auth:
+            return True
+        token = (header or "").removeprefix("Bearer ")
+        expires = self.tokens.get(token)
+        return expires is not None and expires > time.time()
+
+    def _dispatch(self, method: str, path: str, query: Dict[str, str], form: Dict[str, str],
+                  auth: Optional[str]) -> Tuple[int, object]:
+        endpoint = path[len(API_PREFIX):] if path.startswith(API_PREFIX) else path
+        if method == "POST" and endpoint == "/auth/token":
+            return self._token(form)
+        if not self._authorized(auth):
+            return 401, {"code": 9001, "message": "The request should be authorized."}
+        if method != "GET":
+            return 405, {"message": "Method not allowed"}
+        if endpoint == "/accounts":
+            return 200, self.accounts
+        if endpoint.startswith("/accounts/"):
+            account = next((a for a in self.accounts if a["id"] == endpoint.split("/")[2]), None)
+            return (200, account) if account else (404, {"code": 3000, "message": "Account not found"})
+        if endpoint == "/transactions":
+            return 200, self._transactions(query)
+        if endpoint.startswith("/transaction/"):
+            tx_id = endpoint.split("/")[2]
+            with self._lock:
+                transaction = next((tx for tx in self.transactions if tx["id"] == tx_id), None)
+            return (200, transaction) if transaction else (404, {"code": 3000, "message": "Transaction not found"})
+        if endpoint == "/rate":
+            return self._rate(query)
+        if endpoint == "/counterparties":
+            return 200, self.counterparties
+        return 404, {"message": f"Unknown endpoint {endpoint}"}
+
+    # -- Inspelning och uppspelning ---------------------------------------
+
+    def _replay(self, method: str, path: str, query: Dict[str, str]) -> Optional[Tuple[int, object]]:
+        """Inspelat svar för exakt samma förfrågan, annars första för samma endpoint"""
+        fallback = None
+        for interaction in self.interactions:
+            if interaction["method"] != method or interaction["path"] != path:
+                continue
+            if interaction["query"] == query:
+                return interaction["status"], interaction["body"]
+            fallback = fallback or (interaction["status"], interaction["body"])
+        return fallback
+
+    def _record(self, method: str, path: str, query: Dict[str, str], body: bytes,
+                headers: Dict[str, str]) -> Tuple[int, object]:
+        forward = {k: v for k, v in headers.items() if k.lower() in ("authorization", "content-type")}
+        response = requests.request(
+            method, self.upstream + path, params=query, data=body or None, headers=forward, timeout=30
+        )
+        try:
+            payload = response.json() if response.content else {}
+        except ValueError:
+            payload = {"raw": response.text}
+        with self._lock:
+            self.interactions.append({
+                "method": method, "path": path, "query": query,
+                "status": response.status_code, "body": _redact(payload),
+            })
+            if self.cassette:
+                self.save_cassette()
+        return response.status_code, payload
+
+    def save_cassette(self, path: Optional[Path] = None):
+        """Skriv inspelade svar till kassettfilen"""
+        target = Path(path or self.cassette)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(target.name + ".tmp")
+        tmp_path.write_text(json.dumps({"interactions": self.interactions}, indent=1), encoding="utf-8")
+        tmp_path.replace(target)
+
+    # -- HTTP -------------------------------------------------------------
+
+    def _injected_fault(self) -> Optional[int]:
+        with self._lock:
+            if self.faults:
+                return self.faults.pop(0)
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+    def _respond(
+        self, method: str, path: str, query: Dict[str, str], body: bytes, form: Dict[str, str], headers
+    ) -> Tuple[int, object, Optional[Dict[str, str]]]:
+        """(status, JSON-svar, extra headers) för en förfrågan"""
+        fault = self._injected_fault()
+        if fault == 429:
+            return 429, {"message": "Too many requests"}, {"Retry-After": "1"}
+        if fault:
+            return fault, {"message": "Injected server error"}, None
+
+        if self.upstream:
+            return (*self._record(method, path, query, body, dict(headers)), None)
+        replayed = self._replay(method, path, query) if self.interactions else None
+        status, payload = replayed or self._dispatch(method, path, query, form, headers.get("Authorization"))
+        return status, payload, None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload, headers: Optional[Dict[str, str]] = None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method: str):
+                parts = urlsplit(self.path)
+                query = {k: v[-1] for k, v in sorted(parse_qs(parts.query).items())}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                form = {k: v[-1] for k, v in parse_qs(body.decode()).items()} if body else {}
+
+                with stub._lock:
+                    stub.requests.append((method, self.path))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    self._send(*stub._respond(method, parts.path, query, body, form, self.headers))
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
+
+    def __enter__(self) -> "RevolutStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    """Kör stubben fristående"""
+    parser = argparse.ArgumentParser(description="Lokal stubbserver för Revolut Business API")
+    parser.add_argument("--port", type=int, default=8999, help="TCP-port (standard: 8999)")
+    parser.add_argument("--transactions", type=int, default=1000, help="Antal syntetiska transaktioner")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fördröjning per förfrågan i sekunder")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Andel 503-svar")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Andel 429-svar")
+    parser.add_argument("--upstream", help="Spela in från detta API, t.ex. https://sandbox-b2b.revolut.com")
+    parser.add_argument("--cassette", type=Path, help="Kassettfil att spela in till eller spela upp")
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import revolut_transactions
+
+    stub = RevolutStub(
+        transactions=revolut_transactions(args.transactions) if not args.upstream else None,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        upstream=args.upstream,
+        cassette=args.cassette,
+        port=args.port,
+    )
+    with stub:
+        print(f"Revolut-stubbe på {stub.api_url} (Ctrl+C för att avsluta)")
+        try:
+            stub._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Lokal generator för Revolut-webhooks
+
+Bygger och signerar TransactionCreated/TransactionStateChanged som Revolut
+skickar dem och postar dem till en WebhookReceiver. Kan köras fristående mot
+en mottagare som kör med samma hemlighet:
+
+    python -m tests.revolut_webhook_events --url http://127.0.0.1:8780/webhooks/revolut \\
+        --secret test --events 100
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from agents.revolut_webhook import sign
+
+
+def transaction_created(transaction: Dict) -> Dict:
+    """TransactionCreated med hela transaktionen"""
+    return {"event": "TransactionCreated", "timestamp": _now(), "data": transaction}
+
+
+def state_changed(transaction_id: str, old_state: str, new_state: str) -> Dict:
+    """TransactionStateChanged - innehåller bara id och tillstånd"""
+    return {
+        "event": "TransactionStateChanged",
+        "timestamp": _now(),
+        "data": {"id": transaction_id, "old_state": old_state, "new_state": new_state},
+    }
+
+
+def signed_request(secret: str, event: Dict, timestamp: Optional[int] = None) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Kropp och headers som Revolut skickar dem
+
+    Args:
+        secret: Signeringshemlighet
+        event: Händelse (t.ex. från transaction_created)
+        timestamp: Millisekunder sedan epok (default: nu)
+    """
+    body = json.dumps(event).encode()
+    stamp = str(timestamp if timestamp is not None else int(time.time() * 1000))
+    return body, {
+        "Content-Type": "application/json",
+        "Revolut-Request-Timestamp": stamp,
+        "Revolut-Signature": sign(secret, body, stamp),
+    }
+
+
+def post_event(url: str, secret: str, event: Dict, session: Optional[requests.Session] = None) -> int:
+    """Posta en signerad händelse och returnera HTTP-status"""
+    body, headers = signed_request(secret, event)
+    response = (session or requests).post(url, data=body, headers=headers, timeout=10)
+    return response.status_code
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def main():
+    """Skicka syntetiska händelser till en mottagare"""
+    parser = argparse.ArgumentParser(description="Skicka signerade Revolut-webhooks till en lokal mottagare")
+    parser.add_argument("--url", default="http://127.0.0.1:8780/webhooks/revolut", help="Mottagarens URL")
+    parser.add_argument("--secret", required=True, help="Signeringshemlighet (REVOLUT_WEBHOOK_SECRET)")
+    parser.add_argument("--events", type=int, default=10, help="Antal transaktioner")
+    parser.add_argument("--pending", action="store_true", help="Skapa som pending och slutför med StateChanged")
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import revolut_transactions
+
+    session = requests.Session()
+    statuses: Dict[int, int] = {}
+    for transaction in revolut_transactions(args.events):
+        if args.pending:
+            events = [
+                transaction_created({**transaction, "state": "pending"}),
+                state_changed(transaction["id"], "pending", "completed"),
+            ]
+        else:
+            events = [transaction_created(transaction)]
+        for event in events:
+            status = post_event(args.url, args.secret, event, session)
+            statuses[status] = statuses.get(status, 0) + 1
+    print(f"Skickade {sum(statuses.values())} händelser: {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Tester för balance_index
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from beancount import loader
+
+from agents.balance_index import BalanceIndex
+
+LEDGER = """
+2025-01-01 open Assets:Bank:Företagskonto SEK
+2025-01-01 open Assets:Bank:Revolut:EUR EUR
+2025-01-01 open Equity:Ingående:Balans
+2025-01-01 open Expenses:Programvara
+
+2025-01-01 * "Ingående balans"
+  Assets:Bank:Företagskonto   1000.00 SEK
+  Assets:Bank:Revolut:EUR      100.00 EUR
+  Equity:Ingående:Balans
+
+2025-01-10 * "Telia"
+  Expenses:Programvara         200.00 SEK
+  Assets:Bank:Företagskonto
+
+2025-01-10 * "Telia"
+  Expenses:Programvara         200.00 SEK
+  Assets:Bank:Företagskonto
+
+2025-02-01 * "GitHub"
+  Expenses:Programvara          10.50 EUR
+  Assets:Bank:Revolut:EUR
+"""
+
+BACKDATED = """
+2025-01-05 * "Kontorsmaterial"
+  Expenses:Programvara          50.00 SEK
+  Assets:Bank:Företagskonto
+"""
+
+APPENDED = """
+2025-03-01 * "Kontorsmaterial"
+  Expenses:Programvara          25.00 SEK
+  Assets:Bank:Företagskonto
+"""
+
+
+def _entries(text):
+    entries, errors, _options = loader.load_string(text)
+    assert not errors
+    return entries
+
+
+def test_balance_on_date():
+    index = BalanceIndex()
+    assert index.sync(_entries(LEDGER)) == 4
+
+    assert index.balance("Assets:Bank:Företagskonto", date(2024, 12, 31)) == {}
+    assert index.balance("Assets:Bank:Företagskonto", date(2025, 1, 9)) == {"SEK": Decimal("1000.00")}
+    # Två identiska transaktioner samma dag räknas båda
+    assert index.balance("Assets:Bank:Företagskonto", date(2025, 1, 10)) == {"SEK": Decimal("600.00")}
+    assert index.balance("Assets:Bank", date(2025, 12, 31), include_children=True) == {
+        "EUR": Decimal("89.50"),
+        "SEK": Decimal("600.00"),
+    }
+    # Prefix utan kolon är inte ett överkonto
+    assert index.balance("Assets:Ban", date(2025, 12, 31), include_children=True) == {}
+
+
+def test_delta_between_dates():
+    index = BalanceIndex()
+    index.sync(_entries(LEDGER))
+    assert index.delta("Expenses", date(2025, 1, 10), date(2025, 2, 1), include_children=True) == {
+        "EUR": Decimal("10.50"),
+        "SEK": Decimal("400.00"),
+    }
+    assert index.delta("Expenses:Programvara", date(2025, 1, 11), date(2025, 1, 31)) == {}
+
+
+def test_incremental_append_and_backdated(tmp_path):
+    db_path = tmp_path / "balances.sqlite"
+    index = BalanceIndex(db_path)
+    index.sync(_entries(LEDGER))
+    index.close()
+
+    index = BalanceIndex(db_path)
+    assert index.sync(_entries(LEDGER)) == 0
+    assert index.sync(_entries(LEDGER + BACKDATED + APPENDED)) == 2
+
+    account = "Assets:Bank:Företagskonto"
+    assert index.balance(account, date(2025, 1, 5)) == {"SEK": Decimal("950.00")}
+    assert index.balance(account, date(2025, 1, 10)) == {"SEK": Decimal("550.00")}
+    assert index.balance(account, date(2025, 3, 1)) == {"SEK": Decimal("525.00")}
+
+
+def test_removed_entries_rebuild():
+    index = BalanceIndex()
+    index.sync(_entries(LEDGER + BACKDATED))
+    index.sync(_entries(LEDGER))
+    assert index.balance("Assets:Bank:Företagskonto", date(2025, 12, 31)) == {"SEK": Decimal("600.00")}
+    assert "Equity:Ingående:Balans" in index.accounts()
@@ -0,0 +1,64 @@
+"""
+Tester för Config
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from agents.config import Config
+from agents.invoice_processor import InvoiceProcessor
+
+
+def test_settings_resolved_lazily_and_cached(tmp_path):
+    environ = {"OCR_DPI": "200"}
+    config = Config(base_dir=tmp_path, environ=environ)
+    assert config._env is None
+
+    assert config.OCR_DPI == 200
+    environ["OCR_DPI"] = "400"
+    assert config.OCR_DPI == 200
+    assert Config(base_dir=tmp_path, environ=environ).OCR_DPI == 400
+
+
+def test_env_file_overrides_and_paths(tmp_path):
+    (tmp_path / ".env").write_text("COMPANY_NAME=Acme AB\nCURRENCY=EUR\nDATA_LEDGER=books\n")
+    config = Config(base_dir=tmp_path, environ={"CURRENCY": "NOK"}, OCR_MODE="full")
+
+    assert config.COMPANY_NAME == "Acme AB"
+    assert config.CURRENCY == "NOK"
+    assert config.DATA_LEDGER == tmp_path / "books"
+    assert config.OCR_MODE == "full"
+
+    other = config.with_overrides(DATA_LEDGER="/srv/other")
+    assert other.DATA_LEDGER == Path("/srv/other")
+    assert other.OCR_MODE == "full"
+    assert config.DATA_LEDGER == tmp_path / "books"
+
+    with pytest.raises(TypeError):
+        Config(DATA_LEGDER="x")
+
+
+def test_invoice_processor_uses_config_paths(tmp_path):
+    config = Config(base_dir=tmp_path, environ={}, INVOICE_LLM_ENABLED="false", OCR_PREPROCESS="false")
+    processor = InvoiceProcessor(config=config)
+
+    assert processor.inbox_path == tmp_path / "data" / "inbox"
+    assert processor.processed_path.is_dir()
+    assert processor.archive_path == tmp_path / "data" / "archive"
+    assert processor.llm_extractor is None
+
+
+def test_import_has_no_side_effects(tmp_path):
+    code = (
+        "import logging, agents.invoice_processor, agents.revolut_sync_agent;"
+        "assert not logging.getLogger().handlers;"
+        "from agents.config import config; assert config._env is None"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code], cwd=tmp_path, check=True,
+        env={"PYTHONPATH": str(Path(__file__).resolve().parent.parent)},
+    )
+    assert list(tmp_path.iterdir()) == []
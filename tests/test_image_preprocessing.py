@@ -0,0 +1,113 @@
+"""
+Tester för image_preprocessing
+"""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from agents.image_preprocessing import (
+    ImagePreprocessor,
+    PreprocessOptions,
+    adaptive_threshold,
+    crop_borders,
+    downscale_to_dpi,
+    estimate_dpi,
+    estimate_skew,
+    to_grayscale,
+)
+
+
+def _text_lines_image(width=1200, height=900) -> Image.Image:
+    """Syntetisk sida med horisontella "textrader"."""
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(100, height - 100, 40):
+        draw.rectangle([100, y, width - 100, y + 12], fill=0)
+    return image
+
+
+def test_to_grayscale_uses_luminance():
+    """Test att färgbild konverteras med luminansvikter"""
+    image = Image.new("RGB", (4, 4), (255, 0, 0))
+    gray = to_grayscale(image)
+    assert gray.dtype == np.uint8
+    assert gray.shape == (4, 4)
+    assert int(gray[0, 0]) == 76
+
+
+def test_estimate_dpi_falls_back_to_a4_width():
+    """Test att DPI uppskattas från A4-bredd när metadata saknas"""
+    image = Image.new("L", (2480, 3508), 255)
+    assert estimate_dpi(image) == pytest.approx(300, abs=1)
+
+    image.info["dpi"] = (72, 72)
+    assert estimate_dpi(image) == pytest.approx(300, abs=1)
+
+    image.info["dpi"] = (600, 600)
+    assert estimate_dpi(image) == 600
+
+
+def test_downscale_never_upscales():
+    """Test nedskalning till mål-DPI"""
+    gray = np.full((1000, 800), 255, dtype=np.uint8)
+    assert downscale_to_dpi(gray, 600, 300).shape == (500, 400)
+    assert downscale_to_dpi(gray, 200, 300) is gray
+
+
+def test_adaptive_threshold_handles_uneven_lighting():
+    """Test att text hittas både i ljusa och mörka delar av bilden"""
+    gradient = np.tile(np.linspace(90, 250, 400), (200, 1))
+    gray = gradient.astype(np.uint8)
+    gray[90:110, 20:60] -= 60  # mörk del
+    gray[90:110, 340:380] -= 60  # ljus del
+
+    binary = adaptive_threshold(gray, block_size=31, offset=12)
+
+    assert (binary[95:105, 25:55] == 0).all()
+    assert (binary[95:105, 345:375] == 0).all()
+    assert (binary[10:30, :] == 255).all()
+
+
+@pytest.mark.parametrize("angle", [3.0, -4.5, 0.0])
+def test_estimate_skew(angle):
+    """Test att lutningen på textrader uppskattas"""
+    rotated = _text_lines_image().rotate(angle, expand=True, fillcolor=255)
+    binary = adaptive_threshold(to_grayscale(rotated))
+    assert estimate_skew(binary) == pytest.approx(angle, abs=0.2)
+
+
+def test_crop_borders_removes_dark_frame():
+    """Test att mörk kant och tom marginal beskärs bort"""
+    binary = np.full((500, 400), 255, dtype=np.uint8)
+    binary[:10, :] = 0
+    binary[:, :10] = 0
+    binary[200:220, 150:250] = 0
+
+    cropped = crop_borders(binary, margin=5)
+
+    assert cropped.shape == (30, 110)
+    assert (cropped == 0).sum() == 20 * 100
+
+
+def test_process_file_uses_cache(tmp_path):
+    """Test att förbehandlat resultat cachas per filinnehåll"""
+    source = tmp_path / "faktura.png"
+    _text_lines_image().rotate(2, expand=True, fillcolor=255).save(source)
+    cache_dir = tmp_path / "cache"
+
+    preprocessor = ImagePreprocessor(PreprocessOptions(target_dpi=150), cache_dir=cache_dir)
+    first = preprocessor.process_file(source)
+    cached_files = list(cache_dir.glob("*.png"))
+    assert len(cached_files) == 1
+
+    # Flyttad fil med samma innehåll ska träffa cachen
+    moved = tmp_path / "arkiv.png"
+    source.rename(moved)
+    second = preprocessor.process_file(moved)
+    assert np.array_equal(np.asarray(first), np.asarray(second))
+    assert len(list(cache_dir.glob("*.png"))) == 1
+
+    # Andra inställningar ger en ny cachepost
+    ImagePreprocessor(PreprocessOptions(deskew=False), cache_dir=cache_dir).process_file(moved)
+    assert len(list(cache_dir.glob("*.png"))) == 2
@@ -0,0 +1,127 @@
+"""
+Tester för invoice_matching
+"""
+
+from datetime import date
+
+from agents.invoice_matching import (
+    BankTransaction,
+    InvoiceMatcher,
+    TransactionIndex,
+    bank_transactions_from_revolut,
+    normalize_name,
+    to_minor_units,
+)
+
+
+def _invoice(**kwargs):
+    data = {
+        "supplier": "Telia Sverige AB",
+        "amount": "998.00",
+        "currency": "SEK",
+        "invoice_date": "2025-01-15",
+        "due_date": "2025-02-14",
+        "ocr_reference": "4455667788",
+    }
+    data.update(kwargs)
+    return data
+
+
+def _tx(tx_id, day, amount, **kwargs):
+    return BankTransaction(
+        id=tx_id,
+        date=day,
+        amount_minor=to_minor_units(amount),
+        currency=kwargs.pop("currency", "SEK"),
+        account=kwargs.pop("account", "Assets:Bank:Revolut:SEK"),
+        **kwargs,
+    )
+
+
+def test_to_minor_units():
+    assert to_minor_units("998.00") == 99800
+    assert to_minor_units("-12.5") == -1250
+    assert to_minor_units(0.1) == 10
+
+
+def test_normalize_name():
+    assert normalize_name("To Telia Sverige AB") == "telia sverige"
+    assert normalize_name("Scandic Hotels AB (publ)") == "scandic hotels"
+
+
+def test_index_candidates_within_window():
+    index = TransactionIndex([
+        _tx("a", date(2025, 1, 1), "-998.00"),
+        _tx("b", date(2025, 2, 10), "-998.00"),
+        _tx("c", date(2025, 6, 1), "-998.00"),
+        _tx("d", date(2025, 2, 10), "-999.00"),
+    ])
+    found = index.candidates("SEK", -99800, date(2025, 1, 10), date(2025, 3, 1))
+    assert [tx.id for tx in found] == ["b"]
+    assert index.candidates("EUR", -99800, date(2025, 1, 1), date(2025, 12, 31)) == []
+
+
+def test_match_prefers_ocr_reference():
+    transactions = [
+        _tx("other", date(2025, 2, 14), "-998.00", counterparty="Okänd"),
+        _tx("telia", date(2025, 2, 20), "-998.00", reference="OCR 4455667788"),
+    ]
+    matches = InvoiceMatcher().match([_invoice()], transactions)
+    assert matches[0].transaction.id == "telia"
+    assert "ocr" in matches[0].reasons
+
+
+def test_match_uses_fuzzy_counterparty():
+    transactions = [
+        _tx("other", date(2025, 2, 14), "-998.00", counterparty="Kontorsgiganten"),
+        _tx("telia", date(2025, 2, 16), "-998.00", counterparty="To TELIA SVERIGE"),
+    ]
+    matches = InvoiceMatcher().match([_invoice(ocr_reference=None)], transactions)
+    assert matches[0].transaction.id == "telia"
+    assert "motpart" in matches[0].reasons
+
+
+def test_each_transaction_used_once():
+    invoices = [_invoice(ocr_reference=None), _invoice(ocr_reference=None, supplier="Annan AB")]
+    transactions = [_tx("only", date(2025, 2, 14), "-998.00", counterparty="Telia")]
+    matches = InvoiceMatcher().match(invoices, transactions)
+    assert list(matches) == [0]
+
+
+def test_no_match_outside_window_or_wrong_sign():
+    transactions = [
+        _tx("late", date(2025, 4, 1), "-998.00"),
+        _tx("incoming", date(2025, 2, 14), "998.00"),
+    ]
+    assert InvoiceMatcher(days_after=30).match([_invoice()], transactions) == {}
+
+
+def test_bank_transactions_from_revolut():
+    payload = [{
+        "id": "tx-1",
+        "state": "completed",
+        "completed_at": "2025-02-14T10:00:00Z",
+        "reference": "4455667788",
+        "legs": [{"amount": -998.0, "currency": "SEK", "description": "To Telia"}],
+    }, {
+        "id": "tx-2",
+        "state": "pending",
+        "created_at": "2025-02-15T10:00:00Z",
+        "legs": [{"amount": -10.0, "currency": "SEK"}],
+    }]
+    transactions = bank_transactions_from_revolut(payload)
+    assert transactions == [BankTransaction(
+        id="tx-1",
+        date=date(2025, 2, 14),
+        amount_minor=-99800,
+        currency="SEK",
+        account="Assets:Bank:Revolut:SEK",
+        reference="4455667788",
+        counterparty="To Telia",
+    )]
+
+
+def test_minor_units_follow_currency():
+    assert to_minor_units("12.50", "SEK") == 1250
+    assert to_minor_units("1234", "JPY") == 1234
+    assert to_minor_units("1.234", "KWD") == 1234
@@ -0,0 +1,71 @@
+"""
+Tester för köbaserad loggning
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from agents.config import Config
+from agents.logging_setup import RateLimitFilter, setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _log_from_worker(number):
+    logger.info("arbetare %s", number, extra={"worker": number})
+    return os.getpid()
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_json_lines_with_extra_fields(tmp_path):
+    log_file = tmp_path / "logs" / "agent.log"
+    logs = setup_logging(Config(environ={}), log_file=log_file, json_format=True, stream=None)
+    logger.info("synk klar", extra={"entries": 12})
+    try:
+        raise ValueError("trasig")
+    except ValueError:
+        logger.exception("fel")
+    logs.stop()
+
+    first, second = _lines(log_file)
+    assert first["message"] == "synk klar"
+    assert first["entries"] == 12
+    assert first["logger"] == __name__
+    assert "ValueError: trasig" in second["exception"]
+
+
+def test_rate_limit_per_call_site():
+    limiter = RateLimitFilter(limit=3, interval=60)
+    records = [
+        logging.LogRecord(__name__, logging.INFO, "sync.py", 10, f"transaktion {i}", None, None)
+        for i in range(10)
+    ]
+    passed = [record for record in records if limiter.filter(record)]
+    assert len(passed) == 3
+
+    other_site = logging.LogRecord(__name__, logging.INFO, "sync.py", 11, "annat", None, None)
+    error = logging.LogRecord(__name__, logging.ERROR, "sync.py", 10, "fel", None, None)
+    assert limiter.filter(other_site) and limiter.filter(error)
+
+    limiter.interval = 0
+    record = logging.LogRecord(__name__, logging.INFO, "sync.py", 10, "transaktion 10", None, None)
+    assert limiter.filter(record)
+    assert record.getMessage() == "transaktion 10 (7 liknande meddelanden undertryckta)"
+
+
+def test_process_pool_workers_log_through_parent(tmp_path):
+    log_file = tmp_path / "agent.log"
+    logs = setup_logging(Config(environ={}), log_file=log_file, json_format=True, rate_limit=0, stream=None)
+    with ProcessPoolExecutor(max_workers=2, **logs.pool_kwargs()) as pool:
+        pids = set(pool.map(_log_from_worker, range(6)))
+    logs.stop()
+
+    lines = _lines(log_file)
+    assert sorted(line["worker"] for line in lines) == list(range(6))
+    assert {line["process"] for line in lines} == pids
+    assert os.getpid() not in pids
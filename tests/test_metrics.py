@@ -0,0 +1,69 @@
+"""
+Tester för metrics
+"""
+
+import json
+from types import SimpleNamespace
+
+from agents.metrics import Histogram, Metrics, metrics
+from agents.revolut_integration import RevolutSync
+from tests.revolut_stub import RevolutStub
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.1, 1.0, 10.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [1, 3, 4]
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(1.0) == 5.0
+    assert histogram.summary()["count"] == 4
+
+
+def test_prometheus_textfile_and_json(tmp_path):
+    registry = Metrics()
+    registry.inc("sync_skipped_total", kind="transactions", state="pending")
+    registry.inc("sync_skipped_total", kind="transactions", state="pending")
+    registry.observe("revolut_api_request_seconds", 0.02, endpoint="/transactions")
+
+    prom_path, json_path = registry.write("revolut_sync", tmp_path)
+    text = prom_path.read_text()
+    assert "# TYPE efficra_sync_skipped_total counter" in text
+    assert 'efficra_sync_skipped_total{job="revolut_sync",kind="transactions",state="pending"} 2' in text
+    assert ('efficra_revolut_api_request_seconds_bucket{job="revolut_sync",endpoint="/transactions",le="0.025"} 1'
+            in text)
+    assert 'efficra_revolut_api_request_seconds_count{job="revolut_sync",endpoint="/transactions"} 1' in text
+
+    summary = json.loads(json_path.read_text())
+    assert summary["counters"]["sync_skipped_total"]["kind=transactions,state=pending"] == 2
+    assert summary["histograms"]["revolut_api_request_seconds"]["endpoint=/transactions"]["count"] == 1
+
+
+def test_sync_records_stage_metrics(tmp_path):
+    transactions = [
+        {"id": "tx-1", "type": "card_payment", "state": "completed",
+         "created_at": "2099-01-01T10:00:00Z", "completed_at": "2099-01-01T10:00:00Z",
+         "legs": [{"amount": -100.0, "currency": "SEK", "description": "To Telia"}]},
+        {"id": "tx-2", "type": "card_payment", "state": "pending",
+         "created_at": "2099-01-01T09:00:00Z",
+         "legs": [{"amount": -50.0, "currency": "SEK", "description": "To SJ"}]},
+    ]
+    config = SimpleNamespace(DATA_LEDGER=tmp_path, CLASSIFIER_ENABLED=False, PRICE_DB=None, CURRENCY="SEK")
+    metrics.reset()
+    with RevolutStub(transactions=transactions, faults=[503]) as stub:
+        sync = RevolutSync("test", config=config, base_url=stub.api_url)
+        try:
+            sync.get_balances()
+        except Exception:
+            pass
+        sync.sync_transactions(output_file=tmp_path / "import.beancount")
+
+    summary = metrics.summary()
+    assert summary["counters"]["revolut_api_errors_total"] == {"endpoint=/accounts,status=503": 1}
+    assert summary["counters"]["sync_entries_total"] == {"kind=transactions": 1}
+    assert summary["counters"]["sync_skipped_total"] == {"kind=transactions,state=pending": 1}
+    assert summary["counters"]["revolut_pages_fetched_total"] == {"endpoint=/transactions": 1}
+    assert set(summary["histograms"]["revolut_api_request_seconds"]) == {
+        "endpoint=/accounts", "endpoint=/transactions"
+    }
+    assert summary["histograms"]["sync_write_seconds"]["kind=transactions"]["count"] == 1
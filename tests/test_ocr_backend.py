@@ -0,0 +1,107 @@
+"""
+Tester för ocr_backend
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from agents import ocr_backend
+from agents.ocr_backend import (
+    PytesseractBackend,
+    TesserocrBackend,
+    close_ocr_backends,
+    get_ocr_backend,
+)
+
+
+class FakeTessAPI:
+    """Ersätter tesserocr.PyTessBaseAPI och räknar initieringar"""
+
+    instances = []
+
+    def __init__(self, lang="eng", path=None):
+        self.lang = lang
+        self.images = []
+        self.cleared = 0
+        self.ended = False
+        FakeTessAPI.instances.append(self)
+
+    def SetPageSegMode(self, psm):
+        self.psm = psm
+
+    def SetImage(self, image):
+        self.images.append(image)
+
+    def GetUTF8Text(self):
+        return f"text {len(self.images)}"
+
+    def Clear(self):
+        self.cleared += 1
+
+    def End(self):
+        self.ended = True
+
+
+@pytest.fixture
+def fake_tesserocr(monkeypatch):
+    FakeTessAPI.instances = []
+    fake = SimpleNamespace(PyTessBaseAPI=FakeTessAPI, PSM=SimpleNamespace(AUTO=3))
+    monkeypatch.setattr(ocr_backend, "tesserocr", fake)
+    close_ocr_backends()
+    yield fake
+    close_ocr_backends()
+
+
+def test_tesserocr_engine_is_reused(fake_tesserocr):
+    """Test att språkdata laddas en gång och motorn återanvänds"""
+    backend = TesserocrBackend("swe+eng")
+    image = Image.new("L", (10, 10), 255)
+
+    for _ in range(5):
+        backend.image_to_string(image)
+
+    assert len(FakeTessAPI.instances) == 1
+    engine = FakeTessAPI.instances[0]
+    assert engine.lang == "swe+eng"
+    assert engine.images[0] is image
+    assert engine.cleared == 5
+
+
+def test_tesserocr_engine_per_thread(fake_tesserocr):
+    """Test att varje tråd får en egen motor"""
+    backend = TesserocrBackend("swe")
+    image = Image.new("L", (10, 10), 255)
+
+    threads = [threading.Thread(target=backend.image_to_string, args=(image,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(FakeTessAPI.instances) == 3
+
+    backend.close()
+    assert all(engine.ended for engine in FakeTessAPI.instances)
+
+
+def test_get_ocr_backend_prefers_tesserocr(fake_tesserocr):
+    """Test att auto väljer tesserocr och delar instans per process"""
+    backend = get_ocr_backend("swe+eng")
+    assert isinstance(backend, TesserocrBackend)
+    assert get_ocr_backend("swe+eng") is backend
+
+
+def test_get_ocr_backend_falls_back_to_pytesseract(monkeypatch):
+    """Test fallback till pytesseract när tesserocr saknas"""
+    monkeypatch.setattr(ocr_backend, "tesserocr", None)
+    close_ocr_backends()
+
+    assert isinstance(get_ocr_backend("swe+eng"), PytesseractBackend)
+    with pytest.raises(ImportError):
+        get_ocr_backend("swe+eng", preferred="tesserocr")
+    with pytest.raises(ValueError):
+        get_ocr_backend("swe+eng", preferred="okänd")
+    close_ocr_backends()
@@ -0,0 +1,128 @@
+"""
+Tester för ocr_regions
+"""
+
+from PIL import Image
+
+from agents.ocr_backend import OCRBackend, OCRWord
+from agents.ocr_regions import RegionOCR, match_anchor, match_line
+
+PAGE_SIZE = (2480, 3508)  # A4 i 300 DPI
+
+# (text, left, top) i 300 DPI, radhöjd 40 px
+PAGE_WORDS = [
+    ("Telia", 150, 150), ("Sverige", 300, 150), ("AB", 500, 150),
+    ("Fakturadatum:", 150, 900), ("2025-01-15", 700, 900),
+    ("Förfallodatum:", 150, 960), ("2025-02-14", 700, 960),
+    ("Mobilabonnemang", 150, 1400), ("319,20", 1800, 1400),
+    ("Moms", 150, 2200), ("25%", 300, 2200), ("199,60", 1800, 2200),
+    ("Att", 150, 2260), ("betala", 250, 2260), ("998,00", 1800, 2260),
+    ("Bankgiro:", 150, 3100), ("5050-1055", 500, 3100),
+]
+
+
+class FakePageBackend(OCRBackend):
+    """Returnerar ord från PAGE_WORDS skalade till den bild som läses"""
+
+    def __init__(self, words=PAGE_WORDS):
+        super().__init__("swe+eng")
+        self.words = words
+        self.layout_sizes = []
+        self.string_calls = []
+
+    def image_to_words(self, image, psm=None):
+        self.layout_sizes.append(image.size)
+        scale = image.width / PAGE_SIZE[0]
+        return [
+            OCRWord(text, 90.0, int(left * scale), int(top * scale), int(100 * scale), int(40 * scale))
+            for text, left, top in self.words
+        ]
+
+    def image_to_string(self, image, psm=None):
+        self.string_calls.append((image.size, psm))
+        return f"region {image.size[1]}"
+
+
+def test_match_anchor_tolerates_ocr_noise():
+    """Test att ankarord känns igen även med lågupplösta felläsningar"""
+    assert match_anchor("Förfallodatum:") == "dates"
+    assert match_anchor("Forfallodatum") == "dates"
+    assert match_anchor("Bankgiro") == "payment"
+    assert match_anchor("OCR-nr") == "payment"
+    assert match_anchor("Mobilabonnemang") is None
+
+
+def test_common_words_are_not_anchors():
+    """Test att vanliga ord bara är ankare i sina fraser"""
+    for word in ("Att", "Moms", "Summa", "Total", "Totalt", "Belopp", "Faktura", "Datum"):
+        assert match_anchor(word) is None
+    assert match_line(["Summa", "att", "betala:"]) == "totals"
+    assert match_line(["Totalt", "att", "betala"]) == "totals"
+    assert match_line(["Exkl.", "moms"]) == "totals"
+    assert match_line(["Vi", "ber", "dig", "att", "kontrollera", "summan"]) is None
+
+
+def test_layout_pass_runs_at_low_resolution():
+    """Test att layoutpasset körs i låg upplösning och hittar regionerna"""
+    backend = FakePageBackend()
+    region_ocr = RegionOCR(backend, layout_dpi=100)
+    image = Image.new("L", PAGE_SIZE, 255)
+
+    regions = region_ocr.layout(image, source_dpi=300)
+
+    assert backend.layout_sizes == [(827, 1169)]
+    names = [region.name for region in regions]
+    assert names[0].startswith("header")
+    assert any("dates" in name for name in names)
+    assert any("totals" in name for name in names)
+    assert any("payment" in name for name in names)
+
+    # Raden utan ankare (Mobilabonnemang) ska inte läsas
+    assert not any(top <= 1400 <= bottom for _l, top, _r, bottom in (r.box for r in regions))
+
+
+def test_recognize_reads_only_regions():
+    """Test att högupplöst pass bara läser regionerna"""
+    backend = FakePageBackend()
+    image = Image.new("L", PAGE_SIZE, 255)
+
+    result = RegionOCR(backend).recognize(image, source_dpi=300)
+
+    assert not result.full_page
+    assert len(backend.string_calls) == len(result.regions)
+    assert all(psm == 6 for _size, psm in backend.string_calls)
+    assert result.coverage < 0.5
+    assert result.text.count("region") == len(result.regions)
+
+
+def test_recognize_falls_back_to_full_page():
+    """Test att hela sidan läses om inga ankare hittas"""
+    backend = FakePageBackend(words=[("Tack", 150, 150), ("för", 300, 150), ("besöket", 450, 150)])
+    image = Image.new("L", PAGE_SIZE, 255)
+
+    result = RegionOCR(backend).recognize(image, source_dpi=300)
+
+    assert result.full_page
+    assert backend.string_calls == [(PAGE_SIZE, None)]
+
+
+def test_body_text_does_not_force_full_page():
+    """Test att en faktura med löptext läses som regioner, inte hela sidan"""
+    body = [
+        "Tack för att du är kund hos oss och att du valt vårt abonnemang",
+        "Observera att moms ingår i alla priser som anges nedan",
+        "Total förbrukning under perioden och summa per tjänst",
+        "Datum för nästa faktura framgår av Mina sidor",
+        "Belopp under 10 kr faktureras med nästa faktura",
+        "Kontakta kundtjänst om du har frågor om att betalningen dragits",
+    ]
+    words = list(PAGE_WORDS)
+    for i, line in enumerate(body * 4):
+        words += [(word, 150 + 120 * j, 1100 + 70 * i) for j, word in enumerate(line.split())]
+    backend = FakePageBackend(words=words)
+    image = Image.new("L", PAGE_SIZE, 255)
+
+    result = RegionOCR(backend).recognize(image, source_dpi=300)
+
+    assert not result.full_page
+    assert result.coverage < 0.5
@@ -0,0 +1,86 @@
+"""
+Tester för ollama_extractor mot en lokal stubbserver
+"""
+
+from agents.ollama_extractor import (
+    SYSTEM_PROMPT,
+    USER_PREFIX,
+    OllamaExtractor,
+    normalize_llm_fields,
+)
+from tests.ollama_stub import OllamaStub
+
+CAFE_FIELDS = {
+    "supplier": "Café Lilla Torget",
+    "invoice_date": "2025-06-02",
+    "amount": "80,00",
+    "vat": "8.57",
+    "vat_rate": "12%",
+    "currency": "SEK",
+}
+
+
+def test_normalize_llm_fields():
+    """Test att LLM-svar normaliseras till samma format som regelmotorn"""
+    fields = normalize_llm_fields(CAFE_FIELDS)
+
+    assert fields["amount"] == "80.00"
+    assert fields["vat"] == "8.57"
+    assert fields["vat_rate"] == "12"
+    assert fields["invoice_date"] == "2025-06-02"
+    assert fields["ocr_reference"] is None
+
+
+def test_prompt_prefix_is_identical():
+    """Test att allt utom OCR-texten är identiskt mellan anrop (KV-cache)"""
+    extractor = OllamaExtractor()
+    first = extractor.build_request("faktura A")
+    second = extractor.build_request("faktura B")
+
+    assert first["messages"][0] == second["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert first["messages"][1]["content"].startswith(USER_PREFIX)
+    assert first["format"]["required"]
+    assert first["stream"] is False
+
+
+def test_extract_batch_concurrent_and_cached(tmp_path):
+    """Test parallella anrop med begränsat antal samtidiga och cache"""
+    texts = [f"Kvitto nr {i}\nCafé Lilla Torget" for i in range(12)]
+
+    with OllamaStub({"Café": CAFE_FIELDS}, latency=0.05) as stub:
+        extractor = OllamaExtractor(host=stub.url, max_in_flight=3, cache_dir=tmp_path)
+        results = extractor.extract_batch(texts + texts[:2])
+
+        assert len(results) == 14
+        assert all(r["supplier"] == "Café Lilla Torget" for r in results)
+        assert len(stub.requests) == 12  # dubbletter skickas inte
+        assert 1 < stub.max_in_flight <= 3
+        assert len(stub.connections) <= 3  # anslutningar återanvänds
+
+        # Andra körningen kommer helt från cachen
+        extractor.extract_batch(texts)
+        assert len(stub.requests) == 12
+
+    # Diskcachen överlever en ny instans utan server
+    fresh = OllamaExtractor(host="http://127.0.0.1:9", cache_dir=tmp_path)
+    assert fresh.extract(texts[0])["amount"] == "80.00"
+
+
+def test_extract_returns_none_on_error():
+    """Test att ett misslyckat anrop ger None istället för undantag"""
+    extractor = OllamaExtractor(host="http://127.0.0.1:9", timeout=1)
+    assert extractor.extract("Faktura") is None
+
+
+def test_non_object_answer_fails_only_that_invoice(tmp_path):
+    """Test att ett svar som inte är ett objekt, och en trasig cache, inte stoppar batchen"""
+    cache_dir = tmp_path / "cache"
+    cache_dir.write_text("inte en katalog", encoding="utf-8")
+    responses = {"lista": ["80,00"], "tomt": None, "Café": CAFE_FIELDS}
+
+    with OllamaStub(responses) as stub:
+        extractor = OllamaExtractor(host=stub.url, cache_dir=cache_dir)
+        results = extractor.extract_batch(["Faktura lista", "Faktura tomt", "Café Lilla Torget"])
+
+    assert results[:2] == [None, None]
+    assert results[2]["amount"] == "80.00"
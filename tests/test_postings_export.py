@@ -0,0 +1,147 @@
+"""
+Tester för postings_export
+"""
+
+import sys
+from datetime import date
+
+import numpy as np
+
+from agents.config import Config
+from agents.postings_export import PostingsExport, main
+
+MAIN = """
+option "operating_currency" "SEK"
+
+2024-01-01 open Assets:Bank:Företagskonto
+2024-01-01 open Assets:Bank:Revolut:SEK
+2024-01-01 open Assets:Kundfordringar
+2024-01-01 open Liabilities:Skatteskulder:Moms
+2024-01-01 open Income:Konsulttjänster
+2024-01-01 open Expenses:Programvara
+2024-01-01 open Equity:Ingående:Balans
+
+2024-01-01 * "Ingående balans"
+  Assets:Bank:Företagskonto  100000.00 SEK
+  Equity:Ingående:Balans
+
+include "2024.beancount"
+include "2025.beancount"
+"""
+
+YEAR_2024 = """
+2024-11-05 * "Kund A AB" "Konsultarvode"
+  Assets:Bank:Företagskonto  12500.00 SEK
+  Income:Konsulttjänster    -10000.00 SEK
+  Liabilities:Skatteskulder:Moms  -2500.00 SEK
+
+2024-12-03 * "GitHub" "Licens"
+  Expenses:Programvara  100.00 EUR @ 11.50 SEK
+  Assets:Bank:Revolut:SEK
+
+2024-12-10 * "Överföring"
+  Assets:Bank:Revolut:SEK  5000.00 SEK
+  Assets:Bank:Företagskonto
+"""
+
+YEAR_2025 = """
+2025-01-15 * "Kund B AB" "Konsultarvode"
+  Assets:Kundfordringar  25000.00 SEK
+  Income:Konsulttjänster  -20000.00 SEK
+  Liabilities:Skatteskulder:Moms  -5000.00 SEK
+"""
+
+LATE_SALE = """
+2025-02-20 * "Kund A AB" "Konsultarvode"
+  Assets:Bank:Företagskonto  6250.00 SEK
+  Income:Konsulttjänster  -5000.00 SEK
+  Liabilities:Skatteskulder:Moms  -1250.00 SEK
+"""
+
+
+def _ledger(tmp_path):
+    (tmp_path / "2024.beancount").write_text(YEAR_2024, encoding="utf-8")
+    (tmp_path / "2025.beancount").write_text(YEAR_2025, encoding="utf-8")
+    main = tmp_path / "main.beancount"
+    main.write_text(MAIN, encoding="utf-8")
+    return main
+
+
+def test_columns_are_dictionary_encoded(tmp_path):
+    export = PostingsExport(_ledger(tmp_path), tmp_path / "postings")
+    postings = export.load()
+
+    assert len(postings) == 12
+    assert len(postings.accounts) == 7
+    assert postings.account.dtype == np.int32
+    assert set(postings.payees) == {"", "Kund A AB", "GitHub", "Kund B AB"}
+    # EUR-posteringen har både belopp i EUR och vikt i SEK
+    eur = postings.currencies[postings.currency] == "EUR"
+    assert postings.number[eur].tolist() == [100.0]
+    assert postings.weight[eur].tolist() == [1150.0]
+    # Transaktionsnummer är unika över partitioner
+    assert len(np.unique(postings.txn)) == 5
+
+
+def test_reports(tmp_path):
+    postings = PostingsExport(_ledger(tmp_path), tmp_path / "postings").load()
+
+    assert postings.cash_flow() == {"2024-01": 100000.0, "2024-11": 12500.0, "2024-12": -1150.0}
+    assert postings.burn_rate(months=2, end=date(2025, 1, 10)) == -5675.0
+    assert postings.revenue_by_customer() == {"Kund B AB": 20000.0, "Kund A AB": 10000.0}
+    assert postings.revenue_by_customer(end=date(2024, 12, 31)) == {"Kund A AB": 10000.0}
+
+
+def test_only_changed_partitions_are_rewritten(tmp_path):
+    main = _ledger(tmp_path)
+    export = PostingsExport(main, tmp_path / "postings")
+    export.update()
+    assert export.loaded_ledger
+    assert len(export.written) == 3
+
+    export.update()
+    assert not export.loaded_ledger and export.written == []
+
+    year = tmp_path / "2025.beancount"
+    year.write_text(YEAR_2025 + LATE_SALE, encoding="utf-8")
+    postings = export.load()
+    assert not export.loaded_ledger
+    assert export.written == [str(year)]
+    assert postings.revenue_by_customer()["Kund A AB"] == 15000.0
+
+    # Ändrad huvudfil läser hela huvudboken men skriver bara om huvudfilens partition
+    main.write_text(MAIN + "\n; kommentar\n", encoding="utf-8")
+    export.update()
+    assert export.loaded_ledger
+    assert export.written == [str(main)]
+
+
+def test_new_file_under_glob_include(tmp_path):
+    main = tmp_path / "main.beancount"
+    main.write_text(MAIN.split("include")[0] + 'include "ledger/*.beancount"\n', encoding="utf-8")
+    (tmp_path / "ledger").mkdir()
+    (tmp_path / "ledger" / "a.beancount").write_text(YEAR_2024, encoding="utf-8")
+
+    export = PostingsExport(main, tmp_path / "postings")
+    assert export.load().revenue_by_customer() == {"Kund A AB": 10000.0}
+
+    added = tmp_path / "ledger" / "b.beancount"
+    added.write_text(YEAR_2025, encoding="utf-8")
+    postings = export.load()
+    assert export.loaded_ledger
+    # Oförändrade partitioner återanvänds
+    assert sorted(export.written) == sorted([str(main), str(added)])
+    assert postings.revenue_by_customer() == {"Kund B AB": 20000.0, "Kund A AB": 10000.0}
+
+
+def test_main_uses_given_config(tmp_path, monkeypatch, capsys):
+    config = Config(base_dir=tmp_path, environ={})
+    assert _ledger(tmp_path) == config.MAIN_LEDGER
+    monkeypatch.setattr(sys, "argv", ["postings_export.py", "--report", "customers"])
+
+    main(config)
+
+    assert (config.POSTINGS_DIR / "manifest.json").exists()
+    assert str(config.POSTINGS_DIR) in capsys.readouterr().out
+    # Köbaserad loggning till bolagets loggfil
+    assert config.LOG_FILE.exists()
@@ -0,0 +1,122 @@
+"""
+Tester för price_db
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from beancount import loader
+from beancount.core import data
+
+from agents.balance_index import BalanceIndex
+from agents.price_db import PriceDB, rates_from_exchange, revaluation_entry
+
+LEDGER = """
+2025-01-01 open Assets:Bank:Revolut:EUR EUR
+2025-01-01 open Equity:Ingående:Balans
+2025-01-01 open Expenses:Programvara
+
+2025-01-01 * "Ingående balans"
+  Assets:Bank:Revolut:EUR      100.00 EUR
+  Equity:Ingående:Balans
+
+2025-02-01 * "GitHub"
+  Expenses:Programvara          10.50 EUR
+  Assets:Bank:Revolut:EUR
+"""
+
+EXCHANGE = {
+    "id": "ex-1",
+    "type": "exchange",
+    "completed_at": "2025-01-15T10:00:00Z",
+    "legs": [
+        {"amount": -1150.00, "currency": "SEK"},
+        {"amount": 100.00, "currency": "EUR"},
+    ],
+}
+
+
+def test_rate_from_exchange_legs():
+    assert rates_from_exchange(EXCHANGE) == [("EUR", date(2025, 1, 15), Decimal("11.500000"))]
+    assert rates_from_exchange({**EXCHANGE, "type": "card_payment"}) == []
+
+
+def test_api_rate_replaces_exchange_rate_but_not_the_reverse():
+    prices = PriceDB()
+    assert prices.add_from_transactions([EXCHANGE]) == 1
+    assert prices.add_rates([("EUR", date(2025, 1, 15), Decimal("11.4"))], "api") == 1
+    assert prices.add_from_transactions([EXCHANGE]) == 0
+
+    assert prices.rate("EUR", date(2025, 1, 20)) == Decimal("11.4")
+    assert prices.rate("EUR", date(2025, 1, 14)) is None
+    assert prices.rate("SEK", date(2025, 1, 1)) == Decimal(1)
+
+
+def test_price_partitions_rewritten_only_on_change(tmp_path):
+    prices = PriceDB()
+    prices.add_rates([("EUR", date(2024, 12, 31), Decimal("11.5")),
+                      ("USD", date(2025, 1, 2), Decimal("10.9"))], "api")
+
+    written = prices.write_partitions(tmp_path)
+    assert [p.name for p in written] == ["prices_2024.beancount", "prices_2025.beancount"]
+    assert "2025-01-02 price USD 10.9 SEK" in (tmp_path / "prices_2025.beancount").read_text()
+    assert prices.write_partitions(tmp_path) == []
+
+    entries, errors, _options = loader.load_file(str(tmp_path / "prices_2025.beancount"))
+    assert not errors and len(entries) == 1
+
+
+def test_revaluation_of_foreign_currency_balance():
+    entries, errors, _options = loader.load_string(LEDGER)
+    assert not errors
+    index = BalanceIndex()
+    index.sync(entries)
+
+    prices = PriceDB()
+    prices.add_rates([
+        ("EUR", date(2025, 1, 1), Decimal("11.00")),
+        ("EUR", date(2025, 2, 1), Decimal("11.20")),
+        ("EUR", date(2025, 3, 31), Decimal("11.50")),
+    ], "api")
+
+    result = prices.revalue(index, date(2024, 12, 31), date(2025, 3, 31))
+    assert len(result) == 1
+    item = result[0]
+    assert item.account == "Assets:Bank:Revolut:EUR"
+    assert item.balance == Decimal("89.50")
+    assert item.value == Decimal("1029.25")
+    # 89.50 * 11.50 - (100 * 11.00 - 10.50 * 11.20)
+    assert item.adjustment == Decimal("46.85")
+
+    # Periodens slutvärde blir nästa periods ingångsvärde
+    next_period = prices.revalue(index, date(2025, 3, 31), date(2025, 6, 30))
+    assert next_period[0].adjustment == Decimal("0.00")
+
+    entry = revaluation_entry(result, date(2025, 3, 31))
+    assert "Assets:Bank:Revolut:EUR:Omvärdering  46.85 SEK" in entry
+    assert "Income:Valutakursvinster  -46.85 SEK" in entry
+
+
+def test_revaluation_entry_opens_missing_accounts():
+    entries, _errors, _options = loader.load_string(LEDGER)
+    index = BalanceIndex()
+    index.sync(entries)
+    prices = PriceDB()
+    prices.add_rates([
+        ("EUR", date(2025, 1, 1), Decimal("11.00")),
+        ("EUR", date(2025, 3, 31), Decimal("11.50")),
+    ], "api")
+    result = prices.revalue(index, date(2024, 12, 31), date(2025, 3, 31))
+
+    opened = {entry.account for entry in entries if isinstance(entry, data.Open)}
+    entry = revaluation_entry(result, date(2025, 3, 31), opened=opened)
+    assert "2025-03-31 open Assets:Bank:Revolut:EUR:Omvärdering SEK" in entry
+    assert "2025-03-31 open Income:Valutakursvinster SEK" in entry
+
+    # Huvudboken med omvärderingen validerar
+    _entries, errors, _options = loader.load_string(LEDGER + "\n" + entry)
+    assert not errors
+
+    # Redan öppna konton öppnas inte igen
+    again = revaluation_entry(result, date(2025, 3, 31), opened=opened | {"Income:Valutakursvinster"})
+    assert "open Income:Valutakursvinster" not in again
@@ -0,0 +1,81 @@
+"""
+Tester för den återupptagbara historiska importen
+"""
+
+from datetime import date, datetime, timezone
+
+from agents.config import Config
+from agents.revolut_backfill import Backfill, Checkpoint, month_chunks
+from agents.revolut_integration import RevolutSync
+from benchmarks.synthetic import revolut_transactions
+from tests.revolut_stub import RevolutStub
+
+
+def _sync(tmp_path, stub):
+    config = Config(base_dir=tmp_path, environ={}, CLASSIFIER_ENABLED="false", PRICE_DB=None)
+    return RevolutSync("test", config=config, base_url=stub.api_url)
+
+
+def _imported_ids(ledger):
+    ids = [
+        line.split('"')[1]
+        for path in ledger.glob("revolut_*.beancount")
+        for line in path.read_text().splitlines() if "revolut_id" in line
+    ]
+    assert len(ids) == len(set(ids))
+    return set(ids)
+
+
+def test_month_chunks():
+    chunks = month_chunks(date(2024, 11, 15), date(2025, 2, 10))
+
+    assert [key for key, _start, _end in chunks] == ["2024-11", "2024-12", "2025-01", "2025-02"]
+    assert chunks[0][1].isoformat() == "2024-11-15T00:00:00+00:00"
+    assert chunks[1][2].isoformat() == "2025-01-01T00:00:00+00:00"
+    assert chunks[-1][2].isoformat() == "2025-02-10T00:00:00+00:00"
+
+
+def test_corrupt_checkpoint_starts_over(tmp_path):
+    path = tmp_path / "backfill.json"
+    path.write_text('{"chunks": {"2025-01": {"from": "2025-01-01T00:', encoding="utf-8")
+    start, end = datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 2, 1, tzinfo=timezone.utc)
+
+    checkpoint = Checkpoint(path)
+    assert checkpoint.chunks == {}
+    checkpoint.mark("2025-01", start, end)
+    assert Checkpoint(path).done("2025-01", start, end)
+
+
+def test_backfill_resumes_after_failed_month(tmp_path):
+    transactions = revolut_transactions(1000)
+    expected = {tx["id"] for tx in transactions if tx["state"] != "pending"}
+
+    with RevolutStub(transactions=transactions) as stub:
+        sync = _sync(tmp_path, stub)
+        fetch = sync.business.get_all_transactions
+
+        def flaky(from_date, **kwargs):
+            if from_date.month == 2:
+                raise ConnectionError("avbruten")
+            return fetch(from_date=from_date, **kwargs)
+
+        sync.business.get_all_transactions = flaky
+        checkpoint = Checkpoint(tmp_path / "backfill.json")
+        first = Backfill(sync, checkpoint, workers=2, page_size=100).run(date(2025, 1, 1), date(2025, 4, 1))
+
+        assert first == {"2025-01": "done", "2025-02": "failed", "2025-03": "done"}
+        assert sorted(p.name for p in sync.output_dir.glob("*.beancount")) == [
+            "revolut_backfill_2025_01.beancount", "revolut_backfill_2025_03.beancount",
+        ]
+
+        # Ny process: bara februari hämtas
+        stub.requests.clear()
+        restarted = _sync(tmp_path, stub)
+        second = Backfill(restarted, Checkpoint(tmp_path / "backfill.json"), page_size=100).run(
+            date(2025, 1, 1), date(2025, 4, 1)
+        )
+
+    assert second == {"2025-01": "skipped", "2025-02": "done", "2025-03": "skipped"}
+    assert all("from=2025-02-01" in path for _method, path in stub.requests)
+    assert len(stub.requests) > 3  # Fler sidor än en
+    assert _imported_ids(sync.output_dir) == expected
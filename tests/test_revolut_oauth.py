@@ -0,0 +1,64 @@
+"""
+Tester för nyckelcache och återanvända client assertions i RevolutOAuth
+"""
+
+import base64
+import json
+import os
+
+import pytest
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from agents import revolut_oauth
+from agents.revolut_oauth import RevolutOAuth
+
+
+def _oauth(tmp_path):
+    return RevolutOAuth("client", cert_dir=tmp_path / "certs", token_file=tmp_path / "tokens.json")
+
+
+def _verify(oauth, jwt):
+    signing_input, _, signature = jwt.rpartition(".")
+    signature = base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4))
+    oauth._private_key.public_key().verify(
+        signature, signing_input.encode(), padding.PKCS1v15(), hashes.SHA256()
+    )
+
+
+def _payload(jwt):
+    part = jwt.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(part + "=" * (-len(part) % 4)))
+
+
+def test_assertion_reused_until_margin(tmp_path, monkeypatch):
+    oauth = _oauth(tmp_path)
+    first = oauth.generate_jwt()
+    assert oauth.generate_jwt() == first
+    assert oauth.generate_jwt(expiry_seconds=120) != first
+
+    # Nära exp signeras en ny assertion
+    exp = _payload(oauth.generate_jwt())["exp"]
+    monkeypatch.setattr(revolut_oauth.time, "time", lambda: exp - revolut_oauth.ASSERTION_REUSE_MARGIN + 1)
+    renewed = oauth.generate_jwt()
+    assert _payload(renewed)["exp"] > exp
+    _verify(oauth, renewed)
+
+
+def test_key_reloaded_when_file_changes(tmp_path):
+    oauth = _oauth(tmp_path)
+    old_jwt = oauth.generate_jwt()
+    old_key = oauth._private_key
+
+    # Ett annat verktyg byter certifikat i samma katalog
+    _oauth(tmp_path).generate_certificates()
+    stat = oauth.private_key_path.stat()
+    os.utime(oauth.private_key_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    new_jwt = oauth.generate_jwt()
+    assert new_jwt != old_jwt
+    assert oauth._private_key is not old_key
+    _verify(oauth, new_jwt)
+    with pytest.raises(InvalidSignature):
+        _verify(oauth, old_jwt)
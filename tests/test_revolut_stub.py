@@ -0,0 +1,145 @@
+"""
+Tester för Revolut-klienterna mot den lokala stubbservern
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import requests
+
+from agents.revolut_integration import RevolutBusiness, RevolutExchange
+from agents.revolut_oauth import RevolutOAuth
+from tests.revolut_stub import RevolutStub
+
+
+def _transactions(count):
+    return [
+        {
+            "id": f"tx-{i}",
+            "type": "card_payment" if i % 3 else "transfer",
+            "state": "completed",
+            "created_at": f"2025-03-{1 + i // 24:02d}T{i % 24:02d}:00:00.000Z",
+            "legs": [{"leg_id": f"leg-{i}", "account_id": "acc-0001-sek", "amount": -10.0 - i,
+                      "currency": "SEK", "description": f"To Handlare {i}"}],
+        }
+        for i in range(count)
+    ]
+
+
+def test_transactions_paginate_newest_first():
+    with RevolutStub(transactions=_transactions(100)) as stub:
+        api = RevolutBusiness(api_key="test", base_url=stub.api_url)
+
+        first = api.get_transactions(limit=40)
+        assert [tx["id"] for tx in first[:2]] == ["tx-99", "tx-98"]
+
+        # Nästa sida: to = sista transaktionens created_at (exklusivt)
+        to_date = datetime.fromisoformat(first[-1]["created_at"].replace("Z", "+00:00"))
+        second = api.get_transactions(limit=40, to_date=to_date)
+        assert second[0]["id"] == "tx-59"
+
+        since = api.get_transactions(from_date=datetime(2025, 3, 5), limit=1000)
+        assert len(since) == 4
+        assert all(tx["type"] == "transfer" for tx in api.get_transactions(transaction_type="transfer"))
+
+
+def test_get_all_transactions_keeps_ties_at_page_boundary():
+    transactions = _transactions(100)
+    for tx in transactions[40:60]:
+        tx["created_at"] = transactions[40]["created_at"]
+    with RevolutStub(transactions=transactions) as stub:
+        api = RevolutBusiness(api_key="test", base_url=stub.api_url)
+        found = api.get_all_transactions(page_size=25)
+
+    assert sorted(tx["id"] for tx in found) == sorted(tx["id"] for tx in transactions)
+    assert len(stub.requests) > 4
+
+
+def test_rate_and_accounts():
+    with RevolutStub() as stub:
+        api = RevolutBusiness(api_key="test", base_url=stub.api_url)
+        assert [a["currency"] for a in api.get_accounts()] == ["SEK", "EUR", "USD"]
+        rate = RevolutExchange(api).get_exchange_rate("SEK", "EUR")
+        assert rate["rate"] == round(1 / 11.45, 6)
+
+
+def test_injected_faults():
+    with RevolutStub(faults=[429, 503]) as stub:
+        throttled = requests.get(stub.api_url + "/accounts")
+        assert throttled.status_code == 429
+        assert throttled.headers["Retry-After"] == "1"
+        assert requests.get(stub.api_url + "/accounts").status_code == 503
+        assert requests.get(stub.api_url + "/accounts").status_code == 200
+
+    # Klienten väntar enligt Retry-After vid 429, men inte vid 5xx
+    with RevolutStub(faults=[429, 503]) as stub:
+        api = RevolutBusiness(api_key="test", base_url=stub.api_url)
+        start = time.monotonic()
+        with pytest.raises(requests.HTTPError) as failed:
+            api.get_accounts()
+        assert failed.value.response.status_code == 503
+        assert time.monotonic() - start >= 1.0
+        assert api.get_accounts()
+
+
+def test_oauth_token_flow(tmp_path):
+    with RevolutStub(require_auth=True, token_ttl=600) as stub:
+        oauth = RevolutOAuth(
+            "client", cert_dir=tmp_path / "certs", token_file=tmp_path / "tokens.json", base_url=stub.url
+        )
+        api = RevolutBusiness(oauth_handler=oauth, base_url=stub.api_url)
+        with pytest.raises(ValueError):
+            api.get_accounts()
+
+        oauth.exchange_code_for_token("oa_sandbox_code")
+        assert api.get_accounts()
+        refreshed = oauth.refresh_access_token()
+        assert refreshed.access_token in stub.tokens
+        assert api.get_accounts()
+
+
+def test_oauth_token_timeout_releases_lock(tmp_path):
+    with RevolutStub(token_ttl=600) as stub:
+        oauth = RevolutOAuth(
+            "client", cert_dir=tmp_path / "certs", token_file=tmp_path / "tokens.json", base_url=stub.url,
+            timeout=0.2
+        )
+        oauth.exchange_code_for_token("oa_sandbox_code")
+
+        # Token-endpointen hänger
+        stub.latency = 1.0
+        start = time.monotonic()
+        with pytest.raises(requests.Timeout):
+            oauth.refresh_access_token()
+        assert time.monotonic() - start < 1.0
+
+        # Fillåset är släppt - en annan tråd får det direkt
+        acquired = threading.Event()
+
+        def take_lock():
+            with oauth.store.locked():
+                acquired.set()
+
+        thread = threading.Thread(target=take_lock)
+        thread.start()
+        thread.join(0.5)
+        assert acquired.is_set()
+
+
+def test_record_and_replay(tmp_path):
+    cassette = tmp_path / "revolut.json"
+    with RevolutStub(transactions=_transactions(10), require_auth=True) as upstream:
+        token = requests.post(
+            upstream.url + "/api/1.0/auth/token",
+            data={"grant_type": "authorization_code", "code": "x", "client_assertion": "jwt"},
+        ).json()["access_token"]
+        with RevolutStub(upstream=upstream.url, cassette=cassette) as recorder:
+            api = RevolutBusiness(api_key=token, base_url=recorder.api_url)
+            recorded = api.get_transactions(limit=5)
+
+    assert token not in cassette.read_text()
+    with RevolutStub(cassette=cassette) as replay:
+        api = RevolutBusiness(api_key="any", base_url=replay.api_url)
+        assert api.get_transactions(limit=5) == recorded
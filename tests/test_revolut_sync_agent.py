@@ -0,0 +1,137 @@
+"""
+Tester för RevolutSyncAgent i daemonläge och med flera bolag
+"""
+
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from agents.config import Config
+from agents.metrics import metrics
+from agents.revolut_sync_agent import RevolutSyncAgent
+from benchmarks.synthetic import revolut_transactions
+from tests.revolut_stub import RevolutStub
+
+
+def _transactions(ids):
+    return [
+        {
+            "id": tx_id, "type": "card_payment", "state": "completed",
+            "created_at": "2099-01-01T10:00:00Z",
+            "legs": [{"amount": -10.0, "currency": "SEK", "description": f"To Handlare {tx_id}"}],
+        }
+        for tx_id in ids
+    ]
+
+
+def _agent(tmp_path, stub):
+    config = Config(
+        base_dir=tmp_path, environ={}, REVOLUT_BUSINESS_API_KEY="test", REVOLUT_API_URL=stub.api_url,
+        CLASSIFIER_ENABLED="false", PRICE_DB=None,
+    )
+    return RevolutSyncAgent(config)
+
+
+def _imported_ids(ledger):
+    return sorted(
+        line.split('"')[1]
+        for path in ledger.glob("revolut_import_*.beancount")
+        for line in path.read_text().splitlines() if "revolut_id" in line
+    )
+
+
+def test_daemon_writes_only_new_transactions(tmp_path):
+    with RevolutStub(transactions=_transactions(["tx-1", "tx-2"])) as stub:
+        agent = _agent(tmp_path, stub)
+        assert agent.run_sync(only_new=True, sync_exchanges=False, show_balances=False)
+
+        stub.add_transactions(_transactions(["tx-3"]))
+        assert agent.run_daemon(interval=0.05, jitter=0.5, sync_exchanges=False, max_runs=3)
+
+    assert agent.runs == 3
+    assert _imported_ids(tmp_path / "data" / "ledger") == ["tx-1", "tx-2", "tx-3"]
+
+
+def test_sync_fetches_every_page(tmp_path):
+    transactions = revolut_transactions(1500, start=datetime.now() - timedelta(days=300))
+    with RevolutStub(transactions=transactions) as stub:
+        agent = _agent(tmp_path, stub)
+        assert agent.sync.sync_transactions(days_back=365, only_new=True)
+
+    # En sida är max 1000 transaktioner
+    assert len([path for _method, path in stub.requests if path.startswith("/api/1.0/transactions")]) == 2
+    assert _imported_ids(tmp_path / "data" / "ledger") == sorted(
+        tx["id"] for tx in transactions if tx["state"] != "pending"
+    )
+
+
+def test_daemon_skips_overlapping_runs_and_stops_on_sigterm(tmp_path):
+    with RevolutStub(transactions=_transactions(["tx-1"]), latency=0.3) as stub:
+        agent = _agent(tmp_path, stub)
+        threading.Timer(1.0, os.kill, (os.getpid(), signal.SIGTERM)).start()
+
+        start = time.monotonic()
+        assert agent.run_daemon(interval=0.1, jitter=0, sync_exchanges=False)
+        elapsed = time.monotonic() - start
+
+    assert 1.0 <= elapsed < 3.0
+    assert agent.skipped_runs > 0
+    assert agent.runs < 10
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+
+
+def _tenant(tmp_path, name, api_url):
+    return Config(
+        base_dir=tmp_path / name, environ={}, TENANT_ID=name, REVOLUT_BUSINESS_API_KEY="test",
+        REVOLUT_API_URL=api_url, CLASSIFIER_ENABLED="false", PRICE_DB=None,
+    )
+
+
+def test_tenants_sync_concurrently_and_isolate_failures(tmp_path):
+    with RevolutStub(transactions=_transactions(["a-1"]), faults=[429]) as throttled, \
+            RevolutStub(transactions=_transactions(["b-1", "b-2"])) as healthy:
+        tenants = [
+            _tenant(tmp_path, "a", throttled.api_url),
+            _tenant(tmp_path, "b", healthy.api_url),
+            _tenant(tmp_path, "c", "http://127.0.0.1:9/api/1.0"),
+        ]
+        results = RevolutSyncAgent.sync_tenants(
+            tenants, days_back=36500, sync_exchanges=False, metrics_dir=tmp_path / "metrics"
+        )
+
+    assert results == {"a": True, "b": True, "c": False}
+    ledgers = {name: tmp_path / name / "data" / "ledger" for name in "abc"}
+    assert _imported_ids(ledgers["a"]) == ["a-1"]
+    assert _imported_ids(ledgers["b"]) == ["b-1", "b-2"]
+    assert not ledgers["c"].exists()
+
+    # b blev klar medan a väntade på Retry-After
+    [a_file] = ledgers["a"].glob("*.beancount")
+    [b_file] = ledgers["b"].glob("*.beancount")
+    assert a_file.stat().st_mtime - b_file.stat().st_mtime >= 0.5
+
+    throttles = metrics.counters["revolut_api_throttled_total"]
+    assert throttles == {(("endpoint", "/transactions"), ("tenant", "a")): 1}
+    assert (tmp_path / "metrics" / "revolut_sync.prom").exists()
+
+
+def test_tenants_must_not_share_ledger(tmp_path):
+    tenant = _tenant(tmp_path, "a", "")
+    tenants = [tenant, tenant.with_overrides(TENANT_ID="b")]
+    with pytest.raises(ValueError, match="DATA_LEDGER"):
+        RevolutSyncAgent.sync_tenants(tenants)
+
+
+def test_run_sync_keeps_other_tenants_metrics(tmp_path):
+    metrics.reset()
+    with metrics.scope(tenant="other"):
+        metrics.inc("sync_errors_total", stage="run")
+
+    with RevolutStub(transactions=_transactions(["tx-1"])) as stub:
+        assert _agent(tmp_path, stub).run_sync(only_new=True, sync_exchanges=False, show_balances=False)
+
+    assert metrics.counters["sync_errors_total"] == {(("stage", "run"), ("tenant", "other")): 1}
@@ -0,0 +1,123 @@
+"""
+Tester för TokenManager: single-flight och proaktiv förnyelse
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.metrics import metrics
+from agents.revolut_integration import RevolutBusiness
+from agents.revolut_oauth import RevolutOAuth, TokenData
+from agents.revolut_token_manager import TokenManager
+from tests.revolut_stub import RevolutStub
+
+
+class FakeOAuth:
+    """Räknar förnyelser; varje förnyelse tar `delay` sekunder"""
+
+    def __init__(self, expires_in: float, delay: float = 0.1, lifetime: float = 3600, age: float = 0):
+        self.delay = delay
+        self.lifetime = lifetime
+        self.refreshes = 0
+        self.token_data = self._token(0, expires_in, age)
+
+    @staticmethod
+    def _token(number, expires_in, age=0):
+        now = time.time()
+        return TokenData(f"access-{number}", "refresh", "Bearer", now + expires_in, now - age)
+
+    def refresh_access_token(self):
+        self.refreshes += 1
+        time.sleep(self.delay)
+        self.token_data = self._token(self.refreshes, self.lifetime)
+        return self.token_data
+
+
+def test_concurrent_expired_callers_share_one_refresh():
+    oauth = FakeOAuth(expires_in=-1)
+    manager = TokenManager(oauth)
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        tokens = list(pool.map(lambda _: manager.get_access_token(), range(20)))
+    assert oauth.refreshes == 1
+    assert set(tokens) == {"access-1"}
+
+
+def test_refresh_near_expiry_runs_in_background():
+    oauth = FakeOAuth(expires_in=120, delay=0.2)
+    manager = TokenManager(oauth, refresh_margin=600)
+
+    start = time.perf_counter()
+    assert manager.get_access_token() == "access-0"
+    assert manager.get_access_token() == "access-0"
+    assert time.perf_counter() - start < 0.1
+
+    assert manager.refresh().access_token == "access-1"
+    assert oauth.refreshes == 1
+    assert manager.get_access_token() == "access-1"
+
+
+def test_stale_token_does_not_refresh_again():
+    oauth = FakeOAuth(expires_in=3600, delay=0)
+    manager = TokenManager(oauth)
+    manager.refresh(stale="access-0")
+    assert manager.refresh(stale="access-0").access_token == "access-1"
+    assert oauth.refreshes == 1
+
+
+def test_background_timer_refreshes_before_expiry():
+    oauth = FakeOAuth(expires_in=600.2, delay=0, age=3000)
+    with TokenManager(oauth, refresh_margin=600):
+        deadline = time.time() + 2
+        while oauth.refreshes == 0 and time.time() < deadline:
+            time.sleep(0.02)
+    assert oauth.refreshes == 1
+
+
+def test_short_lived_token_is_not_refreshed_in_a_loop():
+    oauth = FakeOAuth(expires_in=1.0, delay=0, lifetime=1.0)
+    manager = TokenManager(oauth, refresh_margin=600, expiry_buffer=0.1)
+    assert manager.get_access_token() == "access-0"
+    assert oauth.refreshes == 0
+
+    with manager:
+        time.sleep(1.2)
+    # Förnyas vid halva livslängden: två gånger på 1,2 s, inte i en tät loop
+    assert 1 <= oauth.refreshes <= 3
+
+
+def test_refresh_metrics_keep_scope_labels():
+    metrics.reset()
+    oauth = FakeOAuth(expires_in=120, delay=0)
+    with metrics.scope(tenant="acme"):
+        TokenManager(oauth).refresh()
+        # Bakgrundstråden startas också i anroparens kontext
+        oauth.token_data = oauth._token(0, 600.2, age=3000)
+        with TokenManager(oauth, refresh_margin=600):
+            deadline = time.time() + 2
+            while oauth.refreshes < 2 and time.time() < deadline:
+                time.sleep(0.02)
+    assert metrics.counters["revolut_token_refresh_total"] == {(("result", "ok"), ("tenant", "acme")): 2}
+
+
+def test_revoked_token_refreshed_once_for_parallel_401(tmp_path):
+    with RevolutStub(require_auth=True) as stub:
+        oauth = RevolutOAuth(
+            "client", cert_dir=tmp_path / "certs", token_file=tmp_path / "tokens.json", base_url=stub.url
+        )
+        oauth.exchange_code_for_token("oa_sandbox_code")
+        clients = [RevolutBusiness(oauth_handler=oauth, base_url=stub.api_url) for _ in range(8)]
+        assert len({id(client.tokens) for client in clients}) == 1
+
+        stub.tokens.clear()
+        barrier = threading.Barrier(len(clients))
+
+        def call(client):
+            barrier.wait()
+            return client.get_accounts()
+
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            assert all(pool.map(call, clients))
+
+        token_requests = [path for _method, path in stub.requests if path.endswith("/auth/token")]
+        assert len(token_requests) == 2
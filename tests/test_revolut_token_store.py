@@ -0,0 +1,82 @@
+"""
+Tester för TokenStore och delade tokens mellan processer
+"""
+
+import json
+import multiprocessing
+import stat
+
+from agents.revolut_oauth import RevolutOAuth
+from agents.revolut_token_store import TokenStore
+from tests.revolut_stub import RevolutStub
+
+
+def test_atomic_save_and_change_detection(tmp_path):
+    store = TokenStore(tmp_path / "tokens.json")
+    assert store.load() is None
+
+    store.save({"access_token": "a"})
+    assert stat.S_IMODE(store.path.stat().st_mode) == 0o600
+    assert not store.changed()
+    assert store.load() is store.load()
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+    # En annan process skriver filen
+    TokenStore(store.path).save({"access_token": "b"})
+    assert store.changed()
+    assert store.load() == {"access_token": "b"}
+
+
+def _oauth(tmp_path, stub):
+    return RevolutOAuth(
+        "client", cert_dir=tmp_path / "certs", token_file=tmp_path / "tokens.json", base_url=stub.url
+    )
+
+
+def _token_requests(stub):
+    return sum(1 for _method, path in stub.requests if path.endswith("/auth/token"))
+
+
+def test_other_process_refresh_is_picked_up(tmp_path):
+    with RevolutStub(require_auth=True, rotate_refresh_tokens=True) as stub:
+        cron = _oauth(tmp_path, stub)
+        cron.exchange_code_for_token("oa_sandbox_code")
+        sync = _oauth(tmp_path, stub)
+        worker = _oauth(tmp_path, stub)
+
+        refreshed = cron.refresh_access_token()
+        assert sync.token_data.access_token == refreshed.access_token
+
+        # Arbetaren vill förnya sin gamla token - den nya från disk används
+        assert worker.refresh_access_token().access_token == refreshed.access_token
+        assert _token_requests(stub) == 2
+
+
+def _refresh_in_child(tmp_path, url, barrier, results):
+    oauth = RevolutOAuth("client", cert_dir=tmp_path / "certs", token_file=tmp_path / "tokens.json",
+                         base_url=url)
+    barrier.wait()
+    results.put(oauth.refresh_access_token().access_token)
+
+
+def test_parallel_processes_refresh_once(tmp_path):
+    context = multiprocessing.get_context("fork")
+    with RevolutStub(require_auth=True, rotate_refresh_tokens=True) as stub:
+        _oauth(tmp_path, stub).exchange_code_for_token("oa_sandbox_code")
+
+        barrier, results = context.Barrier(4), context.Queue()
+        workers = [
+            context.Process(target=_refresh_in_child, args=(tmp_path, stub.url, barrier, results))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        tokens = {results.get(timeout=30) for _ in workers}
+        for worker in workers:
+            worker.join(10)
+
+        assert all(worker.exitcode == 0 for worker in workers)
+        assert len(tokens) == 1
+        assert _token_requests(stub) == 2
+        saved = json.loads((tmp_path / "tokens.json").read_text())
+        assert saved["refresh_token"] in stub.refresh_tokens
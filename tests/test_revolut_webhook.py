@@ -0,0 +1,153 @@
+"""
+Tester för webhook-mottagaren: signatur, beständig kö och bokföring i mikrobatcher
+"""
+
+import time
+
+import requests
+
+from agents.config import Config
+from agents.revolut_integration import RevolutSync
+from agents.revolut_webhook import (
+    MAX_ATTEMPTS, EventQueue, WebhookIngestor, WebhookReceiver, sign, verify_signature
+)
+from tests.revolut_stub import RevolutStub
+from tests.revolut_webhook_events import post_event, signed_request, state_changed, transaction_created
+
+SECRET = "wsk_test"
+
+
+def _transaction(tx_id, state="completed"):
+    return {
+        "id": tx_id, "type": "card_payment", "state": state,
+        "created_at": "2099-01-01T10:00:00Z",
+        "legs": [{"amount": -10.0, "currency": "SEK", "description": f"To Handlare {tx_id}"}],
+    }
+
+
+def _sync(tmp_path, stub):
+    config = Config(base_dir=tmp_path, environ={}, CLASSIFIER_ENABLED="false", PRICE_DB=None)
+    return RevolutSync("test", config=config, base_url=stub.api_url)
+
+
+def _imported_ids(ledger):
+    return sorted(
+        line.split('"')[1]
+        for path in ledger.glob("revolut_*.beancount")
+        for line in path.read_text().splitlines() if "revolut_id" in line
+    )
+
+
+def test_verify_signature():
+    body = b'{"event": "TransactionCreated"}'
+    now = time.time()
+    stamp = str(int(now * 1000))
+    signature = sign(SECRET, body, stamp)
+
+    assert verify_signature(SECRET, body, stamp, signature, now=now)
+    assert verify_signature(SECRET, body, stamp, f"v1=00ff,{signature}", now=now)
+    assert not verify_signature(SECRET, body + b" ", stamp, signature, now=now)
+    assert not verify_signature("other", body, stamp, signature, now=now)
+    assert not verify_signature(SECRET, body, stamp, signature, now=now + 600)
+    assert not verify_signature(SECRET, body, None, signature, now=now)
+
+
+def test_receiver_books_events_in_micro_batches(tmp_path):
+    with RevolutStub() as stub:
+        sync = _sync(tmp_path, stub)
+        queue = EventQueue(tmp_path / "events.sqlite")
+        ingestor = WebhookIngestor(sync, queue, batch_seconds=0.5)
+        with WebhookReceiver(SECRET, queue, ingestor.notify) as receiver:
+            ingestor.start()
+            events = [
+                transaction_created(_transaction("tx-1")),
+                transaction_created(_transaction("tx-2")),
+                transaction_created(_transaction("tx-3", state="pending")),
+            ]
+            assert [post_event(receiver.url, SECRET, event) for event in events] == [204, 204, 204]
+
+            # Omsänd händelse och felaktig signatur
+            body, headers = signed_request(SECRET, events[0])
+            assert requests.post(receiver.url, data=body, headers=headers).status_code == 204
+            assert requests.post(receiver.url, data=body, headers=headers).status_code == 204
+            assert post_event(receiver.url, "wrong", events[1]) == 401
+
+            deadline = time.monotonic() + 5
+            while _imported_ids(sync.output_dir) != ["tx-1", "tx-2"] and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert _imported_ids(sync.output_dir) == ["tx-1", "tx-2"]
+
+            assert post_event(receiver.url, SECRET, state_changed("tx-3", "pending", "completed")) == 204
+            while len(_imported_ids(sync.output_dir)) < 3 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            ingestor.stop()
+
+        assert _imported_ids(sync.output_dir) == ["tx-1", "tx-2", "tx-3"]
+        assert (receiver.accepted, receiver.duplicates, receiver.rejected) == (4, 2, 1)
+        assert ingestor.batches == 2
+        assert len(queue) == 0
+        # Inga anrop mot API:t - allt kom med händelserna
+        assert stub.requests == []
+
+
+def test_queued_events_survive_restart_and_skip_known_ids(tmp_path):
+    with RevolutStub(transactions=[_transaction("tx-2"), _transaction("tx-3")]) as stub:
+        sync = _sync(tmp_path, stub)
+        sync.sync_transactions(days_back=36500, only_new=True)
+
+        # Mottagen men inte bokförd när processen dör
+        queue = EventQueue(tmp_path / "events.sqlite")
+        receiver = WebhookReceiver(SECRET, queue)
+        for event in (
+            transaction_created(_transaction("tx-1")),
+            transaction_created(_transaction("tx-2")),
+            state_changed("tx-3", "pending", "completed"),
+            {"event": "PayoutLinkCreated", "data": {"id": "pl-1"}},
+        ):
+            body, headers = signed_request(SECRET, event)
+            assert receiver.receive(body, headers["Revolut-Request-Timestamp"], headers["Revolut-Signature"]) == 204
+        receiver._server.server_close()
+        queue.close()
+
+        queue = EventQueue(tmp_path / "events.sqlite")
+        assert len(queue) == 4
+        restarted = _sync(tmp_path, stub)
+        assert WebhookIngestor(restarted, queue).process() == 4
+
+    assert len(queue) == 0
+    assert _imported_ids(sync.output_dir) == ["tx-1", "tx-2", "tx-3"]
+    assert len(list(sync.output_dir.glob("revolut_webhook_*.beancount"))) == 1
+    # tx-3 saknade pending-version i kön och hämtades från API:t
+    assert ("GET", "/api/1.0/transaction/tx-3") in stub.requests
+
+
+def test_failing_event_does_not_fail_batch(tmp_path):
+    with RevolutStub() as stub:
+        sync = _sync(tmp_path, stub)
+        queue = EventQueue(tmp_path / "events.sqlite")
+        receiver = WebhookReceiver(SECRET, queue)
+        for event in (
+            transaction_created(_transaction("tx-1")),
+            # Finns inte i API:t - uppslaget ger 404
+            state_changed("tx-missing", "pending", "completed"),
+            # Går inte att konvertera
+            transaction_created({**_transaction("tx-bad"), "created_at": "igår"}),
+            transaction_created(_transaction("tx-2")),
+        ):
+            body, headers = signed_request(SECRET, event)
+            assert receiver.receive(body, headers["Revolut-Request-Timestamp"], headers["Revolut-Signature"]) == 204
+        receiver._server.server_close()
+
+        ingestor = WebhookIngestor(sync, queue)
+        assert ingestor.process() == 4
+        assert _imported_ids(sync.output_dir) == ["tx-1", "tx-2"]
+        assert ingestor.failed_events == 2
+        assert len(queue) == 2
+
+        # Försöks igen tills de lämnas åt pollingen
+        while ingestor.process():
+            pass
+
+    assert len(queue) == 0
+    assert _imported_ids(sync.output_dir) == ["tx-1", "tx-2"]
+    assert ingestor.failed_events == 2 * MAX_ATTEMPTS
@@ -0,0 +1,158 @@
+"""
+Tester för sie_export
+"""
+
+from decimal import Decimal
+
+import pytest
+from beancount import loader
+from beancount.core import prices
+
+from agents.sie_export import SIEExporter, SIEExportError
+
+LEDGER = """
+option "operating_currency" "SEK"
+
+2024-01-01 open Assets:Bank:Företagskonto SEK
+2024-01-01 open Assets:Bank:Revolut:EUR EUR
+2024-01-01 open Liabilities:Skatteskulder:Moms SEK
+2024-01-01 open Equity:Ingående:Balans SEK
+2024-01-01 open Income:Konsulttjänster SEK
+2024-01-01 open Expenses:Programvara
+2024-01-01 open Expenses:Specialkonto
+  bas: "6999"
+
+2024-01-01 * "Ingående balans"
+  Assets:Bank:Företagskonto   50000.00 SEK
+  Equity:Ingående:Balans     -50000.00 SEK
+
+2024-06-01 * "Kund AB" "Konsultarvode"
+  Assets:Bank:Företagskonto   12500.00 SEK
+  Income:Konsulttjänster     -10000.00 SEK
+  Liabilities:Skatteskulder:Moms -2500.00 SEK
+
+2025-01-10 * "Telia" "Bredband \\"fiber\\""
+  Expenses:Programvara          798.40 SEK
+  Liabilities:Skatteskulder:Moms 199.60 SEK
+  Assets:Bank:Företagskonto    -998.00 SEK
+
+2025-01-15 price EUR 11.50 SEK
+
+2025-02-01 * "GitHub"
+  Expenses:Specialkonto          10.00 EUR
+  Assets:Bank:Revolut:EUR       -10.00 EUR
+"""
+
+
+def _export(tmp_path, years=None):
+    entries, errors, _options = loader.load_string(LEDGER)
+    assert not errors
+    exporter = SIEExporter(
+        "Efficra Consulting KB", "969000-0000", price_map=prices.build_price_map(entries)
+    )
+    return exporter.export(entries, tmp_path, years)
+
+
+def _records(path):
+    raw = path.read_bytes()
+    assert b"\r\n" in raw
+    return raw.decode("cp437").splitlines()
+
+
+def test_one_file_per_year(tmp_path):
+    paths = _export(tmp_path)
+    assert [p.name for p in paths] == ["9690000000_2024.se", "9690000000_2025.se"]
+
+    lines = _records(paths[1])
+    assert lines[:3] == ["#FLAGGA 0", "#FORMAT PC8", "#SIETYP 4"]
+    assert "#RAR 0 20250101 20251231" in lines
+    assert "#RAR -1 20240101 20241231" in lines
+    assert '#KONTO 1930 "Företagskonto"' in lines
+    assert "#KTYP 2650 S" in lines
+
+
+def test_opening_closing_and_result(tmp_path):
+    lines = _records(_export(tmp_path)[1])
+
+    # Föregående års resultat ingår i ingående balans som balanserat resultat
+    assert "#IB 0 1930 62500.00" in lines
+    assert "#IB 0 2091 -10000.00" in lines
+    assert "#UB 0 1930 61502.00" in lines
+    assert "#UB 0 2650 -2300.40" in lines
+    assert "#RES 0 5420 798.40" in lines
+    assert "#RES -1 3041 -10000.00" in lines
+    # Metadata bas: på open-direktivet och omräkning med prisnotering
+    assert "#RES 0 6999 115.00" in lines
+
+
+def test_verifications_balance(tmp_path):
+    lines = _records(_export(tmp_path)[1])
+    vers = [line for line in lines if line.startswith("#VER")]
+    assert vers[0].startswith('#VER A 1 20250110 "Telia - Bredband \\"fiber\\""')
+    assert len(vers) == 2
+
+    total = Decimal(0)
+    for line in lines:
+        if line.strip().startswith("#TRANS"):
+            total += Decimal(line.split()[-1])
+        elif line == "}":
+            assert total == 0
+            total = Decimal(0)
+
+
+def test_selected_years_and_unknown_account(tmp_path):
+    assert [p.name for p in _export(tmp_path, years=[2025])] == ["9690000000_2025.se"]
+
+    entries, _errors, _options = loader.load_string(
+        '2024-01-01 open Liabilities:Okänt\n2024-01-01 open Assets:Bank:Företagskonto\n'
+        '2024-02-01 * "X"\n  Liabilities:Okänt  1.00 SEK\n  Assets:Bank:Företagskonto\n'
+    )
+    with pytest.raises(SIEExportError):
+        SIEExporter("Test").export(entries, tmp_path)
+
+
+def test_rounding_residual_on_last_row(tmp_path):
+    entries, errors, _options = loader.load_string(
+        '2024-01-01 open Assets:Bank:Revolut:EUR EUR\n'
+        '2024-01-01 open Expenses:Programvara\n'
+        '2024-01-01 open Expenses:Bankkostnader\n'
+        '2024-01-01 price EUR 11.333 SEK\n'
+        '2024-02-01 * "Tjänster"\n'
+        '  Expenses:Programvara     1.00 EUR\n'
+        '  Expenses:Bankkostnader   1.00 EUR\n'
+        '  Assets:Bank:Revolut:EUR -2.00 EUR\n'
+    )
+    assert not errors
+    path = SIEExporter("Test", price_map=prices.build_price_map(entries)).export(entries, tmp_path)[0]
+    rows = [line.split() for line in _records(path) if line.strip().startswith("#TRANS")]
+
+    # 11.33 + 11.33 - 22.67 skulle ge -0.01
+    assert [(row[1], row[-1]) for row in rows] == [("5420", "11.33"), ("6570", "11.33"), ("1940", "-22.66")]
+    assert "#UB 0 1940 -22.66" in _records(path)
+
+
+def test_exchange_difference_not_booked_on_bank(tmp_path):
+    # Växlingen är bokad utan kurs - de två benen räknas om till olika dagskurser
+    entries, _errors, _options = loader.load_string(
+        '2024-01-01 open Assets:Bank:Revolut:EUR EUR\n'
+        '2024-01-01 open Assets:Bank:Revolut:USD USD\n'
+        '2024-01-01 price EUR 11.50 SEK\n'
+        '2024-01-01 price USD 10.00 SEK\n'
+        '2024-02-01 * "Växling" "EUR till USD"\n'
+        '  Assets:Bank:Revolut:USD  110.00 USD\n'
+        '  Assets:Bank:Revolut:EUR -100.00 EUR\n'
+        '2024-02-02 * "Växling" "USD till EUR"\n'
+        '  Assets:Bank:Revolut:EUR  100.00 EUR\n'
+        '  Assets:Bank:Revolut:USD -105.00 USD\n'
+    )
+    exporter = SIEExporter("Test", account_map={
+        "Assets:Bank:Revolut:EUR": "1941", "Assets:Bank:Revolut:USD": "1942",
+        "Income:Valutakursvinster": "3960", "Expenses:Valutakursförluster": "7960",
+    }, price_map=prices.build_price_map(entries))
+    path = exporter.export(entries, tmp_path)[0]
+    rows = [line.split() for line in _records(path) if line.strip().startswith("#TRANS")]
+
+    assert [(row[1], row[-1]) for row in rows] == [
+        ("1942", "1100.00"), ("1941", "-1150.00"), ("7960", "50.00"),
+        ("1941", "1150.00"), ("1942", "-1050.00"), ("3960", "-100.00"),
+    ]
@@ -0,0 +1,84 @@
+"""
+Starttid för agents-paketet och CLI:na
+
+Varje mätning körs i en ny Python-process. Importerna mäts med
+`python -X importtime` (kumulativ tid per modul); CLI:na med väggtid för
+`--help`, bästa av tre körningar. Budgetarna har marginal för långsamma
+CI-maskiner - det som fångar regressioner är framför allt att cron-agenterna
+inte laddar tunga beroenden vid import.
+"""
+
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+
+# Beroenden som bara får laddas när de faktiskt används
+HEAVY = {"numpy", "requests", "urllib3", "PIL", "cryptography", "pytesseract", "tesserocr", "beancount"}
+
+# Modul: importbudget i ms (inga tunga beroenden får laddas)
+IMPORT_BUDGETS = {
+    "agents.metrics": 100,
+    "agents.revolut_oauth": 150,
+    "agents.revolut_integration": 150,
+    "agents.revolut_sync_agent": 200,
+    "agents.invoice_processor": 200,
+}
+
+# CLI: budget i ms för --help
+CLI_BUDGETS = {
+    "agents/revolut_backfill.py": 600,
+    "agents/revolut_sync_agent.py": 600,
+    "agents/revolut_webhook.py": 600,
+    "agents/invoice_processor.py": 600,
+    "agents/transaction_classifier.py": 800,
+    "agents/vat_report.py": 1000,
+    "agents/sie_export.py": 1000,
+    "agents/balance_index.py": 1000,
+    "agents/price_db.py": 1200,
+    "agents/postings_export.py": 1200,
+}
+
+
+def import_profile(module: str) -> Tuple[Dict[str, int], Set[str]]:
+    """
+    Importera en modul i en ny process under -X importtime
+
+    Returns:
+        (kumulativ importtid i mikrosekunder per modul, importerade toppaket)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, total, name = line.split(":", 1)[1].split("|")
+        cumulative[name.strip()] = int(total)
+    return cumulative, {name.split(".")[0] for name in cumulative}
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS))
+def test_import_time(module):
+    cumulative, packages = import_profile(module)
+
+    assert packages & HEAVY == set()
+    assert cumulative[module] / 1000 <= IMPORT_BUDGETS[module], f"{module}: {cumulative[module] / 1000:.0f} ms"
+
+
+@pytest.mark.parametrize("script", sorted(CLI_BUDGETS))
+def test_cli_startup(script):
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, "--help"], cwd=REPO, capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+
+    assert min(timings) * 1000 <= CLI_BUDGETS[script], f"{script}: {min(timings) * 1000:.0f} ms"
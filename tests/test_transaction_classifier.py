@@ -0,0 +1,130 @@
+"""
+Tester för transaction_classifier
+"""
+
+from decimal import Decimal
+
+from beancount import loader
+
+from agents.revolut_integration import RevolutToBeancount
+from agents.transaction_classifier import (
+    TransactionClassifier,
+    amount_band,
+    ledger_example,
+    revolut_tokens,
+)
+
+ACCOUNTS = """
+2024-01-01 open Assets:Bank:Revolut:SEK
+2024-01-01 open Expenses:Telefon:Internet
+2024-01-01 open Expenses:Programvara
+2024-01-01 open Expenses:Resor
+2024-01-01 open Expenses:Unknown
+"""
+
+EXAMPLE = """
+2024-{month:02d}-{day:02d} * "{description}" #card-payment
+  merchant: "{merchant}"
+  Assets:Bank:Revolut:SEK  -{amount} SEK
+  {account}
+"""
+
+HISTORY = [
+    ("To Telia Sverige", "Telia", "499.00", "Expenses:Telefon:Internet"),
+    ("GitHub Inc", "GitHub", "95.00", "Expenses:Programvara"),
+    ("Atlassian Jira", "Atlassian", "120.00", "Expenses:Programvara"),
+    ("SJ AB Stockholm", "SJ", "845.00", "Expenses:Resor"),
+    ("Uber Trip", "Uber", "230.00", "Expenses:Resor"),
+]
+
+
+def _ledger(months=range(1, 7), extra=""):
+    text = ACCOUNTS
+    for month in months:
+        for day, (description, merchant, amount, account) in enumerate(HISTORY, start=1):
+            text += EXAMPLE.format(
+                month=month, day=day, description=description,
+                merchant=merchant, amount=amount, account=account,
+            )
+    entries, errors, _options = loader.load_string(text + extra)
+    assert not errors
+    return entries
+
+
+def _revolut(tx_id, description, merchant, amount):
+    return {
+        "id": tx_id,
+        "type": "card_payment",
+        "state": "completed",
+        "completed_at": "2025-03-01T10:00:00Z",
+        "merchant": {"name": merchant},
+        "legs": [{"amount": -amount, "currency": "SEK", "description": description}],
+    }
+
+
+def test_amount_band():
+    assert amount_band(Decimal("-150")) == "-2^7"
+    assert amount_band(Decimal("1000")) == "+2^9"
+    assert amount_band(None) == "0"
+
+
+def test_ledger_example_skips_unknown_and_multi_account():
+    entries, _errors, _options = loader.load_string(ACCOUNTS + """
+2024-01-01 * "Okänt"
+  Assets:Bank:Revolut:SEK  -10 SEK
+  Expenses:Unknown
+
+2024-01-02 * "Delad"
+  Assets:Bank:Revolut:SEK  -10 SEK
+  Expenses:Resor  5 SEK
+  Expenses:Programvara  5 SEK
+""")
+    assert [ledger_example(e) for e in entries if hasattr(e, "postings")] == [None, None]
+
+
+def test_train_and_predict_batch():
+    model = TransactionClassifier()
+    assert model.fit_entries(_ledger()) == 30
+
+    predictions = model.predict([
+        revolut_tokens(_revolut("a", "To Telia Sverige", "Telia", 499)),
+        revolut_tokens(_revolut("b", "GitHub Inc", "GitHub", 95)),
+        revolut_tokens(_revolut("c", "SJ AB Göteborg", "SJ", 650)),
+    ])
+    assert [account for account, _p in predictions] == [
+        "Expenses:Telefon:Internet", "Expenses:Programvara", "Expenses:Resor",
+    ]
+    assert all(p > 0.9 for _account, p in predictions)
+
+
+def test_incremental_fit_and_persistence(tmp_path):
+    model = TransactionClassifier()
+    model.fit_entries(_ledger(months=range(1, 3)))
+    # Redan sedda transaktioner tränas inte igen
+    assert model.fit_entries(_ledger(months=range(1, 3))) == 0
+    assert model.fit_entries(_ledger(months=range(1, 5))) == 10
+
+    path = tmp_path / "classifier.npz"
+    model.save(path)
+    loaded = TransactionClassifier.load(path)
+    assert loaded.classes == model.classes
+    assert loaded.n_docs == 20
+
+    tokens = [revolut_tokens(_revolut("a", "Uber Trip", "Uber", 200))]
+    assert loaded.predict(tokens) == model.predict(tokens)
+    assert loaded.fit_entries(_ledger(months=range(1, 5))) == 0
+
+
+def test_converter_uses_classifier_above_threshold():
+    model = TransactionClassifier()
+    model.fit_entries(_ledger())
+    converter = RevolutToBeancount(None, classifier=model)
+
+    known = _revolut("known", "To Telia Sverige", "Telia", 499)
+    unknown = _revolut("unknown", "Restaurant Lunch", "Okänd", 180)
+    converter.prepare([known, unknown])
+    converter._predictions["unknown"] = ("Expenses:Resor", 0.3)
+
+    assert "  Expenses:Telefon:Internet" in converter.transaction_to_beancount(known)
+    # Under tröskeln används reglerna
+    assert converter._categorize_transaction(unknown) == "Expenses:Unknown"
@@ -0,0 +1,181 @@
+"""
+Tester för vat_report
+"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from agents.vat_report import VATReport, period_key, previous_period
+
+LEDGER_HEADER = """
+option "operating_currency" "SEK"
+
+2024-01-01 open Assets:Bank:Företagskonto SEK
+2024-01-01 open Assets:Kundfordringar SEK
+2024-01-01 open Liabilities:Skatteskulder:Moms SEK
+2024-01-01 open Income:Konsulttjänster SEK
+2024-01-01 open Income:Export SEK
+2024-01-01 open Expenses:Programvara SEK
+2024-01-01 open Expenses:Representation SEK
+"""
+
+SALE = """
+{date} * "Kund AB" "Konsultarvode"
+  Assets:Kundfordringar            12500.00 SEK
+  Income:Konsulttjänster          -10000.00 SEK
+  Liabilities:Skatteskulder:Moms   -2500.00 SEK
+"""
+
+PURCHASE = """
+{date} * "Telia" "Bredband"
+  Expenses:Programvara               798.40 SEK
+  Liabilities:Skatteskulder:Moms     199.60 SEK
+  Assets:Bank:Företagskonto         -998.00 SEK
+"""
+
+MEAL = """
+{date} * "Restaurang" "Kundlunch"
+  Assets:Kundfordringar               1060.00 SEK
+  Income:Konsulttjänster             -1000.00 SEK
+  Liabilities:Skatteskulder:Moms       -60.00 SEK
+"""
+
+EXPORT = """
+{date} * "Client GmbH" "Consulting"
+  vat_box: "39"
+  Assets:Kundfordringar              20000.00 SEK
+  Income:Export                     -20000.00 SEK
+"""
+
+SETTLEMENT = """
+{date} * "Skatteverket" "Moms januari"
+  Liabilities:Skatteskulder:Moms     2300.40 SEK
+  Assets:Bank:Företagskonto         -2300.40 SEK
+"""
+
+
+def _write(path, *parts):
+    path.write_text(LEDGER_HEADER + "".join(parts), encoding="utf-8")
+
+
+def test_period_key():
+    assert period_key(date(2025, 2, 14)) == "2025-02"
+    assert period_key(date(2025, 2, 14), "quarterly") == "2025-Q1"
+    assert period_key(date(2025, 2, 14), "yearly") == "2025"
+    assert previous_period(date(2025, 1, 10), "monthly") == "2024-12"
+    assert previous_period(date(2025, 1, 10), "quarterly") == "2024-Q4"
+
+
+def test_boxes_per_period(tmp_path):
+    ledger = tmp_path / "main.beancount"
+    _write(
+        ledger,
+        SALE.format(date="2025-01-10"),
+        PURCHASE.format(date="2025-01-20"),
+        MEAL.format(date="2025-01-25"),
+        EXPORT.format(date="2025-01-28"),
+        SETTLEMENT.format(date="2025-02-12"),
+    )
+    periods = VATReport(ledger).periods()
+
+    assert periods["2025-01"] == {
+        "05": Decimal("11000.00"),
+        "10": Decimal("2500.00"),
+        "12": Decimal("60.00"),
+        "39": Decimal("20000.00"),
+        "48": Decimal("199.60"),
+        "49": Decimal("2360.40"),
+    }
+    # Betalning av momsskulden påverkar inte deklarationen
+    assert periods["2025-02"] == {"49": Decimal("0")}
+
+
+def test_declaration_in_whole_kronor(tmp_path):
+    ledger = tmp_path / "main.beancount"
+    _write(ledger, SALE.format(date="2025-01-10"), PURCHASE.format(date="2025-01-20"))
+    declaration = VATReport(ledger).declaration("2025-01")
+    assert declaration["48"] == Decimal("199")
+    assert declaration["49"] == Decimal("2301")
+
+
+def test_only_changed_periods_are_recomputed(tmp_path):
+    ledger = tmp_path / "main.beancount"
+    cache = tmp_path / "vat.json"
+    _write(ledger, SALE.format(date="2025-01-10"), SALE.format(date="2025-02-10"))
+
+    report = VATReport(ledger, cache_path=cache)
+    report.periods()
+    assert report.loaded_ledger and report.recomputed == ["2025-01", "2025-02"]
+
+    # Oförändrad huvudbok - läses inte in alls
+    report.periods()
+    assert not report.loaded_ledger
+
+    _write(
+        ledger,
+        SALE.format(date="2025-01-10"),
+        SALE.format(date="2025-02-10"),
+        PURCHASE.format(date="2025-02-20"),
+    )
+    periods = report.periods()
+    assert report.loaded_ledger and report.recomputed == ["2025-02"]
+    assert periods["2025-02"]["48"] == Decimal("199.60")
+    assert periods["2025-01"]["49"] == Decimal("2500.00")
+
+
+def test_changed_include_is_parsed_alone(tmp_path):
+    ledger = tmp_path / "main.beancount"
+    _write(ledger, 'include "2024.beancount"\ninclude "2025.beancount"\n')
+    (tmp_path / "2024.beancount").write_text(SALE.format(date="2024-12-10"), encoding="utf-8")
+    year = tmp_path / "2025.beancount"
+    year.write_text(SALE.format(date="2025-01-10"), encoding="utf-8")
+
+    report = VATReport(ledger, cache_path=tmp_path / "vat.json")
+    report.periods()
+
+    year.write_text(SALE.format(date="2025-01-10") + PURCHASE.format(date="2025-02-01"), encoding="utf-8")
+    periods = report.periods()
+    assert not report.loaded_ledger
+    assert report.parsed_files == [str(year)]
+    assert report.recomputed == ["2025-02"]
+    assert periods["2024-12"]["10"] == Decimal("2500.00")
+    assert periods["2025-02"]["49"] == Decimal("-199.60")
+
+    # Nästlad include kräver full inläsning
+    (tmp_path / "extra.beancount").write_text(PURCHASE.format(date="2025-03-01"), encoding="utf-8")
+    year.write_text(SALE.format(date="2025-01-10") + 'include "extra.beancount"\n', encoding="utf-8")
+    periods = report.periods()
+    assert report.loaded_ledger
+    assert periods["2025-03"]["48"] == Decimal("199.60")
+    assert "2025-02" not in periods
+
+
+def test_new_file_under_glob_include(tmp_path):
+    ledger = tmp_path / "main.beancount"
+    _write(ledger, 'include "ledger/*.beancount"\n')
+    (tmp_path / "ledger").mkdir()
+    (tmp_path / "ledger" / "a.beancount").write_text(SALE.format(date="2025-01-10"), encoding="utf-8")
+
+    report = VATReport(ledger, cache_path=tmp_path / "vat.json")
+    assert report.periods()["2025-01"]["10"] == Decimal("2500.00")
+
+    # Ny importfil - huvudfilen och den gamla filen är oförändrade
+    (tmp_path / "ledger" / "b.beancount").write_text(SALE.format(date="2025-01-20"), encoding="utf-8")
+    periods = report.periods()
+    assert report.loaded_ledger
+    assert periods["2025-01"]["05"] == Decimal("20000.00")
+    assert periods == VATReport(ledger).periods()
+
+    # Borttagen fil
+    (tmp_path / "ledger" / "a.beancount").unlink()
+    assert report.periods()["2025-01"]["05"] == Decimal("10000.00")
+
+    report.periods()
+    assert not report.loaded_ledger
+
+
+def test_unknown_frequency():
+    with pytest.raises(ValueError):
+        VATReport("main.beancount", frequency="weekly")